@@ -0,0 +1,296 @@
+"""
+Adoption workflow for PetNest Network
+An application moves pending -> approved -> completed (or to rejected), and
+the pet moves available -> reserved -> adopted with it. adoptions and pets
+both carry a version column: a transition reads the current state without
+locking, then applies it with UPDATE ... WHERE version = <read version>, so
+of many sellers/admins/adopters acting on the same pet exactly one wins and
+the rest get a conflict instead of waiting on a row lock. The adoption and
+pet writes of a transition commit together with its outbox event in one
+short transaction; the seller's stats and badge are counted from the
+adoption.completed event (BadgeEngine.count_events) after it commits.
+"""
+
+import random
+import threading
+import time
+
+from checkout import RETRYABLE_ERRORS
+from outbox import emit, emit_select
+
+DUPLICATE_KEY = 1062
+
+# action -> (adoption from, adoption to, pet from, pet to, who may act)
+TRANSITIONS = {
+    'approve': ('pending', 'approved', 'available', 'reserved', 'seller'),
+    'reject': ('pending', 'rejected', None, None, 'seller'),
+    'withdraw': ('pending', 'rejected', None, None, 'adopter'),
+    'cancel': ('approved', 'rejected', 'reserved', 'available', 'seller'),
+    'complete': ('approved', 'completed', 'reserved', 'adopted', 'seller'),
+}
+
+# action -> outbox event type
+EVENT_TYPES = {
+    'approve': 'adoption.approved',
+    'reject': 'adoption.rejected',
+    'withdraw': 'adoption.withdrawn',
+    'cancel': 'adoption.cancelled',
+    'complete': 'adoption.completed',
+}
+
+COLUMNS = """a.adoption_id, a.pet_id, a.adopter_id, a.seller_id, a.adoption_date, a.adoption_fee, a.status,
+             a.approved_by, a.approved_at, a.notes, a.version, a.updated_at, p.pet_name, p.status AS pet_status"""
+
+
+class AdoptionConflict(Exception):
+    """The adoption or its pet is not in a state that allows the action (someone else acted first)"""
+
+    def __init__(self, message, current=None):
+        super().__init__(message)
+        self.current = current
+
+
+def _shape(row):
+    adoption = dict(row)
+    adoption['adoption_fee'] = float(adoption['adoption_fee']) if adoption['adoption_fee'] is not None else None
+    for key in ('adoption_date', 'approved_at', 'updated_at'):
+        adoption[key] = adoption[key].isoformat() if adoption[key] else None
+    return adoption
+
+
+class AdoptionWorkflow:
+    """Applies adoption transitions; safe to share between request threads"""
+
+    def __init__(self, get_connection, max_attempts=5, base_delay=0.01, max_delay=0.2):
+        self._get_connection = get_connection
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._metrics = {'applied': 0, 'approve': 0, 'reject': 0, 'withdraw': 0, 'cancel': 0, 'complete': 0,
+                         'conflicts': 0, 'retries': 0, 'auto_rejected': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def _connect(self):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        return connection
+
+    # ----- reads -----
+    def get(self, adoption_id):
+        """One adoption with its pet's name and status, None if missing"""
+        connection = self._connect()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT {COLUMNS} FROM adoptions a
+                JOIN pets p ON p.pet_id = a.pet_id
+                WHERE a.adoption_id = %s
+            """, (adoption_id,))
+            row = cursor.fetchone()
+            return _shape(row) if row else None
+        finally:
+            cursor.close()
+            connection.close()
+
+    def list_for(self, user_id, side='adopter', status=None, pet_id=None, limit=50):
+        """Newest applications made by (side='adopter') or received by (side='seller') a user"""
+        column = 'a.seller_id' if side == 'seller' else 'a.adopter_id'
+        clauses = [f"{column} = %s"]
+        params = [user_id]
+        if status:
+            clauses.append("a.status = %s")
+            params.append(status)
+        if pet_id:
+            clauses.append("a.pet_id = %s")
+            params.append(pet_id)
+        connection = self._connect()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute(f"""
+                SELECT {COLUMNS} FROM adoptions a
+                JOIN pets p ON p.pet_id = a.pet_id
+                WHERE {' AND '.join(clauses)}
+                ORDER BY a.adoption_id DESC
+                LIMIT %s
+            """, params + [limit])
+            return [_shape(row) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            connection.close()
+
+    # ----- writes -----
+    def apply(self, adopter_id, pet_id, notes=None):
+        """Create a pending application; returns its adoption_id
+
+        A single INSERT ... SELECT only succeeds while the pet is available
+        for adoption, and unique_open_application rejects a second open
+        application by the same adopter, so neither check needs a lock.
+        Raises LookupError if the pet does not exist and AdoptionConflict if
+        it cannot be applied for.
+        """
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            try:
+                cursor.execute("""
+                    INSERT INTO adoptions (pet_id, adopter_id, seller_id, adoption_fee, notes)
+                    SELECT pet_id, %s, seller_id, price, %s FROM pets
+                    WHERE pet_id = %s AND status = 'available' AND is_for_adoption = TRUE AND seller_id != %s
+                """, (adopter_id, notes, pet_id, adopter_id))
+            except Exception as e:
+                connection.rollback()
+                if getattr(e, 'errno', None) == DUPLICATE_KEY:
+                    self._count('conflicts')
+                    raise AdoptionConflict('You already have an open application for this pet')
+                raise
+            if cursor.rowcount == 1:
+                adoption_id = cursor.lastrowid
+                emit(cursor, 'adoption', adoption_id, 'adoption.applied',
+                     {'adoption_id': adoption_id, 'pet_id': pet_id, 'adopter_id': adopter_id})
+                connection.commit()
+                self._count('applied')
+                return adoption_id
+            connection.rollback()
+            # Only the failure path reads the pet, to say why
+            cursor.execute("SELECT seller_id, status, is_for_adoption FROM pets WHERE pet_id = %s", (pet_id,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+            connection.close()
+        if not row:
+            raise LookupError('Pet not found')
+        self._count('conflicts')
+        if row[0] == adopter_id:
+            raise AdoptionConflict('You cannot adopt your own pet')
+        if not row[2]:
+            raise AdoptionConflict('This pet is not listed for adoption')
+        raise AdoptionConflict(f"This pet is {row[1]}", {'pet_status': row[1]})
+
+    def transition(self, action, adoption_id, actor_id, is_admin=False, expected_version=None):
+        """Move an adoption (and its pet) along TRANSITIONS; returns the new state
+
+        With expected_version the caller's view must still be current, else
+        AdoptionConflict. Without it, a lost version race is retried against
+        freshly read state as long as the action is still allowed. Raises
+        LookupError, PermissionError or AdoptionConflict; deadlocks are
+        retried with jittered backoff.
+        """
+        if action not in TRANSITIONS:
+            raise ValueError(f"action must be one of {', '.join(TRANSITIONS)}")
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self._attempt(action, adoption_id, actor_id, is_admin, expected_version)
+            except AdoptionConflict:
+                self._count('conflicts')
+                raise
+            except Exception as e:
+                if getattr(e, 'errno', None) not in RETRYABLE_ERRORS or attempt >= self.max_attempts:
+                    raise
+                result = None
+            if result is not None:
+                self._count(action)
+                return result
+            if attempt >= self.max_attempts:
+                self._count('conflicts')
+                raise AdoptionConflict('The adoption is changing too often, please try again')
+            self._count('retries')
+            time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def _attempt(self, action, adoption_id, actor_id, is_admin, expected_version):
+        """One optimistic try; None means a version race was lost and may be retried"""
+        from_status, to_status, pet_from, pet_to, actor = TRANSITIONS[action]
+        connection = self._connect()
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # Plain read: no locks are held while the request is validated
+            cursor.execute("""
+                SELECT a.pet_id, a.adopter_id, a.seller_id, a.status, a.version,
+                       p.status AS pet_status, p.version AS pet_version
+                FROM adoptions a
+                JOIN pets p ON p.pet_id = a.pet_id
+                WHERE a.adoption_id = %s
+            """, (adoption_id,))
+            row = cursor.fetchone()
+            if not row:
+                raise LookupError('Adoption not found')
+            allowed = row['adopter_id'] == actor_id if actor == 'adopter' else (row['seller_id'] == actor_id or is_admin)
+            if not allowed:
+                raise PermissionError(f"Only the {actor} can {action} this adoption")
+            current = {'status': row['status'], 'version': row['version'], 'pet_status': row['pet_status']}
+            if expected_version is not None and row['version'] != expected_version:
+                raise AdoptionConflict('The adoption was changed by someone else', current)
+            if row['status'] != from_status:
+                raise AdoptionConflict(f"Cannot {action} an adoption that is {row['status']}", current)
+            if pet_from and row['pet_status'] != pet_from:
+                raise AdoptionConflict(f"Cannot {action}: the pet is {row['pet_status']}", current)
+
+            # With autocommit off the read opened a transaction; end it so the write starts a fresh one
+            connection.rollback()
+            connection.start_transaction()
+            extra = ", approved_by = %s, approved_at = CURRENT_TIMESTAMP" if action == 'approve' else ""
+            extra += ", adoption_date = CURRENT_TIMESTAMP" if action == 'complete' else ""
+            cursor.execute(f"""
+                UPDATE adoptions SET status = %s, version = version + 1{extra}
+                WHERE adoption_id = %s AND version = %s
+            """, [to_status] + ([actor_id] if action == 'approve' else []) + [adoption_id, row['version']])
+            if cursor.rowcount != 1:
+                connection.rollback()
+                return self._lost(expected_version, current)
+            if pet_to:
+                cursor.execute("""
+                    UPDATE pets SET status = %s, version = version + 1
+                    WHERE pet_id = %s AND version = %s
+                """, (pet_to, row['pet_id'], row['pet_version']))
+                if cursor.rowcount != 1:
+                    connection.rollback()
+                    return self._lost(expected_version, current)
+
+            emit(cursor, 'adoption', adoption_id, EVENT_TYPES[action], {
+                'adoption_id': adoption_id, 'pet_id': row['pet_id'], 'seller_id': row['seller_id'],
+                'status': to_status, 'version': row['version'] + 1, 'actor_id': actor_id
+            })
+
+            auto_rejected = 0
+            if action == 'complete':
+                # The pet is gone: close the applications still waiting for it
+                emit_select(cursor, 'adoption', 'adoption.rejected', 'adoption_id', {
+                    'adoption_id': 'adoption_id', 'pet_id': 'pet_id', 'status': "'rejected'",
+                    'version': 'version + 1', 'actor_id': 'NULL', 'reason': "'pet_adopted'"
+                }, "FROM adoptions WHERE pet_id = %s AND status = 'pending'", (row['pet_id'],))
+                cursor.execute("""
+                    UPDATE adoptions SET status = 'rejected', version = version + 1
+                    WHERE pet_id = %s AND status = 'pending'
+                """, (row['pet_id'],))
+                auto_rejected = cursor.rowcount
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+        if auto_rejected:
+            self._count('auto_rejected', auto_rejected)
+        return {
+            'adoption_id': adoption_id,
+            'status': to_status,
+            'version': row['version'] + 1,
+            'pet_id': row['pet_id'],
+            'pet_status': pet_to or row['pet_status']
+        }
+
+    def _lost(self, expected_version, current):
+        if expected_version is not None:
+            raise AdoptionConflict('The adoption was changed by someone else', current)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics)
@@ -0,0 +1,417 @@
+"""
+In-memory analytics cube for PetNest Network admin charts
+Report, adoption and user facts are held as NumPy columns: categoricals are
+dictionary-encoded to small integer codes, timestamps are epoch seconds.
+New rows are pulled past a gap-safe id watermark (watermarks.py, so a row
+that commits after a higher id was loaded is still picked up) and changed
+rows (by their updated/status-changed timestamp) are overwritten in place,
+so refreshes never rescan the tables. Queries filter with boolean masks and group with a
+single bincount over a composite key.
+"""
+
+import calendar
+import datetime
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import watermarks
+
+# kind: 'cat' (dictionary-encoded), 'time' (epoch seconds), 'num' (float);
+# time_column names the column that since/until and buckets apply to
+Column = namedtuple('Column', ['name', 'sql', 'kind'])
+FactSpec = namedtuple('FactSpec', ['name', 'table', 'id_column', 'time_column', 'columns', 'changed_column'])
+
+FACTS = {
+    'reports': FactSpec('reports', 'animal_reports', 'report_id', 'reported_at', [
+        Column('reported_at', 'reported_at', 'time'),
+        Column('city', 'city', 'cat'),
+        Column('condition', 'animal_condition', 'cat'),
+        Column('urgency', 'urgency_level', 'cat'),
+        Column('status', 'status', 'cat'),
+    ], 'status_changed_at'),
+    'adoptions': FactSpec('adoptions', 'adoptions', 'adoption_id', 'adoption_date', [
+        Column('adoption_date', 'adoption_date', 'time'),
+        Column('status', 'status', 'cat'),
+        Column('fee', 'adoption_fee', 'num'),
+    ], 'updated_at'),
+    'users': FactSpec('users', 'users', 'user_id', 'created_at', [
+        Column('created_at', 'created_at', 'time'),
+        Column('role', 'role', 'cat'),
+        Column('city', 'city', 'cat'),
+        Column('is_active', 'is_active', 'cat'),
+    ], 'updated_at'),
+}
+
+BUCKETS = ('day', 'week', 'month', 'year')
+DENSE_GROUPS = 1 << 20  # bincount over every possible group up to this many (or 4x the rows)
+DTYPES = {'cat': np.int32, 'time': np.int64, 'num': np.float64}
+
+
+def _epoch(value):
+    """Naive DB datetime -> epoch seconds (the DB clock is taken as-is)"""
+    if value is None:
+        return 0
+    return calendar.timegm(value.timetuple())
+
+
+class Dictionary:
+    """Value <-> code mapping for a categorical column (code 0 is NULL)"""
+
+    def __init__(self):
+        self.values = [None]
+        self._codes = {None: 0}
+
+    def encode(self, value):
+        if isinstance(value, (bool, int)) and not isinstance(value, str):
+            value = int(value)
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def lookup(self, value):
+        """Code of a value, -1 if never seen (query-string digits also match integer values)"""
+        code = self._codes.get(value, -1)
+        if code == -1 and isinstance(value, str) and value.isdigit():
+            code = self._codes.get(int(value), -1)
+        return code
+
+
+class FactTable:
+    """Growable column arrays for one fact, rows kept in id order"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.size = 0
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.columns = {column.name: np.zeros(0, dtype=DTYPES[column.kind]) for column in spec.columns}
+        # Day/week/month numbers of the time column, derived once on load instead of per query
+        for derived in ('_day', '_week', '_month'):
+            self.columns[derived] = np.zeros(0, dtype=np.int32)
+        self.dictionaries = {column.name: Dictionary() for column in spec.columns if column.kind == 'cat'}
+        self.watermark = None  # set on the first refresh, with the server's auto_increment step
+        self.changed_since = None
+
+    @property
+    def high_water(self):
+        """Highest id loaded"""
+        return int(self.ids[self.size - 1]) if self.size else 0
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.ids):
+            return
+        capacity = max(needed, len(self.ids) * 2, 1024)
+        self.ids = np.resize(self.ids, capacity)
+        for name, array in self.columns.items():
+            self.columns[name] = np.resize(array, capacity)
+
+    def encode_rows(self, rows):
+        """DB rows (id, *columns) -> (ids, {column: array})"""
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        arrays = {}
+        for position, column in enumerate(self.spec.columns, start=1):
+            if column.kind == 'cat':
+                encode = self.dictionaries[column.name].encode
+                values = (encode(row[position]) for row in rows)
+            elif column.kind == 'time':
+                values = (_epoch(row[position]) for row in rows)
+            else:
+                values = (float(row[position] or 0) for row in rows)
+            arrays[column.name] = np.fromiter(values, dtype=DTYPES[column.kind], count=len(rows))
+        return ids, self.with_derived(arrays)
+
+    def with_derived(self, arrays):
+        """Add the _day/_week/_month columns computed from the time column"""
+        seconds = arrays[self.spec.time_column]
+        arrays['_day'] = (seconds // 86400).astype(np.int32)
+        arrays['_week'] = (arrays['_day'] + 3) // 7  # weeks start on Monday
+        arrays['_month'] = seconds.astype('datetime64[s]').astype('datetime64[M]').astype(np.int32)
+        return arrays
+
+    def append(self, ids, arrays):
+        """Append rows whose ids are all above the high-water mark"""
+        count = len(ids)
+        if not count:
+            return
+        self._reserve(count)
+        self.ids[self.size:self.size + count] = ids
+        for name, values in arrays.items():
+            self.columns[name][self.size:self.size + count] = values
+        self.size += count
+
+    def load(self, ids, arrays):
+        """Add rows read past the watermark: new ids go at the end, late ones (gaps) in id order"""
+        self.watermark.advance([int(row_id) for row_id in ids])
+        late = ids <= self.high_water
+        if not late.any():
+            self.append(ids, arrays)
+            return
+        self.append(ids[~late], {name: values[~late] for name, values in arrays.items()})
+        positions = np.searchsorted(self.ids[:self.size], ids[late])
+        self._reserve(int(late.sum()))
+        size = self.size + int(late.sum())
+        self.ids[:size] = np.insert(self.ids[:self.size], positions, ids[late])
+        for name, values in arrays.items():
+            self.columns[name][:size] = np.insert(self.columns[name][:self.size], positions, values[late])
+        self.size = size
+
+    def overwrite(self, ids, arrays):
+        """Replace rows that are already loaded (matched by id)"""
+        if not self.size:
+            return 0
+        positions = np.searchsorted(self.ids[:self.size], ids)
+        found = (positions < self.size) & (self.ids[np.minimum(positions, self.size - 1)] == ids)
+        for name, values in arrays.items():
+            self.columns[name][positions[found]] = values[found]
+        return int(found.sum())
+
+    def view(self, name):
+        return self.columns[name][:self.size]
+
+
+# bucket -> derived column holding its number (days/weeks/months since 1970)
+BUCKET_COLUMNS = {'day': '_day', 'week': '_week', 'month': '_month', 'year': '_month'}
+
+
+def _bucket_label(number, bucket):
+    if bucket == 'day':
+        return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(number))).isoformat()
+    if bucket == 'week':
+        return (datetime.date(1970, 1, 1) + datetime.timedelta(days=int(number) * 7 - 3)).isoformat()
+    if bucket == 'month':
+        return f"{1970 + int(number) // 12:04d}-{int(number) % 12 + 1:02d}"
+    return str(1970 + int(number))
+
+
+class AnalyticsCube:
+    """All facts, their refresh from MySQL, and slice/group-by/time-bucket queries"""
+
+    def __init__(self, get_connection, refresh_interval=30, batch_size=50000):
+        self._get_connection = get_connection
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.tables = {name: FactTable(spec) for name, spec in FACTS.items()}
+        self._lock = threading.RLock()
+        self._last_refresh = 0.0
+        self.ready = False
+        self._metrics = {'refreshes': 0, 'rows_loaded': 0, 'rows_updated': 0, 'queries': 0, 'errors': 0}
+
+    # ----- loading -----
+    def refresh(self, force=False):
+        """Pull new and changed rows for every fact; returns rows touched"""
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return 0
+        self._last_refresh = now
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        touched = 0
+        try:
+            for table in self.tables.values():
+                if table.watermark is None:
+                    table.watermark = watermarks.Watermark(table.high_water, (), *watermarks.step_of(connection))
+                touched += self._refresh_table(cursor, table)
+            self.ready = True
+            self._metrics['refreshes'] += 1
+        finally:
+            cursor.close()
+            connection.close()
+        return touched
+
+    def _refresh_table(self, cursor, table):
+        """Rows are fetched outside the lock; only encoding/applying them blocks queries"""
+        spec = table.spec
+        select = ', '.join([spec.id_column] + [column.sql for column in spec.columns])
+        cursor.execute("SELECT CURRENT_TIMESTAMP")
+        started_at = cursor.fetchone()[0]
+        loaded_up_to = table.high_water
+        touched = 0
+
+        # Changed rows among those already loaded
+        if table.changed_since is not None and loaded_up_to:
+            cursor.execute(f"""
+                SELECT {select} FROM {spec.table}
+                WHERE {spec.changed_column} >= %s AND {spec.id_column} <= %s
+            """, (table.changed_since, loaded_up_to))
+            rows = cursor.fetchall()
+            if rows:
+                with self._lock:
+                    updated = table.overwrite(*table.encode_rows(rows))
+                self._metrics['rows_updated'] += updated
+                touched += updated
+
+        # New rows past the watermark, and missing ids below it that have committed since
+        table.watermark.expire()
+        while True:
+            condition, params = table.watermark.condition(spec.id_column)
+            cursor.execute(f"""
+                SELECT {select} FROM {spec.table}
+                WHERE {condition} ORDER BY {spec.id_column} LIMIT %s
+            """, params + [self.batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            with self._lock:
+                table.load(*table.encode_rows(rows))
+            self._metrics['rows_loaded'] += len(rows)
+            touched += len(rows)
+            if len(rows) < self.batch_size:
+                break
+
+        # Overlap a little so a change committed during this pass is seen next time
+        table.changed_since = started_at - datetime.timedelta(seconds=5)
+        return touched
+
+    def start(self):
+        """Initial load plus a background refresh loop"""
+        def loop():
+            while True:
+                try:
+                    self.refresh(force=True)
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    print(f"⚠️ Analytics refresh failed: {e}")
+                time.sleep(self.refresh_interval)
+        threading.Thread(target=loop, name='analytics-refresh', daemon=True).start()
+
+    # ----- queries -----
+    def query(self, fact, group_by=(), bucket=None, filters=None, since=None, until=None, measure='count'):
+        """Group counts (or sums of a numeric column) over a slice of one fact
+
+        filters: {column: [values]}; since/until: datetimes on the fact's time
+        column; bucket: day/week/month/year on that column. Returns a list of
+        dicts with one key per group column, 'bucket' and 'value'.
+        """
+        if fact not in self.tables:
+            raise ValueError(f"Unknown fact: {fact}")
+        table = self.tables[fact]
+        kinds = {column.name: column.kind for column in table.spec.columns}
+        time_name = table.spec.time_column
+        for name in list(group_by) + list((filters or {}).keys()):
+            if kinds.get(name) != 'cat':
+                raise ValueError(f"{fact} has no categorical column '{name}'")
+        if len(set(group_by)) != len(group_by):
+            raise ValueError("group_by columns must be distinct")
+        if bucket and bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        if measure != 'count' and kinds.get(measure) != 'num':
+            raise ValueError(f"measure must be 'count' or a numeric column of {fact}")
+
+        self._metrics['queries'] += 1
+        with self._lock:
+            # No mask (and no column copies) unless something filters rows
+            mask = None
+            for name, values in (filters or {}).items():
+                # Boolean lookup table indexed by code: one gather instead of np.isin
+                wanted = np.zeros(len(table.dictionaries[name].values), dtype=bool)
+                for value in values:
+                    code = table.dictionaries[name].lookup(value)
+                    if code >= 0:
+                        wanted[code] = True
+                matched = wanted[table.view(name)]
+                mask = matched if mask is None else mask & matched
+            if since or until:
+                times = table.view(time_name)
+                in_range = np.ones(table.size, dtype=bool)
+                if since:
+                    in_range &= times >= _epoch(since)
+                if until:
+                    in_range &= times < _epoch(until)
+                mask = in_range if mask is None else mask & in_range
+
+            def column(name):
+                values = table.view(name)
+                return values if mask is None else values[mask]
+
+            # Composite group key: mixed-radix number over the group columns (and bucket)
+            parts = []
+            for name in group_by:
+                parts.append((name, column(name), len(table.dictionaries[name].values)))
+            bucket_offset = 0
+            if bucket:
+                numbers = column(BUCKET_COLUMNS[bucket])
+                if bucket == 'year':
+                    numbers = numbers // 12
+                # Bucket numbers count from 1970: offset them to the slice's own range
+                if len(numbers):
+                    bucket_offset = int(numbers.min())
+                    numbers = numbers - bucket_offset
+                    radix = int(numbers.max()) + 1
+                else:
+                    radix = 1
+                parts.insert(0, ('bucket', numbers, radix))
+            weights = column(measure) if measure != 'count' else None
+            rows = table.size if mask is None else int(np.count_nonzero(mask))
+            dictionaries = {name: list(table.dictionaries[name].values) for name in group_by}
+
+        total_groups = 1
+        for _, _, radix in parts:
+            total_groups *= radix
+        if total_groups <= max(DENSE_GROUPS, 4 * rows):
+            # bincount wants intp, so build the key in intp directly
+            if not parts:
+                key = np.zeros(rows, dtype=np.intp)
+            else:
+                key = parts[0][1].astype(np.intp)
+                for _, codes, radix in parts[1:]:
+                    key *= radix
+                    key += codes
+            counts = np.bincount(key, minlength=total_groups)
+
+            def codes_of(flat):
+                codes = []
+                for _, _, radix in reversed(parts):
+                    flat, code = divmod(flat, radix)
+                    codes.append(code)
+                return reversed(codes)
+        else:
+            # Too many possible groups to count densely: renumber the key to the groups
+            # present after each column, so it never exceeds the row count
+            key = np.zeros(rows, dtype=np.int64)
+            for _, codes, radix in parts:
+                key = np.unique(key * radix + codes, return_inverse=True)[1].reshape(-1)
+            first = np.unique(key, return_index=True)[1]
+            counts = np.bincount(key, minlength=len(first))
+
+            def codes_of(group):
+                return (int(codes[first[group]]) for _, codes, _ in parts)
+
+        # A group exists when it has rows, even if its sum is 0 (free adoptions)
+        groups = np.flatnonzero(counts)
+        values = counts if weights is None else np.bincount(key, weights=weights, minlength=len(counts))
+        results = []
+        for group in groups:
+            row = {}
+            for (name, _, _), code in zip(parts, codes_of(int(group))):
+                row[name] = _bucket_label(code + bucket_offset, bucket) if name == 'bucket' else dictionaries[name][code]
+            row['value'] = float(values[group]) if weights is not None else int(values[group])
+            results.append(row)
+        return results
+
+    def describe(self):
+        """Facts with their groupable columns and row counts"""
+        return {
+            name: {
+                'rows': table.size,
+                'high_water': table.high_water,
+                'dimensions': [c.name for c in table.spec.columns if c.kind == 'cat'],
+                'measures': ['count'] + [c.name for c in table.spec.columns if c.kind == 'num']
+            }
+            for name, table in self.tables.items()
+        }
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['ready'] = self.ready
+        stats['rows'] = {name: table.size for name, table in self.tables.items()}
+        stats['bytes'] = sum(table.ids.nbytes + sum(a.nbytes for a in table.columns.values())
+                             for table in self.tables.values())
+        return stats
@@ -1,7 +1,7 @@
-﻿from flask import Flask, request, jsonify, session, make_response, send_from_directory
+﻿from flask import Flask, request, jsonify, make_response, send_from_directory
 from flask_cors import CORS
-from flask_session import Session
 from dotenv import load_dotenv
+import click
 import os
 import mysql.connector
 from mysql.connector import Error
@@ -9,8 +9,35 @@ import bcrypt
 import jwt
 import datetime
 from functools import wraps
+import gzip
 import re
-import uuid
+from session_store import SessionStore, SessionReaper, MySQLSessionBackend, MemorySessionBackend
+from rate_limiter import RateLimiter, ShardedMemoryStore, RedisStore, retry_after_header
+from availability import AvailabilityIndex, LookupCache, normalize
+from report_photos import describe_bytes, thumbnail_bytes, insert_report_photos, backfill_photo_metadata
+from badges import EVENT_COUNTERS, BadgeEngine, load_rules
+from work_queue import ReportWorkQueue, TransitionError, TRANSITIONS
+from report_sla import SlaAggregator, record_report_created, sla_percentiles
+from user_directory import (SEARCH_FIELDS, ROLES, BULK_ACTIONS, decode_cursor, list_users,
+                            approximate_count, bulk_update)
+from user_import import UserImporter, ImportJobs, read_rows, format_for, write_results
+from heatmap import HeatmapIndex, CONDITIONS, STATUSES, rebuild as rebuild_heatmap
+from analytics import AnalyticsCube
+from storage import create_storage, is_legacy_path, migrate_uploads
+from pets import (STATUSES as PET_STATUSES, list_pets, popular_pets, get_pet, add_images as add_pet_images,
+                  set_primary_image, delete_image as delete_pet_image)
+from favorites import FavoritesStore, MAX_BULK as MAX_FAVORITES_BULK
+from checkout import Checkout, CheckoutError, RETRYABLE_ERRORS
+from catalog import CatalogIndex, CATEGORIES
+from sales import store_dashboard, backfill as backfill_sales
+from adoptions import AdoptionWorkflow, AdoptionConflict, TRANSITIONS as ADOPTION_TRANSITIONS
+from recommendations import Recommender
+from duplicates import perceptual_hash, check_report as check_duplicate_report, prune as prune_photo_hashes
+from report_search import search as search_reports
+from suggest import Suggester
+from sync import changes as sync_changes, find_client_report, is_valid_client_id
+from outbox import OutboxRelay, SpoolBroker, emit as emit_event, prune as prune_outbox
+from notifications import notify, PREFIXES as NOTIFICATION_PREFIXES
 
 # Load environment variables
 load_dotenv()
@@ -20,12 +47,17 @@ app = Flask(__name__)
 
 # Configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'petnest_dev_secret_key')
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_PERMANENT'] = False
-app.config['SESSION_USE_SIGNER'] = True
+app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'mysql')  # 'mysql' (shared) or 'memory' (single worker)
 app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=7)
+app.config['SESSION_REAPER_ENABLED'] = os.getenv('SESSION_REAPER_ENABLED', 'true').lower() == 'true'
+app.config['SESSION_REAPER_INTERVAL'] = int(os.getenv('SESSION_REAPER_INTERVAL', 300))  # seconds between runs
+app.config['SESSION_REAPER_BATCH'] = int(os.getenv('SESSION_REAPER_BATCH', 500))  # rows per DELETE
+app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # 'memory' (per process) or 'redis' (shared)
+app.config['REDIS_URL'] = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'local')  # 'local' (sharded static/uploads) or 's3'
+app.config['IMPORT_RESULTS_FOLDER'] = os.getenv('IMPORT_RESULTS_FOLDER', 'import_results')  # not under static/
 
 # Configure CORS to allow credentials
 CORS(app, 
@@ -34,9 +66,6 @@ CORS(app,
      methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'],
      allow_headers=['Content-Type', 'Authorization', 'X-Requested-With'])
 
-# Initialize session
-Session(app)
-
 # ========== DATABASE CONNECTION ==========
 def get_db_connection():
     """Get MySQL database connection"""
@@ -54,6 +83,200 @@ def get_db_connection():
         print(f"❌ Database connection error: {e}")
         return None
 
+# ========== UPLOAD STORAGE ==========
+# Content-addressed, sharded storage for every uploaded file
+upload_storage = create_storage(
+    app.config['STORAGE_BACKEND'],
+    root=app.config['UPLOAD_FOLDER'],
+    bucket=os.getenv('S3_BUCKET', 'petnest-uploads'),
+    endpoint_url=os.getenv('S3_ENDPOINT_URL'),  # e.g. http://localhost:9000 for MinIO
+    access_key=os.getenv('S3_ACCESS_KEY'),
+    secret_key=os.getenv('S3_SECRET_KEY'),
+    region=os.getenv('S3_REGION'),
+    public_url=os.getenv('S3_PUBLIC_URL')
+)
+
+# ========== SESSION STORE ==========
+def create_session_store():
+    """Build the login session store for the configured backend"""
+    if app.config['SESSION_BACKEND'] == 'memory':
+        backend = MemorySessionBackend()
+    else:
+        backend = MySQLSessionBackend(get_db_connection)
+    return SessionStore(backend, lifetime=app.config['PERMANENT_SESSION_LIFETIME'])
+
+session_store = create_session_store()
+
+# Expired sessions are purged in the background, never on the login path
+session_reaper = SessionReaper(
+    session_store.backend,
+    interval=app.config['SESSION_REAPER_INTERVAL'],
+    batch_size=app.config['SESSION_REAPER_BATCH']
+)
+if app.config['SESSION_REAPER_ENABLED']:
+    session_reaper.start()
+
+# ========== AVAILABILITY INDEX ==========
+# Bloom filter over usernames/emails: definite misses never reach MySQL
+availability_index = AvailabilityIndex(get_db_connection)
+availability_index.build_in_background()
+
+# Recent check_username results for names the filter could not rule out
+username_lookup_cache = LookupCache(capacity=10000, ttl=30)
+
+# ========== BADGES ==========
+# Stats counters and badge thresholds (rules overridable via system_settings.badge_rules)
+badge_engine = BadgeEngine(load_rules(get_db_connection))
+
+# ========== SHELTER WORK QUEUE ==========
+report_queue = ReportWorkQueue(get_db_connection, lease_seconds=int(os.getenv('REPORT_LEASE_SECONDS', 300)))
+
+# user_id -> approved shelter_id (or None) for queue endpoints
+shelter_id_cache = LookupCache(capacity=5000, ttl=300)
+
+# ========== REPORT HEATMAP ==========
+# Per-worker geohash tiles; the aggregator that persists report_geo_cells runs where enabled
+heatmap_index = HeatmapIndex(get_db_connection, refresh_interval=int(os.getenv('HEATMAP_REFRESH_INTERVAL', 5)))
+heatmap_index.load_in_background()
+if os.getenv('HEATMAP_AGGREGATOR_ENABLED', 'true').lower() == 'true':
+    heatmap_index.start()
+
+# ========== ADMIN ANALYTICS ==========
+# Report/adoption/user facts as NumPy columns, refreshed from id and updated_at high-water marks
+analytics_cube = AnalyticsCube(get_db_connection, refresh_interval=int(os.getenv('ANALYTICS_REFRESH_INTERVAL', 30)))
+if os.getenv('ANALYTICS_ENABLED', 'true').lower() == 'true':
+    analytics_cube.start()
+
+# ========== USER IMPORT ==========
+def register_imported_users(rows):
+    """Make imported usernames/emails visible to the availability filter right away"""
+    for row in rows:
+        availability_index.add(username=row['username'], email=row['email'])
+        username_lookup_cache.discard(normalize(row['username']))
+
+import_jobs = ImportJobs(get_db_connection, app.config['IMPORT_RESULTS_FOLDER'], on_created=register_imported_users)
+
+# ========== REPORT SLA ==========
+# Folds report_status_events into the report_sla_rollup histograms
+sla_aggregator = SlaAggregator(get_db_connection, interval=int(os.getenv('SLA_AGGREGATOR_INTERVAL', 10)))
+if os.getenv('SLA_AGGREGATOR_ENABLED', 'true').lower() == 'true':
+    sla_aggregator.start()
+
+# ========== CHECKOUT ==========
+# Conditional stock decrements; deadlocks are retried with jittered backoff
+order_checkout = Checkout(get_db_connection, max_attempts=int(os.getenv('CHECKOUT_MAX_ATTEMPTS', 5)))
+
+# ========== PRODUCT CATALOG ==========
+# In-memory browse pages; changes come from products.updated_at polling and reload() after local writes
+catalog_index = CatalogIndex(get_db_connection, refresh_interval=int(os.getenv('CATALOG_REFRESH_INTERVAL', 5)))
+if os.getenv('CATALOG_ENABLED', 'true').lower() == 'true':
+    catalog_index.load_in_background()
+    catalog_index.start()
+
+# ========== FAVORITES ==========
+# Per-user favorite pet ids as sorted int arrays; pets.favorite_count is kept by the writes
+favorites_store = FavoritesStore(get_db_connection, ttl=int(os.getenv('FAVORITES_CACHE_TTL', 120)))
+
+# ========== ADOPTIONS ==========
+# apply -> approve -> complete with version checks instead of row locks
+adoption_workflow = AdoptionWorkflow(get_db_connection,
+                                     max_attempts=int(os.getenv('ADOPTION_MAX_ATTEMPTS', 5)))
+
+# ========== RECOMMENDATIONS ==========
+# Available pets as one-hot feature codes in NumPy; per-adopter rankings cached for cache_ttl seconds
+recommender = Recommender(get_db_connection,
+                          refresh_interval=int(os.getenv('RECOMMENDATIONS_REFRESH_INTERVAL', 30)),
+                          cache_ttl=int(os.getenv('RECOMMENDATIONS_CACHE_TTL', 300)))
+if os.getenv('RECOMMENDATIONS_ENABLED', 'true').lower() == 'true':
+    recommender.start()
+
+# ========== SUGGESTIONS ==========
+# Distinct types, breeds, cities, areas and streets in sorted arrays, ranked by how often they are used
+suggester = Suggester(get_db_connection,
+                      refresh_interval=int(os.getenv('SUGGEST_REFRESH_INTERVAL', 30)),
+                      rebuild_interval=int(os.getenv('SUGGEST_REBUILD_INTERVAL', 3600)))
+if os.getenv('SUGGEST_ENABLED', 'true').lower() == 'true':
+    suggester.start()
+
+# ========== OUTBOX ==========
+def log_report_activity(cursor, events):
+    """Outbox handler: REPORT_CREATED activity rows, written off the request path"""
+    cursor.execute(f"""
+        INSERT INTO activity_logs (user_id, action, details, ip_address, user_agent)
+        VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(events))}
+    """, [value for event in events for value in (
+        event['payload']['reporter_id'], 'REPORT_CREATED', f"Created animal report #{event['aggregate_id']}",
+        event['payload'].get('ip_address'), event['payload'].get('user_agent'))])
+
+# Events written in the same transaction as report/adoption changes, delivered in batches by one worker
+SPOOL_EVENTS = ('report.created,report.status_changed,adoption.applied,adoption.approved,adoption.rejected,'
+                'adoption.withdrawn,adoption.cancelled,adoption.completed')
+outbox_relay = OutboxRelay(get_db_connection,
+                           interval=float(os.getenv('OUTBOX_RELAY_INTERVAL', 1)),
+                           batch_size=int(os.getenv('OUTBOX_BATCH_SIZE', 500)))
+outbox_relay.subscribe('notifications', notify, NOTIFICATION_PREFIXES)
+outbox_relay.subscribe('activity_log', log_report_activity, ('report.created',))
+# Reporter/seller counters and badges, bumped outside the request so it does not hold the user's stats row
+outbox_relay.subscribe('badges', badge_engine.count_events, tuple(EVENT_COUNTERS))
+if os.getenv('OUTBOX_SPOOL_PATH'):
+    # JSON lines for consumers outside the app (search indexers, analytics), standing in for a broker;
+    # only the listed event types leave the app
+    outbox_relay.subscribe('spool', SpoolBroker(os.getenv('OUTBOX_SPOOL_PATH')), [
+        event_type.strip() for event_type in os.getenv('OUTBOX_SPOOL_EVENTS', SPOOL_EVENTS).split(',')
+        if event_type.strip()])
+if os.getenv('OUTBOX_RELAY_ENABLED', 'true').lower() == 'true':
+    outbox_relay.start()
+
+# ========== RATE LIMITING ==========
+def create_rate_limiter():
+    """Build the rate limiter and its rules for unauthenticated endpoints"""
+    if app.config['RATE_LIMIT_BACKEND'] == 'redis':
+        store = RedisStore(app.config['REDIS_URL'])
+    else:
+        store = ShardedMemoryStore()
+    limiter = RateLimiter(store)
+    limiter.bucket('auth:ip', capacity=30, per_seconds=60)            # login / reset requests per IP
+    limiter.bucket('lookup:ip', capacity=60, per_seconds=60)          # keystroke-driven lookups per IP
+    limiter.bucket('suggest:ip', capacity=300, per_seconds=60)        # autocomplete keystrokes per IP
+    limiter.bucket('login:identifier', capacity=10, per_seconds=60)   # login attempts per account
+    limiter.bucket('reset:identifier', capacity=5, per_seconds=300)   # reset attempts per account
+    limiter.window('login:failures', limit=5, window_seconds=900)     # failed passwords per account
+    limiter.window('login:ip_failures', limit=20, window_seconds=900) # failed passwords per IP
+    return limiter
+
+rate_limiter = create_rate_limiter()
+
+def client_ip():
+    """Rate-limit key for the calling IP"""
+    return request.remote_addr or 'unknown'
+
+def json_field(name):
+    """Rate-limit key taken from a JSON body field (normalised), None if absent"""
+    def key():
+        data = request.get_json(silent=True) or {}
+        value = str(data.get(name) or '').strip().lower()
+        return value or None
+    return key
+
+def rate_limited(*checks):
+    """Reject over-limit requests with 429 before the endpoint touches the database"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method != 'OPTIONS':
+                for rule, key_func in checks:
+                    key = key_func()
+                    if key is None:
+                        continue
+                    decision = rate_limiter.check(rule, key)
+                    if not decision.allowed:
+                        response = jsonify({'success': False, 'message': 'Too many attempts. Please try again later.'})
+                        response.headers['Retry-After'] = retry_after_header(decision)
+                        return response, 429
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
+
 # ========== UTILITY FUNCTIONS ==========
 def hash_password(password):
     """Hash a password using bcrypt"""
@@ -94,68 +317,42 @@ def generate_session_token(user_id):
         return None
 
 def create_session_in_db(user_id, session_token, request):
-    """Create a session record in database"""
-    connection = get_db_connection()
-    if not connection:
-        return False
-    
-    cursor = None
+    """Create a session record in the session store"""
     try:
-        cursor = connection.cursor()
-        expires_at = datetime.datetime.now() + datetime.timedelta(days=7)
-        
-        # Create user_sessions table if not exists
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                session_id VARCHAR(255) PRIMARY KEY,
-                user_id INT NOT NULL,
-                session_data TEXT,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Delete old sessions for this user
-        cursor.execute("DELETE FROM user_sessions WHERE user_id = %s", (user_id,))
-        
-        # Insert new session
-        cursor.execute("""
-            INSERT INTO user_sessions 
-            (session_id, user_id, session_data, expires_at)
-            VALUES (%s, %s, %s, %s)
-        """, (
-            session_token,
-            user_id,
-            str({'ip': request.remote_addr, 'agent': request.user_agent.string}),
-            expires_at
-        ))
-        
-        connection.commit()
+        session_store.create(user_id, session_token, request.remote_addr, request.user_agent.string)
         return True
-    except Error as e:
+    except Exception as e:
         print(f"❌ Session creation error: {e}")
         return False
-    finally:
-        if cursor:
-            cursor.close()
-        connection.close()
 
 # ========== AUTH MIDDLEWARE ==========
+def request_token():
+    """Session token from the cookie, else from an Authorization: Bearer header"""
+    token = request.cookies.get('session_token')
+    if not token and request.headers.get('Authorization'):
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+    return token
+
+def optional_user_id():
+    """user_id of a valid session on a public endpoint, None for anonymous visitors"""
+    token = request_token()
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, os.getenv('JWT_SECRET_KEY', 'petnest_jwt_secret_2025'), algorithms=['HS256'])
+        session_record = session_store.get(token)
+        if session_record and session_record.user_id == payload['user_id']:
+            return payload['user_id']
+    except Exception:
+        pass
+    return None
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Get token from cookies
-        if 'session_token' in request.cookies:
-            token = request.cookies.get('session_token')
-        
-        # Get token from headers
-        if not token and request.headers.get('Authorization'):
-            auth_header = request.headers.get('Authorization')
-            if auth_header and auth_header.startswith('Bearer '):
-                token = auth_header.split(' ')[1]
+        token = request_token()
         
         if not token:
             return jsonify({'success': False, 'message': 'Session token is missing'}), 401
@@ -168,20 +365,10 @@ def token_required(f):
                 algorithms=['HS256']
             )
             
-            # Check session in database
-            connection = get_db_connection()
-            if connection:
-                cursor = connection.cursor(dictionary=True)
-                cursor.execute("""
-                    SELECT * FROM user_sessions 
-                    WHERE session_id = %s AND expires_at > NOW()
-                """, (token,))
-                session_data = cursor.fetchone()
-                cursor.close()
-                connection.close()
-                
-                if not session_data:
-                    return jsonify({'success': False, 'message': 'Invalid or expired session'}), 401
+            # Check session in the session store (hot tier, then shared backend)
+            session_record = session_store.get(token)
+            if not session_record or session_record.user_id != payload['user_id']:
+                return jsonify({'success': False, 'message': 'Invalid or expired session'}), 401
             
             # Store user_id in request context
             request.user_id = payload['user_id']
@@ -198,6 +385,49 @@ def token_required(f):
     
     return decorated
 
+# user_id -> role for admin and store endpoints
+user_role_cache = LookupCache(capacity=5000, ttl=60)
+
+def current_user_role():
+    """Role of the authenticated user (None if inactive); raises ConnectionError without a database"""
+    cached, role = user_role_cache.get(request.user_id)
+    if not cached:
+        connection = get_db_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        cursor.execute("SELECT role FROM users WHERE user_id = %s AND is_active = TRUE", (request.user_id,))
+        row = cursor.fetchone()
+        cursor.close()
+        connection.close()
+        role = row[0] if row else None
+        user_role_cache.put(request.user_id, role)
+    return role
+
+def role_required(role_name):
+    """Use below @token_required: only active users with this role get through"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+            
+            try:
+                role = current_user_role()
+            except ConnectionError:
+                return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            
+            if role != role_name:
+                return jsonify({'success': False, 'message': f'{role_name.capitalize()} access required'}), 403
+            
+            return f(*args, **kwargs)
+        
+        return decorated
+    return decorator
+
+admin_required = role_required('admin')
+store_required = role_required('store')
+
 # ========== HELPER FUNCTIONS ==========
 def create_cors_response():
     """Create CORS preflight response"""
@@ -226,23 +456,12 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def save_uploaded_file(file, upload_type='profiles'):
-    """Save uploaded file and return its path"""
+    """Save uploaded file and return its URL"""
     try:
         if file and file.filename and allowed_file(file.filename):
-            # Generate unique filename
             file_ext = file.filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4().hex}.{file_ext}"
-            
-            # Create directory if not exists
-            upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], upload_type)
-            os.makedirs(upload_dir, exist_ok=True)
-            
-            # Save file
-            file_path = os.path.join(upload_dir, unique_filename)
-            file.save(file_path)
-            
-            # Return relative path
-            return f"/static/uploads/{upload_type}/{unique_filename}"
+            _, url = upload_storage.put(upload_type, file.read(), file_ext)
+            return url
     except Exception as e:
         print(f"❌ File save error: {e}")
     return None
@@ -255,6 +474,7 @@ def serve_static(filename):
 
 # ========== PASSWORD RESET ROUTES ==========
 @app.route('/api/auth/verify_identity', methods=['POST', 'OPTIONS'])
+@rate_limited(('auth:ip', client_ip), ('reset:identifier', json_field('username')))
 def verify_identity():
     """Verify user identity for password reset"""
     if request.method == 'OPTIONS':
@@ -309,6 +529,7 @@ def verify_identity():
         return jsonify({'success': False, 'message': 'Server error'}), 500
 
 @app.route('/api/auth/direct_reset', methods=['POST', 'OPTIONS'])
+@rate_limited(('auth:ip', client_ip), ('reset:identifier', json_field('user_id')))
 def direct_reset_password():
     """Direct password reset with user_id (after identity verification)"""
     if request.method == 'OPTIONS':
@@ -359,6 +580,9 @@ def direct_reset_password():
         
         connection.commit()
         
+        # Sessions opened with the old password end on every worker
+        session_store.revoke_user(user[0])
+        
         # Log the activity
         try:
             ip_address = request.remote_addr
@@ -388,6 +612,7 @@ def direct_reset_password():
         return jsonify({'success': False, 'message': 'Server error'}), 500
 
 @app.route('/api/auth/check_username', methods=['POST', 'OPTIONS'])
+@rate_limited(('lookup:ip', client_ip))
 def check_username():
     """Check if username exists (for form validation)"""
     if request.method == 'OPTIONS':
@@ -400,20 +625,27 @@ def check_username():
         if not username:
             return jsonify({'success': False, 'message': 'Username is required'}), 400
         
-        connection = get_db_connection()
-        if not connection:
-            return jsonify({'success': False, 'message': 'Database error'}), 500
-        
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute("""
-            SELECT user_id, email, phone, role 
-            FROM users 
-            WHERE username = %s AND is_active = TRUE
-        """, (username,))
-        
-        user = cursor.fetchone()
-        cursor.close()
-        connection.close()
+        if not availability_index.may_exist('username', username):
+            user = None
+        else:
+            cache_key = normalize(username)
+            cached, user = username_lookup_cache.get(cache_key)
+            if not cached:
+                connection = get_db_connection()
+                if not connection:
+                    return jsonify({'success': False, 'message': 'Database error'}), 500
+                
+                cursor = connection.cursor(dictionary=True)
+                cursor.execute("""
+                    SELECT user_id, email, phone, role 
+                    FROM users 
+                    WHERE username = %s AND is_active = TRUE
+                """, (username,))
+                
+                user = cursor.fetchone()
+                cursor.close()
+                connection.close()
+                username_lookup_cache.put(cache_key, user)
         
         if user:
             # Mask email for security
@@ -448,6 +680,7 @@ def check_username():
         return jsonify({'success': False, 'message': 'Server error'}), 500
 
 @app.route('/api/auth/get_user_by_email', methods=['POST', 'OPTIONS'])
+@rate_limited(('lookup:ip', client_ip))
 def get_user_by_email():
     """Get user info by email (for email verification step)"""
     if request.method == 'OPTIONS':
@@ -460,6 +693,13 @@ def get_user_by_email():
         if not email:
             return jsonify({'success': False, 'message': 'Email is required'}), 400
         
+        if not availability_index.may_exist('email', email):
+            return jsonify({
+                'success': True,
+                'exists': False,
+                'message': 'Email not found'
+            })
+        
         connection = get_db_connection()
         if not connection:
             return jsonify({'success': False, 'message': 'Database error'}), 500
@@ -571,13 +811,15 @@ def register():
         
         cursor = connection.cursor(dictionary=True)
         
-        # Check duplicates
-        cursor.execute("SELECT user_id FROM users WHERE username = %s OR email = %s", 
-                      (data['username'], data['email']))
-        if cursor.fetchone():
-            cursor.close()
-            connection.close()
-            return jsonify({'success': False, 'message': 'Username or email already exists'}), 409
+        # Check duplicates (skipped when the filter rules both out; the UNIQUE keys still guard races)
+        if (availability_index.may_exist('username', data['username'])
+                or availability_index.may_exist('email', data['email'])):
+            cursor.execute("SELECT user_id FROM users WHERE username = %s OR email = %s", 
+                          (data['username'], data['email']))
+            if cursor.fetchone():
+                cursor.close()
+                connection.close()
+                return jsonify({'success': False, 'message': 'Username or email already exists'}), 409
         
         # Hash password
         hashed_pw = hash_password(data['password'])
@@ -617,6 +859,8 @@ def register():
             ))
         
         connection.commit()
+        availability_index.add(username=data['username'], email=data['email'])
+        username_lookup_cache.discard(normalize(data['username']))
         
         # Generate token and session
         token = generate_session_token(user_id)
@@ -664,7 +908,18 @@ def register():
         print(f"❌ Registration error: {e}")
         return jsonify({'success': False, 'message': 'Server error'}), 500
 
+def record_login_failure(identifier):
+    """Count a failed login against the account and the calling IP"""
+    rate_limiter.record('login:failures', identifier.lower())
+    rate_limiter.record('login:ip_failures', client_ip())
+
 @app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
+@rate_limited(
+    ('auth:ip', client_ip),
+    ('login:ip_failures', client_ip),
+    ('login:identifier', json_field('identifier')),
+    ('login:failures', json_field('identifier'))
+)
 def login():
     """Handle user login with email/username"""
     if request.method == 'OPTIONS':
@@ -698,14 +953,18 @@ def login():
         if not user:
             cursor.close()
             connection.close()
+            record_login_failure(identifier)
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
         # Verify password
         if not verify_password(password, user['password']):
             cursor.close()
             connection.close()
+            record_login_failure(identifier)
             return jsonify({'success': False, 'message': 'Invalid credentials'}), 401
         
+        rate_limiter.reset('login:failures', identifier.lower())
+        
         # Generate token
         token = generate_session_token(user['user_id'])
         if token:
@@ -821,14 +1080,9 @@ def logout():
     try:
         token = request.cookies.get('session_token')
         
-        # Delete session from database
-        connection = get_db_connection()
-        if connection:
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM user_sessions WHERE session_id = %s", (token,))
-            connection.commit()
-            cursor.close()
-            connection.close()
+        # Delete session from the session store
+        if token:
+            session_store.delete(token)
         
         response = jsonify({'success': True, 'message': 'Logged out'})
         response.set_cookie('session_token', '', expires=0)
@@ -902,6 +1156,9 @@ def change_password():
         
         connection.commit()
         
+        # Other sessions opened with the old password end on every worker; this one stays
+        session_store.revoke_user(request.user_id, keep=request_token())
+        
         # Log the activity
         try:
             ip_address = request.remote_addr
@@ -1096,6 +1353,7 @@ def update_profile():
             print(f"⚠️ Failed to log activity: {log_error}")
         
         connection.commit()
+        availability_index.add(email=personal_info['email'])
         
         cursor.close()
         connection.close()
@@ -1141,22 +1399,12 @@ def upload_profile_picture():
         if file_size > 5 * 1024 * 1024:  # 5MB
             return jsonify({'success': False, 'message': 'File too large (max 5MB)'}), 400
         
-        # Generate unique filename
-        unique_filename = str(uuid.uuid4()) + '.' + file.filename.rsplit('.', 1)[1].lower()
-        
-        # Create uploads directory if it doesn't exist
-        upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'profiles')
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Save file
-        file_path = os.path.join(upload_dir, unique_filename)
-        file.save(file_path)
+        # Store the file (content-addressed, so identical pictures are kept once)
+        _, profile_pic_url = upload_storage.put('profiles', file.read(), file.filename.rsplit('.', 1)[1].lower())
         
         # Update database with file path
         connection = get_db_connection()
         if not connection:
-            # Delete the uploaded file if database connection fails
-            os.remove(file_path)
             return jsonify({'success': False, 'message': 'Database error'}), 500
         
         cursor = connection.cursor()
@@ -1166,17 +1414,16 @@ def upload_profile_picture():
         old_picture = cursor.fetchone()
         
         # Update profile picture
-        profile_pic_url = f'/static/uploads/profiles/{unique_filename}'
         cursor.execute("""
             UPDATE users 
             SET profile_picture = %s, updated_at = CURRENT_TIMESTAMP 
             WHERE user_id = %s
         """, (profile_pic_url, request.user_id))
         
-        # Delete old profile picture if it exists and is not default
-        if old_picture and old_picture[0] and 'randomuser.me' not in old_picture[0]:
+        # Delete an old per-upload (legacy) picture; stored objects may be shared, so they are kept
+        if old_picture and old_picture[0] and is_legacy_path(old_picture[0], upload_storage):
             try:
-                old_file_path = old_picture[0].replace('/static/', '').replace('/', os.sep)
+                old_file_path = old_picture[0].lstrip('/').replace('/', os.sep)
                 if os.path.exists(old_file_path):
                     os.remove(old_file_path)
             except Exception as e:
@@ -1385,6 +1632,20 @@ def create_report():
         area = request.form.get('area', '').strip()
         street = request.form.get('street', '').strip()
         exact_location = request.form.get('exact_location', '').strip()
+        # Id generated on the device for submissions queued offline; retries return the same report
+        client_id = request.form.get('client_id', '').strip() or None
+        if client_id and not is_valid_client_id(client_id):
+            return jsonify({'success': False, 'message': 'Invalid client id'}), 400
+        
+        # Optional coordinates (used by the heatmap)
+        try:
+            latitude = float(request.form['latitude']) if request.form.get('latitude') else None
+            longitude = float(request.form['longitude']) if request.form.get('longitude') else None
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid coordinates'}), 400
+        if (latitude is None) != (longitude is None) or (
+                latitude is not None and not (-90 <= latitude <= 90 and -180 <= longitude <= 180)):
+            return jsonify({'success': False, 'message': 'Invalid coordinates'}), 400
         
         # Validate required fields
         required_fields = ['animal_type', 'condition', 'description', 'city', 'area']
@@ -1396,6 +1657,25 @@ def create_report():
         if condition not in ['stray', 'sick', 'dead']:
             return jsonify({'success': False, 'message': 'Invalid condition'}), 400
         
+        if client_id:
+            connection = get_db_connection()
+            if not connection:
+                return jsonify({'success': False, 'message': 'Database error'}), 500
+            cursor = connection.cursor()
+            existing_id = find_client_report(cursor, reporter_id, client_id)
+            cursor.close()
+            connection.close()
+            if existing_id:
+                return jsonify({'success': True, 'message': 'Report already submitted', 'report_id': existing_id,
+                                'client_id': client_id, 'replayed': True})
+        
+        # Store the most common spelling of values already in use ("lahore " -> "Lahore")
+        animal_type = suggester.canonical('animal_type', animal_type)
+        breed = suggester.canonical('breed', breed)
+        city = suggester.canonical('city', city)
+        area = suggester.canonical('region', area)
+        street = suggester.canonical('street', street)
+        
         # Check for uploaded files
         photos = []
         for key in request.files:
@@ -1413,16 +1693,18 @@ def create_report():
                     if file_size > 5 * 1024 * 1024:
                         return jsonify({'success': False, 'message': 'File too large (max 5MB)'}), 400
                     
-                    # Generate unique filename
-                    filename = f"{uuid.uuid4()}.{file.filename.split('.')[-1]}"
-                    
-                    # Save file
-                    upload_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'reports')
-                    os.makedirs(upload_dir, exist_ok=True)
-                    file_path = os.path.join(upload_dir, filename)
-                    file.save(file_path)
-                    
-                    photos.append(f'/static/uploads/reports/{filename}')
+                    # Store the photo and its thumbnail, with per-photo metadata for report_photos
+                    data = file.read()
+                    photo = describe_bytes(data)
+                    # The stored key's extension comes from the bytes, never from the client's file name
+                    if not photo['format']:
+                        return jsonify({'success': False, 'message': 'Only JPG/PNG images allowed'}), 400
+                    photo['phash'] = perceptual_hash(data)
+                    _, photo['file_path'] = upload_storage.put('reports', data, photo['format'])
+                    thumb = thumbnail_bytes(data)
+                    if thumb:
+                        _, photo['thumbnail_path'] = upload_storage.put('reports/thumbs', thumb, 'jpg')
+                    photos.append(photo)
         
         if not photos:
             return jsonify({'success': False, 'message': 'At least one photo is required'}), 400
@@ -1434,46 +1716,66 @@ def create_report():
         cursor = connection.cursor()
         
         # Insert report
-        cursor.execute("""
-            INSERT INTO animal_reports 
-            (reporter_id, animal_type, breed, animal_condition, description, 
-             urgency_level, city, street, region, photos, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending')
-        """, (
-            reporter_id,
-            animal_type,
-            breed,
-            condition,
-            description,
-            urgency,
-            city,
-            street,
-            area,  # Using region field for area
-            ','.join(photos)  # Store as comma-separated string
-        ))
+        try:
+            cursor.execute("""
+                INSERT INTO animal_reports 
+                (reporter_id, animal_type, breed, animal_condition, description, 
+                 urgency_level, city, street, region, latitude, longitude, status, client_id)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 'pending', %s)
+            """, (
+                reporter_id,
+                animal_type,
+                breed,
+                condition,
+                description,
+                urgency,
+                city,
+                street,
+                area,  # Using region field for area
+                latitude,
+                longitude,
+                client_id
+            ))
+        except Error as e:
+            if e.errno != 1062 or not client_id:
+                raise
+            # The same queued submission arrived twice at once and the other request stored it
+            connection.rollback()
+            existing_id = find_client_report(cursor, reporter_id, client_id)
+            cursor.close()
+            connection.close()
+            return jsonify({'success': True, 'message': 'Report already submitted', 'report_id': existing_id,
+                            'client_id': client_id, 'replayed': True})
         
         report_id = cursor.lastrowid
         
-        # Update reporter stats
-        cursor.execute("""
-            INSERT INTO reporter_stats (reporter_id, total_reports)
-            VALUES (%s, 1)
-            ON DUPLICATE KEY UPDATE 
-            total_reports = total_reports + 1,
-            last_updated = CURRENT_TIMESTAMP
-        """, (reporter_id,))
-        
-        # Log activity
-        try:
-            ip_address = request.remote_addr
-            user_agent = request.user_agent.string
-            
-            cursor.execute("""
-                INSERT INTO activity_logs (user_id, action, details, ip_address, user_agent)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (reporter_id, 'REPORT_CREATED', f'Created animal report #{report_id}', ip_address, user_agent))
-        except Exception as log_error:
-            print(f"⚠️ Failed to log activity: {log_error}")
+        # Insert all photos in one statement
+        insert_report_photos(cursor, report_id, photos)
+        
+        # Link likely duplicates: nearby recent reports with a near-identical photo
+        duplicates, duplicate_of = check_duplicate_report(cursor, report_id, animal_type, latitude, longitude,
+                                                          city, area, photos)
+        if duplicate_of:
+            print(f"🔁 Report {report_id} looks like a duplicate of report {duplicate_of}")
+        
+        # First entry of the report's status history
+        record_report_created(cursor, report_id)
+        
+        # Activity log, reporter stats/badges and other consumers pick the report up from the outbox after commit
+        emit_event(cursor, 'report', report_id, 'report.created', {
+            'report_id': report_id,
+            'reporter_id': reporter_id,
+            'animal_type': animal_type,
+            'animal_condition': condition,
+            'urgency_level': urgency,
+            'city': city,
+            'region': area,
+            'latitude': latitude,
+            'longitude': longitude,
+            'duplicate_of': duplicate_of,
+            'ip_address': request.remote_addr,
+            'user_agent': request.user_agent.string
+        })
         
         connection.commit()
         
@@ -1483,7 +1785,10 @@ def create_report():
         return jsonify({
             'success': True,
             'message': 'Report submitted successfully',
-            'report_id': report_id
+            'report_id': report_id,
+            'client_id': client_id,
+            'duplicate_of': duplicate_of,
+            'possible_duplicates': [match['report_id'] for match in duplicates]
         })
         
     except Error as e:
@@ -1554,28 +1859,39 @@ def get_report_details(report_id):
         
         cursor = connection.cursor(dictionary=True)
         
+        # Report, reporter, shelter and all photos in one round trip (one row per photo)
         cursor.execute("""
             SELECT 
                 r.*, u.full_name as reporter_name, u.phone as reporter_phone,
-                s.organization_name as assigned_shelter
+                s.organization_name as assigned_shelter,
+                p.photo_id, p.file_path as photo_path, p.thumbnail_path as photo_thumbnail,
+                p.width as photo_width, p.height as photo_height, p.size_bytes as photo_size
             FROM animal_reports r
             LEFT JOIN users u ON r.reporter_id = u.user_id
             LEFT JOIN shelters s ON r.assigned_to = s.shelter_id
+            LEFT JOIN report_photos p ON p.report_id = r.report_id
             WHERE r.report_id = %s AND r.reporter_id = %s
+            ORDER BY p.position
         """, (report_id, request.user_id))
         
-        report = cursor.fetchone()
+        rows = cursor.fetchall()
         
-        if not report:
+        if not rows:
             cursor.close()
             connection.close()
             return jsonify({'success': False, 'message': 'Report not found'}), 404
         
-        # Convert photos string to array
-        if report['photos']:
-            report['photos'] = report['photos'].split(',')
-        else:
-            report['photos'] = []
+        photo_columns = ['photo_id', 'photo_path', 'photo_thumbnail', 'photo_width', 'photo_height', 'photo_size']
+        report = {key: value for key, value in rows[0].items() if key not in photo_columns}
+        report['photo_details'] = [{
+            'photo_id': row['photo_id'],
+            'url': row['photo_path'],
+            'thumbnail_url': row['photo_thumbnail'],
+            'width': row['photo_width'],
+            'height': row['photo_height'],
+            'size_bytes': row['photo_size']
+        } for row in rows if row['photo_id']]
+        report['photos'] = [photo['url'] for photo in report['photo_details']]
         
         cursor.close()
         connection.close()
@@ -1633,61 +1949,1341 @@ def get_all_reports():
         print(f"❌ Get all reports error: {e}")
         return jsonify({'success': False, 'message': 'Server error'}), 500
 
-# ========== TEST ENDPOINTS ==========
-@app.route('/api/test', methods=['GET'])
-def test():
-    return jsonify({
-        'success': True,
-        'message': 'API is working',
-        'timestamp': datetime.datetime.now().isoformat()
-    })
+@app.route('/api/reports/search', methods=['GET', 'OPTIONS'])
+@token_required
+def report_search():
+    """Ranked full-text search over report descriptions for admins and shelters, with highlighted snippets"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        statuses = [s for s in request.args.get('status', '').split(',') if s]
+        condition = request.args.get('condition') or None
+        if any(s not in STATUSES for s in statuses) or (condition and condition not in CONDITIONS):
+            raise ValueError('Unknown condition or status')
+        since = datetime.date.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.date.fromisoformat(request.args['until']) if request.args.get('until') else None
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+        page = min(max(int(request.args.get('page', 1)), 1), 50)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameters: {e}'}), 400
+    
+    try:
+        shelter_id = None
+        if current_user_role() != 'admin':
+            shelter_id = current_shelter_id()
+            if not shelter_id:
+                return jsonify({'success': False, 'message': 'Admin or approved shelter account required'}), 403
+        
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database error'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        reports, has_more = search_reports(
+            cursor, request.args.get('q', ''),
+            statuses=statuses,
+            city=request.args.get('city', '').strip() or None,
+            condition=condition,
+            since=since,
+            # until is inclusive for the caller
+            until=until + datetime.timedelta(days=1) if until else None,
+            shelter_id=shelter_id,
+            match_all=bool_arg('all') is True,
+            limit=limit,
+            offset=(page - 1) * limit
+        )
+        cursor.close()
+        connection.close()
+        
+        return jsonify({'success': True, 'reports': reports, 'page': page, 'has_more': has_more})
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except ConnectionError:
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Error as e:
+        print(f"❌ Database error in report_search: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
 
-@app.route('/api/test-login', methods=['GET'])
-def test_login():
-    return jsonify({
-        'success': True,
-        'message': 'Login system is ready',
-        'endpoints': {
-            'POST /api/auth/login': 'User login',
-            'GET /api/auth/check': 'Check session',
-            'POST /api/auth/logout': 'Logout'
-        }
-    })
+@app.route('/api/reports/heatmap', methods=['GET', 'OPTIONS'])
+def report_heatmap():
+    """Report counts per geohash cell for a map zoom level (JSON, or binary with format=binary)"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if not heatmap_index.ready:
+        return jsonify({'success': False, 'message': 'Heatmap is still loading'}), 503
+    
+    try:
+        zoom = int(request.args.get('zoom', 6))
+        bbox = None
+        if request.args.get('bbox'):
+            bbox = tuple(float(value) for value in request.args['bbox'].split(','))
+            if len(bbox) != 4:
+                raise ValueError('bbox must be min_lon,min_lat,max_lon,max_lat')
+        conditions = [c for c in request.args.get('condition', '').split(',') if c]
+        statuses = [s for s in request.args.get('status', '').split(',') if s]
+        if any(c not in CONDITIONS for c in conditions) or any(s not in STATUSES for s in statuses):
+            raise ValueError('Unknown condition or status')
+        since = datetime.date.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.date.fromisoformat(request.args['until']) if request.args.get('until') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameters: {e}'}), 400
+    
+    if zoom > 10 and not bbox:
+        return jsonify({'success': False, 'message': 'bbox is required above zoom 10'}), 400
+    
+    try:
+        cells, counts, precision = heatmap_index.tile(zoom, bbox, conditions, statuses, since, until)
+        
+        if request.args.get('format') == 'binary':
+            response = make_response(HeatmapIndex.tile_binary(cells, counts, precision))
+            response.headers['Content-Type'] = 'application/octet-stream'
+            return response
+        
+        return jsonify({
+            'success': True,
+            'precision': precision,
+            'cells': HeatmapIndex.tile_json(cells, counts, precision)
+        })
+        
+    except Error as e:
+        print(f"❌ Database error in report_heatmap: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Heatmap error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
 
-@app.route('/api/db/test', methods=['GET'])
-def test_db():
-    connection = get_db_connection()
-    if connection:
-        try:
-            cursor = connection.cursor()
-            cursor.execute("SHOW TABLES")
-            tables = [table[0] for table in cursor.fetchall()]
-            cursor.close()
-            connection.close()
-            return jsonify({
-                'success': True,
-                'tables': tables,
-                'message': f'Found {len(tables)} tables'
-            })
-        except Error as e:
-            return jsonify({'success': False, 'message': str(e)}), 500
-    return jsonify({'success': False, 'message': 'No connection'}), 500
+# ========== SUGGEST ROUTES ==========
+@app.route('/api/suggest', methods=['GET', 'OPTIONS'])
+@rate_limited(('suggest:ip', client_ip))
+def suggest():
+    """Autocomplete for report and pet form fields, most used values first"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if not suggester.ready:
+        return jsonify({'success': False, 'message': 'Suggestions are loading, try again shortly'}), 503
+    
+    try:
+        field = request.args.get('field', '')
+        limit = int(request.args.get('limit', 8))
+        suggestions = suggester.suggest(field, request.args.get('q', ''), limit)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'Invalid parameters: {e}'}), 400
+    
+    return jsonify({'success': True, 'field': field, 'suggestions': suggestions})
 
-# ========== HEALTH CHECK ==========
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
+# ========== SYNC ROUTES ==========
+@app.route('/api/sync', methods=['GET', 'OPTIONS'])
+@token_required
+def sync():
+    """Reports, status updates, notifications and profile changed since the client's watermark"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
     try:
+        limit = int(request.args.get('limit', 200))
         connection = get_db_connection()
-        db_status = 'connected' if connection else 'disconnected'
-        if connection:
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database error'}), 500
+        
+        cursor = connection.cursor()
+        try:
+            delta = sync_changes(cursor, request.user_id, request.args.get('watermark'), limit)
+        finally:
+            cursor.close()
             connection.close()
         
-        return jsonify({
-            'status': 'healthy',
-            'timestamp': datetime.datetime.now().isoformat(),
-            'database': db_status,
-            'endpoints': {
+        response = jsonify({'success': True, **delta})
+        # Weak mobile links: gzip the delta when the client accepts it and it is worth it
+        if 'gzip' in request.headers.get('Accept-Encoding', '') and response.content_length > 1024:
+            response.set_data(gzip.compress(response.get_data(), compresslevel=6))
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except Error as e:
+        print(f"❌ Database error in sync: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+# ========== PET ROUTES ==========
+@app.route('/api/pets', methods=['GET', 'OPTIONS'])
+def pets_list():
+    """Browse pets, newest first (pets + sellers, then images: two queries per page)"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        status = request.args.get('status', 'available')
+        if status and status not in PET_STATUSES:
+            return jsonify({'success': False, 'message': f"status must be one of {', '.join(PET_STATUSES)}"}), 400
+        filters = {
+            'status': status or None,
+            'animal_type': request.args.get('animal_type', '').strip() or None,
+            'breed': request.args.get('breed', '').strip() or None,
+            'city': request.args.get('city', '').strip() or None,
+            'seller_id': int(request.args['seller_id']) if request.args.get('seller_id') else None,
+            'for_adoption': bool_arg('for_adoption'),
+            'for_sale': bool_arg('for_sale'),
+            'min_price': float(request.args['min_price']) if request.args.get('min_price') else None,
+            'max_price': float(request.args['max_price']) if request.args.get('max_price') else None
+        }
+        limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        with_images = bool_arg('images') is not False
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        pets, next_cursor = list_pets(cursor, filters, limit=limit, after=after, with_images=with_images)
+        cursor.close()
+        connection.close()
+        favorites_store.annotate(optional_user_id(), pets)
+        
+        return jsonify({'success': True, 'pets': pets, 'next_cursor': next_cursor})
+        
+    except Error as e:
+        print(f"❌ Database error in pets_list: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Pet list error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/pets/popular', methods=['GET', 'OPTIONS'])
+def pets_popular():
+    """Most favorited available pets (ordered by the maintained favorite_count)"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        pets = popular_pets(cursor, limit=limit)
+        cursor.close()
+        connection.close()
+        favorites_store.annotate(optional_user_id(), pets)
+        
+        return jsonify({'success': True, 'pets': pets})
+        
+    except ConnectionError:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    except Error as e:
+        print(f"❌ Database error in pets_popular: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Popular pets error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/pets/recommended', methods=['GET', 'OPTIONS'])
+@token_required
+def pets_recommended():
+    """Available pets ranked for the user from their favorites and adoption applications"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Invalid limit or page'}), 400
+    
+    if not recommender.ready:
+        return jsonify({'success': False, 'message': 'Recommendations are warming up, please try again'}), 503
+    
+    try:
+        ranked = recommender.recommend(request.user_id, limit=limit, offset=(page - 1) * limit)
+        pets = []
+        if ranked:
+            connection = get_db_connection()
+            if not connection:
+                return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+            cursor = connection.cursor(dictionary=True)
+            loaded, _ = list_pets(cursor, {'pet_ids': [pet_id for pet_id, _ in ranked]}, limit=limit)
+            cursor.close()
+            connection.close()
+            by_id = {pet['pet_id']: pet for pet in loaded}
+            for pet_id, score in ranked:
+                if pet_id in by_id:
+                    by_id[pet_id]['score'] = round(score, 4)
+                    pets.append(by_id[pet_id])
+            favorites_store.annotate(request.user_id, pets)
+        
+        return jsonify({'success': True, 'pets': pets, 'page': page})
+        
+    except ConnectionError:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    except Error as e:
+        print(f"❌ Database error in pets_recommended: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Recommendations error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/pets/<int:pet_id>', methods=['GET', 'OPTIONS'])
+def pet_detail(pet_id):
+    """One pet with its seller and all images"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        pet = get_pet(cursor, pet_id)
+        cursor.close()
+        connection.close()
+        
+        if not pet:
+            return jsonify({'success': False, 'message': 'Pet not found'}), 404
+        favorites_store.annotate(optional_user_id(), [pet])
+        return jsonify({'success': True, 'pet': pet})
+        
+    except Error as e:
+        print(f"❌ Database error in pet_detail: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Pet detail error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+def can_manage_pet(cursor, pet_id):
+    """True if the current user is the pet's seller or an admin; None if the pet does not exist"""
+    cursor.execute("""
+        SELECT p.seller_id, u.role FROM pets p
+        JOIN users u ON u.user_id = %s
+        WHERE p.pet_id = %s
+    """, (request.user_id, pet_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    return row['seller_id'] == request.user_id or row['role'] == 'admin'
+
+@app.route('/api/pets/<int:pet_id>/images', methods=['POST', 'OPTIONS'])
+@token_required
+def pet_upload_images(pet_id):
+    """Add photos to a pet; `primary=true` makes the first upload the primary image"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    files = [file for file in request.files.getlist('images') if file and file.filename]
+    if not files or len(files) > 10:
+        return jsonify({'success': False, 'message': 'Upload between 1 and 10 images'}), 400
+    for file in files:
+        if not allowed_file(file.filename) or file.filename.rsplit('.', 1)[1].lower() not in ('png', 'jpg', 'jpeg', 'gif'):
+            return jsonify({'success': False, 'message': 'Invalid file type'}), 400
+        file.seek(0, 2)
+        too_large = file.tell() > 5 * 1024 * 1024
+        file.seek(0)
+        if too_large:
+            return jsonify({'success': False, 'message': 'File too large (max 5MB)'}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        allowed = can_manage_pet(cursor, pet_id)
+        if not allowed:
+            cursor.close()
+            connection.close()
+            if allowed is None:
+                return jsonify({'success': False, 'message': 'Pet not found'}), 404
+            return jsonify({'success': False, 'message': 'Only the seller can change this pet'}), 403
+        
+        urls = [save_uploaded_file(file, 'pets') for file in files]
+        if None in urls:
+            cursor.close()
+            connection.close()
+            return jsonify({'success': False, 'message': 'Failed to save image'}), 500
+        add_pet_images(cursor, pet_id, urls, make_primary=request.form.get('primary') == 'true')
+        connection.commit()
+        pet = get_pet(cursor, pet_id)
+        cursor.close()
+        connection.close()
+        
+        return jsonify({'success': True, 'message': 'Images uploaded', 'pet': pet}), 201
+        
+    except Error as e:
+        print(f"❌ Database error in pet_upload_images: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+@app.route('/api/pets/<int:pet_id>/images/<int:image_id>', methods=['PUT', 'DELETE', 'OPTIONS'])
+@token_required
+def pet_manage_image(pet_id, image_id):
+    """PUT makes the image primary, DELETE removes it"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        allowed = can_manage_pet(cursor, pet_id)
+        if not allowed:
+            cursor.close()
+            connection.close()
+            if allowed is None:
+                return jsonify({'success': False, 'message': 'Pet not found'}), 404
+            return jsonify({'success': False, 'message': 'Only the seller can change this pet'}), 403
+        
+        if request.method == 'PUT':
+            found = set_primary_image(cursor, pet_id, image_id)
+        else:
+            # Stored objects are content-addressed and may be shared, so the file itself is kept
+            found = delete_pet_image(cursor, pet_id, image_id) is not None
+        if not found:
+            cursor.close()
+            connection.close()
+            return jsonify({'success': False, 'message': 'Image not found'}), 404
+        connection.commit()
+        pet = get_pet(cursor, pet_id)
+        cursor.close()
+        connection.close()
+        
+        return jsonify({'success': True, 'pet': pet})
+        
+    except Error as e:
+        print(f"❌ Database error in pet_manage_image: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+# ========== FAVORITES ROUTES ==========
+@app.route('/api/favorites', methods=['GET', 'POST', 'DELETE', 'OPTIONS'])
+@token_required
+def favorites():
+    """GET lists the user's favorite pets; POST/DELETE add or remove {"pet_ids": [...]} in bulk"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if request.method == 'GET':
+        try:
+            ids = list(favorites_store.ids(request.user_id))
+            page = max(int(request.args.get('page', 1)), 1)
+            limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+            # Newest pets first; the page is loaded with the usual two pet queries
+            page_ids = sorted(ids, reverse=True)[(page - 1) * limit:page * limit]
+            pets = []
+            if page_ids:
+                connection = get_db_connection()
+                if not connection:
+                    return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+                cursor = connection.cursor(dictionary=True)
+                pets, _ = list_pets(cursor, {'pet_ids': page_ids}, limit=limit)
+                cursor.close()
+                connection.close()
+                for pet in pets:
+                    pet['is_favorited'] = True
+            return jsonify({'success': True, 'pet_ids': ids, 'pets': pets, 'total': len(ids), 'page': page})
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid page'}), 400
+        except ConnectionError:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        except Error as e:
+            print(f"❌ Database error in favorites: {e}")
+            return jsonify({'success': False, 'message': 'Database error'}), 500
+        except Exception as e:
+            print(f"❌ Favorites error: {e}")
+            return jsonify({'success': False, 'message': 'Server error'}), 500
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        pet_ids = [int(pet_id) for pet_id in data.get('pet_ids', [])]
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid pet ids'}), 400
+    if not pet_ids or len(pet_ids) > MAX_FAVORITES_BULK:
+        return jsonify({'success': False, 'message': f'Provide between 1 and {MAX_FAVORITES_BULK} pet ids'}), 400
+    
+    try:
+        if request.method == 'POST':
+            changed = favorites_store.add(request.user_id, pet_ids)
+            recommender.forget(request.user_id)
+            return jsonify({'success': True, 'added': changed})
+        changed = favorites_store.remove(request.user_id, pet_ids)
+        recommender.forget(request.user_id)
+        return jsonify({'success': True, 'removed': changed})
+        
+    except ConnectionError:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    except Error as e:
+        print(f"❌ Database error in favorites: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Favorites error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+# ========== ADOPTION ROUTES ==========
+@app.route('/api/adoptions', methods=['GET', 'POST', 'OPTIONS'])
+@token_required
+def adoptions():
+    """GET lists the user's applications (?as=adopter|seller&status=&pet_id=); POST applies for {"pet_id", "notes"}"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if request.method == 'GET':
+        side = request.args.get('as', 'adopter')
+        status = request.args.get('status') or None
+        if side not in ('adopter', 'seller'):
+            return jsonify({'success': False, 'message': 'as must be adopter or seller'}), 400
+        if status and status not in ('pending', 'approved', 'rejected', 'completed'):
+            return jsonify({'success': False, 'message': 'Invalid status'}), 400
+        try:
+            pet_id = request.args.get('pet_id', type=int)
+            limit = min(max(int(request.args.get('limit', 50)), 1), 100)
+            items = adoption_workflow.list_for(request.user_id, side, status, pet_id, limit)
+            return jsonify({'success': True, 'adoptions': items, 'count': len(items)})
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+        except Error as e:
+            print(f"❌ Database error in adoptions: {e}")
+            return jsonify({'success': False, 'message': 'Database error'}), 500
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        pet_id = int(data.get('pet_id'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'pet_id is required'}), 400
+    notes = (data.get('notes') or '').strip() or None
+    
+    try:
+        adoption_id = adoption_workflow.apply(request.user_id, pet_id, notes)
+        recommender.forget(request.user_id)
+        print(f"🐾 Adoption application {adoption_id} for pet {pet_id} by user {request.user_id}")
+        return jsonify({
+            'success': True,
+            'message': 'Application submitted',
+            'adoption_id': adoption_id,
+            'status': 'pending',
+            'version': 0
+        }), 201
+        
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except AdoptionConflict as e:
+        return jsonify({'success': False, 'message': str(e), 'current': e.current}), 409
+    except Error as e:
+        print(f"❌ Database error in adoptions: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+@app.route('/api/adoptions/<int:adoption_id>', methods=['GET', 'OPTIONS'])
+@token_required
+def adoption_detail(adoption_id):
+    """One application, visible to its adopter, the pet's seller and admins"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        adoption = adoption_workflow.get(adoption_id)
+        if not adoption:
+            return jsonify({'success': False, 'message': 'Adoption not found'}), 404
+        if request.user_id not in (adoption['adopter_id'], adoption['seller_id']) and current_user_role() != 'admin':
+            return jsonify({'success': False, 'message': 'Access denied'}), 403
+        return jsonify({'success': True, 'adoption': adoption})
+        
+    except Error as e:
+        print(f"❌ Database error in adoption_detail: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+@app.route('/api/adoptions/<int:adoption_id>/<action>', methods=['POST', 'OPTIONS'])
+@token_required
+def transition_adoption(adoption_id, action):
+    """approve / reject / cancel / complete (seller or admin) and withdraw (adopter)
+
+    Send the adoption's "version" to fail with 409 if it changed since it was read.
+    """
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if action not in ADOPTION_TRANSITIONS:
+        return jsonify({'success': False, 'message': 'Unknown action'}), 400
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        expected_version = int(data['version']) if data.get('version') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid version'}), 400
+    
+    try:
+        is_admin = current_user_role() == 'admin'
+        result = adoption_workflow.transition(action, adoption_id, request.user_id, is_admin, expected_version)
+        return jsonify({'success': True, **result})
+        
+    except LookupError as e:
+        return jsonify({'success': False, 'message': str(e)}), 404
+    except PermissionError as e:
+        return jsonify({'success': False, 'message': str(e)}), 403
+    except AdoptionConflict as e:
+        return jsonify({'success': False, 'message': str(e), 'current': e.current}), 409
+    except ConnectionError:
+        return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+    except Error as e:
+        print(f"❌ Database error in transition_adoption: {e}")
+        if e.errno in RETRYABLE_ERRORS:
+            return jsonify({'success': False, 'message': 'Adoption is busy, please try again'}), 503
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+# ========== PRODUCT ROUTES ==========
+@app.route('/api/products', methods=['GET', 'OPTIONS'])
+def browse_products():
+    """Browse products by category or store, sorted and price filtered, from the catalog cache"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if not catalog_index.ready:
+        return jsonify({'success': False, 'message': 'Catalog is still loading'}), 503
+    
+    try:
+        category = request.args.get('category') or None
+        if category and category not in CATEGORIES:
+            return jsonify({'success': False, 'message': f"category must be one of {', '.join(CATEGORIES)}"}), 400
+        page = max(int(request.args.get('page', 1)), 1)
+        limit = min(max(int(request.args.get('limit', 24)), 1), 100)
+        products, total = catalog_index.browse(
+            category=category,
+            store_id=int(request.args['store_id']) if request.args.get('store_id') else None,
+            sort=request.args.get('sort', 'newest'),
+            min_price=float(request.args['min_price']) if request.args.get('min_price') else None,
+            max_price=float(request.args['max_price']) if request.args.get('max_price') else None,
+            in_stock=bool_arg('in_stock') or False,
+            animal_type=request.args.get('animal_type', '').strip() or None,
+            page=page,
+            limit=limit
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'products': products,
+        'total': total,
+        'page': page,
+        'pages': (total + limit - 1) // limit
+    })
+
+@app.route('/api/products/<int:product_id>', methods=['GET', 'OPTIONS'])
+def product_detail(product_id):
+    """One active product from the catalog cache"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if not catalog_index.ready:
+        return jsonify({'success': False, 'message': 'Catalog is still loading'}), 503
+    
+    product = catalog_index.get(product_id)
+    if not product:
+        return jsonify({'success': False, 'message': 'Product not found'}), 404
+    return jsonify({'success': True, 'product': product})
+
+# Columns a store may set on its products, with their parsers
+PRODUCT_FIELDS = {
+    'product_name': lambda v: str(v).strip()[:100],
+    'category': str,
+    'description': str,
+    'price': float,
+    'stock_quantity': int,
+    'animal_type': lambda v: str(v).strip()[:50] or None,
+    'brand': lambda v: str(v).strip()[:50] or None,
+    'images': lambda v: ','.join(v) if isinstance(v, list) else str(v),
+    'is_active': lambda v: v if isinstance(v, bool) else str(v).lower() in ('1', 'true', 'yes')
+}
+
+def parse_product_fields(data, required=()):
+    """Validated {column: value} from a product payload; raises ValueError"""
+    fields = {}
+    for column, parse in PRODUCT_FIELDS.items():
+        if column in data and data[column] is not None:
+            try:
+                fields[column] = parse(data[column])
+            except (TypeError, ValueError):
+                raise ValueError(f'Invalid {column}')
+    for column in required:
+        if fields.get(column) in (None, ''):
+            raise ValueError(f'{column} is required')
+    if 'category' in fields and fields['category'] not in CATEGORIES:
+        raise ValueError(f"category must be one of {', '.join(CATEGORIES)}")
+    if fields.get('price', 0) < 0 or fields.get('stock_quantity', 0) < 0:
+        raise ValueError('Price and stock cannot be negative')
+    if len(fields.get('images', '')) > 500:
+        raise ValueError('Too many images')
+    return fields
+
+@app.route('/api/store/products', methods=['POST', 'OPTIONS'])
+@token_required
+@store_required
+def store_create_product():
+    """Add a product to the current store"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        fields = parse_product_fields(request.get_json(silent=True) or {}, required=('product_name', 'category', 'price'))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor()
+        columns = ['store_id'] + list(fields)
+        cursor.execute(f"""
+            INSERT INTO products ({', '.join(columns)})
+            VALUES ({', '.join(['%s'] * len(columns))})
+        """, [request.user_id] + list(fields.values()))
+        product_id = cursor.lastrowid
+        connection.commit()
+        cursor.close()
+        connection.close()
+        
+        catalog_index.reload([product_id])
+        
+        return jsonify({'success': True, 'message': 'Product created', 'product_id': product_id}), 201
+        
+    except Error as e:
+        print(f"❌ Database error in store_create_product: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+@app.route('/api/store/products/<int:product_id>', methods=['PUT', 'OPTIONS'])
+@token_required
+@store_required
+def store_update_product(product_id):
+    """Edit, restock or (de)activate one of the current store's products"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        fields = parse_product_fields(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if not fields:
+        return jsonify({'success': False, 'message': 'Nothing to update'}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            UPDATE products SET {', '.join(f'{column} = %s' for column in fields)}
+            WHERE product_id = %s AND store_id = %s
+        """, list(fields.values()) + [product_id, request.user_id])
+        cursor.execute("SELECT 1 FROM products WHERE product_id = %s AND store_id = %s", (product_id, request.user_id))
+        found = cursor.fetchone() is not None
+        connection.commit()
+        cursor.close()
+        connection.close()
+        
+        if not found:
+            return jsonify({'success': False, 'message': 'Product not found'}), 404
+        catalog_index.reload([product_id])
+        
+        return jsonify({'success': True, 'message': 'Product updated', 'product': catalog_index.get(product_id)})
+        
+    except Error as e:
+        print(f"❌ Database error in store_update_product: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+@app.route('/api/store/dashboard', methods=['GET', 'OPTIONS'])
+@token_required
+@store_required
+def store_sales_dashboard():
+    """Revenue, units and orders for the current store, per day and per product, from sales_daily"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        today = datetime.date.today()
+        until = datetime.date.fromisoformat(request.args['until']) if request.args.get('until') else today
+        since = (datetime.date.fromisoformat(request.args['since']) if request.args.get('since')
+                 else until - datetime.timedelta(days=int(request.args.get('days', 30)) - 1))
+        if since > until or (until - since).days > 366:
+            raise ValueError('Date range must be between 1 and 367 days')
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor()
+        dashboard = store_dashboard(cursor, request.user_id, since, until)
+        cursor.close()
+        connection.close()
+        
+        # Names come from the catalog cache, not another query
+        for product in dashboard['products']:
+            cached = catalog_index.get(product['product_id'])
+            product['product_name'] = cached['product_name'] if cached else None
+        
+        return jsonify({'success': True, 'since': since.isoformat(), 'until': until.isoformat(), **dashboard})
+        
+    except Error as e:
+        print(f"❌ Database error in store_sales_dashboard: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+
+# ========== ORDER ROUTES ==========
+@app.route('/api/orders/checkout', methods=['POST', 'OPTIONS'])
+@token_required
+def checkout_order():
+    """Order a cart: reserves stock and creates one order per store in a single transaction"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    data = request.get_json(silent=True) or {}
+    shipping_address = data.get('shipping_address') or ''
+    payment_method = data.get('payment_method') or 'cash_on_delivery'
+    if not isinstance(shipping_address, str) or not shipping_address.strip():
+        return jsonify({'success': False, 'message': 'Shipping address is required'}), 400
+    if not isinstance(payment_method, str) or len(payment_method.strip()) > 50:
+        return jsonify({'success': False, 'message': 'Invalid payment method'}), 400
+    shipping_address = shipping_address.strip()
+    payment_method = payment_method.strip()
+    
+    try:
+        orders = order_checkout.place_order(request.user_id, data.get('items'), shipping_address, payment_method)
+        # The order is committed: a failed catalog reload must not turn it into an error the
+        # client retries (checkout has no idempotency key); the refresh loop catches up
+        try:
+            catalog_index.reload([item['product_id'] for order in orders for item in order['items']])
+        except Exception as e:
+            print(f"⚠️ Catalog reload after checkout failed: {e}")
+        
+        return jsonify({
+            'success': True,
+            'message': 'Order placed',
+            'orders': orders
+        }), 201
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except CheckoutError as e:
+        return jsonify({'success': False, 'message': str(e), 'product_id': e.product_id}), 409
+    except Error as e:
+        print(f"❌ Database error in checkout_order: {e}")
+        if e.errno in RETRYABLE_ERRORS:
+            # Still deadlocking after every retry
+            return jsonify({'success': False, 'message': 'Checkout is busy, please try again'}), 503
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Checkout error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+# ========== SHELTER QUEUE ROUTES ==========
+def current_shelter_id():
+    """Approved shelter_id of the authenticated user, None if not a shelter"""
+    cached, shelter_id = shelter_id_cache.get(request.user_id)
+    if cached:
+        return shelter_id
+    connection = get_db_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT s.shelter_id FROM shelters s
+        JOIN users u ON u.user_id = s.user_id
+        WHERE s.user_id = %s AND s.is_approved = TRUE AND u.role = 'shelter' AND u.is_active = TRUE
+    """, (request.user_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    connection.close()
+    shelter_id = row[0] if row else None
+    shelter_id_cache.put(request.user_id, shelter_id)
+    return shelter_id
+
+@app.route('/api/shelter/queue/claim', methods=['POST', 'OPTIONS'])
+@token_required
+def claim_reports():
+    """Claim the next pending reports for the current shelter"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        shelter_id = current_shelter_id()
+        if not shelter_id:
+            return jsonify({'success': False, 'message': 'Approved shelter account required'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        try:
+            batch = min(max(int(data.get('batch', 5)), 1), 50)
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid batch size'}), 400
+        
+        reports = report_queue.claim(
+            shelter_id,
+            limit=batch,
+            city=data.get('city') or None,
+            condition=data.get('condition') or None
+        )
+        
+        return jsonify({
+            'success': True,
+            'reports': reports,
+            'count': len(reports),
+            'lease_seconds': report_queue.lease_seconds
+        })
+        
+    except Error as e:
+        print(f"❌ Database error in claim_reports: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Claim reports error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/shelter/queue/heartbeat', methods=['POST', 'OPTIONS'])
+@token_required
+def heartbeat_reports():
+    """Extend the leases on reports the current shelter is looking at"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        shelter_id = current_shelter_id()
+        if not shelter_id:
+            return jsonify({'success': False, 'message': 'Approved shelter account required'}), 403
+        
+        data = request.get_json(silent=True) or {}
+        report_ids = [int(report_id) for report_id in data.get('report_ids', [])][:50]
+        held = report_queue.heartbeat(shelter_id, report_ids)
+        
+        return jsonify({
+            'success': True,
+            'held': held,
+            'lost': [report_id for report_id in report_ids if report_id not in held]
+        })
+        
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid report ids'}), 400
+    except Error as e:
+        print(f"❌ Database error in heartbeat_reports: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Heartbeat error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/shelter/reports/<int:report_id>/<action>', methods=['POST', 'OPTIONS'])
+@token_required
+def transition_report(report_id, action):
+    """Move a claimed report through accept / start / complete / release"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if action not in TRANSITIONS:
+        return jsonify({'success': False, 'message': 'Unknown action'}), 400
+    
+    try:
+        shelter_id = current_shelter_id()
+        if not shelter_id:
+            return jsonify({'success': False, 'message': 'Approved shelter account required'}), 403
+        
+        old_status, new_status = report_queue.transition(shelter_id, report_id, action)
+        
+        return jsonify({
+            'success': True,
+            'report_id': report_id,
+            'previous_status': old_status,
+            'status': new_status
+        })
+        
+    except TransitionError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except Error as e:
+        print(f"❌ Database error in transition_report: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Report transition error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+# ========== ADMIN REPORT SLA ROUTES ==========
+@app.route('/api/admin/reports/sla', methods=['GET', 'OPTIONS'])
+@token_required
+@admin_required
+def report_sla():
+    """p50/p90 time in each report status, overall or per city/shelter"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    scope = request.args.get('scope', 'all')
+    key = request.args.get('key', '').strip()
+    if scope not in ('all', 'city', 'shelter'):
+        return jsonify({'success': False, 'message': 'scope must be all, city or shelter'}), 400
+    if scope != 'all' and not key:
+        return jsonify({'success': False, 'message': 'key is required for city/shelter scope'}), 400
+    
+    try:
+        statuses = sla_percentiles(get_db_connection, scope, key if scope != 'all' else '')
+        return jsonify({
+            'success': True,
+            'scope': scope,
+            'key': key if scope != 'all' else None,
+            'statuses': statuses,
+            'last_event_id': sla_aggregator.stats()['last_event_id']
+        })
+    except Error as e:
+        print(f"❌ Database error in report_sla: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Report SLA error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/admin/reports/<int:report_id>/history', methods=['GET', 'OPTIONS'])
+@token_required
+@admin_required
+def report_status_history(report_id):
+    """Status events of one report, oldest first"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT event_id, from_status, to_status, shelter_id, seconds_in_status, created_at
+            FROM report_status_events
+            WHERE report_id = %s
+            ORDER BY event_id
+        """, (report_id,))
+        events = cursor.fetchall()
+        cursor.close()
+        connection.close()
+        
+        for event in events:
+            event['created_at'] = event['created_at'].isoformat() if event['created_at'] else None
+        
+        return jsonify({'success': True, 'report_id': report_id, 'events': events})
+        
+    except Error as e:
+        print(f"❌ Database error in report_status_history: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Report history error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+# ========== ADMIN ANALYTICS ROUTES ==========
+@app.route('/api/admin/analytics', methods=['GET', 'OPTIONS'])
+@token_required
+@admin_required
+def admin_analytics():
+    """Group-by / time-bucket counts over reports, adoptions or users from the in-memory cube
+
+    Query: fact, group_by=col1,col2, bucket=day|week|month|year, since, until
+    (ISO dates), measure, and where.<column>=value1,value2 filters. Without a
+    fact, describes the available facts.
+    """
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    if not analytics_cube.ready:
+        return jsonify({'success': False, 'message': 'Analytics are still loading'}), 503
+    
+    fact = request.args.get('fact')
+    if not fact:
+        return jsonify({'success': True, 'facts': analytics_cube.describe()})
+    
+    try:
+        group_by = [name for name in request.args.get('group_by', '').split(',') if name]
+        filters = {
+            key[len('where.'):]: [value for value in request.args[key].split(',') if value]
+            for key in request.args if key.startswith('where.')
+        }
+        since = datetime.datetime.fromisoformat(request.args['since']) if request.args.get('since') else None
+        until = datetime.datetime.fromisoformat(request.args['until']) if request.args.get('until') else None
+        
+        started = datetime.datetime.now()
+        rows = analytics_cube.query(
+            fact,
+            group_by=group_by,
+            bucket=request.args.get('bucket') or None,
+            filters=filters,
+            since=since,
+            until=until,
+            measure=request.args.get('measure', 'count')
+        )
+        elapsed_ms = (datetime.datetime.now() - started).total_seconds() * 1000
+        
+        return jsonify({
+            'success': True,
+            'fact': fact,
+            'rows': rows,
+            'elapsed_ms': round(elapsed_ms, 2)
+        })
+        
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        print(f"❌ Analytics error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+# ========== ADMIN USER DIRECTORY ROUTES ==========
+def bool_arg(name):
+    """Optional true/false query parameter, None when absent"""
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+@app.route('/api/admin/users', methods=['GET', 'OPTIONS'])
+@token_required
+@admin_required
+def admin_list_users():
+    """Search and page through users (keyset pagination, newest first)"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    try:
+        query = request.args.get('q', '').strip()
+        field = request.args.get('field') or None
+        role = request.args.get('role') or None
+        if field and field not in SEARCH_FIELDS:
+            return jsonify({'success': False, 'message': f"field must be one of {', '.join(SEARCH_FIELDS)}"}), 400
+        if role and role not in ROLES:
+            return jsonify({'success': False, 'message': 'Invalid role'}), 400
+        filters = {
+            'query': query or None,
+            'field': field,
+            'role': role,
+            'is_active': bool_arg('is_active'),
+            'is_verified': bool_arg('is_verified'),
+            'city': request.args.get('city', '').strip() or None
+        }
+        limit = min(max(int(request.args.get('limit', 50)), 1), 200)
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor(dictionary=True)
+        users, next_cursor = list_users(cursor, filters, limit=limit, after=after)
+        # Only the first page pays for the estimate
+        estimate = approximate_count(cursor, filters) if not after else None
+        cursor.close()
+        connection.close()
+        
+        for user in users:
+            user['created_at'] = user['created_at'].isoformat() if user['created_at'] else None
+        
+        return jsonify({
+            'success': True,
+            'users': users,
+            'next_cursor': next_cursor,
+            'approximate_total': estimate
+        })
+        
+    except Error as e:
+        print(f"❌ Database error in admin_list_users: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Admin user list error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/admin/users/bulk', methods=['POST', 'OPTIONS'])
+@token_required
+@admin_required
+def admin_bulk_users():
+    """Suspend/unsuspend/verify/unverify many users in one statement"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in BULK_ACTIONS:
+        return jsonify({'success': False, 'message': f"action must be one of {', '.join(BULK_ACTIONS)}"}), 400
+    try:
+        user_ids = sorted({int(user_id) for user_id in data.get('user_ids', [])})
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Invalid user ids'}), 400
+    if not user_ids or len(user_ids) > 1000:
+        return jsonify({'success': False, 'message': 'Provide between 1 and 1000 user ids'}), 400
+    
+    try:
+        connection = get_db_connection()
+        if not connection:
+            return jsonify({'success': False, 'message': 'Database connection failed'}), 500
+        
+        cursor = connection.cursor()
+        updated = bulk_update(cursor, action, user_ids, request.user_id, data.get('reason'))
+        suspended = []
+        if action == 'suspend':
+            # Admins are never suspended, so their sessions stay
+            cursor.execute(f"""
+                SELECT user_id FROM users WHERE user_id IN ({', '.join(['%s'] * len(user_ids))}) AND role != 'admin'
+            """, user_ids)
+            suspended = [row[0] for row in cursor.fetchall()]
+        cursor.execute("""
+            INSERT INTO admin_activity_logs (admin_id, action_type, action_details, ip_address, user_agent)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (request.user_id, f'bulk_{action}', f'{updated} of {len(user_ids)} users: {user_ids[:50]}',
+              request.remote_addr, request.user_agent.string))
+        connection.commit()
+        cursor.close()
+        connection.close()
+        
+        for user_id in user_ids:
+            user_role_cache.discard(user_id)
+        # token_required does not look at is_active: a suspension takes effect by ending the sessions,
+        # which reaches the other workers' hot tiers through session_revocations
+        sessions_revoked = sum(session_store.revoke_user(user_id) for user_id in suspended)
+        
+        return jsonify({'success': True, 'action': action, 'requested': len(user_ids), 'updated': updated,
+                        'sessions_revoked': sessions_revoked})
+        
+    except Error as e:
+        print(f"❌ Database error in admin_bulk_users: {e}")
+        return jsonify({'success': False, 'message': 'Database error'}), 500
+    except Exception as e:
+        print(f"❌ Admin bulk action error: {e}")
+        return jsonify({'success': False, 'message': 'Server error'}), 500
+
+@app.route('/api/admin/users/import', methods=['POST', 'OPTIONS'])
+@token_required
+@admin_required
+def admin_import_users():
+    """Start a bulk import from an uploaded CSV/NDJSON file (runs in the background)"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    upload = request.files.get('file')
+    if not upload or not upload.filename:
+        return jsonify({'success': False, 'message': 'No file uploaded'}), 400
+    
+    try:
+        fmt = request.form.get('format') or format_for(upload.filename)
+        rows = read_rows(upload.read().decode('utf-8-sig'), fmt)
+    except (UnicodeDecodeError, ValueError) as e:
+        return jsonify({'success': False, 'message': f'Could not read file: {e}'}), 400
+    if not rows:
+        return jsonify({'success': False, 'message': 'File has no rows'}), 400
+    
+    job_id = import_jobs.start(rows, request.user_id)
+    return jsonify({'success': True, 'job_id': job_id, 'rows': len(rows)}), 202
+
+@app.route('/api/admin/users/import/<job_id>', methods=['GET', 'OPTIONS'])
+@token_required
+@admin_required
+def admin_import_status(job_id):
+    """Progress and summary of an import; ?download=1 returns the per-row result file"""
+    if request.method == 'OPTIONS':
+        return create_cors_response()
+    
+    job = import_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Import job not found'}), 404
+    
+    if request.args.get('download'):
+        if not job['result_file']:
+            return jsonify({'success': False, 'message': 'Import has not finished'}), 409
+        return send_from_directory(os.path.abspath(app.config['IMPORT_RESULTS_FOLDER']), job['result_file'],
+                                   as_attachment=True, download_name=f'import_{job_id}.csv')
+    
+    return jsonify({'success': True, 'job': job})
+
+# ========== TEST ENDPOINTS ==========
+@app.route('/api/test', methods=['GET'])
+def test():
+    return jsonify({
+        'success': True,
+        'message': 'API is working',
+        'timestamp': datetime.datetime.now().isoformat()
+    })
+
+@app.route('/api/test-login', methods=['GET'])
+def test_login():
+    return jsonify({
+        'success': True,
+        'message': 'Login system is ready',
+        'endpoints': {
+            'POST /api/auth/login': 'User login',
+            'GET /api/auth/check': 'Check session',
+            'POST /api/auth/logout': 'Logout'
+        }
+    })
+
+@app.route('/api/db/test', methods=['GET'])
+def test_db():
+    connection = get_db_connection()
+    if connection:
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SHOW TABLES")
+            tables = [table[0] for table in cursor.fetchall()]
+            cursor.close()
+            connection.close()
+            return jsonify({
+                'success': True,
+                'tables': tables,
+                'message': f'Found {len(tables)} tables'
+            })
+        except Error as e:
+            return jsonify({'success': False, 'message': str(e)}), 500
+    return jsonify({'success': False, 'message': 'No connection'}), 500
+
+# ========== HEALTH CHECK ==========
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint"""
+    try:
+        connection = get_db_connection()
+        db_status = 'connected' if connection else 'disconnected'
+        if connection:
+            connection.close()
+        
+        return jsonify({
+            'status': 'healthy',
+            'timestamp': datetime.datetime.now().isoformat(),
+            'database': db_status,
+            'sessions': {
+                'store': session_store.stats(),
+                'reaper': session_reaper.stats()
+            },
+            'rate_limits': rate_limiter.stats(),
+            'availability': availability_index.stats(),
+            'report_queue': report_queue.stats(),
+            'sla_aggregator': sla_aggregator.stats(),
+            'heatmap': heatmap_index.stats(),
+            'storage': upload_storage.stats(),
+            'checkout': order_checkout.stats(),
+            'catalog': catalog_index.stats(),
+            'favorites': favorites_store.stats(),
+            'adoptions': adoption_workflow.stats(),
+            'recommendations': recommender.stats(),
+            'suggestions': suggester.stats(),
+            'outbox': outbox_relay.stats(),
+            'analytics': analytics_cube.stats(),
+            'endpoints': {
                 'auth': {
                     'register': 'POST /api/auth/register',
                     'login': 'POST /api/auth/login',
@@ -1707,11 +3303,35 @@ def health_check():
                 'dashboard': {
                     'stats': 'GET /api/dashboard/stats'
                 },
+                'suggest': 'GET /api/suggest?field=<animal_type|breed|city|region|street>&q=&limit=',
+                'sync': 'GET /api/sync?watermark=&limit=',
                 'reports': {
                     'create': 'POST /api/reports/create',
                     'recent': 'GET /api/reports/recent',
                     'details': 'GET /api/reports/<id>',
-                    'all': 'GET /api/reports/all'
+                    'all': 'GET /api/reports/all',
+                    'search': 'GET /api/reports/search?q=&status=&city=&condition=&since=&until=&all=&page=',
+                    'heatmap': 'GET /api/reports/heatmap?zoom=&bbox=&condition=&status=&since=&until=&format=json|binary'
+                },
+                'adoptions': {
+                    'list': 'GET /api/adoptions?as=<adopter|seller>&status=&pet_id=',
+                    'apply': 'POST /api/adoptions',
+                    'details': 'GET /api/adoptions/<id>',
+                    'transition': 'POST /api/adoptions/<id>/<approve|reject|withdraw|cancel|complete>'
+                },
+                'shelter_queue': {
+                    'claim': 'POST /api/shelter/queue/claim',
+                    'heartbeat': 'POST /api/shelter/queue/heartbeat',
+                    'transition': 'POST /api/shelter/reports/<id>/<accept|start|complete|release>'
+                },
+                'admin': {
+                    'report_sla': 'GET /api/admin/reports/sla?scope=<all|city|shelter>&key=',
+                    'report_history': 'GET /api/admin/reports/<id>/history',
+                    'analytics': 'GET /api/admin/analytics?fact=&group_by=&bucket=&since=&until=&where.<col>=',
+                    'users': 'GET /api/admin/users?q=&field=&role=&is_active=&is_verified=&city=&cursor=',
+                    'users_bulk': 'POST /api/admin/users/bulk',
+                    'users_import': 'POST /api/admin/users/import',
+                    'users_import_status': 'GET /api/admin/users/import/<job_id>[?download=1]'
                 }
             }
         })
@@ -1732,6 +3352,98 @@ def internal_error(error):
     print(f"❌ Internal server error: {error}")
     return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
+# ========== CLI COMMANDS ==========
+@app.cli.command('backfill-report-photos')
+def backfill_report_photos_command():
+    """Fill size/hash/dimensions/thumbnails for report_photos rows migrated from animal_reports.photos"""
+    updated = backfill_photo_metadata(get_db_connection, 'static')
+    print(f"✅ Updated metadata for {updated} report photos")
+
+@app.cli.command('prune-photo-hashes')
+@click.option('--keep-days', default=30, help='Days of photo hash bands to keep')
+def prune_photo_hashes_command(keep_days):
+    """Delete duplicate-detection hash rows older than --keep-days"""
+    deleted = prune_photo_hashes(get_db_connection, keep_days=keep_days)
+    print(f"✅ Deleted {deleted} photo hash rows")
+
+@app.cli.command('prune-outbox')
+@click.option('--keep-days', default=7, help='Days of delivered outbox events to keep')
+def prune_outbox_command(keep_days):
+    """Delete outbox events every subscriber has consumed, older than --keep-days"""
+    deleted = prune_outbox(get_db_connection, keep_days=keep_days)
+    print(f"✅ Deleted {deleted} outbox events")
+
+@app.cli.command('backfill-badges')
+@click.option('--batch-size', default=5000, help='Users per transaction')
+@click.option('--recount', is_flag=True, help='Recompute report/deal counters from source tables first')
+def backfill_badges_command(batch_size, recount):
+    """Award badges to existing users whose counters already meet the rules"""
+    awarded = badge_engine.backfill(get_db_connection, batch_size=batch_size, recount=recount)
+    for badge, count in awarded.items():
+        print(f"✅ {badge}: {count} users")
+
+@app.cli.command('aggregate-report-sla')
+def aggregate_report_sla_command():
+    """Fold all pending report status events into the SLA rollup now"""
+    applied = 0
+    while True:
+        batch = sla_aggregator.run_once()
+        applied += batch
+        if batch < sla_aggregator.batch_size:
+            break
+    print(f"✅ Applied {applied} report status events")
+
+@app.cli.command('import-users')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default=None, help='Defaults to the file extension')
+@click.option('--results', default=None, help='Per-row result CSV (default: <path>.results.csv)')
+@click.option('--chunk-size', default=1000, help='Rows per INSERT statement')
+@click.option('--workers', default=None, type=int, help='Password hashing processes (default: all cores)')
+def import_users_command(path, fmt, results, chunk_size, workers):
+    """Bulk-create users from a CSV or NDJSON file"""
+    with open(path, encoding='utf-8-sig') as f:
+        rows = read_rows(f.read(), fmt or format_for(path))
+    
+    def progress(done, total):
+        print(f"  inserted {done}/{total}")
+    
+    importer = UserImporter(get_db_connection, chunk_size=chunk_size, workers=workers, on_progress=progress)
+    outcomes, created, summary = importer.run(rows)
+    results = results or path + '.results.csv'
+    write_results(results, rows, outcomes)
+    print(f"✅ {summary['counts']} in {summary['seconds']}s "
+          f"({summary['rows_per_second']} rows/s, {summary['created_per_second']} created/s, {summary['workers']} workers)")
+    print(f"   phases: {summary['phase_seconds']}")
+    print(f"   results: {results}")
+
+@app.cli.command('rebuild-heatmap')
+@click.option('--batch-size', default=100000, help='Reports read per range')
+def rebuild_heatmap_command(batch_size):
+    """Recompute report_geo_cells from animal_reports with NumPy binning"""
+    cells = rebuild_heatmap(get_db_connection, batch_size=batch_size)
+    print(f"✅ Rebuilt heatmap: {cells} cells")
+
+@app.cli.command('migrate-uploads')
+@click.option('--batch-size', default=500, help='Rows per transaction')
+def migrate_uploads_command(batch_size):
+    """Move legacy flat uploads into the configured storage and rewrite their DB paths"""
+    summary = migrate_uploads(get_db_connection, upload_storage, static_root='static', batch_size=batch_size)
+    for column, counts in summary.items():
+        print(f"✅ {column}: {counts['rows']} rows rewritten, {counts['moved']} files stored, "
+              f"{counts['missing']} missing on disk")
+
+@app.cli.command('backfill-sales')
+@click.option('--since', default=None, help='First day to rebuild (YYYY-MM-DD), default: first order')
+@click.option('--until', default=None, help='Last day to rebuild (YYYY-MM-DD), default: last order')
+def backfill_sales_command(since, until):
+    """Recompute sales_daily from orders and order_items, one day per transaction"""
+    days = backfill_sales(
+        get_db_connection,
+        since=datetime.date.fromisoformat(since) if since else None,
+        until=datetime.date.fromisoformat(until) if until else None
+    )
+    print(f"✅ Rebuilt sales rollups for {days} days")
+
 # ========== INITIALIZATION ==========
 def initialize_directories():
     """Create necessary directories"""
@@ -1769,6 +3481,18 @@ if __name__ == '__main__':
     print("  GET  /api/reports/recent         - Get recent reports")
     print("  GET  /api/reports/<id>           - Get report details")
     print("  GET  /api/reports/all            - Get all reports")
+    print("  GET  /api/reports/heatmap        - Report heatmap tiles")
+    print("\n📦 Shelter Queue Endpoints:")
+    print("  POST /api/shelter/queue/claim    - Claim pending reports")
+    print("  POST /api/shelter/queue/heartbeat - Extend report leases")
+    print("  POST /api/shelter/reports/<id>/<action> - accept/start/complete/release")
+    print("\n📦 Admin Endpoints:")
+    print("  GET  /api/admin/reports/sla      - p50/p90 time per report status")
+    print("  GET  /api/admin/reports/<id>/history - Report status history")
+    print("  GET  /api/admin/analytics        - Report/adoption/user analytics")
+    print("  GET  /api/admin/users            - Search users (keyset pages)")
+    print("  POST /api/admin/users/bulk       - Bulk suspend/verify users")
+    print("  POST /api/admin/users/import     - Bulk import users (CSV/NDJSON)")
     print("\n📦 Password Reset Endpoints:")
     print("  POST /api/auth/verify_identity   - Verify identity")
     print("  POST /api/auth/direct_reset      - Reset password")
@@ -0,0 +1,255 @@
+"""
+Username/email availability index for PetNest Network
+A Bloom filter over every username and email answers "definitely not taken"
+without touching MySQL; only possible matches go to the database, and those
+results are kept in a small LRU. The filter is rebuilt at startup and kept
+current from an updated_at watermark. A user row can commit after a newer
+one was read (import chunks, registrations with a shelter), so each refresh
+re-reads REFRESH_OVERLAP seconds before the server time of the previous
+one, and the filter is rebuilt every rebuild_interval seconds to catch a
+transaction that took even longer.
+"""
+
+import datetime
+import hashlib
+import math
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+REFRESH_OVERLAP = 30  # seconds re-read on every refresh
+
+
+def normalize(value):
+    """Fold case and accents the way the utf8mb4_unicode_ci collation compares them"""
+    value = unicodedata.normalize('NFKD', str(value or '').strip())
+    return ''.join(ch for ch in value if not unicodedata.combining(ch)).casefold()
+
+
+# ========== BLOOM FILTER ==========
+class BloomFilter:
+    """Fixed-size Bloom filter using double hashing over one blake2b digest"""
+
+    def __init__(self, capacity, error_rate=0.001):
+        capacity = max(int(capacity), 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def add(self, key):
+        """Set the key's bits; keys already present (re-read rows) are not counted again"""
+        bits = self._bits
+        added = False
+        for pos in self._positions(key):
+            mask = 1 << (pos & 7)
+            if not bits[pos >> 3] & mask:
+                bits[pos >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+
+    def __contains__(self, key):
+        bits = self._bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self):
+        return len(self._bits)
+
+
+# ========== LOOKUP CACHE ==========
+class LookupCache:
+    """LRU of recent database lookups (found rows and confirmed misses) with a short TTL"""
+
+    def __init__(self, capacity=10000, ttl=30):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (hit, value)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[1] + self.ttl <= time.monotonic():
+                self._entries.pop(key, None)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ========== AVAILABILITY INDEX ==========
+class AvailabilityIndex:
+    """Bloom filter over users.username and users.email, refreshed incrementally"""
+
+    def __init__(self, get_connection, error_rate=0.001, min_capacity=100000, refresh_interval=2.0,
+                 rebuild_interval=3600):
+        self._get_connection = get_connection
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter = None
+        self._watermark = None
+        self._built_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._building = threading.Lock()
+        self._metrics = {'definite_misses': 0, 'maybe_hits': 0, 'not_ready': 0, 'refreshes': 0, 'rebuilds': 0}
+
+    @property
+    def ready(self):
+        return self._filter is not None
+
+    def build(self):
+        """Full rebuild from the users table; the filter is swapped in when complete"""
+        if not self._building.acquire(blocking=False):
+            return False
+        try:
+            connection = self._get_connection()
+            if not connection:
+                return False
+            cursor = connection.cursor()
+            try:
+                cursor.execute("SELECT CURRENT_TIMESTAMP, COUNT(*) FROM users")
+                started_at, total = cursor.fetchone()
+                bloom = BloomFilter(max(total * 2 * 2, self.min_capacity), self.error_rate)
+                cursor.execute("SELECT username, email FROM users")
+                while True:
+                    rows = cursor.fetchmany(10000)
+                    if not rows:
+                        break
+                    for username, email in rows:
+                        bloom.add('u:' + normalize(username))
+                        if email:
+                            bloom.add('e:' + normalize(email))
+            finally:
+                cursor.close()
+                connection.close()
+            with self._lock:
+                self._filter = bloom
+                self._watermark = started_at - datetime.timedelta(seconds=REFRESH_OVERLAP)
+                self._built_at = time.monotonic()
+                self._last_refresh = 0.0
+            self._metrics['rebuilds'] += 1
+            print(f"✅ Availability filter built: {bloom.count} keys, {bloom.nbytes / 1024:.0f} KB")
+        finally:
+            self._building.release()
+        # Pick up anything written while the scan was running
+        self.refresh(force=True)
+        return True
+
+    def build_in_background(self):
+        thread = threading.Thread(target=self._safe_build, name='availability-build', daemon=True)
+        thread.start()
+        return thread
+
+    def _safe_build(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"⚠️ Availability filter build failed: {e}")
+
+    def refresh(self, force=False):
+        """Add users created or changed since the watermark (one indexed range query on idx_users_updated)"""
+        if not self.ready:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_refresh < self.refresh_interval:
+            return
+        self._last_refresh = now
+        connection = self._get_connection()
+        if not connection:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT CURRENT_TIMESTAMP")
+            started_at = cursor.fetchone()[0]
+            cursor.execute("SELECT username, email FROM users WHERE updated_at >= %s", (self._watermark,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        with self._lock:
+            for username, email in rows:
+                self._filter.add('u:' + normalize(username))
+                if email:
+                    self._filter.add('e:' + normalize(email))
+            # Overlap so a row committed during this pass with an older updated_at is seen next time
+            self._watermark = max(self._watermark, started_at - datetime.timedelta(seconds=REFRESH_OVERLAP))
+            over_capacity = self._filter.count > self._filter.capacity
+        self._metrics['refreshes'] += 1
+        if over_capacity or now - self._built_at >= self.rebuild_interval:
+            self._built_at = now  # one rebuild at a time; build() sets it again when done
+            self.build_in_background()
+
+    def may_exist(self, field, value):
+        """False means the username/email is definitely not in users"""
+        if not self.ready:
+            self._metrics['not_ready'] += 1
+            return True
+        key = ('u:' if field == 'username' else 'e:') + normalize(value)
+        if key in self._filter:
+            self._metrics['maybe_hits'] += 1
+            return True
+        # Another worker may have registered it since our last refresh
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"⚠️ Availability filter refresh failed: {e}")
+            return True
+        if key in self._filter:
+            self._metrics['maybe_hits'] += 1
+            return True
+        self._metrics['definite_misses'] += 1
+        return False
+
+    def add(self, username=None, email=None):
+        """Record a new or changed user immediately (this worker)"""
+        if not self.ready:
+            return
+        with self._lock:
+            if username:
+                self._filter.add('u:' + normalize(username))
+            if email:
+                self._filter.add('e:' + normalize(email))
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['ready'] = self.ready
+        if self.ready:
+            stats.update({
+                'keys': self._filter.count,
+                'capacity': self._filter.capacity,
+                'bytes': self._filter.nbytes,
+                'hashes': self._filter.num_hashes
+            })
+        return stats
@@ -0,0 +1,185 @@
+"""
+Badge engine for PetNest Network
+Counters in reporter_stats/seller_stats are bumped through the engine, which
+knows the value before and after the bump and only evaluates badge rules
+whose threshold was crossed, for that one user. Replaces the trigger UPDATEs
+that joined every user on every insert. The counters of new reports and
+completed adoptions are bumped by count_events, an outbox subscriber, so the
+request's transaction does not hold the user's stats row.
+"""
+
+import json
+from collections import namedtuple
+
+BadgeRule = namedtuple('BadgeRule', ['badge', 'role', 'counter', 'threshold'])
+
+# counter name -> (stats table, user column); identifiers are whitelisted here
+# because they are formatted into SQL
+COUNTERS = {
+    'total_reports': ('reporter_stats', 'reporter_id'),
+    'verified_reports': ('reporter_stats', 'reporter_id'),
+    'resolved_reports': ('reporter_stats', 'reporter_id'),
+    'total_listings': ('seller_stats', 'seller_id'),
+    'total_sold': ('seller_stats', 'seller_id'),
+    'total_adopted': ('seller_stats', 'seller_id'),
+    'successful_deals': ('seller_stats', 'seller_id'),
+}
+
+# outbox event type -> (payload key of the user, counters bumped once per event)
+EVENT_COUNTERS = {
+    'report.created': ('reporter_id', ('total_reports',)),
+    'adoption.completed': ('seller_id', ('total_adopted', 'successful_deals')),
+}
+
+DEFAULT_RULES = [
+    BadgeRule('Star Reporter', 'reporter', 'total_reports', 5),
+    BadgeRule('PRO Seller', 'seller', 'successful_deals', 5),
+]
+
+
+def load_rules(get_connection):
+    """Badge rules from system_settings.badge_rules (JSON list), defaults otherwise"""
+    connection = get_connection()
+    if not connection:
+        return list(DEFAULT_RULES)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT setting_value FROM system_settings WHERE setting_key = 'badge_rules'")
+        row = cursor.fetchone()
+    except Exception as e:
+        print(f"⚠️ Could not read badge rules, using defaults: {e}")
+        row = None
+    finally:
+        cursor.close()
+        connection.close()
+    if not row or not row[0]:
+        return list(DEFAULT_RULES)
+    try:
+        return [BadgeRule(r['badge'], r['role'], r['counter'], int(r['threshold'])) for r in json.loads(row[0])]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"⚠️ Invalid badge_rules setting, using defaults: {e}")
+        return list(DEFAULT_RULES)
+
+
+class BadgeEngine:
+    """Increments stats counters and awards badges when a threshold is crossed"""
+
+    def __init__(self, rules=None):
+        self.set_rules(rules or DEFAULT_RULES)
+
+    def set_rules(self, rules):
+        for rule in rules:
+            if rule.counter not in COUNTERS:
+                raise ValueError(f"Unknown badge counter: {rule.counter}")
+        self.rules = sorted(rules, key=lambda rule: rule.threshold)
+
+    def _rules_for(self, counter):
+        return [rule for rule in self.rules if rule.counter == counter]
+
+    def increment(self, cursor, user_id, counter, amount=1):
+        """Bump a counter inside the caller's transaction; returns the badge awarded, if any
+
+        One upsert returns the new value through LAST_INSERT_ID(expr), so no
+        extra read is needed, and at most one single-row UPDATE follows.
+        """
+        table, user_column = COUNTERS[counter]
+        cursor.execute(f"""
+            INSERT INTO {table} ({user_column}, {counter}) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE
+            {counter} = LAST_INSERT_ID({counter} + VALUES({counter})),
+            last_updated = CURRENT_TIMESTAMP
+        """, (user_id, amount))
+        # rowcount 1 = new row (value is amount), 2 = updated row (value in lastrowid)
+        new_value = amount if cursor.rowcount == 1 else cursor.lastrowid
+        old_value = new_value - amount
+
+        crossed = [rule for rule in self._rules_for(counter) if old_value < rule.threshold <= new_value]
+        if not crossed:
+            return None
+        return self._award(cursor, user_id, crossed[-1])
+
+    def count_events(self, cursor, events):
+        """Outbox handler: bump the counters of EVENT_COUNTERS events, awarding badges
+
+        Runs in the relay's transaction, so the counters commit with the
+        subscriber's watermark and every event is counted once. A user's
+        events in one batch become one upsert per counter.
+        """
+        amounts = {}
+        for event in events:
+            user_key, counters = EVENT_COUNTERS.get(event['event_type'], (None, ()))
+            user_id = event['payload'].get(user_key)
+            if not user_id:
+                continue
+            for counter in counters:
+                amounts[(user_id, counter)] = amounts.get((user_id, counter), 0) + 1
+        for (user_id, counter), amount in sorted(amounts.items()):
+            self.increment(cursor, user_id, counter, amount)
+        return len(amounts)
+
+    def _award(self, cursor, user_id, rule):
+        """Set the badge unless the user already holds it or a higher tier"""
+        lower_tiers = [r.badge for r in self._rules_for(rule.counter)
+                       if r.role == rule.role and r.threshold < rule.threshold]
+        condition = "badge IS NULL"
+        params = [rule.badge, user_id, rule.role]
+        if lower_tiers:
+            condition = f"(badge IS NULL OR badge IN ({', '.join(['%s'] * len(lower_tiers))}))"
+            params.extend(lower_tiers)
+        cursor.execute(f"""
+            UPDATE users SET badge = %s
+            WHERE user_id = %s AND role = %s AND {condition}
+        """, params)
+        return rule.badge if cursor.rowcount else None
+
+    def backfill(self, get_connection, batch_size=5000, recount=False):
+        """Award badges for existing counters in user_id ranges; optionally recount reports first
+
+        Each batch is its own short transaction. Returns {badge: users awarded}.
+        """
+        awarded = {rule.badge: 0 for rule in self.rules}
+        connection = get_connection()
+        if not connection:
+            return awarded
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT COALESCE(MAX(user_id), 0) FROM users")
+            max_user_id = cursor.fetchone()[0]
+            for start in range(1, max_user_id + 1, batch_size):
+                end = start + batch_size - 1
+                if recount:
+                    cursor.execute("""
+                        INSERT INTO reporter_stats (reporter_id, total_reports)
+                        SELECT reporter_id, COUNT(*) FROM animal_reports
+                        WHERE reporter_id BETWEEN %s AND %s
+                        GROUP BY reporter_id
+                        ON DUPLICATE KEY UPDATE total_reports = VALUES(total_reports)
+                    """, (start, end))
+                    cursor.execute("""
+                        INSERT INTO seller_stats (seller_id, successful_deals)
+                        SELECT seller_id, COUNT(*) FROM adoptions
+                        WHERE status = 'completed' AND seller_id BETWEEN %s AND %s
+                        GROUP BY seller_id
+                        ON DUPLICATE KEY UPDATE successful_deals = VALUES(successful_deals)
+                    """, (start, end))
+                # Highest tier first so users land directly on their top badge
+                for rule in reversed(self.rules):
+                    table, user_column = COUNTERS[rule.counter]
+                    lower_tiers = [r.badge for r in self._rules_for(rule.counter)
+                                   if r.role == rule.role and r.threshold < rule.threshold]
+                    condition = "u.badge IS NULL"
+                    if lower_tiers:
+                        condition = f"(u.badge IS NULL OR u.badge IN ({', '.join(['%s'] * len(lower_tiers))}))"
+                    cursor.execute(f"""
+                        UPDATE users u
+                        JOIN {table} st ON st.{user_column} = u.user_id
+                        SET u.badge = %s
+                        WHERE u.user_id BETWEEN %s AND %s AND u.role = %s
+                        AND st.{rule.counter} >= %s AND {condition}
+                    """, [rule.badge, start, end, rule.role, rule.threshold] + lower_tiers)
+                    awarded[rule.badge] += cursor.rowcount
+                connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        return awarded
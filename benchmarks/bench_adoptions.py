@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Benchmark for adoption approvals under contention: many applicants per pet
+Run: python benchmarks/bench_adoptions.py [--pets N] [--applicants N] [--connections N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_adoption_bench, lets every applicant of
+every pet apply at the same moment, then races one approval per application
+(as if each were clicked by a different admin) first with check-then-act
+(read the pet status, then UPDATE) and then with AdoptionWorkflow. Finally
+completes every approved adoption and delivers the completions to the
+badges outbox subscriber. Reports approvals per pet, conflicts,
+throughput and seller_stats. Exits non-zero if AdoptionWorkflow approves
+a pet twice or the completed counts do not match.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from adoptions import AdoptionWorkflow, AdoptionConflict
+from badges import EVENT_COUNTERS, BadgeEngine
+from outbox import OutboxRelay
+
+SELLERS = 10
+
+SCHEMA = [
+    """CREATE TABLE users (
+        user_id INT PRIMARY KEY AUTO_INCREMENT,
+        role VARCHAR(20) NOT NULL,
+        badge VARCHAR(50) NULL
+    )""",
+    """CREATE TABLE pets (
+        pet_id INT PRIMARY KEY AUTO_INCREMENT,
+        seller_id INT,
+        pet_name VARCHAR(50) NOT NULL,
+        price DECIMAL(10,2),
+        status ENUM('available', 'reserved', 'adopted', 'sold') DEFAULT 'available',
+        is_for_adoption BOOLEAN DEFAULT TRUE,
+        version INT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE adoptions (
+        adoption_id INT PRIMARY KEY AUTO_INCREMENT,
+        pet_id INT,
+        adopter_id INT,
+        seller_id INT,
+        adoption_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        adoption_fee DECIMAL(10,2),
+        status ENUM('pending', 'approved', 'rejected', 'completed') DEFAULT 'pending',
+        approved_by INT,
+        approved_at TIMESTAMP NULL,
+        notes TEXT,
+        version INT NOT NULL DEFAULT 0,
+        open_adopter_id INT AS (IF(status IN ('pending', 'approved'), adopter_id, NULL)) STORED,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        UNIQUE KEY unique_open_application (pet_id, open_adopter_id)
+    )""",
+    """CREATE TABLE seller_stats (
+        stat_id INT PRIMARY KEY AUTO_INCREMENT,
+        seller_id INT UNIQUE,
+        total_listings INT DEFAULT 0,
+        total_sold INT DEFAULT 0,
+        total_adopted INT DEFAULT 0,
+        successful_deals INT DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE outbox_events (
+        event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        aggregate_type VARCHAR(30) NOT NULL,
+        aggregate_id BIGINT NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_outbox_aggregate (aggregate_type, aggregate_id, event_id)
+    )""",
+    """CREATE TABLE rollup_watermarks (
+        name VARCHAR(50) PRIMARY KEY,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE watermark_gaps (
+        name VARCHAR(50) NOT NULL,
+        gap_id BIGINT NOT NULL,
+        found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (name, gap_id)
+    )""",
+    """CREATE TABLE outbox_dead_letters (
+        subscriber VARCHAR(50) NOT NULL,
+        event_id BIGINT NOT NULL,
+        error VARCHAR(500),
+        attempts INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (subscriber, event_id)
+    )""",
+]
+
+
+def connect(database='petnest_adoption_bench'):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def reset(pets, applicants):
+    """Sellers are users 1..SELLERS, adopters the users after them"""
+    connection = connect(None)
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_adoption_bench")
+    cursor.execute("CREATE DATABASE petnest_adoption_bench")
+    cursor.execute("USE petnest_adoption_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    cursor.executemany("INSERT INTO users (role) VALUES (%s)",
+                       [('seller',)] * SELLERS + [('user',)] * applicants)
+    cursor.executemany("INSERT INTO pets (seller_id, pet_name, price) VALUES (%s, %s, 50)",
+                       [(pet % SELLERS + 1, f'Pet {pet}') for pet in range(pets)])
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def race(jobs, connections, act):
+    """Release all jobs at once; returns (succeeded, conflicts, seconds)"""
+    pool = threading.BoundedSemaphore(connections)  # stands in for the app's connection limit
+    start_gate = threading.Event()
+    succeeded = []
+    conflicts = []
+
+    def worker(job):
+        start_gate.wait()
+        with pool:
+            try:
+                (succeeded if act(*job) else conflicts).append(job)
+            except AdoptionConflict:
+                conflicts.append(job)
+
+    threads = [threading.Thread(target=worker, args=(job,)) for job in jobs]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    return len(succeeded), len(conflicts), time.perf_counter() - started
+
+
+def pending_applications():
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT adoption_id, seller_id FROM adoptions WHERE status = 'pending' ORDER BY adoption_id")
+    rows = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    return rows
+
+
+def outcome():
+    """(most approvals on one pet, pets reserved, pets adopted, successful_deals total)"""
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("""
+        SELECT COALESCE(MAX(n), 0) FROM (
+            SELECT COUNT(*) AS n FROM adoptions WHERE status IN ('approved', 'completed') GROUP BY pet_id
+        ) per_pet
+    """)
+    most = cursor.fetchone()[0]
+    cursor.execute("SELECT SUM(status = 'reserved'), SUM(status = 'adopted') FROM pets")
+    reserved, adopted = (int(value or 0) for value in cursor.fetchone())
+    cursor.execute("SELECT COALESCE(SUM(successful_deals), 0) FROM seller_stats")
+    deals = int(cursor.fetchone()[0])
+    cursor.close()
+    connection.close()
+    return most, reserved, adopted, deals
+
+
+def naive_approve(adoption_id, seller_id):
+    """Read the pet status, then write 'reserved' if it looked available"""
+    connection = connect()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT p.pet_id, p.status FROM adoptions a JOIN pets p ON p.pet_id = a.pet_id
+            WHERE a.adoption_id = %s
+        """, (adoption_id,))
+        pet_id, status = cursor.fetchone()
+        if status != 'available':
+            connection.rollback()
+            return False
+        cursor.execute("UPDATE pets SET status = 'reserved' WHERE pet_id = %s", (pet_id,))
+        cursor.execute("UPDATE adoptions SET status = 'approved' WHERE adoption_id = %s", (adoption_id,))
+        connection.commit()
+        return True
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pets', type=int, default=50)
+    parser.add_argument('--applicants', type=int, default=40, help='applicants per pet')
+    parser.add_argument('--connections', type=int, default=100)
+    args = parser.parse_args()
+
+    applications = [(SELLERS + a + 1, p + 1) for p in range(args.pets) for a in range(args.applicants)]
+
+    reset(args.pets, args.applicants)
+    print(f"{args.pets} pets x {args.applicants} applicants = {len(applications)} applications")
+    workflow = AdoptionWorkflow(connect)
+    ok, failed, seconds = race(applications, args.connections, lambda adopter, pet: workflow.apply(adopter, pet))
+    print(f"apply              {ok:6d} submitted, {failed:4d} rejected, {len(applications) / seconds:7.0f} applications/s")
+
+    naive_jobs = pending_applications()
+    ok, failed, seconds = race(naive_jobs, args.connections, naive_approve)
+    most, reserved, adopted, deals = outcome()
+    print(f"check-then-act     {ok:6d} approvals for {args.pets} pets, up to {most} per pet, "
+          f"{len(naive_jobs) / seconds:7.0f} approvals/s")
+
+    reset(args.pets, args.applicants)
+    workflow = AdoptionWorkflow(connect)
+    race(applications, args.connections, lambda adopter, pet: workflow.apply(adopter, pet))
+    jobs = pending_applications()
+
+    def approve(adoption_id, seller_id):
+        workflow.transition('approve', adoption_id, seller_id)
+        return True
+
+    ok, failed, seconds = race(jobs, args.connections, approve)
+    most, reserved, adopted, deals = outcome()
+    stats = workflow.stats()
+    print(f"AdoptionWorkflow   {ok:6d} approvals for {args.pets} pets, up to {most} per pet, "
+          f"{len(jobs) / seconds:7.0f} approvals/s, {failed} conflicts, {stats['retries']} retries")
+    approved_ok = ok == args.pets and most == 1 and reserved == args.pets
+
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT adoption_id, seller_id FROM adoptions WHERE status = 'approved'")
+    approved = cursor.fetchall()
+    cursor.close()
+    connection.close()
+
+    def complete(adoption_id, seller_id):
+        workflow.transition('complete', adoption_id, seller_id)
+        return True
+
+    ok, failed, seconds = race(approved, args.connections, complete)
+    # seller_stats are counted from the adoption.completed events
+    relay = OutboxRelay(connect)
+    relay.subscribe('badges', BadgeEngine().count_events, tuple(EVENT_COUNTERS))
+    relay.run_once()
+    most, reserved, adopted, deals = outcome()
+    stats = workflow.stats()
+    print(f"complete           {ok:6d} adoptions, {adopted} pets adopted, successful_deals {deals}, "
+          f"{stats['auto_rejected']} waiting applications closed, {len(approved) / seconds:7.0f} completions/s")
+    completed_ok = ok == adopted == deals == args.pets
+
+    connection = connect()
+    connection.cursor().execute("DROP DATABASE petnest_adoption_bench")
+    connection.close()
+
+    if not (approved_ok and completed_ok):
+        print("❌ AdoptionWorkflow approved a pet twice or lost a completion")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
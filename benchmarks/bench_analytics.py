@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the in-memory analytics cube
+Run: python benchmarks/bench_analytics.py [--rows N] [--repeat N]
+
+Fills the reports fact with N synthetic rows (no database needed) and times
+typical admin chart queries: reports per day by city, per month by
+condition/urgency for one city, and a filtered status breakdown.
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import AnalyticsCube
+
+CITIES = ['Lahore', 'Karachi', 'Islamabad', 'Rawalpindi', 'Faisalabad', 'Multan', 'Peshawar', 'Quetta',
+          'Sialkot', 'Hyderabad', 'Gujranwala', 'Bahawalpur', 'Sargodha', 'Abbottabad', 'Sukkur']
+CONDITIONS = ['stray', 'sick', 'dead']
+URGENCY = ['low', 'medium', 'high']
+STATUSES = ['pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed']
+
+
+def fill(cube, rows, chunk=1000000):
+    table = cube.tables['reports']
+    # Register dictionary values once, then append code arrays directly
+    codes = {
+        'city': np.array([table.dictionaries['city'].encode(v) for v in CITIES], dtype=np.int32),
+        'condition': np.array([table.dictionaries['condition'].encode(v) for v in CONDITIONS], dtype=np.int32),
+        'urgency': np.array([table.dictionaries['urgency'].encode(v) for v in URGENCY], dtype=np.int32),
+        'status': np.array([table.dictionaries['status'].encode(v) for v in STATUSES], dtype=np.int32),
+    }
+    rng = np.random.default_rng(42)
+    start_ts = 1640995200  # 2022-01-01
+    span = 3 * 365 * 86400
+    for start in range(0, rows, chunk):
+        count = min(chunk, rows - start)
+        ids = np.arange(start + 1, start + count + 1, dtype=np.int64)
+        arrays = {
+            'reported_at': start_ts + ids * span // rows,  # ids and time grow together
+            'city': codes['city'][rng.integers(0, len(CITIES), count)],
+            'condition': codes['condition'][rng.integers(0, len(CONDITIONS), count)],
+            'urgency': codes['urgency'][rng.integers(0, len(URGENCY), count)],
+            'status': codes['status'][rng.integers(0, len(STATUSES), count)],
+        }
+        table.append(ids, table.with_derived(arrays))
+    cube.ready = True
+
+
+def timed(cube, repeat, **query):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = cube.query('reports', **query)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=10000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    cube = AnalyticsCube(lambda: None)
+    start = time.perf_counter()
+    fill(cube, args.rows)
+    print(f"loaded {args.rows:,} rows in {time.perf_counter() - start:.1f}s "
+          f"({cube.stats()['bytes'] / 1e6:.0f} MB)")
+
+    queries = [
+        ('per day by city', dict(group_by=['city'], bucket='day')),
+        ('per month by condition/urgency, Lahore', dict(group_by=['condition', 'urgency'], bucket='month',
+                                                        filters={'city': ['Lahore']})),
+        ('status breakdown, last 90 days', dict(group_by=['status'],
+                                                since=datetime.datetime(2024, 10, 1))),
+        ('total per week', dict(bucket='week')),
+    ]
+    for label, query in queries:
+        ms, groups = timed(cube, args.repeat, **query)
+        print(f"{label:42s} {ms:8.1f} ms   {groups:6d} groups")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the username/email availability filter
+Run: python benchmarks/bench_availability.py [--users N] [--probes N]
+
+Builds the Bloom filter over N synthetic users (username + email each), then
+measures lookup QPS and the observed false-positive rate for names that are
+not registered, i.e. the share of "available" checks that still hit MySQL.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from availability import BloomFilter, normalize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--probes', type=int, default=1000000)
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    args = parser.parse_args()
+
+    # Same sizing as AvailabilityIndex.build(): two keys per user, 2x headroom
+    bloom = BloomFilter(args.users * 2 * 2, args.error_rate)
+    start = time.perf_counter()
+    for i in range(args.users):
+        bloom.add('u:' + normalize(f"user_{i}"))
+        bloom.add('e:' + normalize(f"user_{i}@example.com"))
+    build = time.perf_counter() - start
+    print(f"build        {args.users:,} users in {build:.2f}s   "
+          f"{bloom.nbytes / 1024 / 1024:.1f} MB, {bloom.num_hashes} hashes")
+
+    start = time.perf_counter()
+    present = sum(1 for i in range(args.probes) if 'u:' + normalize(f"user_{i % args.users}") in bloom)
+    elapsed = time.perf_counter() - start
+    assert present == args.probes, 'false negative'
+    print(f"taken        {args.probes / elapsed:>12,.0f} lookups/s")
+
+    start = time.perf_counter()
+    false_positives = sum(1 for i in range(args.probes) if 'u:' + normalize(f"free_{i}") in bloom)
+    elapsed = time.perf_counter() - start
+    print(f"available    {args.probes / elapsed:>12,.0f} lookups/s   "
+          f"false positives {false_positives:,} ({false_positives / args.probes:.4%}, "
+          f"target {args.error_rate:.2%} at full capacity)")
+
+
+if __name__ == '__main__':
+    main()
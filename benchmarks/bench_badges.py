@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark for report inserts: legacy badge trigger vs the badge engine
+Run: python benchmarks/bench_badges.py [--users N] [--inserts N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_badge_bench, seeds N users with reporter
+stats, then times report inserts with the old after_report_insert trigger
+(badge UPDATE joined across all users) and with BadgeEngine.increment
+(single-user evaluation). The engine's cost should not grow with --users.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from badges import BadgeEngine
+
+SCHEMA = [
+    """CREATE TABLE users (
+        user_id INT PRIMARY KEY AUTO_INCREMENT,
+        username VARCHAR(50) NOT NULL,
+        role ENUM('admin', 'reporter', 'adopter', 'seller', 'shelter', 'store') NOT NULL,
+        badge VARCHAR(20) DEFAULT NULL
+    )""",
+    """CREATE TABLE reporter_stats (
+        stat_id INT PRIMARY KEY AUTO_INCREMENT,
+        reporter_id INT UNIQUE,
+        total_reports INT DEFAULT 0,
+        verified_reports INT DEFAULT 0,
+        resolved_reports INT DEFAULT 0,
+        last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE animal_reports (
+        report_id INT PRIMARY KEY AUTO_INCREMENT,
+        reporter_id INT,
+        animal_type VARCHAR(50) NOT NULL,
+        reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+LEGACY_TRIGGER = """
+    CREATE TRIGGER after_report_insert
+    AFTER INSERT ON animal_reports
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO reporter_stats (reporter_id, total_reports)
+        VALUES (NEW.reporter_id, 1)
+        ON DUPLICATE KEY UPDATE
+        total_reports = total_reports + 1,
+        last_updated = CURRENT_TIMESTAMP;
+
+        UPDATE users u
+        JOIN reporter_stats rs ON u.user_id = rs.reporter_id
+        SET u.badge = 'Star Reporter'
+        WHERE rs.total_reports >= 5 AND u.role = 'reporter' AND u.badge IS NULL;
+    END
+"""
+
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def seed(users):
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_badge_bench")
+    cursor.execute("CREATE DATABASE petnest_badge_bench")
+    cursor.execute("USE petnest_badge_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    chunk = 5000
+    for start in range(1, users + 1, chunk):
+        ids = range(start, min(start + chunk, users + 1))
+        cursor.execute(
+            "INSERT INTO users (user_id, username, role) VALUES " + ', '.join(['(%s, %s, %s)'] * len(ids)),
+            [v for i in ids for v in (i, f"user{i}", 'reporter')]
+        )
+        # Everyone sits below the threshold so the legacy UPDATE has to look at all of them
+        cursor.execute(
+            "INSERT INTO reporter_stats (reporter_id, total_reports) VALUES " + ', '.join(['(%s, %s)'] * len(ids)),
+            [v for i in ids for v in (i, random.randint(0, 3))]
+        )
+        connection.commit()
+    cursor.close()
+    return connection
+
+
+def time_inserts(connection, users, inserts, engine=None):
+    cursor = connection.cursor()
+    latencies = []
+    for _ in range(inserts):
+        reporter_id = random.randint(1, users)
+        start = time.perf_counter()
+        cursor.execute("INSERT INTO animal_reports (reporter_id, animal_type) VALUES (%s, 'Dog')", (reporter_id,))
+        if engine:
+            engine.increment(cursor, reporter_id, 'total_reports')
+        connection.commit()
+        latencies.append(time.perf_counter() - start)
+    cursor.close()
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1000, latencies[int(len(latencies) * 0.99)] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--inserts', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"seeding {args.users:,} users ...")
+    connection = seed(args.users)
+    cursor = connection.cursor()
+
+    cursor.execute(LEGACY_TRIGGER)
+    p50, p99 = time_inserts(connection, args.users, args.inserts)
+    print(f"legacy trigger   p50 {p50:8.2f} ms   p99 {p99:8.2f} ms per report insert")
+
+    cursor.execute("DROP TRIGGER after_report_insert")
+    p50, p99 = time_inserts(connection, args.users, args.inserts, engine=BadgeEngine())
+    print(f"badge engine     p50 {p50:8.2f} ms   p99 {p99:8.2f} ms per report insert")
+
+    cursor.execute("DROP DATABASE petnest_badge_bench")
+    cursor.close()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
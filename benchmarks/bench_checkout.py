@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark for checkout under a flash sale: many buyers, one SKU
+Run: python benchmarks/bench_checkout.py [--buyers N] [--stock N] [--connections N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_checkout_bench with one product, then lets
+N buyer threads check out one unit each at the same moment, first with a
+read-modify-write decrement (SELECT stock, then UPDATE to the value read)
+and then with Checkout. Reports orders placed vs stock, the final stock
+level, throughput and deadlock retries. Exits non-zero if Checkout oversells.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from checkout import Checkout, CheckoutError
+
+SCHEMA = [
+    """CREATE TABLE products (
+        product_id INT PRIMARY KEY AUTO_INCREMENT,
+        store_id INT,
+        product_name VARCHAR(100) NOT NULL,
+        price DECIMAL(10,2) NOT NULL,
+        stock_quantity INT DEFAULT 0,
+        is_active BOOLEAN DEFAULT TRUE
+    )""",
+    """CREATE TABLE orders (
+        order_id INT PRIMARY KEY AUTO_INCREMENT,
+        customer_id INT,
+        store_id INT,
+        total_amount DECIMAL(10,2) NOT NULL,
+        status ENUM('pending', 'processing', 'shipped', 'delivered', 'cancelled') DEFAULT 'pending',
+        shipping_address TEXT,
+        payment_method VARCHAR(50),
+        order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE order_items (
+        order_item_id INT PRIMARY KEY AUTO_INCREMENT,
+        order_id INT,
+        product_id INT,
+        quantity INT NOT NULL,
+        unit_price DECIMAL(10,2) NOT NULL,
+        subtotal DECIMAL(10,2) AS (quantity * unit_price) STORED,
+        INDEX (order_id)
+    )""",
+    """CREATE TABLE sales_daily (
+        store_id INT NOT NULL,
+        product_id INT NOT NULL,
+        day DATE NOT NULL,
+        revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+        units INT NOT NULL DEFAULT 0,
+        orders INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (store_id, day, product_id)
+    )""",
+]
+
+
+def connect(database='petnest_checkout_bench'):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def reset(stock):
+    connection = connect(None)
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_checkout_bench")
+    cursor.execute("CREATE DATABASE petnest_checkout_bench")
+    cursor.execute("USE petnest_checkout_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    cursor.execute("INSERT INTO products (store_id, product_name, price, stock_quantity) VALUES (1, 'Flash sale kibble', 999, %s)",
+                   (stock,))
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def naive_checkout(connection, customer_id):
+    """Read the stock, then write back the value computed in Python"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT stock_quantity, price FROM products WHERE product_id = 1")
+        stock, price = cursor.fetchone()
+        if stock < 1:
+            connection.rollback()
+            return False
+        cursor.execute("UPDATE products SET stock_quantity = %s WHERE product_id = 1", (stock - 1,))
+        cursor.execute("INSERT INTO orders (customer_id, store_id, total_amount) VALUES (%s, 1, %s)", (customer_id, price))
+        cursor.execute("INSERT INTO order_items (order_id, product_id, quantity, unit_price) VALUES (%s, 1, 1, %s)",
+                       (cursor.lastrowid, price))
+        connection.commit()
+        return True
+    finally:
+        cursor.close()
+
+
+def run(buyers, connections, buy):
+    """Release all buyers at once; returns (orders placed, failures, seconds)"""
+    pool = threading.BoundedSemaphore(connections)  # stands in for the app's connection limit
+    start_gate = threading.Event()
+    placed = []
+    failed = []
+
+    def buyer(customer_id):
+        start_gate.wait()
+        with pool:
+            try:
+                (placed if buy(customer_id) else failed).append(customer_id)
+            except Exception:
+                failed.append(customer_id)
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(1, buyers + 1)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    return len(placed), len(failed), time.perf_counter() - started
+
+
+def final_stock():
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT stock_quantity FROM products WHERE product_id = 1")
+    stock = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(SUM(quantity), 0) FROM order_items")
+    sold = int(cursor.fetchone()[0])
+    cursor.close()
+    connection.close()
+    return stock, sold
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=500)
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--connections', type=int, default=100)
+    args = parser.parse_args()
+
+    reset(args.stock)
+
+    def naive_buy(customer_id):
+        connection = connect()
+        try:
+            return naive_checkout(connection, customer_id)
+        finally:
+            connection.close()
+
+    placed, failed, seconds = run(args.buyers, args.connections, naive_buy)
+    stock, sold = final_stock()
+    print(f"read-modify-write  {placed:4d} orders for {args.stock} units, {sold} units sold, "
+          f"final stock {stock}, {args.buyers / seconds:7.0f} buyers/s")
+
+    reset(args.stock)
+    checkout = Checkout(connect)
+
+    def checkout_buy(customer_id):
+        try:
+            checkout.place_order(customer_id, [{'product_id': 1, 'quantity': 1}], 'bench', 'cash_on_delivery')
+            return True
+        except CheckoutError:
+            return False
+
+    placed, failed, seconds = run(args.buyers, args.connections, checkout_buy)
+    stock, sold = final_stock()
+    stats = checkout.stats()
+    print(f"Checkout           {placed:4d} orders for {args.stock} units, {sold} units sold, "
+          f"final stock {stock}, {args.buyers / seconds:7.0f} buyers/s, "
+          f"{stats['retries']} retries, {stats['gave_up']} gave up")
+
+    connection = connect()
+    connection.cursor().execute("DROP DATABASE petnest_checkout_bench")
+    connection.close()
+
+    if sold > args.stock or stock < 0 or placed != min(args.buyers, args.stock):
+        print("❌ Checkout oversold or lost orders")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
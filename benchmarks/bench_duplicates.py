@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark for duplicate report detection over perceptual hash bands
+Run: python benchmarks/bench_duplicates.py [--photos N] [--queries N] [--days N]
+
+Builds N synthetic report photos (random 64-bit hashes at locations around
+Pakistani cities over --days days; no database needed) and lays out their
+hash band rows exactly like the report_photo_hashes primary key: one sorted
+(area, band, day) key array, probed with range lookups as MySQL would. New
+reports, half of them near-duplicates (same spot within ~1 km, 0-3 days
+later, 0-7 bits flipped), are checked with the band probes and with a NumPy
+brute-force scan of every photo. Exits non-zero if the band probes miss a
+match the scan finds.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from duplicates import (BANDS, BAND_BITS, BAND_MASK, MAX_DISTANCE, WINDOW_DAYS, AREA_PRECISION,
+                        area_keys, probe_keys)
+from heatmap import geohash_ints
+
+CITIES = [(31.52, 74.36), (24.86, 67.00), (33.68, 73.05), (33.60, 73.04), (31.42, 73.08), (30.16, 71.52),
+          (34.01, 71.58), (30.18, 66.97), (32.49, 74.53), (25.40, 68.37)]
+DAY0 = 20000
+DAY_BITS = 15
+BAND_KEY_BITS = 2 + BAND_BITS
+
+BYTE_BITS = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(values):
+    return BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def composite(area, band_key, day):
+    """The (area_key, band_key, day) primary-key prefix packed into one sortable int64"""
+    return (area.astype(np.int64) << (BAND_KEY_BITS + DAY_BITS)) | (band_key.astype(np.int64) << DAY_BITS) | \
+        (day.astype(np.int64) - DAY0)
+
+
+def synthetic(count, days, rng):
+    city = rng.integers(0, len(CITIES), count)
+    centers = np.array(CITIES)[city]
+    lats = centers[:, 0] + rng.normal(0, 0.08, count)
+    lons = centers[:, 1] + rng.normal(0, 0.08, count)
+    hashes = rng.integers(0, np.iinfo(np.int64).max, count, dtype=np.int64).astype(np.uint64) * np.uint64(2) + \
+        rng.integers(0, 2, count).astype(np.uint64)
+    day = DAY0 + rng.integers(0, days, count)
+    return lats, lons, hashes, day
+
+
+def build_index(lats, lons, hashes, day):
+    """Sorted band rows: (keys, photo index) with BANDS rows per photo"""
+    areas = geohash_ints(lats, lons, AREA_PRECISION)
+    keys = []
+    for band in range(BANDS):
+        band_key = (band << BAND_BITS) | ((hashes >> np.uint64(band * BAND_BITS)) & np.uint64(BAND_MASK)).astype(np.int64)
+        keys.append(composite(areas, band_key, day))
+    keys = np.concatenate(keys)
+    photos = np.tile(np.arange(len(hashes)), BANDS)
+    order = np.argsort(keys, kind='stable')
+    return keys[order], photos[order], areas
+
+
+def probe(index, hashes, lat, lon, phash, day):
+    """Photo indexes within MAX_DISTANCE found through the band rows of nearby areas and recent days"""
+    keys, photos = index
+    areas = np.array(area_keys(lat, lon, None, None, neighbours=True), dtype=np.int64)
+    probes = np.array(probe_keys(phash), dtype=np.int64)
+    area_grid = np.repeat(areas, len(probes))
+    probe_grid = np.tile(probes, len(areas))
+    # Days are the low bits of the packed key, so the window must not reach below DAY0
+    first_day = max(day - WINDOW_DAYS, DAY0)
+    lo = np.searchsorted(keys, composite(area_grid, probe_grid, np.full(len(area_grid), first_day)), 'left')
+    hi = np.searchsorted(keys, composite(area_grid, probe_grid, np.full(len(area_grid), day)), 'right')
+    spans = [photos[a:b] for a, b in zip(lo, hi) if b > a]
+    if not spans:
+        return set(), 0
+    candidates = np.unique(np.concatenate(spans))
+    distance = popcount(hashes[candidates] ^ np.uint64(phash))
+    return set(candidates[distance <= MAX_DISTANCE].tolist()), len(candidates)
+
+
+def scan(hashes, areas, day_numbers, lat, lon, phash, day):
+    """Brute force over every photo: same areas and window, exact Hamming distance"""
+    nearby = np.isin(areas, area_keys(lat, lon, None, None, neighbours=True))
+    recent = (day_numbers >= day - WINDOW_DAYS) & (day_numbers <= day)
+    distance = popcount(hashes ^ np.uint64(phash))
+    return set(np.flatnonzero(nearby & recent & (distance <= MAX_DISTANCE)).tolist())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--photos', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    lats, lons, hashes, day_numbers = synthetic(args.photos, args.days, rng)
+    started = time.perf_counter()
+    keys, photos, areas = build_index(lats, lons, hashes, day_numbers)
+    print(f"indexed {args.photos:,} photos as {len(keys):,} band rows in {time.perf_counter() - started:.1f}s")
+
+    probe_times, scan_times, candidates_seen = [], [], []
+    found = expected = missed = 0
+    for query in range(args.queries):
+        if query % 2 == 0:
+            # Near-duplicate of an existing photo
+            source = int(rng.integers(0, args.photos))
+            lat = lats[source] + rng.normal(0, 0.004)
+            lon = lons[source] + rng.normal(0, 0.004)
+            phash = int(hashes[source])
+            for bit in rng.choice(64, int(rng.integers(0, MAX_DISTANCE + 1)), replace=False):
+                phash ^= 1 << int(bit)
+            day = int(day_numbers[source]) + int(rng.integers(0, WINDOW_DAYS + 1))
+        else:
+            lat, lon = CITIES[int(rng.integers(0, len(CITIES)))]
+            phash = int(rng.integers(0, 1 << 62)) << 2
+            day = DAY0 + int(rng.integers(0, args.days))
+
+        start = time.perf_counter()
+        matches, candidates = probe((keys, photos), hashes, lat, lon, phash, day)
+        probe_times.append(time.perf_counter() - start)
+        candidates_seen.append(candidates)
+
+        start = time.perf_counter()
+        truth = scan(hashes, areas, day_numbers, lat, lon, phash, day)
+        scan_times.append(time.perf_counter() - start)
+
+        found += len(matches & truth)
+        expected += len(truth)
+        missed += len(truth - matches)
+
+    def ms(samples, p):
+        return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+    print(f"band probes   p50 {ms(probe_times, 0.5):8.3f} ms  p99 {ms(probe_times, 0.99):8.3f} ms  "
+          f"{np.mean(candidates_seen):.1f} candidates per report")
+    print(f"full scan     p50 {ms(scan_times, 0.5):8.3f} ms  p99 {ms(scan_times, 0.99):8.3f} ms")
+    print(f"matches found {found} of {expected}")
+    if missed:
+        print(f"❌ Band probes missed {missed} matches within {MAX_DISTANCE} bits")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
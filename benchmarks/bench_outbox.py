@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the transactional outbox and its relay
+Run: python benchmarks/bench_outbox.py [--writers N] [--changes N] [--aggregates N] [--slow N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_outbox_bench. N writer threads each make
+--changes status changes to random aggregates (one UPDATE plus one outbox
+row per transaction) while an OutboxRelay with a recording subscriber and
+a second, flaky subscriber (fails every 50th batch) tails the table. The
+--slow writers hold each transaction open for up to a second after the
+emit, so their events commit after later ones were delivered.
+Reports write transaction latency, relay throughput and the lag metrics.
+Exits non-zero if an event is lost or duplicated on the database side or
+if any aggregate's events arrive out of order.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbox import OutboxRelay, emit
+
+SCHEMA = [
+    """CREATE TABLE items (
+        item_id INT PRIMARY KEY,
+        status INT NOT NULL DEFAULT 0
+    )""",
+    """CREATE TABLE rollup_watermarks (
+        name VARCHAR(50) PRIMARY KEY,
+        last_id BIGINT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE watermark_gaps (
+        name VARCHAR(50) NOT NULL,
+        gap_id BIGINT NOT NULL,
+        found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (name, gap_id)
+    )""",
+    """CREATE TABLE outbox_events (
+        event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        aggregate_type VARCHAR(30) NOT NULL,
+        aggregate_id BIGINT NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_outbox_created (created_at)
+    )""",
+    """CREATE TABLE outbox_dead_letters (
+        subscriber VARCHAR(50) NOT NULL,
+        event_id BIGINT NOT NULL,
+        error VARCHAR(500),
+        attempts INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (subscriber, event_id)
+    )""",
+    """CREATE TABLE received (
+        subscriber VARCHAR(50) NOT NULL,
+        event_id BIGINT NOT NULL,
+        PRIMARY KEY (subscriber, event_id)
+    )""",
+]
+
+
+def connect(database='petnest_outbox_bench'):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def reset(aggregates):
+    connection = connect(None)
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_outbox_bench")
+    cursor.execute("CREATE DATABASE petnest_outbox_bench")
+    cursor.execute("USE petnest_outbox_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    cursor.executemany("INSERT INTO items (item_id) VALUES (%s)", [(i,) for i in range(1, aggregates + 1)])
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--changes', type=int, default=500)
+    parser.add_argument('--aggregates', type=int, default=200)
+    parser.add_argument('--slow', type=int, default=2, help='writers that commit late')
+    args = parser.parse_args()
+
+    reset(args.aggregates)
+
+    # Per aggregate, the versions each subscriber saw, in delivery order
+    seen = {'recorder': {}, 'flaky': {}}
+    batches = {'flaky': 0}
+
+    def recorder(name):
+        def handler(cursor, events):
+            if name == 'flaky':
+                batches['flaky'] += 1
+                if batches['flaky'] % 50 == 0:
+                    raise RuntimeError('simulated subscriber failure')
+            # The database side effect commits with the watermark: a duplicate would hit the primary key
+            cursor.executemany("INSERT INTO received (subscriber, event_id) VALUES (%s, %s)",
+                               [(name, event['event_id']) for event in events])
+            for event in events:
+                seen[name].setdefault(event['aggregate_id'], []).append(event['payload']['version'])
+        return handler
+
+    relay = OutboxRelay(connect, interval=0.05, batch_size=500)
+    relay.subscribe('recorder', recorder('recorder'))
+    relay.subscribe('flaky', recorder('flaky'))
+    relay.start()
+
+    latencies = []
+    lock = threading.Lock()
+
+    def writer(seed, changes, slow=False):
+        rng = random.Random(seed)
+        connection = connect()
+        cursor = connection.cursor()
+        for _ in range(changes):
+            item_id = rng.randint(1, args.aggregates)
+            start = time.perf_counter()
+            # The row lock orders the aggregate's changes, and its event is written under the same lock
+            cursor.execute("UPDATE items SET status = status + 1 WHERE item_id = %s", (item_id,))
+            cursor.execute("SELECT status FROM items WHERE item_id = %s", (item_id,))
+            version = cursor.fetchone()[0]
+            emit(cursor, 'item', item_id, 'item.changed', {'version': version})
+            if slow:
+                time.sleep(rng.uniform(0, 1))
+            connection.commit()
+            with lock:
+                latencies.append(time.perf_counter() - start)
+        cursor.close()
+        connection.close()
+
+    # Each slow transaction takes half a second on average, so they write fewer changes
+    slow_changes = min(args.changes, 20)
+    threads = [threading.Thread(target=writer, args=(seed, args.changes)) for seed in range(args.writers)]
+    threads += [threading.Thread(target=writer, args=(args.writers + seed, slow_changes, True))
+                for seed in range(args.slow)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    written = args.writers * args.changes + args.slow * slow_changes
+    write_seconds = time.perf_counter() - started
+
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        stats = relay.stats()['subscribers']
+        if all(sub['last_event_id'] >= written and not sub['open_gaps'] for sub in stats.values()):
+            break
+        time.sleep(0.1)
+    drained = time.perf_counter() - started
+    relay.stop(timeout=5)
+    stats = relay.stats()['subscribers']
+
+    def ms(samples, p):
+        return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+    print(f"writes         {written:,} in {write_seconds:.1f}s  p50 {ms(latencies, 0.5):.2f} ms  "
+          f"p99 {ms(latencies, 0.99):.2f} ms per transaction")
+    print(f"relay          all events delivered {drained - write_seconds:.1f}s after the last write, "
+          f"{written / drained:,.0f} events/s")
+    for name, sub in stats.items():
+        print(f"  {name:9s} delivered {sub['delivered']:,} in {sub['batches']} batches, "
+              f"{sub['failures']} failures, {sub['dead_letters']} dead letters, "
+              f"lag {sub['lag_events']} events / {sub['lag_seconds']:.1f}s, {sub['open_gaps']} open gaps")
+
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("SELECT subscriber, COUNT(*) FROM received GROUP BY subscriber")
+    received = dict(cursor.fetchall())
+    cursor.execute("DROP DATABASE petnest_outbox_bench")
+    cursor.close()
+    connection.close()
+
+    problems = []
+    for name in seen:
+        expected = written - stats[name]['dead_letters']
+        if received.get(name, 0) != expected:
+            problems.append(f"{name} stored {received.get(name, 0)} of {expected} events")
+        disordered = [item for item, versions in seen[name].items() if versions != sorted(versions)]
+        if disordered:
+            problems.append(f"{name} saw {len(disordered)} aggregates out of order")
+    if problems:
+        print(f"❌ {'; '.join(problems)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
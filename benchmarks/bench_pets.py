@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the pet listing: per-pet image queries vs batched loading
+Run: python benchmarks/bench_pets.py [--pets N] [--pages N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_pets_bench with N pets (1-5 images each),
+then pages through 50-pet listings the naive way (one image query per pet)
+and with pets.list_pets, counting the statements each page issues. Exits
+non-zero if a list_pets page or a detail lookup takes more than 2 queries.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pets import list_pets, get_pet, sync_primary_images
+from user_directory import decode_cursor
+
+SCHEMA = [
+    """CREATE TABLE users (
+        user_id INT PRIMARY KEY AUTO_INCREMENT,
+        username VARCHAR(50) NOT NULL,
+        full_name VARCHAR(100),
+        role ENUM('admin', 'reporter', 'adopter', 'seller', 'shelter', 'store') NOT NULL,
+        city VARCHAR(50),
+        profile_picture VARCHAR(255),
+        badge VARCHAR(20) DEFAULT NULL,
+        is_verified BOOLEAN DEFAULT FALSE
+    )""",
+    """CREATE TABLE pets (
+        pet_id INT PRIMARY KEY AUTO_INCREMENT,
+        seller_id INT,
+        pet_name VARCHAR(50) NOT NULL,
+        animal_type VARCHAR(50) NOT NULL,
+        breed VARCHAR(50),
+        age INT,
+        gender ENUM('male', 'female', 'unknown'),
+        color VARCHAR(50),
+        weight DECIMAL(5,2),
+        health_status ENUM('excellent', 'good', 'fair', 'poor') DEFAULT 'good',
+        vaccination_status BOOLEAN DEFAULT FALSE,
+        spayed_neutered BOOLEAN DEFAULT FALSE,
+        description TEXT,
+        price DECIMAL(10,2),
+        status ENUM('available', 'reserved', 'adopted', 'sold') DEFAULT 'available',
+        is_for_adoption BOOLEAN DEFAULT TRUE,
+        is_for_sale BOOLEAN DEFAULT FALSE,
+        primary_image_url VARCHAR(255) NULL,
+        favorite_count INT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        INDEX idx_pets_status_created (status, created_at, pet_id)
+    )""",
+    """CREATE TABLE pet_images (
+        image_id INT PRIMARY KEY AUTO_INCREMENT,
+        pet_id INT,
+        image_url VARCHAR(255) NOT NULL,
+        is_primary BOOLEAN DEFAULT FALSE,
+        uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_pet_images_pet (pet_id, is_primary, image_id)
+    )""",
+]
+
+
+class CountingCursor:
+    """Cursor wrapper that counts executed statements"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.queries = 0
+
+    def execute(self, sql, params=None):
+        self.queries += 1
+        return self._cursor.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def connect(database=None):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def seed(pets):
+    connection = connect()
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_pets_bench")
+    cursor.execute("CREATE DATABASE petnest_pets_bench")
+    cursor.execute("USE petnest_pets_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    sellers = max(1, pets // 20)
+    cursor.execute(
+        "INSERT INTO users (user_id, username, full_name, role, city) VALUES "
+        + ', '.join(['(%s, %s, %s, %s, %s)'] * sellers),
+        [v for i in range(1, sellers + 1) for v in (i, f"seller{i}", f"Seller {i}", 'seller', 'Lahore')]
+    )
+    chunk = 5000
+    for start in range(1, pets + 1, chunk):
+        ids = range(start, min(start + chunk, pets + 1))
+        cursor.execute(
+            "INSERT INTO pets (pet_id, seller_id, pet_name, animal_type, price) VALUES "
+            + ', '.join(['(%s, %s, %s, %s, %s)'] * len(ids)),
+            [v for i in ids for v in (i, random.randint(1, sellers), f"Pet {i}", 'Dog', 1000)]
+        )
+        images = [(i, f"/static/uploads/pets/{i}-{n}.jpg", n == 0) for i in ids for n in range(random.randint(1, 5))]
+        cursor.execute(
+            "INSERT INTO pet_images (pet_id, image_url, is_primary) VALUES " + ', '.join(['(%s, %s, %s)'] * len(images)),
+            [v for image in images for v in image]
+        )
+        sync_primary_images(cursor, list(ids))
+        connection.commit()
+    cursor.close()
+    return connection
+
+
+def naive_page(cursor, after_id):
+    """What an endpoint without batching does: the page, then images and seller per pet"""
+    cursor.execute("""
+        SELECT * FROM pets WHERE status = 'available' AND pet_id < %s
+        ORDER BY pet_id DESC LIMIT 50
+    """, (after_id,))
+    pets = cursor.fetchall()
+    for pet in pets:
+        cursor.execute("SELECT * FROM pet_images WHERE pet_id = %s", (pet['pet_id'],))
+        pet['images'] = cursor.fetchall()
+        cursor.execute("SELECT username, full_name, city FROM users WHERE user_id = %s", (pet['seller_id'],))
+        pet['seller'] = cursor.fetchone()
+    return pets[-1]['pet_id'] if pets else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pets', type=int, default=100000)
+    parser.add_argument('--pages', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"seeding {args.pets:,} pets ...")
+    connection = seed(args.pets)
+
+    cursor = CountingCursor(connection.cursor(dictionary=True))
+    after_id = args.pets + 1
+    start = time.perf_counter()
+    for _ in range(args.pages):
+        after_id = naive_page(cursor, after_id)
+    elapsed = time.perf_counter() - start
+    print(f"per-pet queries  {elapsed / args.pages * 1000:8.2f} ms/page   {cursor.queries / args.pages:6.1f} queries/page")
+
+    worst = 0
+    after = None
+    pages = 0
+    total = 0
+    start = time.perf_counter()
+    while pages < args.pages:
+        cursor.queries = 0
+        pets, next_cursor = list_pets(cursor, {'status': 'available'}, limit=50, after=after)
+        pages += 1
+        worst = max(worst, cursor.queries)
+        total += cursor.queries
+        if not next_cursor:
+            break
+        after = decode_cursor(next_cursor)
+    elapsed = time.perf_counter() - start
+    print(f"batched loading  {elapsed / pages * 1000:8.2f} ms/page   {total / pages:6.1f} queries/page")
+
+    cursor.queries = 0
+    get_pet(cursor, random.randint(1, args.pets))
+    detail_queries = cursor.queries
+    print(f"pet detail       {detail_queries} queries")
+
+    connection.cursor().execute("DROP DATABASE petnest_pets_bench")
+    connection.close()
+
+    if worst > 2 or detail_queries > 2:
+        print(f"❌ expected at most 2 queries per page/detail, saw {worst}/{detail_queries}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark for pet recommendations
+Run: python benchmarks/bench_recommendations.py [--pets N] [--adopters N] [--history N]
+
+Encodes N synthetic available pets (no database needed), then times one
+vectorised scoring pass per adopter (preference built from --history
+favorites/applications) against a per-pet Python loop, and cached
+recommend() calls. Exits non-zero if the vectorised top 20 differs from the
+loop's.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recommendations import PetMatrix, Recommender, encode, preference_vector, POPULARITY_WEIGHT
+
+TYPES = ['dog', 'cat', 'bird', 'rabbit', 'fish', 'hamster', 'turtle', 'parrot']
+BREEDS = [f'breed-{i}' for i in range(120)]
+CITIES = ['Lahore', 'Karachi', 'Islamabad', 'Rawalpindi', 'Faisalabad', 'Multan', 'Peshawar', 'Quetta',
+          'Sialkot', 'Hyderabad', 'Gujranwala', 'Bahawalpur', 'Sargodha', 'Abbottabad', 'Sukkur']
+
+
+def synthetic_pets(count, rng):
+    """Rows in recommendations.COLUMNS order"""
+    return [(
+        pet_id,
+        rng.randint(1, 2000),
+        rng.choice(TYPES),
+        rng.choice(BREEDS),
+        rng.choice([None, rng.randint(1, 180)]),
+        rng.choice(['male', 'female', 'unknown', None]),
+        round(rng.uniform(0.1, 60), 2),
+        rng.choice(['excellent', 'good', 'fair', 'poor']),
+        rng.random() < 0.6,
+        rng.random() < 0.4,
+        rng.choice([0, rng.randint(500, 150000)]),
+        int(rng.expovariate(0.2)),
+        rng.choice(CITIES),
+    ) for pet_id in range(1, count + 1)]
+
+
+def loop_scores(rows, preference):
+    """Reference: score each pet in Python"""
+    top = max(row[11] for row in rows)
+    scores = []
+    for row in rows:
+        score = sum(float(preference[index]) for index in encode(row))
+        if top > 0:
+            score += POPULARITY_WEIGHT * float(np.log1p(row[11]) / np.log1p(top))
+        scores.append((row[0], score))
+    return scores
+
+
+class SyntheticRecommender(Recommender):
+    """Recommender whose adopter histories come from memory instead of MySQL"""
+
+    def __init__(self, histories):
+        super().__init__(lambda: None)
+        self.histories = histories
+        self.ready = True
+
+    def history(self, user_id):
+        return self.histories[user_id]
+
+
+def percentile(samples, p):
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pets', type=int, default=100000)
+    parser.add_argument('--adopters', type=int, default=200)
+    parser.add_argument('--history', type=int, default=30)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = synthetic_pets(args.pets, rng)
+    started = time.perf_counter()
+    matrix = PetMatrix.from_rows(rows)
+    print(f"encoded {args.pets:,} pets in {time.perf_counter() - started:.2f}s ({matrix.nbytes / 1e6:.1f} MB)")
+
+    histories = {}
+    for user_id in range(1, args.adopters + 1):
+        liked = [rows[i] for i in rng.sample(range(len(rows)), args.history)]
+        histories[user_id] = ([encode(row) for row in liked], [rng.choice([1.0, 2.0, 3.0]) for _ in liked],
+                              [row[0] for row in liked])
+
+    recommender = SyntheticRecommender(histories)
+    recommender.matrix = matrix
+
+    cold = []
+    for user_id in histories:
+        started = time.perf_counter()
+        recommender.recommend(user_id, limit=20)
+        cold.append(time.perf_counter() - started)
+    warm = []
+    for user_id in histories:
+        started = time.perf_counter()
+        recommender.recommend(user_id, limit=20)
+        warm.append(time.perf_counter() - started)
+    print(f"vectorised score + top-k  p50 {percentile(cold, 0.5):7.2f} ms  p99 {percentile(cold, 0.99):7.2f} ms")
+    print(f"cached recommend          p50 {percentile(warm, 0.5):7.3f} ms  p99 {percentile(warm, 0.99):7.3f} ms")
+
+    # Reference check on one adopter: same top 20 from a per-pet Python loop
+    user_id = 1
+    codes, weights, seen = histories[user_id]
+    preference = preference_vector(codes, weights)
+    started = time.perf_counter()
+    reference = loop_scores(rows, preference)
+    loop_ms = (time.perf_counter() - started) * 1000
+    print(f"python loop score         {loop_ms:7.0f} ms per adopter")
+    excluded = set(seen) | {row[0] for row in rows if row[1] == user_id}
+    expected = sorted((item for item in reference if item[0] not in excluded), key=lambda item: (-item[1], -item[0]))[:20]
+    got = recommender.rank(user_id, codes, weights, seen, 20)
+    if any(abs(a[1] - b[1]) > 1e-4 for a, b in zip(expected, got)) or len(got) != len(expected):
+        print("❌ Vectorised ranking differs from the reference loop")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Benchmark for report text search: LIKE scans vs the FULLTEXT index
+Run: python benchmarks/bench_report_search.py [--reports N] [--queries N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_search_bench with N synthetic reports
+(descriptions built from a small vocabulary of animals, injuries and
+landmarks), then runs the same one- and two-word staff searches as
+description LIKE '%word%' filters and through report_search.search.
+Reports p50/p99 latency for both. Exits non-zero if a report the LIKE scan
+finds by whole word is missing from the full-text results.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_search import search
+
+SCHEMA = [
+    """CREATE TABLE animal_reports (
+        report_id INT PRIMARY KEY AUTO_INCREMENT,
+        animal_type VARCHAR(50) NOT NULL,
+        breed VARCHAR(100),
+        animal_condition ENUM('stray', 'sick', 'dead') NOT NULL,
+        urgency_level ENUM('low', 'medium', 'high', 'critical') DEFAULT 'medium',
+        description TEXT NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        region VARCHAR(100),
+        street VARCHAR(255),
+        status ENUM('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed') DEFAULT 'pending',
+        assigned_to INT,
+        reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_reports_status (status),
+        FULLTEXT INDEX ft_reports_text (description, street, region)
+    )""",
+]
+
+ANIMALS = ['dog', 'puppy', 'cat', 'kitten', 'donkey', 'horse', 'cow', 'goat', 'parrot', 'pigeon']
+STATES = ['injured', 'limping', 'bleeding', 'starving', 'shivering', 'trapped', 'wounded', 'blind', 'pregnant',
+          'abandoned', 'collared', 'aggressive', 'scared', 'sleeping', 'crying']
+PLACES = ['market', 'bazaar', 'mosque', 'school', 'hospital', 'canal', 'bridge', 'roundabout', 'bakery', 'petrol',
+          'station', 'park', 'graveyard', 'railway', 'bus', 'stop', 'plaza', 'chowk', 'gate', 'colony']
+FILLER = ['near', 'behind', 'outside', 'since', 'morning', 'evening', 'yesterday', 'please', 'help', 'small',
+          'brown', 'white', 'black', 'old', 'young', 'leg', 'eye', 'tail', 'road', 'corner']
+CITIES = ['Lahore', 'Karachi', 'Islamabad', 'Rawalpindi', 'Faisalabad', 'Multan', 'Peshawar', 'Quetta']
+AREAS = ['Gulberg', 'DHA', 'Model Town', 'Saddar', 'Clifton', 'F-7', 'G-9', 'Johar Town', 'Cantt', 'Satellite Town']
+
+
+def connect(database='petnest_search_bench'):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def description(rng):
+    words = [rng.choice(STATES), rng.choice(ANIMALS), rng.choice(FILLER), rng.choice(PLACES)]
+    words += rng.choices(FILLER + STATES + PLACES, k=rng.randint(4, 30))
+    return ' '.join(words).capitalize() + '.'
+
+
+def reset(reports, rng, batch_size=2000):
+    connection = connect(None)
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_search_bench")
+    cursor.execute("CREATE DATABASE petnest_search_bench")
+    cursor.execute("USE petnest_search_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    for first in range(0, reports, batch_size):
+        rows = [(rng.choice(ANIMALS), rng.choice(['stray', 'sick', 'dead']), description(rng), rng.choice(CITIES),
+                 rng.choice(AREAS), f"Street {rng.randint(1, 99)}",
+                 rng.choice(['pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed']))
+                for _ in range(min(batch_size, reports - first))]
+        cursor.executemany("""
+            INSERT INTO animal_reports (animal_type, animal_condition, description, city, region, street, status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, rows)
+        connection.commit()
+    cursor.execute("OPTIMIZE TABLE animal_reports")
+    cursor.fetchall()
+    cursor.close()
+    connection.close()
+
+
+def like_search(cursor, terms, limit):
+    """What a search box without an index does: every term as a '%term%' filter, newest first"""
+    cursor.execute(f"""
+        SELECT report_id, description FROM animal_reports
+        WHERE {' AND '.join(['description LIKE %s'] * len(terms))}
+        ORDER BY report_id DESC
+        LIMIT %s
+    """, [f"%{term}%" for term in terms] + [limit])
+    return cursor.fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reports', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    started = time.perf_counter()
+    reset(args.reports, rng)
+    print(f"loaded {args.reports:,} reports in {time.perf_counter() - started:.1f}s")
+
+    connection = connect()
+    cursor = connection.cursor(dictionary=True)
+    like_times, fulltext_times = [], []
+    missing = 0
+    for query in range(args.queries):
+        terms = [rng.choice(STATES), rng.choice(ANIMALS)] if query % 2 else [rng.choice(PLACES)]
+
+        start = time.perf_counter()
+        scanned = like_search(cursor, terms, args.limit)
+        like_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found, _ = search(cursor, ' '.join(terms), match_all=True, limit=args.limit)
+        fulltext_times.append(time.perf_counter() - start)
+
+        # Every term of a full-text hit must be in the description, street or region
+        if found:
+            ids = [report['report_id'] for report in found]
+            cursor.execute(f"""
+                SELECT LOWER(CONCAT_WS(' ', description, street, region)) AS text FROM animal_reports
+                WHERE report_id IN ({', '.join(['%s'] * len(ids))})
+            """, ids)
+            missing += sum(1 for row in cursor.fetchall() if not all(term in row['text'] for term in terms))
+        # A LIKE hit on whole words must also be a full-text hit when both return fewer than the limit
+        if len(scanned) < args.limit and len(found) < len(scanned):
+            missing += len(scanned) - len(found)
+    cursor.close()
+
+    def ms(samples, p):
+        return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+    print(f"LIKE '%term%'   p50 {ms(like_times, 0.5):8.2f} ms  p99 {ms(like_times, 0.99):8.2f} ms")
+    print(f"FULLTEXT        p50 {ms(fulltext_times, 0.5):8.2f} ms  p99 {ms(fulltext_times, 0.99):8.2f} ms")
+
+    connection.cursor().execute("DROP DATABASE petnest_search_bench")
+    connection.close()
+
+    if missing:
+        print(f"❌ Full-text search disagreed with the LIKE scan on {missing} reports")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
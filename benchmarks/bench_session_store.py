@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the session store: login (create) and auth check (get) throughput
+Run: python benchmarks/bench_session_store.py [--sessions N] [--latency-ms MS]
+
+--latency-ms adds a simulated round trip to every backend call so the effect
+of the hot tier against a remote shared backend is visible.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from session_store import SessionStore, MemorySessionBackend
+
+
+class SlowBackend(MemorySessionBackend):
+    """Memory backend with an artificial per-call round trip"""
+
+    def __init__(self, latency):
+        super().__init__()
+        self.latency = latency
+
+    def put(self, *args):
+        time.sleep(self.latency)
+        return super().put(*args)
+
+    def get(self, *args):
+        time.sleep(self.latency)
+        return super().get(*args)
+
+
+def run(label, store, tokens, checks):
+    start = time.perf_counter()
+    for i, token in enumerate(tokens):
+        store.create(i + 1, token, '203.0.113.7', 'Mozilla/5.0 (bench)')
+    login_elapsed = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(checks):
+        store.get(tokens[i % len(tokens)])
+    check_elapsed = time.perf_counter() - start
+
+    print(f"{label:<28} login {len(tokens) / login_elapsed:>12,.0f}/s   "
+          f"check {checks / check_elapsed:>12,.0f}/s   {store.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=50000)
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    args = parser.parse_args()
+
+    tokens = [uuid.uuid4().hex for _ in range(args.sessions)]
+
+    def backend():
+        if args.latency_ms:
+            return SlowBackend(args.latency_ms / 1000.0)
+        return MemorySessionBackend()
+
+    run('hot tier', SessionStore(backend(), hot_capacity=args.sessions), tokens, args.checks)
+    run('hot tier (10% capacity)', SessionStore(backend(), hot_capacity=args.sessions // 10), tokens, args.checks)
+    run('backend only', SessionStore(backend(), hot_capacity=0), tokens, args.checks)
+
+
+if __name__ == '__main__':
+    main()
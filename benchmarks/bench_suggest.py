@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark for autocomplete over sorted arrays with range-maximum tables
+Run: python benchmarks/bench_suggest.py [--values N] [--queries N] [--updates N]
+
+Builds a Suggester (no database needed) with N distinct street names whose
+use counts follow a Zipf curve, then adds --updates new uses that stay in
+the overlay, as between two compactions. Random 1-4 letter prefixes are
+answered by Suggester.suggest and by a scan of every value with
+startswith plus heapq.nlargest, the in-memory equivalent of
+LIKE 'prefix%' ... GROUP BY ... ORDER BY COUNT(*). Exits non-zero if the
+two disagree.
+"""
+
+import argparse
+import heapq
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from suggest import Suggester, normalize
+
+SYLLABLES = ['al', 'ba', 'cha', 'da', 'ga', 'gul', 'ha', 'ja', 'ka', 'la', 'ma', 'na', 'pa', 'qa', 'ra', 'sa',
+             'sha', 'ta', 'wa', 'za', 'bad', 'pur', 'abad', 'ganj', 'kot', 'nagar', 'wala', 'pura']
+SUFFIXES = ['Road', 'Street', 'Bazaar', 'Chowk', 'Lane', 'Avenue', 'Block', 'Colony']
+
+
+def street_names(count, rng):
+    names = set()
+    while len(names) < count:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        names.add(f"{word} {rng.choice(SUFFIXES)}" if rng.random() < 0.8 else f"Street {rng.randint(1, 9999)}")
+    return sorted(names)
+
+
+def brute_force(totals, labels, prefix, limit):
+    """Every key starting with prefix, most used first (alphabetical on ties)"""
+    matches = [(-count, key) for key, count in totals.items() if key.startswith(prefix)]
+    return [{'value': labels[key], 'count': -count} for count, key in heapq.nsmallest(limit, matches)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--values', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--updates', type=int, default=1500)
+    parser.add_argument('--limit', type=int, default=8)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    names = street_names(args.values, rng)
+    rng.shuffle(names)
+    # Zipf-like use counts: the i-th most used street has about values / (i + 1) / 100 uses
+    uses = [name for rank, name in enumerate(names) for _ in range(max(1, args.values // (rank + 1) // 100))]
+    suggester = Suggester(None, compact_at=len(uses) + args.updates + 1)
+    started = time.perf_counter()
+    suggester.add('street', uses)
+    suggester.compact('street')
+    print(f"indexed {args.values:,} streets in {time.perf_counter() - started:.2f}s, "
+          f"{suggester.stats()['fields']['street']['bytes'] / 2**20:.1f} MB of slots")
+
+    # Uses arriving between compactions, some in a different case
+    fresh = [rng.choice(names) for _ in range(args.updates // 2)] + \
+        [rng.choice(names).upper() for _ in range(args.updates // 4)] + \
+        [f"New Street {i}" for i in range(args.updates - args.updates // 2 - args.updates // 4)]
+    suggester.add('street', fresh)
+    totals, spellings = {}, {}
+    for name in uses + fresh:
+        key = normalize(name)
+        totals[key] = totals.get(key, 0) + 1
+        spellings.setdefault(key, {})
+        spellings[key][name] = spellings[key].get(name, 0) + 1
+    labels = {key: max(by_spelling, key=by_spelling.get) for key, by_spelling in spellings.items()}
+    print(f"overlay holds {suggester.stats()['fields']['street']['overlay']:,} changed streets")
+
+    prefixes = []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        prefixes.append(name[:rng.randint(1, 4)].lower())
+
+    suggest_times, scan_times = [], []
+    wrong = 0
+    for prefix in prefixes:
+        start = time.perf_counter()
+        result = suggester.suggest('street', prefix, args.limit)
+        suggest_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        expected = brute_force(totals, labels, prefix, args.limit)
+        scan_times.append(time.perf_counter() - start)
+        wrong += result != expected
+
+    def ms(samples, p):
+        return sorted(samples)[min(len(samples) - 1, int(len(samples) * p))] * 1000
+
+    print(f"suggest       p50 {ms(suggest_times, 0.5):8.3f} ms  p99 {ms(suggest_times, 0.99):8.3f} ms")
+    print(f"full scan     p50 {ms(scan_times, 0.5):8.3f} ms  p99 {ms(scan_times, 0.99):8.3f} ms")
+    if wrong:
+        print(f"❌ {wrong} of {args.queries} suggestions differ from the full scan")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the shelter work queue: concurrent claims on one pending backlog
+Run: python benchmarks/bench_work_queue.py [--reports N] [--shelters N] [--limit N]
+
+Needs a MySQL/MariaDB server (BENCH_DB_HOST, BENCH_DB_USER, BENCH_DB_PASSWORD).
+Creates a scratch database petnest_queue_bench with --reports pending
+reports of mixed urgency, prints the EXPLAIN of the claim query, then lets
+--shelters shelters claim at the same moment until the backlog is empty.
+Reports claims per second and how many claims came back empty while work
+was left. Exits non-zero if the claim plan sorts (filesort), a report is
+claimed twice, or the most urgent reports were not claimed first.
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+import mysql.connector
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from work_queue import ReportWorkQueue
+
+SCHEMA = [
+    """CREATE TABLE animal_reports (
+        report_id INT PRIMARY KEY AUTO_INCREMENT,
+        reporter_id INT NOT NULL,
+        animal_type VARCHAR(20) NOT NULL,
+        breed VARCHAR(50),
+        animal_condition VARCHAR(20) NOT NULL,
+        latitude DECIMAL(10, 8),
+        longitude DECIMAL(11, 8),
+        city VARCHAR(50),
+        street VARCHAR(100),
+        region VARCHAR(50),
+        description TEXT,
+        urgency_level ENUM('low', 'medium', 'high') DEFAULT 'medium',
+        status ENUM('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed') DEFAULT 'pending',
+        assigned_to INT,
+        lease_expires_at TIMESTAMP NULL,
+        status_changed_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP,
+        last_status_seconds INT NULL,
+        reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        completed_at TIMESTAMP NULL,
+        INDEX idx_reports_queue (status, urgency_level, reported_at),
+        INDEX idx_reports_lease (status, lease_expires_at)
+    )""",
+    """CREATE TABLE report_status_events (
+        event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        report_id INT NOT NULL,
+        from_status VARCHAR(20),
+        to_status VARCHAR(20) NOT NULL,
+        shelter_id INT,
+        city VARCHAR(50),
+        seconds_in_status INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+    """CREATE TABLE outbox_events (
+        event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+        aggregate_type VARCHAR(30) NOT NULL,
+        aggregate_id BIGINT NOT NULL,
+        event_type VARCHAR(50) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )""",
+]
+
+
+def connect(database='petnest_queue_bench'):
+    return mysql.connector.connect(
+        host=os.getenv('BENCH_DB_HOST', 'localhost'),
+        user=os.getenv('BENCH_DB_USER', 'root'),
+        password=os.getenv('BENCH_DB_PASSWORD', ''),
+        database=database,
+        autocommit=False
+    )
+
+
+def reset(reports):
+    connection = connect(None)
+    cursor = connection.cursor()
+    cursor.execute("DROP DATABASE IF EXISTS petnest_queue_bench")
+    cursor.execute("CREATE DATABASE petnest_queue_bench")
+    cursor.execute("USE petnest_queue_bench")
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    rng = random.Random(7)
+    rows = [(1, 'dog', 'injured', rng.choice(['low', 'medium', 'medium', 'high']), 'Lahore',
+             "2026-01-01 00:00:00" if i % 2 else "2026-01-02 00:00:00") for i in range(reports)]
+    for start in range(0, len(rows), 5000):
+        cursor.executemany("""
+            INSERT INTO animal_reports (reporter_id, animal_type, animal_condition, urgency_level, city, reported_at)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, rows[start:start + 5000])
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+
+def explain():
+    """EXPLAIN of the first (high urgency) claim query; returns True if it needs a filesort"""
+    connection = connect()
+    cursor = connection.cursor(dictionary=True)
+    cursor.execute("""
+        EXPLAIN SELECT report_id FROM animal_reports
+        WHERE status = 'pending' AND urgency_level = 'high'
+        ORDER BY reported_at LIMIT 5 FOR UPDATE SKIP LOCKED
+    """)
+    plan = cursor.fetchall()
+    cursor.close()
+    connection.close()
+    for row in plan:
+        print(f"EXPLAIN  key={row.get('key')} type={row.get('type')} rows={row.get('rows')} extra={row.get('Extra')}")
+    return any('filesort' in (row.get('Extra') or '') for row in plan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reports', type=int, default=20000)
+    parser.add_argument('--shelters', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=5)
+    args = parser.parse_args()
+
+    reset(args.reports)
+    filesort = explain()
+    queue = ReportWorkQueue(connect)
+    claimed = {}
+    empty = [0]
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def shelter(shelter_id):
+        start_gate.wait()
+        while True:
+            reports = queue.claim(shelter_id, limit=args.limit)
+            with lock:
+                if not reports:
+                    if len(claimed) >= args.reports:
+                        return
+                    empty[0] += 1
+                    continue
+                for report in reports:
+                    claimed.setdefault(report['report_id'], []).append((shelter_id, report['urgency_level']))
+
+    threads = [threading.Thread(target=shelter, args=(shelter_id,)) for shelter_id in range(1, args.shelters + 1)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    stats = queue.stats()
+    print(f"claims         {args.reports:,} reports by {args.shelters} shelters in {seconds:.1f}s, "
+          f"{args.reports / seconds:,.0f} reports/s, {empty[0]} empty claims while work was left")
+
+    connection = connect()
+    cursor = connection.cursor()
+    # High reports go first; only claims already running when the last ones were taken may have picked low ones
+    cursor.execute("""
+        SELECT (SELECT MAX(event_id) FROM report_status_events e JOIN animal_reports r USING (report_id)
+                WHERE r.urgency_level = 'high'),
+               (SELECT MIN(event_id) FROM report_status_events e JOIN animal_reports r USING (report_id)
+                WHERE r.urgency_level = 'low')
+    """)
+    last_high, first_low = cursor.fetchone()
+    cursor.execute("DROP DATABASE petnest_queue_bench")
+    cursor.close()
+    connection.close()
+
+    problems = []
+    if filesort:
+        problems.append('the claim query sorts with a filesort')
+    doubled = sum(1 for holders in claimed.values() if len(holders) > 1)
+    if doubled or len(claimed) != args.reports:
+        problems.append(f"{doubled} reports claimed twice, {args.reports - len(claimed)} never claimed")
+    if last_high and first_low and last_high > first_low + args.shelters * args.limit:
+        problems.append('low urgency reports were claimed before high urgency ones')
+    if problems:
+        print(f"❌ {'; '.join(problems)} ({stats})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Product catalog read model for PetNest Network
+Every active product is held in memory with a member set per view (all
+products, each category, each store). Sorted pages of a view are built on
+first use and kept until a change touches them: a product moving between
+categories/stores or being (de)activated drops every sort of the views it
+left or joined, a price change drops only the price sorts, and a stock-only
+change (checkout) drops nothing. Browse requests never touch MySQL; changes
+arrive from products.updated_at polling and from reload() after local writes.
+"""
+
+import bisect
+import datetime
+import threading
+import time
+
+CATEGORIES = ('food', 'toy', 'medicine', 'accessory', 'bedding', 'grooming')
+
+COLUMNS = """product_id, store_id, product_name, category, description, price, stock_quantity,
+             animal_type, brand, images, rating, review_count, is_active, created_at, updated_at"""
+
+# sort -> (row -> sort key, columns whose change reorders it)
+SORTS = {
+    'newest': (lambda p: (-p['_created'], -p['product_id']), ('created_at',)),
+    'price_asc': (lambda p: (p['price'], p['product_id']), ('price',)),
+    'price_desc': (lambda p: (-p['price'], p['product_id']), ('price',)),
+    'rating': (lambda p: (-p['rating'], -p['review_count'], p['product_id']), ('rating', 'review_count')),
+}
+
+
+def _views_for(product):
+    if product is None:
+        return set()
+    return {('all', None), ('category', product['category']), ('store', product['store_id'])}
+
+
+def _row(row):
+    """DB row -> cached product (floats for prices, epoch for ordering)"""
+    product = dict(row)
+    product['price'] = float(product['price'])
+    product['rating'] = float(product['rating'] or 0)
+    product['review_count'] = product['review_count'] or 0
+    product['stock_quantity'] = product['stock_quantity'] or 0
+    product['_created'] = product['created_at'].timestamp() if product['created_at'] else 0
+    return product
+
+
+def public(product):
+    """Cached product as returned by the API"""
+    return {
+        'product_id': product['product_id'],
+        'store_id': product['store_id'],
+        'product_name': product['product_name'],
+        'category': product['category'],
+        'description': product['description'],
+        'price': product['price'],
+        'stock_quantity': product['stock_quantity'],
+        'in_stock': product['stock_quantity'] > 0,
+        'animal_type': product['animal_type'],
+        'brand': product['brand'],
+        'images': [url.strip() for url in product['images'].split(',') if url.strip()] if product['images'] else [],
+        'rating': product['rating'],
+        'review_count': product['review_count'],
+        'created_at': product['created_at'].isoformat() if product['created_at'] else None
+    }
+
+
+class CatalogIndex:
+    """Per-worker catalog; browse() is served from memory once `ready`"""
+
+    def __init__(self, get_connection, refresh_interval=5):
+        self._get_connection = get_connection
+        self.refresh_interval = refresh_interval
+        self._products = {}
+        self._members = {}
+        self._pages = {}  # (view, sort) -> (product ids, leading sort key of each)
+        self._lock = threading.RLock()
+        self._changed_since = None
+        self.ready = False
+        self._metrics = {'hits': 0, 'rebuilds': 0, 'rebuild_ms_total': 0.0, 'rebuild_ms_last': 0.0,
+                         'invalidations': 0, 'products_applied': 0, 'refreshes': 0, 'errors': 0}
+
+    # ----- loading -----
+    def load(self):
+        """Full load, then switch to incremental refreshes"""
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT CURRENT_TIMESTAMP AS now")
+            started_at = cursor.fetchone()['now']
+            cursor.execute(f"SELECT {COLUMNS} FROM products WHERE is_active = TRUE")
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        with self._lock:
+            self._products = {}
+            self._members = {}
+            self._pages = {}
+            self.apply(rows)
+        self._changed_since = started_at - datetime.timedelta(seconds=5)
+        self.ready = True
+        return len(rows)
+
+    def refresh(self):
+        """Apply products changed since the last pass (updated_at covers inserts, edits and stock)"""
+        if not self.ready:
+            return 0
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("SELECT CURRENT_TIMESTAMP AS now")
+            started_at = cursor.fetchone()['now']
+            cursor.execute(f"SELECT {COLUMNS} FROM products WHERE updated_at >= %s", (self._changed_since,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        applied = self.apply(rows)
+        # Overlap a little so a change committed during this pass is seen next time
+        self._changed_since = started_at - datetime.timedelta(seconds=5)
+        self._metrics['refreshes'] += 1
+        return applied
+
+    def reload(self, product_ids):
+        """Re-read specific products right after this worker changed them"""
+        if not self.ready or not product_ids:
+            return 0
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor(dictionary=True)
+        try:
+            ids = list(product_ids)
+            cursor.execute(f"SELECT {COLUMNS} FROM products WHERE product_id IN ({', '.join(['%s'] * len(ids))})", ids)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        found = {row['product_id'] for row in rows}
+        # Deleted products disappear from the catalog too
+        return self.apply(rows, deleted=[pid for pid in ids if pid not in found])
+
+    def apply(self, rows, deleted=()):
+        """Fold changed product rows in, dropping only the sorted pages they affect"""
+        with self._lock:
+            for row in rows:
+                new = _row(row) if row['is_active'] else None
+                self._replace(row['product_id'], new)
+            for product_id in deleted:
+                self._replace(product_id, None)
+        self._metrics['products_applied'] += len(rows) + len(deleted)
+        return len(rows) + len(deleted)
+
+    def _replace(self, product_id, new):
+        old = self._products.get(product_id)
+        if old is None and new is None:
+            return
+        old_views = _views_for(old)
+        new_views = _views_for(new)
+        for view in old_views - new_views:
+            self._members[view].discard(product_id)
+            self._invalidate(view, SORTS)
+        for view in new_views - old_views:
+            self._members.setdefault(view, set()).add(product_id)
+            self._invalidate(view, SORTS)
+        changed = {column for column in ('created_at', 'price', 'rating', 'review_count')
+                   if old and new and old[column] != new[column]}
+        if changed:
+            sorts = [sort for sort, (_, columns) in SORTS.items() if changed.intersection(columns)]
+            for view in old_views & new_views:
+                self._invalidate(view, sorts)
+        if new is None:
+            self._products.pop(product_id, None)
+        else:
+            self._products[product_id] = new
+
+    def _invalidate(self, view, sorts):
+        for sort in sorts:
+            if self._pages.pop((view, sort), None) is not None:
+                self._metrics['invalidations'] += 1
+
+    def load_in_background(self):
+        def run():
+            try:
+                count = self.load()
+                print(f"✅ Catalog loaded: {count} products")
+            except Exception as e:
+                print(f"⚠️ Catalog load failed: {e}")
+        threading.Thread(target=run, name='catalog-load', daemon=True).start()
+
+    def start(self):
+        """Background loop applying product changes every refresh_interval seconds"""
+        def loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                try:
+                    if not self.ready:
+                        self.load()
+                    else:
+                        self.refresh()
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    print(f"⚠️ Catalog refresh failed: {e}")
+        threading.Thread(target=loop, name='catalog-refresh', daemon=True).start()
+
+    # ----- reads -----
+    def _page(self, view, sort):
+        """Sorted ids of a view, rebuilt only if a change dropped it"""
+        page = self._pages.get((view, sort))
+        if page is not None:
+            self._metrics['hits'] += 1
+            return page
+        started = time.perf_counter()
+        key_of = SORTS[sort][0]
+        products = sorted((self._products[pid] for pid in self._members.get(view, ())), key=key_of)
+        page = ([p['product_id'] for p in products], [key_of(p)[0] for p in products])
+        self._pages[(view, sort)] = page
+        elapsed = (time.perf_counter() - started) * 1000
+        self._metrics['rebuilds'] += 1
+        self._metrics['rebuild_ms_total'] += elapsed
+        self._metrics['rebuild_ms_last'] = round(elapsed, 3)
+        return page
+
+    def browse(self, category=None, store_id=None, sort='newest', min_price=None, max_price=None,
+               in_stock=False, animal_type=None, page=1, limit=24):
+        """One page of products; returns (products, total matching)"""
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        if store_id is not None:
+            view = ('store', store_id)
+        elif category:
+            view = ('category', category)
+        else:
+            view = ('all', None)
+        with self._lock:
+            ids, keys = self._page(view, sort)
+            # Price sorts lead with the (negated for desc) price, so a price range is a slice
+            if sort in ('price_asc', 'price_desc') and (min_price is not None or max_price is not None):
+                low, high = (min_price, max_price) if sort == 'price_asc' else (
+                    -max_price if max_price is not None else None, -min_price if min_price is not None else None)
+                lo = bisect.bisect_left(keys, low) if low is not None else 0
+                hi = bisect.bisect_right(keys, high) if high is not None else len(keys)
+                ids = ids[lo:hi]
+            elif min_price is not None or max_price is not None:
+                ids = [pid for pid in ids
+                       if (min_price is None or self._products[pid]['price'] >= min_price)
+                       and (max_price is None or self._products[pid]['price'] <= max_price)]
+            if (store_id is not None and category) or in_stock or animal_type:
+                ids = [pid for pid in ids if self._matches(self._products[pid], category if store_id is not None else None,
+                                                           in_stock, animal_type)]
+            start = (page - 1) * limit
+            return [public(self._products[pid]) for pid in ids[start:start + limit]], len(ids)
+
+    @staticmethod
+    def _matches(product, category, in_stock, animal_type):
+        if category and product['category'] != category:
+            return False
+        if in_stock and product['stock_quantity'] <= 0:
+            return False
+        if animal_type and (product['animal_type'] or '').lower() != animal_type.lower():
+            return False
+        return True
+
+    def get(self, product_id):
+        with self._lock:
+            product = self._products.get(product_id)
+            return public(product) if product else None
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['rebuild_ms_total'] = round(stats['rebuild_ms_total'], 3)
+        stats['ready'] = self.ready
+        stats['products'] = len(self._products)
+        stats['cached_pages'] = len(self._pages)
+        return stats
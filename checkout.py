@@ -0,0 +1,168 @@
+"""
+Order checkout for PetNest Network
+Stock is reserved with one conditional UPDATE per product
+(stock_quantity = stock_quantity - n WHERE stock_quantity >= n), so two
+buyers can never both take the last unit and no row is read and written
+back. Products are locked in product_id order, the cart is split into one
+order per store, and orders plus all their items (and the sales_daily
+rollup rows) are written in the same transaction. Deadlocks and lock wait timeouts are retried with jittered
+exponential backoff.
+"""
+
+import random
+import threading
+import time
+
+from sales import record_order_sales
+
+DEADLOCK = 1213
+LOCK_WAIT_TIMEOUT = 1205
+RETRYABLE_ERRORS = (DEADLOCK, LOCK_WAIT_TIMEOUT)
+
+MAX_ITEMS = 50
+MAX_QUANTITY = 100
+
+
+class CheckoutError(Exception):
+    """A product in the cart is inactive or does not have enough stock"""
+
+    def __init__(self, message, product_id=None):
+        super().__init__(message)
+        self.product_id = product_id
+
+
+def normalize_items(items):
+    """{product_id: quantity} from [{'product_id', 'quantity'}], merging repeats; ValueError if malformed"""
+    if not isinstance(items, list) or not items:
+        raise ValueError('Cart is empty')
+    cart = {}
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item.get('quantity', 1))
+        except (TypeError, KeyError, ValueError, AttributeError):
+            raise ValueError('Each item needs a product_id and a quantity')
+        if quantity < 1:
+            raise ValueError('Quantity must be at least 1')
+        cart[product_id] = cart.get(product_id, 0) + quantity
+    if len(cart) > MAX_ITEMS:
+        raise ValueError(f'At most {MAX_ITEMS} different products per order')
+    if max(cart.values()) > MAX_QUANTITY:
+        raise ValueError(f'At most {MAX_QUANTITY} of one product per order')
+    return cart
+
+
+class Checkout:
+    """Places orders; safe to share between request threads"""
+
+    def __init__(self, get_connection, max_attempts=5, base_delay=0.01, max_delay=0.5):
+        self._get_connection = get_connection
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self._metrics = {'orders': 0, 'checkouts': 0, 'out_of_stock': 0, 'retries': 0, 'gave_up': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._metrics[name] += amount
+
+    def place_order(self, customer_id, items, shipping_address=None, payment_method=None):
+        """Reserve stock and create the orders for a cart
+
+        Returns a list of orders (one per store), each with its items.
+        Raises ValueError for a malformed cart and CheckoutError if it cannot
+        be fulfilled; nothing is reserved in either case.
+        """
+        cart = normalize_items(items)
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                orders = self._attempt(customer_id, cart, shipping_address, payment_method)
+            except CheckoutError:
+                self._count('out_of_stock')
+                raise
+            except Exception as e:
+                if getattr(e, 'errno', None) not in RETRYABLE_ERRORS:
+                    raise
+                if attempt >= self.max_attempts:
+                    self._count('gave_up')
+                    raise
+                self._count('retries')
+                # Full jitter: spread retries so the same buyers do not collide again
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                continue
+            self._count('checkouts')
+            self._count('orders', len(orders))
+            return orders
+
+    def _attempt(self, customer_id, cart, shipping_address, payment_method):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor(dictionary=True)
+        try:
+            connection.start_transaction()
+            product_ids = sorted(cart)
+
+            # 1. Reserve: one conditional decrement per product, always in the same order
+            for product_id in product_ids:
+                cursor.execute("""
+                    UPDATE products
+                    SET stock_quantity = stock_quantity - %s
+                    WHERE product_id = %s AND is_active = TRUE AND stock_quantity >= %s
+                """, (cart[product_id], product_id, cart[product_id]))
+                if cursor.rowcount != 1:
+                    raise CheckoutError('Product unavailable or not enough stock', product_id)
+
+            # 2. Prices and stores of the rows this transaction now holds locks on
+            cursor.execute(f"""
+                SELECT product_id, store_id, product_name, price
+                FROM products WHERE product_id IN ({', '.join(['%s'] * len(product_ids))})
+            """, product_ids)
+            products = {row['product_id']: row for row in cursor.fetchall()}
+
+            by_store = {}
+            for product_id in product_ids:
+                by_store.setdefault(products[product_id]['store_id'], []).append(product_id)
+
+            # 3. One order per store, then every item in a single multi-row INSERT
+            orders = []
+            item_values = []
+            for store_id, store_products in by_store.items():
+                total = sum(products[pid]['price'] * cart[pid] for pid in store_products)
+                cursor.execute("""
+                    INSERT INTO orders (customer_id, store_id, total_amount, shipping_address, payment_method)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (customer_id, store_id, total, shipping_address, payment_method))
+                order_id = cursor.lastrowid
+                items = []
+                for pid in store_products:
+                    item_values.extend([order_id, pid, cart[pid], products[pid]['price']])
+                    items.append({
+                        'product_id': pid,
+                        'product_name': products[pid]['product_name'],
+                        'quantity': cart[pid],
+                        'unit_price': float(products[pid]['price'])
+                    })
+                orders.append({'order_id': order_id, 'store_id': store_id, 'total_amount': float(total),
+                               'status': 'pending', 'items': items})
+            cursor.execute(f"""
+                INSERT INTO order_items (order_id, product_id, quantity, unit_price)
+                VALUES {', '.join(['(%s, %s, %s, %s)'] * (len(item_values) // 4))}
+            """, item_values)
+            record_order_sales(cursor, orders)
+
+            connection.commit()
+            return orders
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._metrics)
@@ -10,9 +10,8 @@ class Config:
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{basedir}/instance/petnest.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    # Session
-    SESSION_TYPE = 'filesystem'
-    SESSION_PERMANENT = False
+    # Session store backend: 'mysql' (shared across workers) or 'memory'
+    SESSION_BACKEND = 'mysql'
     
     # CORS
     CORS_ORIGINS = ['http://localhost:8000', 'http://127.0.0.1:8000']
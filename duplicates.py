@@ -0,0 +1,208 @@
+"""
+Duplicate animal report detection for PetNest Network
+Each report photo gets a 64-bit difference hash (dHash), which changes by
+only a few bits when the same picture is resized, recompressed or
+screenshotted. Hashes are split into 4 bands of 16 bits and stored once per
+band in report_photo_hashes, keyed by area (geohash cell and city/region),
+band and day. Two hashes within MAX_DISTANCE = 7 bits must agree on some
+band to within one bit (pigeonhole), so a new photo only probes its 4 bands
+plus their one-bit neighbours, in the nearby areas and the last WINDOW_DAYS
+days: a handful of primary-key ranges, never a scan of all reports.
+Candidates are confirmed with the exact Hamming distance and linked in
+report_duplicates.
+"""
+
+import datetime
+import io
+import zlib
+
+from heatmap import geohash_int
+
+try:
+    from PIL import Image
+except ImportError:  # Without Pillow photos get no hash and duplicate checks are skipped
+    Image = None
+
+BANDS = 4
+BAND_BITS = 16
+BAND_MASK = (1 << BAND_BITS) - 1
+MAX_DISTANCE = 7
+PROBE_RADIUS = MAX_DISTANCE // BANDS  # bits flipped per band when probing
+
+WINDOW_DAYS = 3
+AREA_PRECISION = 5  # geohash cells of ~4.9 x 4.9 km
+CITY_AREA = 1 << 32  # city/region area keys live above every geohash cell number
+EPOCH = datetime.date(1970, 1, 1)
+
+# Cell size at AREA_PRECISION: 13 longitude bits, 12 latitude bits
+_CELL_LON = 360.0 / (1 << 13)
+_CELL_LAT = 180.0 / (1 << 12)
+
+
+# ========== HASHING ==========
+def perceptual_hash(data):
+    """64-bit dHash of image bytes (9x8 grayscale, left < right per pixel); None if unavailable"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            pixels = list(img.convert('L').resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        print(f"⚠️ Perceptual hash failed: {e}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            value = (value << 1) | (1 if left < pixels[row * 9 + col + 1] else 0)
+    return value
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def band_keys(phash):
+    """The band_key of each band: band number in the high bits, 16 hash bits below"""
+    return [(band << BAND_BITS) | ((phash >> (band * BAND_BITS)) & BAND_MASK) for band in range(BANDS)]
+
+
+def probe_keys(phash):
+    """band_keys of the hash and of every variant within PROBE_RADIUS bits per band"""
+    keys = []
+    for key in band_keys(phash):
+        keys.append(key)
+        if PROBE_RADIUS >= 1:
+            keys.extend(key ^ (1 << bit) for bit in range(BAND_BITS))
+    return keys
+
+
+# ========== BUCKETS ==========
+def city_area(city, region):
+    if not city:
+        return None
+    text = f"{city.strip().lower()}|{(region or '').strip().lower()}"
+    return CITY_AREA + zlib.crc32(text.encode('utf-8'))
+
+
+def area_keys(latitude, longitude, city, region, neighbours=False):
+    """Area keys of a report: its geohash cell (and the 8 around it when probing) plus city/region"""
+    keys = []
+    if latitude is not None and longitude is not None:
+        offsets = (-1, 0, 1) if neighbours else (0,)
+        for dy in offsets:
+            for dx in offsets:
+                lat = min(max(latitude + dy * _CELL_LAT, -90.0), 90.0)
+                lon = (longitude + dx * _CELL_LON + 180.0) % 360.0 - 180.0
+                keys.append(geohash_int(lat, lon, AREA_PRECISION))
+    area = city_area(city, region)
+    if area is not None:
+        keys.append(area)
+    return sorted(set(keys))
+
+
+def day_number(moment=None):
+    return ((moment or datetime.datetime.now()).date() - EPOCH).days
+
+
+# ========== DATABASE ==========
+def find_duplicates(cursor, report_id, animal_type, areas, day, photos):
+    """Earlier reports with a photo within MAX_DISTANCE bits, as [{report_id, distance, ...}]
+
+    areas: area_keys(..., neighbours=True); photos: dicts with 'phash'.
+    Matches must be the same animal type and still open.
+    """
+    hashes = [(position, photo['phash']) for position, photo in enumerate(photos) if photo.get('phash') is not None]
+    if not hashes or not areas:
+        return []
+    probes = sorted({key for _, phash in hashes for key in probe_keys(phash)})
+    cursor.execute(f"""
+        SELECT h.report_id, h.position, h.phash
+        FROM report_photo_hashes h
+        JOIN animal_reports r ON r.report_id = h.report_id
+        WHERE h.area_key IN ({', '.join(['%s'] * len(areas))})
+          AND h.band_key IN ({', '.join(['%s'] * len(probes))})
+          AND h.day BETWEEN %s AND %s
+          AND h.report_id != %s
+          AND r.animal_type = %s
+          AND r.status NOT IN ('completed', 'closed')
+    """, list(areas) + probes + [day - WINDOW_DAYS, day, report_id, animal_type])
+    best = {}
+    for other_id, other_position, other_hash in cursor.fetchall():
+        for position, phash in hashes:
+            distance = hamming(phash, int(other_hash))
+            if distance <= MAX_DISTANCE and (other_id not in best or distance < best[other_id]['distance']):
+                best[other_id] = {'report_id': other_id, 'distance': distance,
+                                  'photo_position': position, 'matched_position': other_position}
+    return sorted(best.values(), key=lambda match: (match['distance'], match['report_id']))
+
+
+def index_photos(cursor, report_id, areas, day, photos):
+    """Store one row per (area, band) for each hashed photo of a new report"""
+    rows = []
+    for position, photo in enumerate(photos):
+        if photo.get('phash') is None:
+            continue
+        for area in areas:
+            for key in band_keys(photo['phash']):
+                rows.append((area, key, day, report_id, position, photo['phash']))
+    if not rows:
+        return 0
+    cursor.execute(f"""
+        INSERT IGNORE INTO report_photo_hashes (area_key, band_key, day, report_id, position, phash)
+        VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))}
+    """, [value for row in rows for value in row])
+    return len(rows)
+
+
+def link_duplicates(cursor, report_id, matches):
+    """Record the matches and point the report at the oldest original among them"""
+    if not matches:
+        return None
+    cursor.execute(f"""
+        INSERT IGNORE INTO report_duplicates (report_id, duplicate_of, distance)
+        VALUES {', '.join(['(%s, %s, %s)'] * len(matches))}
+    """, [value for match in matches for value in (report_id, match['report_id'], match['distance'])])
+    ids = [match['report_id'] for match in matches]
+    # A match that is itself a duplicate leads back to its original
+    cursor.execute(f"""
+        SELECT MIN(COALESCE(duplicate_of, report_id)) FROM animal_reports
+        WHERE report_id IN ({', '.join(['%s'] * len(ids))})
+    """, ids)
+    original = cursor.fetchone()[0]
+    cursor.execute("UPDATE animal_reports SET duplicate_of = %s WHERE report_id = %s", (original, report_id))
+    return original
+
+
+def check_report(cursor, report_id, animal_type, latitude, longitude, city, region, photos, day=None):
+    """Find, link and index in the create transaction; returns (matches, original report id or None)"""
+    day = day_number() if day is None else day
+    matches = find_duplicates(cursor, report_id, animal_type,
+                              area_keys(latitude, longitude, city, region, neighbours=True), day, photos)
+    original = link_duplicates(cursor, report_id, matches)
+    index_photos(cursor, report_id, area_keys(latitude, longitude, city, region), day, photos)
+    return matches, original
+
+
+def prune(get_connection, keep_days=30, batch_size=10000):
+    """Delete hash rows older than keep_days in bounded batches; returns rows deleted
+
+    Only the last WINDOW_DAYS are ever probed, so older rows are dead weight.
+    """
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    deleted = 0
+    try:
+        cutoff = day_number() - max(keep_days, WINDOW_DAYS)
+        while True:
+            cursor.execute("DELETE FROM report_photo_hashes WHERE day < %s LIMIT %s", (cutoff, batch_size))
+            connection.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+        return deleted
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,164 @@
+"""
+Favorites for PetNest Network
+Each user's favorite pet ids are cached per worker as a sorted array('I')
+(4 bytes per favorite), so a listing page annotates 50 pets with bisect and
+no query. Bulk add/remove run in one transaction that serializes on the
+user's row, changes only the pairs that actually flip and moves
+pets.favorite_count by exactly that much, so counts never need COUNT(*).
+"""
+
+import bisect
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+MAX_BULK = 200
+
+
+def _contains(ids, pet_id):
+    index = bisect.bisect_left(ids, pet_id)
+    return index < len(ids) and ids[index] == pet_id
+
+
+class FavoritesStore:
+    """Favorite writes plus an LRU of per-user sorted id arrays"""
+
+    def __init__(self, get_connection, capacity=20000, ttl=120):
+        self._get_connection = get_connection
+        self.capacity = capacity
+        self.ttl = ttl  # bounds staleness from other workers' writes
+        self._sets = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'loads': 0, 'added': 0, 'removed': 0}
+
+    # ----- cache -----
+    def _cached(self, user_id):
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if not entry or entry[1] + self.ttl <= time.monotonic():
+                self._sets.pop(user_id, None)
+                return None
+            self._sets.move_to_end(user_id)
+            self._metrics['hits'] += 1
+            return entry[0]
+
+    def _store(self, user_id, ids):
+        with self._lock:
+            self._sets[user_id] = (ids, time.monotonic())
+            self._sets.move_to_end(user_id)
+            while len(self._sets) > self.capacity:
+                self._sets.popitem(last=False)
+
+    def ids(self, user_id):
+        """Sorted array of the user's favorite pet ids"""
+        ids = self._cached(user_id)
+        if ids is not None:
+            return ids
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        try:
+            # Covered by unique_favorite (user_id, pet_id), already in order
+            cursor.execute("SELECT pet_id FROM favorites WHERE user_id = %s ORDER BY pet_id", (user_id,))
+            ids = array('I', (row[0] for row in cursor.fetchall()))
+        finally:
+            cursor.close()
+            connection.close()
+        self._metrics['loads'] += 1
+        self._store(user_id, ids)
+        return ids
+
+    def annotate(self, user_id, pets):
+        """Set is_favorited on each pet dict (False for anonymous users)"""
+        ids = self.ids(user_id) if user_id else array('I')
+        for pet in pets:
+            pet['is_favorited'] = _contains(ids, pet['pet_id'])
+        return pets
+
+    # ----- writes -----
+    def add(self, user_id, pet_ids):
+        """Favorite many pets; returns the ids newly added (unknown and already favorited are skipped)"""
+        return self._change(user_id, pet_ids, adding=True)
+
+    def remove(self, user_id, pet_ids):
+        """Unfavorite many pets; returns the ids actually removed"""
+        return self._change(user_id, pet_ids, adding=False)
+
+    def _change(self, user_id, pet_ids, adding):
+        wanted = sorted(set(pet_ids))
+        if not wanted:
+            return []
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction()
+            # One writer per user at a time, so the existing set read below cannot go stale
+            cursor.execute("SELECT user_id FROM users WHERE user_id = %s FOR UPDATE", (user_id,))
+            placeholders = ', '.join(['%s'] * len(wanted))
+            cursor.execute(f"""
+                SELECT pet_id FROM favorites
+                WHERE user_id = %s AND pet_id IN ({placeholders})
+                FOR UPDATE
+            """, [user_id] + wanted)
+            existing = {row[0] for row in cursor.fetchall()}
+
+            if adding:
+                candidates = [pet_id for pet_id in wanted if pet_id not in existing]
+                if candidates:
+                    cursor.execute(f"SELECT pet_id FROM pets WHERE pet_id IN ({', '.join(['%s'] * len(candidates))})",
+                                   candidates)
+                    changed = sorted(row[0] for row in cursor.fetchall())
+                else:
+                    changed = []
+                if changed:
+                    cursor.execute(f"""
+                        INSERT INTO favorites (user_id, pet_id)
+                        VALUES {', '.join(['(%s, %s)'] * len(changed))}
+                    """, [value for pet_id in changed for value in (user_id, pet_id)])
+            else:
+                changed = sorted(existing)
+                if changed:
+                    cursor.execute(f"""
+                        DELETE FROM favorites
+                        WHERE user_id = %s AND pet_id IN ({', '.join(['%s'] * len(changed))})
+                    """, [user_id] + changed)
+
+            if changed:
+                cursor.execute(f"""
+                    UPDATE pets SET favorite_count = GREATEST(favorite_count + %s, 0)
+                    WHERE pet_id IN ({', '.join(['%s'] * len(changed))})
+                """, [1 if adding else -1] + changed)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+        self._metrics['added' if adding else 'removed'] += len(changed)
+        self._apply_local(user_id, changed, adding)
+        return changed
+
+    def _apply_local(self, user_id, changed, adding):
+        """Patch this worker's cached set instead of reloading it"""
+        if not changed:
+            return
+        with self._lock:
+            entry = self._sets.get(user_id)
+            if not entry:
+                return
+            current = set(entry[0])
+            current = current | set(changed) if adding else current - set(changed)
+            self._sets[user_id] = (array('I', sorted(current)), entry[1])
+
+    def stats(self):
+        stats = dict(self._metrics)
+        with self._lock:
+            stats['cached_users'] = len(self._sets)
+            stats['cached_ids'] = sum(len(entry[0]) for entry in self._sets.values())
+        return stats
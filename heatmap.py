@@ -0,0 +1,474 @@
+"""
+Report heatmap tiles for PetNest Network
+Counts of animal reports per geohash cell (precision 6, ~1.2 x 0.6 km),
+condition, status and report day. The counts live in report_geo_cells and
+are kept current from report_status_events (+1 on creation, -1/+1 on each
+status change), so nothing ever scans animal_reports except the NumPy
+rebuild. Each worker also holds the cells in memory and serves zoom-level
+tiles (coarser geohash prefixes) as JSON or packed binary.
+"""
+
+import datetime
+import struct
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+import watermarks
+
+BASE_PRECISION = 6
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+CONDITIONS = ('stray', 'sick', 'dead')
+STATUSES = ('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed')
+EPOCH = datetime.date(1970, 1, 1)
+
+# Binary tile: header (precision, cell count), then (cell, count) pairs, little endian
+TILE_HEADER = struct.Struct('<BI')
+TILE_CELL = np.dtype([('cell', '<u4'), ('count', '<u4')])
+
+
+# ========== GEOHASH ==========
+def zoom_to_precision(zoom):
+    """Web map zoom level -> geohash precision of the tile cells"""
+    for max_zoom, precision in ((2, 1), (4, 2), (7, 3), (10, 4), (13, 5)):
+        if zoom <= max_zoom:
+            return precision
+    return BASE_PRECISION
+
+
+def geohash_int(lat, lon, precision=BASE_PRECISION):
+    """Geohash as an integer of 5 * precision interleaved bits (lon first)"""
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    value = 0
+    for bit in range(5 * precision):
+        if bit % 2 == 0:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+    return value
+
+
+def geohash_ints(lats, lons, precision=BASE_PRECISION):
+    """Vectorised geohash_int over NumPy arrays"""
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lon_q = np.clip(((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    lat_q = np.clip(((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+    value = np.zeros(lats.shape, dtype=np.int64)
+    for bit in range(bits):
+        if bit % 2 == 0:
+            source, shift = lon_q, lon_bits - 1 - bit // 2
+        else:
+            source, shift = lat_q, lat_bits - 1 - bit // 2
+        value = (value << 1) | ((source >> shift) & 1)
+    return value
+
+
+def cell_centers(cells, precision=BASE_PRECISION):
+    """Centre (lat, lon) arrays of geohash integer cells"""
+    cells = np.asarray(cells, dtype=np.int64)
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    lon_q = np.zeros(cells.shape, dtype=np.int64)
+    lat_q = np.zeros(cells.shape, dtype=np.int64)
+    for bit in range(bits):
+        value = (cells >> (bits - 1 - bit)) & 1
+        if bit % 2 == 0:
+            lon_q = (lon_q << 1) | value
+        else:
+            lat_q = (lat_q << 1) | value
+    lats = (lat_q + 0.5) / (1 << lat_bits) * 180.0 - 90.0
+    lons = (lon_q + 0.5) / (1 << lon_bits) * 360.0 - 180.0
+    return lats, lons
+
+
+def geohash_str(cell, precision=BASE_PRECISION):
+    return ''.join(BASE32[(cell >> (5 * (precision - 1 - i))) & 31] for i in range(precision))
+
+
+def geohash_from_str(text):
+    value = 0
+    for char in text:
+        value = (value << 5) | BASE32.index(char)
+    return value
+
+
+def _day(value):
+    """Day number (days since 1970-01-01) of a date/datetime"""
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+# ========== EVENT FOLDING ==========
+# Status events joined to the report fields that place them on the map.
+# {condition} is a watermarks.Watermark condition on e.event_id. Every event
+# is read, with or without coordinates, so the watermark sees each id and
+# only ids that are really missing become gaps.
+EVENTS_QUERY = """
+    SELECT e.event_id, e.from_status, e.to_status, r.latitude, r.longitude,
+           r.animal_condition, DATE(r.reported_at)
+    FROM report_status_events e
+    LEFT JOIN animal_reports r ON r.report_id = e.report_id
+    WHERE {condition}
+    ORDER BY e.event_id
+    LIMIT %s
+"""
+
+
+def read_events(cursor, watermark, limit):
+    condition, params = watermark.condition('e.event_id')
+    cursor.execute(EVENTS_QUERY.format(condition=condition), params + [limit])
+    return cursor.fetchall()
+
+
+def fold_events(events):
+    """Count deltas {(cell, condition, status, day): delta} for a batch of joined events"""
+    deltas = defaultdict(int)
+    for _, from_status, to_status, lat, lon, condition, reported_day in events:
+        if lat is None or lon is None:
+            continue
+        cell = geohash_int(float(lat), float(lon))
+        day = _day(reported_day)
+        if from_status:
+            deltas[(cell, condition, from_status, day)] -= 1
+        deltas[(cell, condition, to_status, day)] += 1
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+class HeatmapIndex:
+    """report_geo_cells maintenance plus the per-worker in-memory tile source"""
+
+    WATERMARK = 'report_heatmap'
+
+    def __init__(self, get_connection, refresh_interval=5, batch_size=5000, tile_cache_size=256):
+        self._get_connection = get_connection
+        self.refresh_interval = refresh_interval
+        self.batch_size = batch_size
+        self.tile_cache_size = tile_cache_size
+        self._cells = {}  # (cell, condition, status, day) -> count
+        self._watermark = watermarks.Watermark()
+        self._arrays = None
+        self._tiles = {}
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.ready = False
+        self._metrics = {'events_applied': 0, 'events_persisted': 0, 'tile_hits': 0, 'tile_misses': 0, 'errors': 0}
+
+    # ----- in-memory tiles -----
+    def load(self):
+        """Snapshot report_geo_cells and its watermark in one consistent read"""
+        connection = self._get_connection()
+        if not connection:
+            return False
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction(consistent_snapshot=True, readonly=True)
+            watermark = watermarks.read(connection, self.WATERMARK, lock='') or watermarks.Watermark()
+            cursor.execute("""
+                SELECT geohash, animal_condition, status, day, report_count
+                FROM report_geo_cells WHERE report_count > 0
+            """)
+            cells = {}
+            for geohash, condition, status, day, count in cursor.fetchall():
+                cells[(geohash_from_str(geohash), condition, status, _day(day))] = count
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+        with self._lock:
+            self._cells = cells
+            self._watermark = watermark
+            self._arrays = None
+            self._tiles = {}
+            self.ready = True
+        self.refresh(force=True)
+        return True
+
+    def load_in_background(self):
+        def run():
+            try:
+                self.load()
+                print(f"✅ Heatmap loaded: {len(self._cells)} cells")
+            except Exception as e:
+                print(f"⚠️ Heatmap load failed: {e}")
+        threading.Thread(target=run, name='heatmap-load', daemon=True).start()
+
+    def refresh(self, force=False):
+        """Apply status events this worker's copy has not seen (at most every refresh_interval)"""
+        now = time.monotonic()
+        if not self.ready or (not force and now - self._last_refresh < self.refresh_interval):
+            return 0
+        self._last_refresh = now
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        applied = 0
+        try:
+            while True:
+                with self._lock:
+                    self._watermark.expire()
+                    watermark = watermarks.Watermark(self._watermark.last_id, self._watermark.gaps)
+                events = read_events(cursor, watermark, self.batch_size)
+                if not events:
+                    break
+                applied += self._apply(events)
+                if len(events) < self.batch_size:
+                    break
+        finally:
+            cursor.close()
+            connection.close()
+        self._metrics['events_applied'] += applied
+        return applied
+
+    def _apply(self, events):
+        """Fold the events this copy has not consumed yet (another request may have applied some)"""
+        with self._lock:
+            watermark = self._watermark
+            events = [event for event in events if event[0] > watermark.last_id or event[0] in watermark.gaps]
+            watermark.advance([event[0] for event in events])
+            deltas = fold_events(events)
+            for key, delta in deltas.items():
+                count = self._cells.get(key, 0) + delta
+                if count > 0:
+                    self._cells[key] = count
+                else:
+                    self._cells.pop(key, None)
+            if deltas:
+                self._arrays = None
+                self._tiles = {}
+            return len(events)
+
+    def _columns(self):
+        """Cells as NumPy columns, rebuilt only after the counts changed"""
+        with self._lock:
+            if self._arrays is None:
+                keys = list(self._cells.keys())
+                cells = np.fromiter((key[0] for key in keys), dtype=np.int64, count=len(keys))
+                lats, lons = cell_centers(cells)
+                self._arrays = {
+                    'cell': cells,
+                    'lat': lats,
+                    'lon': lons,
+                    'condition': np.fromiter((CONDITIONS.index(key[1]) for key in keys), dtype=np.int8, count=len(keys)),
+                    'status': np.fromiter((STATUSES.index(key[2]) for key in keys), dtype=np.int8, count=len(keys)),
+                    'day': np.fromiter((key[3] for key in keys), dtype=np.int32, count=len(keys)),
+                    'count': np.fromiter(self._cells.values(), dtype=np.int64, count=len(keys)),
+                }
+            return self._arrays
+
+    def tile(self, zoom, bbox=None, conditions=None, statuses=None, since=None, until=None):
+        """Aggregated (cell ints, counts, precision) for a zoom level and optional filters
+
+        bbox is (min_lon, min_lat, max_lon, max_lat); since/until are dates.
+        """
+        self.refresh()
+        precision = zoom_to_precision(zoom)
+        key = (precision, bbox, tuple(conditions or ()), tuple(statuses or ()), since, until)
+        cached = self._tiles.get(key)
+        if cached is not None:
+            self._metrics['tile_hits'] += 1
+            return cached
+        self._metrics['tile_misses'] += 1
+
+        columns = self._columns()
+        mask = np.ones(len(columns['cell']), dtype=bool)
+        if bbox:
+            min_lon, min_lat, max_lon, max_lat = bbox
+            mask &= (columns['lon'] >= min_lon) & (columns['lon'] <= max_lon)
+            mask &= (columns['lat'] >= min_lat) & (columns['lat'] <= max_lat)
+        if conditions:
+            mask &= np.isin(columns['condition'], [CONDITIONS.index(c) for c in conditions])
+        if statuses:
+            mask &= np.isin(columns['status'], [STATUSES.index(s) for s in statuses])
+        if since:
+            mask &= columns['day'] >= _day(since)
+        if until:
+            mask &= columns['day'] <= _day(until)
+
+        parents = columns['cell'][mask] >> (5 * (BASE_PRECISION - precision))
+        cells, inverse = np.unique(parents, return_inverse=True)
+        counts = np.bincount(inverse, weights=columns['count'][mask], minlength=len(cells)).astype(np.int64)
+        result = (cells, counts, precision)
+        if len(self._tiles) >= self.tile_cache_size:
+            self._tiles.clear()
+        self._tiles[key] = result
+        return result
+
+    @staticmethod
+    def tile_json(cells, counts, precision):
+        return {geohash_str(int(cell), precision): int(count) for cell, count in zip(cells, counts)}
+
+    @staticmethod
+    def tile_binary(cells, counts, precision):
+        packed = np.empty(len(cells), dtype=TILE_CELL)
+        packed['cell'] = cells
+        packed['count'] = counts
+        return TILE_HEADER.pack(precision, len(cells)) + packed.tobytes()
+
+    # ----- report_geo_cells maintenance -----
+    def persist_once(self):
+        """Fold one batch of events into report_geo_cells; rows and watermark commit together"""
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        try:
+            watermark = (watermarks.read(connection, self.WATERMARK)
+                         or watermarks.Watermark(0, (), *watermarks.step_of(connection)))
+            events = read_events(cursor, watermark, self.batch_size)
+            if not events:
+                connection.commit()  # keeps the gaps read() expired
+                return 0
+            deltas = fold_events(events)
+            if deltas:
+                rows = [(geohash_str(cell), condition, status, EPOCH + datetime.timedelta(days=day), delta)
+                        for (cell, condition, status, day), delta in deltas.items()]
+                cursor.execute(f"""
+                    INSERT INTO report_geo_cells (geohash, animal_condition, status, day, report_count)
+                    VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(rows))}
+                    ON DUPLICATE KEY UPDATE report_count = report_count + VALUES(report_count)
+                """, [value for row in rows for value in row])
+            opened, closed = watermark.advance([event[0] for event in events])
+            watermarks.save(connection, self.WATERMARK, watermark, opened, closed)
+            connection.commit()
+            self._metrics['events_persisted'] += len(events)
+            return len(events)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    def start(self, interval=10):
+        """Background persist_once loop (one worker per deployment is enough)"""
+        if self._thread and self._thread.is_alive():
+            return
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    while self.persist_once() == self.batch_size:
+                        pass
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    print(f"⚠️ Heatmap aggregator error: {e}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=loop, name='heatmap-aggregator', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats.update({
+            'ready': self.ready,
+            'cells': len(self._cells),
+            'last_event_id': self._watermark.last_id,
+            'open_gaps': len(self._watermark.gaps),
+            'cached_tiles': len(self._tiles),
+            'aggregator_running': bool(self._thread and self._thread.is_alive())
+        })
+        return stats
+
+
+# ========== REBUILD ==========
+def bin_reports(lats, lons, conditions, statuses, days):
+    """NumPy binning of report columns -> (cells, condition codes, status codes, days, counts)"""
+    cells = geohash_ints(lats, lons)
+    keys = np.stack([cells, conditions.astype(np.int64), statuses.astype(np.int64), days.astype(np.int64)])
+    unique, counts = np.unique(keys, axis=1, return_counts=True)
+    return unique[0], unique[1], unique[2], unique[3], counts
+
+
+def rebuild(get_connection, batch_size=100000, insert_chunk=2000):
+    """Recompute report_geo_cells from animal_reports and reset the watermark
+
+    Reads the table in report_id ranges inside one consistent snapshot, bins
+    each range with NumPy, and swaps the result in within the same
+    transaction. Recent event ids the snapshot does not see are stored as
+    gaps, so reports still committing are folded in once they do. Returns
+    the number of cells written.
+    """
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction(consistent_snapshot=True)
+        cursor.execute("SELECT COALESCE(MAX(event_id), 0) FROM report_status_events")
+        last_event_id = cursor.fetchone()[0]
+        watermark = watermarks.Watermark(max(last_event_id - watermarks.MAX_NEW_GAPS, 0), (),
+                                         *watermarks.step_of(connection))
+        cursor.execute("SELECT event_id FROM report_status_events WHERE event_id > %s ORDER BY event_id",
+                       (watermark.last_id,))
+        watermark.advance([row[0] for row in cursor.fetchall()])
+        cursor.execute("SELECT COALESCE(MAX(report_id), 0) FROM animal_reports")
+        max_report_id = cursor.fetchone()[0]
+
+        totals = defaultdict(int)
+        condition_codes = {name: code for code, name in enumerate(CONDITIONS)}
+        status_codes = {name: code for code, name in enumerate(STATUSES)}
+        for start in range(1, max_report_id + 1, batch_size):
+            cursor.execute("""
+                SELECT latitude, longitude, animal_condition, status, DATE(reported_at)
+                FROM animal_reports
+                WHERE report_id BETWEEN %s AND %s
+                AND latitude IS NOT NULL AND longitude IS NOT NULL
+            """, (start, start + batch_size - 1))
+            rows = cursor.fetchall()
+            if not rows:
+                continue
+            lats = np.array([float(row[0]) for row in rows])
+            lons = np.array([float(row[1]) for row in rows])
+            conditions = np.array([condition_codes[row[2]] for row in rows], dtype=np.int8)
+            statuses = np.array([status_codes[row[3]] for row in rows], dtype=np.int8)
+            days = np.array([_day(row[4]) for row in rows], dtype=np.int32)
+            for cell, condition, status, day, count in zip(*bin_reports(lats, lons, conditions, statuses, days)):
+                totals[(int(cell), int(condition), int(status), int(day))] += int(count)
+
+        cursor.execute("DELETE FROM report_geo_cells")
+        rows = [(geohash_str(cell), CONDITIONS[condition], STATUSES[status],
+                 EPOCH + datetime.timedelta(days=day), count)
+                for (cell, condition, status, day), count in totals.items()]
+        for start in range(0, len(rows), insert_chunk):
+            chunk = rows[start:start + insert_chunk]
+            cursor.execute(f"""
+                INSERT INTO report_geo_cells (geohash, animal_condition, status, day, report_count)
+                VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))}
+            """, [value for row in chunk for value in row])
+        watermarks.save(connection, HeatmapIndex.WATERMARK, watermark, replace=True)
+        connection.commit()
+        return len(rows)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
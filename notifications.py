@@ -0,0 +1,74 @@
+"""
+User notifications for PetNest Network
+An outbox subscriber that turns report and adoption events into
+notifications rows, which mobile clients pick up through /api/sync. Every
+row keeps the event it came from in source_event_id, unique per user, so
+a redelivered event adds nothing.
+"""
+
+PREFIXES = ('report.', 'adoption.')
+
+# report status -> (type, title, message); statuses not listed are not announced
+REPORT_STATUS = {
+    'seen': ('info', 'Report seen', 'A shelter has seen your report #{report_id}.'),
+    'assigned': ('info', 'Shelter assigned', 'A shelter has taken on your report #{report_id}.'),
+    'in_progress': ('info', 'Rescue under way', 'The shelter is on its way for report #{report_id}.'),
+    'completed': ('success', 'Rescue completed', 'Report #{report_id} has been completed. Thank you for reporting!'),
+    'closed': ('warning', 'Report closed', 'Report #{report_id} was closed.'),
+}
+
+# adoption event -> [(recipient column, type, title, message)]
+ADOPTION_EVENTS = {
+    'adoption.applied': [('seller_id', 'info', 'New adoption application',
+                          'Someone applied to adopt {pet_name}.')],
+    'adoption.approved': [('adopter_id', 'success', 'Application approved',
+                           'Your application for {pet_name} was approved.')],
+    'adoption.rejected': [('adopter_id', 'warning', 'Application not accepted',
+                           'Your application for {pet_name} was not accepted.')],
+    'adoption.withdrawn': [('seller_id', 'info', 'Application withdrawn',
+                            'An application for {pet_name} was withdrawn.')],
+    'adoption.cancelled': [('adopter_id', 'warning', 'Adoption cancelled',
+                            'The adoption of {pet_name} was cancelled.')],
+    'adoption.completed': [('adopter_id', 'success', 'Adoption completed',
+                            'Congratulations, {pet_name} is now yours!'),
+                           ('seller_id', 'success', 'Adoption completed', '{pet_name} has found a home.')],
+}
+
+
+def _adoption_parties(cursor, adoption_ids):
+    """adoption_id -> {adopter_id, seller_id, pet_name}"""
+    if not adoption_ids:
+        return {}
+    cursor.execute(f"""
+        SELECT a.adoption_id, a.adopter_id, a.seller_id, p.pet_name
+        FROM adoptions a JOIN pets p ON p.pet_id = a.pet_id
+        WHERE a.adoption_id IN ({', '.join(['%s'] * len(adoption_ids))})
+    """, list(adoption_ids))
+    return {row['adoption_id']: row for row in cursor.fetchall()}
+
+
+def notify(cursor, events):
+    """Outbox handler (dictionary cursor): one notifications row per recipient of each event"""
+    adoption_ids = {event['aggregate_id'] for event in events if event['aggregate_type'] == 'adoption'}
+    parties = _adoption_parties(cursor, adoption_ids)
+    rows = []
+    for event in events:
+        payload = event['payload']
+        if event['event_type'] == 'report.status_changed':
+            announced = REPORT_STATUS.get(payload['to_status'])
+            if announced and payload.get('reporter_id'):
+                kind, title, message = announced
+                rows.append((payload['reporter_id'], title, message.format(**payload), kind,
+                             event['aggregate_id'], 'report', event['event_id']))
+        elif event['event_type'] in ADOPTION_EVENTS and event['aggregate_id'] in parties:
+            party = parties[event['aggregate_id']]
+            for recipient, kind, title, message in ADOPTION_EVENTS[event['event_type']]:
+                if party[recipient]:
+                    rows.append((party[recipient], title, message.format(pet_name=party['pet_name'] or 'the pet'),
+                                 kind, event['aggregate_id'], 'adoption', event['event_id']))
+    if rows:
+        cursor.execute(f"""
+            INSERT IGNORE INTO notifications (user_id, title, message, type, related_id, related_type, source_event_id)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))}
+        """, [value for row in rows for value in row])
+    return len(rows)
@@ -0,0 +1,320 @@
+"""
+Transactional outbox for PetNest Network
+A handler that changes a report or an adoption also inserts an event row
+into outbox_events with emit(), in the same transaction, so the event
+exists exactly when the change does. OutboxRelay tails the table in
+event_id order and hands batches to subscribers. Each subscriber has its
+own watermark row in rollup_watermarks, and it is locked FOR UPDATE SKIP
+LOCKED, so only one worker delivers to a subscriber at a time. The
+subscriber runs inside that transaction with the relay's cursor: database
+side effects and the new watermark commit together, and anything outside
+the database (a spool file, a broker) sees a batch again if the commit
+fails, which makes delivery at-least-once. The watermarks are gap-safe
+(watermarks.py): an event whose transaction commits after later events
+were delivered is delivered when it shows up. Events of one aggregate are
+written under that aggregate's row lock, so they become visible, and are
+delivered, in the order they were written. An event that keeps failing is
+retried on its own and then parked in outbox_dead_letters so the rest of
+the stream can move on.
+"""
+
+import datetime
+import json
+import os
+import threading
+import time
+
+import watermarks
+
+WATERMARK_PREFIX = 'outbox:'
+PRIVATE_FIELDS = ('ip_address', 'user_agent')  # payload keys never sent outside the database
+
+
+# ========== WRITING ==========
+def _json(value):
+    return json.dumps(value, default=str, separators=(',', ':'))
+
+
+def emit(cursor, aggregate_type, aggregate_id, event_type, payload):
+    """Add an event to the caller's transaction"""
+    cursor.execute("""
+        INSERT INTO outbox_events (aggregate_type, aggregate_id, event_type, payload)
+        VALUES (%s, %s, %s, %s)
+    """, (aggregate_type, aggregate_id, event_type, _json(payload)))
+
+
+def emit_many(cursor, aggregate_type, event_type, events):
+    """Add several events of one type; events: (aggregate_id, payload) pairs"""
+    if not events:
+        return
+    cursor.execute(f"""
+        INSERT INTO outbox_events (aggregate_type, aggregate_id, event_type, payload)
+        VALUES {', '.join(['(%s, %s, %s, %s)'] * len(events))}
+    """, [value for aggregate_id, payload in events
+          for value in (aggregate_type, aggregate_id, event_type, _json(payload))])
+
+
+def emit_select(cursor, aggregate_type, event_type, id_expression, fields, source, params=()):
+    """Add one event per row of `source` ("FROM ... WHERE ..."), payload built in SQL as JSON_OBJECT
+
+    fields: payload key -> SQL expression; params fill the %s placeholders of
+    the expressions and then of source, in that order. Nothing is read back,
+    so it works on any cursor and never widens the caller's transaction.
+    """
+    pairs = ', '.join(f"'{name}', {expression}" for name, expression in fields.items())
+    cursor.execute(f"""
+        INSERT INTO outbox_events (aggregate_type, aggregate_id, event_type, payload)
+        SELECT %s, {id_expression}, %s, JSON_OBJECT({pairs}) {source}
+    """, [aggregate_type, event_type] + list(params))
+
+
+# ========== SUBSCRIBERS ==========
+class Subscriber:
+    """A named consumer of events whose type starts with one of `prefixes`
+
+    handler(cursor, events) gets the relay's dictionary cursor and the
+    matching events of a batch as dicts (event_id, aggregate_type,
+    aggregate_id, event_type, payload, created_at).
+    """
+
+    def __init__(self, name, handler, prefixes=('',)):
+        self.name = name
+        self.handler = handler
+        self.prefixes = tuple(prefixes)
+        self.failing_event = None  # events are delivered one at a time until this event_id is consumed
+        self.attempts = 0
+        self.metrics = {'delivered': 0, 'batches': 0, 'failures': 0, 'dead_letters': 0, 'skipped_locked': 0,
+                        'last_event_id': 0, 'open_gaps': 0, 'lag_events': 0, 'lag_seconds': 0.0, 'delivery_lag_seconds': 0.0,
+                        'batch_ms_last': 0.0}
+
+    def wants(self, event_type):
+        return event_type.startswith(self.prefixes)
+
+
+class SpoolBroker:
+    """Local stand-in for a message broker: appends each delivered batch to a JSON lines file
+
+    External consumers tail the file and drop event_ids they have seen,
+    since a batch is written again if the relay's commit fails. Payload
+    keys in `private` (request metadata kept for the activity log) are
+    left out of the file.
+    """
+
+    def __init__(self, path, private=PRIVATE_FIELDS):
+        self.path = path
+        self.private = frozenset(private)
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def __call__(self, cursor, events):
+        lines = ''.join(_json(dict(event, payload={key: value for key, value in event['payload'].items()
+                                                   if key not in self.private})) + '\n'
+                        for event in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+# ========== RELAY ==========
+class OutboxRelay:
+    """Delivers outbox events to subscribers in batches, one watermark per subscriber"""
+
+    def __init__(self, get_connection, interval=1, batch_size=500, max_attempts=5):
+        self._get_connection = get_connection
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.subscribers = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics = {'runs': 0, 'errors': 0}
+
+    def subscribe(self, name, handler, prefixes=('',)):
+        if len(WATERMARK_PREFIX + name) > 50:
+            raise ValueError('Subscriber name too long')
+        self.subscribers[name] = Subscriber(name, handler, prefixes)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='outbox-relay', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self._metrics['errors'] += 1
+                print(f"⚠️ Outbox relay error: {e}")
+
+    def run_once(self):
+        """Deliver every subscriber's backlog in batches; returns events delivered"""
+        with self._lock:
+            delivered = 0
+            for subscriber in self.subscribers.values():
+                while True:
+                    count = self._deliver(subscriber)
+                    delivered += max(count, 0)
+                    # One event at a time while a failing event is retried, until that event is consumed
+                    if count < self.batch_size and not (count > 0 and subscriber.failing_event):
+                        break
+            self._metrics['runs'] += 1
+            return delivered
+
+    def _deliver(self, subscriber):
+        """One batch for one subscriber; returns events consumed, or -1 if another worker holds it"""
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor(dictionary=True)
+        name = WATERMARK_PREFIX + subscriber.name
+        try:
+            cursor.execute("INSERT IGNORE INTO rollup_watermarks (name, last_id) VALUES (%s, 0)", (name,))
+            connection.commit()
+            watermark = watermarks.read(connection, name, lock='FOR UPDATE SKIP LOCKED')
+            if watermark is None:
+                connection.rollback()
+                subscriber.metrics['skipped_locked'] += 1
+                return -1
+            self._settle_failing(subscriber, watermark)
+            condition, params = watermark.condition('event_id')
+            cursor.execute(f"""
+                SELECT event_id, aggregate_type, aggregate_id, event_type, payload, created_at
+                FROM outbox_events
+                WHERE {condition}
+                ORDER BY event_id LIMIT %s
+            """, params + [1 if subscriber.failing_event else self.batch_size])
+            events = cursor.fetchall()
+            if not events:
+                connection.commit()  # keeps the gaps read() expired
+                self._measure(cursor, subscriber, watermark)
+                return 0
+
+            started = time.perf_counter()
+            matching = []
+            for event in events:
+                if subscriber.wants(event['event_type']):
+                    event['payload'] = json.loads(event['payload'])
+                    matching.append(event)
+            # A failing handler's writes are undone without giving up the watermark lock
+            cursor.execute("SAVEPOINT outbox_delivery")
+            try:
+                if matching:
+                    subscriber.handler(cursor, matching)
+            except Exception as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT outbox_delivery")
+                subscriber.metrics['failures'] += 1
+                if not self._failed(cursor, subscriber, events, e):
+                    connection.rollback()
+                    return 0
+                matching = []
+            opened, closed = watermark.advance([event['event_id'] for event in events])
+            watermarks.save(connection, name, watermark, opened, closed)
+            connection.commit()
+
+            self._settle_failing(subscriber, watermark)
+            subscriber.metrics['delivered'] += len(matching)
+            subscriber.metrics['batches'] += 1
+            subscriber.metrics['batch_ms_last'] = round((time.perf_counter() - started) * 1000, 3)
+            subscriber.metrics['last_event_id'] = watermark.last_id
+            self._measure(cursor, subscriber, watermark, events[-1]['created_at'])
+            return len(events)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    @staticmethod
+    def _settle_failing(subscriber, watermark):
+        """Leave single-event mode once the failing event was delivered or parked (by any worker)"""
+        failing = subscriber.failing_event
+        if failing is not None and failing <= watermark.last_id and failing not in watermark.gaps:
+            subscriber.failing_event = None
+            subscriber.attempts = 0
+
+    def _failed(self, cursor, subscriber, events, error):
+        """Retry a failed batch one event at a time; True once the event is parked as a dead letter"""
+        if len(events) > 1:
+            # Any event of the batch may be the bad one: go one at a time until all of it is consumed
+            subscriber.failing_event = events[-1]['event_id']
+            subscriber.attempts = 0
+            print(f"⚠️ Outbox subscriber {subscriber.name} failed a batch, retrying one event at a time: {error}")
+            return False
+        event = events[0]
+        if subscriber.failing_event != event['event_id']:
+            subscriber.failing_event = event['event_id']
+            subscriber.attempts = 0
+        subscriber.attempts += 1
+        if subscriber.attempts < self.max_attempts:
+            return False
+        print(f"❌ Outbox subscriber {subscriber.name} gave up on event {event['event_id']}: {error}")
+        cursor.execute("""
+            INSERT INTO outbox_dead_letters (subscriber, event_id, error, attempts) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE error = VALUES(error), attempts = VALUES(attempts)
+        """, (subscriber.name, event['event_id'], str(error)[:500], subscriber.attempts))
+        subscriber.metrics['dead_letters'] += 1
+        return True
+
+    def _measure(self, cursor, subscriber, watermark, delivered_created_at=None):
+        """Lag behind the newest event, in events and in age of the oldest undelivered one"""
+        cursor.execute("SELECT CURRENT_TIMESTAMP AS now, (SELECT COALESCE(MAX(event_id), 0) FROM outbox_events) AS newest")
+        row = cursor.fetchone()
+        now = row['now']
+        subscriber.metrics['lag_events'] = max(row['newest'] - watermark.last_id, 0)
+        subscriber.metrics['open_gaps'] = len(watermark.gaps)
+        condition, params = watermark.condition('event_id')
+        cursor.execute(f"SELECT created_at FROM outbox_events WHERE {condition} ORDER BY event_id LIMIT 1", params)
+        oldest = cursor.fetchone()
+        subscriber.metrics['lag_seconds'] = max((now - oldest['created_at']).total_seconds(), 0) if oldest else 0.0
+        if delivered_created_at:
+            subscriber.metrics['delivery_lag_seconds'] = max((now - delivered_created_at).total_seconds(), 0)
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        stats['subscribers'] = {name: dict(subscriber.metrics) for name, subscriber in self.subscribers.items()}
+        return stats
+
+
+# ========== MAINTENANCE ==========
+def prune(get_connection, keep_days=7, batch_size=10000):
+    """Delete events every subscriber has consumed and that are older than keep_days; returns rows deleted
+
+    Ids a subscriber still waits for (its gaps) are kept even below its last_id.
+    """
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    deleted = 0
+    try:
+        cursor.execute("SELECT COALESCE(MIN(last_id), 0) FROM rollup_watermarks WHERE name LIKE %s",
+                       (WATERMARK_PREFIX + '%',))
+        consumed = cursor.fetchone()[0]
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=keep_days)
+        while True:
+            cursor.execute("""
+                DELETE FROM outbox_events
+                WHERE event_id <= %s AND created_at < %s
+                  AND event_id NOT IN (SELECT gap_id FROM watermark_gaps WHERE name LIKE %s)
+                LIMIT %s
+            """, (consumed, cutoff, WATERMARK_PREFIX + '%', batch_size))
+            connection.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                break
+        return deleted
+    finally:
+        cursor.close()
+        connection.close()
@@ -53,15 +53,138 @@ CREATE TABLE animal_reports (
     city VARCHAR(50),
     street VARCHAR(100),
     region VARCHAR(50),
-    photos VARCHAR(500), -- Comma separated image paths
+    photos VARCHAR(500), -- Legacy comma separated image paths, superseded by report_photos
     description TEXT,
     urgency_level ENUM('low', 'medium', 'high') DEFAULT 'medium',
     status ENUM('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed') DEFAULT 'pending',
     assigned_to INT, -- shelter_id
+    lease_expires_at TIMESTAMP NULL, -- shelter work queue claim lease (status 'seen')
+    status_changed_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP, -- when the current status was entered
+    last_status_seconds INT NULL, -- time spent in the previous status (copied into report_status_events)
     reported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     completed_at TIMESTAMP NULL,
+    duplicate_of INT NULL, -- original report when a photo matched an earlier one (duplicates.py)
+    client_id VARCHAR(64) NULL, -- id generated by an offline client, makes resubmission idempotent (sync.py)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_report_client_id (reporter_id, client_id),
     FOREIGN KEY (reporter_id) REFERENCES users(user_id) ON DELETE CASCADE,
-    FOREIGN KEY (assigned_to) REFERENCES shelters(shelter_id) ON DELETE SET NULL
+    FOREIGN KEY (assigned_to) REFERENCES shelters(shelter_id) ON DELETE SET NULL,
+    FOREIGN KEY (duplicate_of) REFERENCES animal_reports(report_id) ON DELETE SET NULL
+);
+
+-- Report photos (one row per photo)
+CREATE TABLE report_photos (
+    photo_id INT PRIMARY KEY AUTO_INCREMENT,
+    report_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL DEFAULT 0, -- display order within the report
+    file_path VARCHAR(255) NOT NULL,
+    thumbnail_path VARCHAR(255),
+    width INT,
+    height INT,
+    size_bytes INT,
+    content_hash CHAR(64), -- SHA-256 of the file
+    phash BIGINT UNSIGNED NULL, -- 64-bit perceptual (difference) hash, NULL without Pillow
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_report_photo_position (report_id, position),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+
+-- Perceptual hash bands of recent report photos, one row per (area, band); pruned after 30 days
+CREATE TABLE report_photo_hashes (
+    area_key BIGINT NOT NULL, -- geohash cell (precision 5) or 2^32 + crc32(city|region)
+    band_key INT UNSIGNED NOT NULL, -- band number << 16 | that band's 16 hash bits
+    day INT NOT NULL, -- days since 1970-01-01
+    report_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL,
+    phash BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (area_key, band_key, day, report_id, position),
+    INDEX idx_photo_hashes_day (day),
+    INDEX idx_photo_hashes_report (report_id),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+
+-- Likely duplicate reports (a photo within 7 bits of an earlier nearby report's photo)
+CREATE TABLE report_duplicates (
+    report_id INT NOT NULL,
+    duplicate_of INT NOT NULL,
+    distance TINYINT UNSIGNED NOT NULL, -- Hamming distance of the closest photo pair
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (report_id, duplicate_of),
+    INDEX idx_report_duplicates_of (duplicate_of),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE,
+    FOREIGN KEY (duplicate_of) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+
+-- Report status history (append-only, one row per status change)
+CREATE TABLE report_status_events (
+    event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    report_id INT NOT NULL,
+    from_status VARCHAR(20), -- NULL for the creation event
+    to_status VARCHAR(20) NOT NULL,
+    shelter_id INT, -- shelter holding the report while it was in from_status
+    city VARCHAR(50),
+    seconds_in_status INT, -- time spent in from_status
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_status_events_report (report_id, event_id)
+);
+
+-- SLA histograms of time in status, maintained from report_status_events by report_sla.py
+CREATE TABLE report_sla_rollup (
+    scope ENUM('all', 'city', 'shelter') NOT NULL,
+    scope_key VARCHAR(50) NOT NULL DEFAULT '', -- city name or shelter_id, '' for all
+    status VARCHAR(20) NOT NULL,
+    bucket TINYINT UNSIGNED NOT NULL, -- index into report_sla.BUCKET_BOUNDS
+    event_count INT NOT NULL DEFAULT 0,
+    total_seconds BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_key, status, bucket)
+);
+
+-- Report heatmap: counts per geohash cell (precision 6) / condition / status / report day
+CREATE TABLE report_geo_cells (
+    geohash CHAR(6) NOT NULL,
+    animal_condition ENUM('stray', 'sick', 'dead') NOT NULL,
+    status ENUM('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed') NOT NULL,
+    day DATE NOT NULL,
+    report_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (geohash, animal_condition, status, day)
+);
+
+-- Progress of incremental aggregators (last source id folded in)
+CREATE TABLE rollup_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Ids below a watermark that were not committed yet when it moved past them (watermarks.py)
+CREATE TABLE watermark_gaps (
+    name VARCHAR(50) NOT NULL,
+    gap_id BIGINT NOT NULL,
+    found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, gap_id)
+);
+
+-- Transactional outbox: written in the same transaction as the change it describes (outbox.py);
+-- each subscriber's progress is an 'outbox:<name>' row in rollup_watermarks
+CREATE TABLE outbox_events (
+    event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    aggregate_type VARCHAR(30) NOT NULL, -- 'report', 'adoption'
+    aggregate_id BIGINT NOT NULL,
+    event_type VARCHAR(50) NOT NULL, -- e.g. 'report.status_changed'
+    payload TEXT NOT NULL, -- JSON
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_outbox_aggregate (aggregate_type, aggregate_id, event_id),
+    INDEX idx_outbox_created (created_at)
+);
+
+-- Events a subscriber gave up on after repeated failures
+CREATE TABLE outbox_dead_letters (
+    subscriber VARCHAR(50) NOT NULL,
+    event_id BIGINT NOT NULL,
+    error VARCHAR(500),
+    attempts INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (subscriber, event_id)
 );
 
 -- Pets for adoption/sale
@@ -83,6 +206,9 @@ CREATE TABLE pets (
     status ENUM('available', 'reserved', 'adopted', 'sold') DEFAULT 'available',
     is_for_adoption BOOLEAN DEFAULT TRUE,
     is_for_sale BOOLEAN DEFAULT FALSE,
+    primary_image_url VARCHAR(255) NULL, -- copy of the primary pet_images row (pets.py keeps it in sync)
+    favorite_count INT NOT NULL DEFAULT 0, -- maintained by favorites.py
+    version INT NOT NULL DEFAULT 0, -- bumped by every adoption status change (adoptions.py)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (seller_id) REFERENCES users(user_id) ON DELETE CASCADE
@@ -110,6 +236,10 @@ CREATE TABLE adoptions (
     approved_by INT, -- admin who approved
     approved_at TIMESTAMP NULL,
     notes TEXT,
+    version INT NOT NULL DEFAULT 0, -- optimistic lock for status changes (adoptions.py)
+    open_adopter_id INT AS (IF(status IN ('pending', 'approved'), adopter_id, NULL)) STORED,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_open_application (pet_id, open_adopter_id), -- one open application per adopter and pet
     FOREIGN KEY (pet_id) REFERENCES pets(pet_id) ON DELETE CASCADE,
     FOREIGN KEY (adopter_id) REFERENCES users(user_id) ON DELETE CASCADE,
     FOREIGN KEY (seller_id) REFERENCES users(user_id) ON DELETE CASCADE,
@@ -201,6 +331,17 @@ CREATE TABLE order_items (
     FOREIGN KEY (product_id) REFERENCES products(product_id) ON DELETE CASCADE
 );
 
+-- Sales per store/product/day, maintained at checkout (sales.py)
+CREATE TABLE sales_daily (
+    store_id INT NOT NULL,
+    product_id INT NOT NULL, -- 0 = all products of the store (orders counted once)
+    day DATE NOT NULL,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    orders INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, day, product_id)
+);
+
 -- Testimonials
 CREATE TABLE testimonials (
     testimonial_id INT PRIMARY KEY AUTO_INCREMENT,
@@ -226,6 +367,9 @@ CREATE TABLE notifications (
     related_id INT, -- ID of related entity (report_id, adoption_id, etc)
     related_type VARCHAR(50), -- 'report', 'adoption', 'message', etc
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    source_event_id BIGINT NULL, -- outbox event the notification was made from (notifications.py)
+    UNIQUE KEY unique_notification_source (source_event_id, user_id),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
@@ -284,18 +428,51 @@ CREATE TABLE reporter_stats (
     FOREIGN KEY (reporter_id) REFERENCES users(user_id) ON DELETE CASCADE
 );
 
+-- Login sessions (binary records written by session_store.py)
+CREATE TABLE user_sessions (
+    session_id VARCHAR(255) PRIMARY KEY,
+    user_id INT NOT NULL,
+    session_data VARBINARY(512),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_sessions_user FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- Deleted session ids, polled by every worker to evict them from its hot tier (session_store.py)
+CREATE TABLE session_revocations (
+    revocation_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    session_id VARCHAR(255) NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revocations_at (revoked_at)
+);
+
 -- Add indexes for better query performance
 CREATE INDEX idx_users_role ON users(role);
 CREATE INDEX idx_users_email ON users(email);
+CREATE INDEX idx_users_full_name ON users(full_name);
+CREATE INDEX idx_users_phone ON users(phone);
 CREATE INDEX idx_pets_status ON pets(status);
 CREATE INDEX idx_pets_seller ON pets(seller_id);
 CREATE INDEX idx_reports_status ON animal_reports(status);
 CREATE INDEX idx_reports_reporter ON animal_reports(reporter_id);
 CREATE INDEX idx_adoptions_status ON adoptions(status);
+CREATE INDEX idx_adoptions_updated ON adoptions(updated_at);
+CREATE INDEX idx_reports_status_changed ON animal_reports(status_changed_at);
 CREATE INDEX idx_messages_conversation ON messages(conversation_id);
 CREATE INDEX idx_orders_customer ON orders(customer_id);
+CREATE INDEX idx_orders_date ON orders(order_date);
 CREATE INDEX idx_products_store ON products(store_id);
+CREATE INDEX idx_products_updated ON products(updated_at);
 CREATE INDEX idx_notifications_user ON notifications(user_id, is_read);
+CREATE INDEX idx_sessions_user ON user_sessions(user_id);
+CREATE INDEX idx_sessions_expires ON user_sessions(expires_at);
+CREATE INDEX idx_users_updated ON users(updated_at);
+CREATE INDEX idx_report_photos_hash ON report_photos(content_hash);
+CREATE INDEX idx_reports_queue ON animal_reports(status, urgency_level, reported_at);
+CREATE INDEX idx_reports_lease ON animal_reports(status, lease_expires_at);
+CREATE FULLTEXT INDEX ft_reports_text ON animal_reports(description, street, region);
+CREATE INDEX idx_reports_reporter_updated ON animal_reports(reporter_id, updated_at, report_id);
+CREATE INDEX idx_notifications_user_updated ON notifications(user_id, updated_at, notification_id);
 
 -- Insert Admin user (password: admin123 - plain text)
 INSERT INTO users (username, email, password, role, full_name, phone, is_verified, is_active) 
@@ -344,47 +521,9 @@ INSERT INTO testimonials (user_id, content, rating, status) VALUES
 (2, 'Great platform! Found my perfect pet here.', 5, 'approved'),
 (3, 'Easy to list pets for adoption.', 4, 'approved');
 
--- Trigger to update reporter stats when new report is added
-DELIMITER $$
-CREATE TRIGGER after_report_insert
-AFTER INSERT ON animal_reports
-FOR EACH ROW
-BEGIN
-    INSERT INTO reporter_stats (reporter_id, total_reports)
-    VALUES (NEW.reporter_id, 1)
-    ON DUPLICATE KEY UPDATE 
-    total_reports = total_reports + 1,
-    last_updated = CURRENT_TIMESTAMP;
-    
-    -- Update badge if conditions met
-    UPDATE users u
-    JOIN reporter_stats rs ON u.user_id = rs.reporter_id
-    SET u.badge = 'Star Reporter'
-    WHERE rs.total_reports >= 5 AND u.role = 'reporter' AND u.badge IS NULL;
-END$$
-DELIMITER ;
-
--- Trigger to update seller stats when adoption is completed
-DELIMITER $$
-CREATE TRIGGER after_adoption_complete
-AFTER UPDATE ON adoptions
-FOR EACH ROW
-BEGIN
-    IF NEW.status = 'completed' AND OLD.status != 'completed' THEN
-        INSERT INTO seller_stats (seller_id, successful_deals)
-        VALUES (NEW.seller_id, 1)
-        ON DUPLICATE KEY UPDATE 
-        successful_deals = successful_deals + 1,
-        last_updated = CURRENT_TIMESTAMP;
-        
-        -- Update PRO seller badge
-        UPDATE users u
-        JOIN seller_stats ss ON u.user_id = ss.seller_id
-        SET u.badge = 'PRO Seller'
-        WHERE ss.successful_deals >= 5 AND u.role = 'seller' AND u.badge IS NULL;
-    END IF;
-END$$
-DELIMITER ;
+-- Reporter/seller stats and Star Reporter / PRO Seller badges are maintained by the
+-- application badge engine (badges.py), which only evaluates the user whose counter
+-- changed. Thresholds live in system_settings.badge_rules.
 
 -- View for available pets
 CREATE OR REPLACE VIEW available_pets AS
@@ -545,6 +684,10 @@ CREATE INDEX idx_users_created ON users(created_at);
 CREATE INDEX idx_reports_created ON animal_reports(created_at);
 CREATE INDEX idx_shelters_approved ON shelters(is_approved);
 CREATE INDEX idx_pets_created ON pets(created_at);
+CREATE INDEX idx_pets_status_created ON pets(status, created_at, pet_id);
+CREATE INDEX idx_pets_popular ON pets(status, favorite_count);
+CREATE INDEX idx_pets_updated ON pets(updated_at);
+CREATE INDEX idx_pet_images_pet ON pet_images(pet_id, is_primary, image_id);
 
 -- Add country column to users table if not exists
 ALTER TABLE users 
@@ -607,4 +750,279 @@ ADD FOREIGN KEY (suspended_by) REFERENCES users(user_id) ON DELETE SET NULL;
 -- Add index for better performance on common queries
 CREATE INDEX IF NOT EXISTS idx_users_role_status ON users(role, is_active, is_verified);
 CREATE INDEX IF NOT EXISTS idx_users_created_city ON users(created_at, city);
-CREATE INDEX IF NOT EXISTS idx_users_email_username ON users(email, username);
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_users_email_username ON users(email, username);
+
+
+
+
+
+
+-- Session table migration for databases where user_sessions was created by the app at login
+CREATE TABLE IF NOT EXISTS user_sessions (
+    session_id VARCHAR(255) PRIMARY KEY,
+    user_id INT NOT NULL,
+    session_data VARBINARY(512),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_sessions_user FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+ALTER TABLE user_sessions MODIFY session_data VARBINARY(512);
+CREATE INDEX IF NOT EXISTS idx_sessions_user ON user_sessions(user_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_expires ON user_sessions(expires_at);
+
+-- Optional: range-partition user_sessions by expiry so whole months can be dropped
+-- instead of deleted row by row. Partitioned InnoDB tables cannot have foreign keys
+-- and every unique key must include expires_at, so the FK is dropped (the session
+-- reaper already removes orphans as they expire) and the primary key is widened.
+-- ALTER TABLE user_sessions DROP FOREIGN KEY fk_sessions_user;
+-- ALTER TABLE user_sessions DROP PRIMARY KEY, ADD PRIMARY KEY (session_id, expires_at);
+-- ALTER TABLE user_sessions PARTITION BY RANGE (UNIX_TIMESTAMP(expires_at)) (
+--     PARTITION p2026_11 VALUES LESS THAN (UNIX_TIMESTAMP('2026-12-01 00:00:00')),
+--     PARTITION p2026_12 VALUES LESS THAN (UNIX_TIMESTAMP('2027-01-01 00:00:00')),
+--     PARTITION p2027_01 VALUES LESS THAN (UNIX_TIMESTAMP('2027-02-01 00:00:00')),
+--     PARTITION pmax VALUES LESS THAN MAXVALUE
+-- );
+-- Monthly maintenance: ALTER TABLE user_sessions REORGANIZE PARTITION pmax INTO (...new month..., pmax);
+--                      ALTER TABLE user_sessions DROP PARTITION <oldest fully expired month>;
+
+-- Watermark index for the username/email availability filter refresh (availability.py)
+CREATE INDEX IF NOT EXISTS idx_users_updated ON users(updated_at);
+
+-- Report photos migration: one row per path from the comma separated animal_reports.photos
+-- (VARCHAR(500) holds at most ~8 upload paths, the 0-19 sequence covers every row)
+CREATE TABLE IF NOT EXISTS report_photos (
+    photo_id INT PRIMARY KEY AUTO_INCREMENT,
+    report_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL DEFAULT 0, -- display order within the report
+    file_path VARCHAR(255) NOT NULL,
+    thumbnail_path VARCHAR(255),
+    width INT,
+    height INT,
+    size_bytes INT,
+    content_hash CHAR(64), -- SHA-256 of the file
+    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY unique_report_photo_position (report_id, position),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_report_photos_hash ON report_photos(content_hash);
+
+INSERT IGNORE INTO report_photos (report_id, position, file_path)
+SELECT r.report_id, seq.n, TRIM(SUBSTRING_INDEX(SUBSTRING_INDEX(r.photos, ',', seq.n + 1), ',', -1))
+FROM animal_reports r
+JOIN (
+    SELECT 0 AS n UNION ALL SELECT 1 UNION ALL SELECT 2 UNION ALL SELECT 3 UNION ALL SELECT 4
+    UNION ALL SELECT 5 UNION ALL SELECT 6 UNION ALL SELECT 7 UNION ALL SELECT 8 UNION ALL SELECT 9
+    UNION ALL SELECT 10 UNION ALL SELECT 11 UNION ALL SELECT 12 UNION ALL SELECT 13 UNION ALL SELECT 14
+    UNION ALL SELECT 15 UNION ALL SELECT 16 UNION ALL SELECT 17 UNION ALL SELECT 18 UNION ALL SELECT 19
+) seq ON seq.n <= LENGTH(r.photos) - LENGTH(REPLACE(r.photos, ',', ''))
+WHERE r.photos IS NOT NULL AND r.photos <> '';
+
+-- Then fill size/hash/dimensions/thumbnails from the files: flask --app app backfill-report-photos
+
+-- Badge engine migration: the stats triggers re-evaluated badges for every user on each
+-- insert; counters and badges are now maintained per user by badges.py
+DROP TRIGGER IF EXISTS after_report_insert;
+DROP TRIGGER IF EXISTS after_adoption_complete;
+
+INSERT IGNORE INTO system_settings (setting_key, setting_value, setting_type, description) VALUES
+('badge_rules', '[{"badge": "Star Reporter", "role": "reporter", "counter": "total_reports", "threshold": 5}, {"badge": "PRO Seller", "role": "seller", "counter": "successful_deals", "threshold": 5}]', 'json', 'Badge thresholds (counter names from reporter_stats/seller_stats)');
+
+-- Award badges already earned under the old triggers: flask --app app backfill-badges --recount
+
+-- Shelter work queue migration (work_queue.py): claim leases and queue-order indexes
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP NULL AFTER assigned_to;
+CREATE INDEX IF NOT EXISTS idx_reports_queue ON animal_reports(status, urgency_level, reported_at);
+CREATE INDEX IF NOT EXISTS idx_reports_lease ON animal_reports(status, lease_expires_at);
+
+-- Report SLA migration (report_sla.py): status history, time-in-status rollups
+-- Safe to re-run: the column is added empty, only empty values are filled, and only reports
+-- without any history get a seed event
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS status_changed_at TIMESTAMP NULL DEFAULT NULL AFTER lease_expires_at;
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS last_status_seconds INT NULL AFTER status_changed_at;
+UPDATE animal_reports SET status_changed_at = COALESCE(completed_at, reported_at) WHERE status_changed_at IS NULL;
+ALTER TABLE animal_reports MODIFY status_changed_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS report_status_events (
+    event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    report_id INT NOT NULL,
+    from_status VARCHAR(20),
+    to_status VARCHAR(20) NOT NULL,
+    shelter_id INT,
+    city VARCHAR(50),
+    seconds_in_status INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_status_events_report (report_id, event_id)
+);
+
+CREATE TABLE IF NOT EXISTS report_sla_rollup (
+    scope ENUM('all', 'city', 'shelter') NOT NULL,
+    scope_key VARCHAR(50) NOT NULL DEFAULT '',
+    status VARCHAR(20) NOT NULL,
+    bucket TINYINT UNSIGNED NOT NULL,
+    event_count INT NOT NULL DEFAULT 0,
+    total_seconds BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_key, status, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    name VARCHAR(50) PRIMARY KEY,
+    last_id BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Seed history with the current status of existing reports (durations start from here)
+INSERT INTO report_status_events (report_id, from_status, to_status, shelter_id, city, created_at)
+SELECT report_id, NULL, status, assigned_to, city, status_changed_at FROM animal_reports
+WHERE NOT EXISTS (SELECT 1 FROM report_status_events e WHERE e.report_id = animal_reports.report_id);
+
+-- Admin user directory migration (user_directory.py): prefix search on every searchable column
+CREATE INDEX IF NOT EXISTS idx_users_full_name ON users(full_name);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
+
+-- Report heatmap migration (heatmap.py); fill it with: flask --app app rebuild-heatmap
+CREATE TABLE IF NOT EXISTS report_geo_cells (
+    geohash CHAR(6) NOT NULL,
+    animal_condition ENUM('stray', 'sick', 'dead') NOT NULL,
+    status ENUM('pending', 'seen', 'assigned', 'in_progress', 'completed', 'closed') NOT NULL,
+    day DATE NOT NULL,
+    report_count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (geohash, animal_condition, status, day)
+);
+
+-- Analytics cube migration (analytics.py): change timestamps for incremental refresh
+ALTER TABLE adoptions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_adoptions_updated ON adoptions(updated_at);
+CREATE INDEX IF NOT EXISTS idx_reports_status_changed ON animal_reports(status_changed_at);
+
+-- Pet listing migration (pets.py): denormalized primary image and listing-order indexes
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS primary_image_url VARCHAR(255) NULL;
+CREATE INDEX IF NOT EXISTS idx_pets_status_created ON pets(status, created_at, pet_id);
+CREATE INDEX IF NOT EXISTS idx_pet_images_pet ON pet_images(pet_id, is_primary, image_id);
+UPDATE pets p
+SET p.primary_image_url = (
+    SELECT i.image_url FROM pet_images i
+    WHERE i.pet_id = p.pet_id
+    ORDER BY i.is_primary DESC, i.image_id
+    LIMIT 1
+);
+
+-- Product catalog migration (catalog.py): workers poll products changed since their last refresh
+CREATE INDEX IF NOT EXISTS idx_products_updated ON products(updated_at);
+
+-- Sales rollup migration (sales.py); fill it with: flask --app app backfill-sales
+CREATE TABLE IF NOT EXISTS sales_daily (
+    store_id INT NOT NULL,
+    product_id INT NOT NULL, -- 0 = all products of the store (orders counted once)
+    day DATE NOT NULL,
+    revenue DECIMAL(12,2) NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    orders INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (store_id, day, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders(order_date);
+
+-- Favorites migration (favorites.py): maintained per-pet counts
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS favorite_count INT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_pets_popular ON pets(status, favorite_count);
+UPDATE pets p
+SET p.favorite_count = (SELECT COUNT(*) FROM favorites f WHERE f.pet_id = p.pet_id);
+
+-- Adoption workflow migration (adoptions.py): version columns for optimistic transitions
+-- (reject all but the newest open application of the same adopter and pet before adding the unique key)
+ALTER TABLE pets ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 0;
+ALTER TABLE adoptions ADD COLUMN IF NOT EXISTS version INT NOT NULL DEFAULT 0;
+UPDATE adoptions a
+JOIN adoptions b ON b.pet_id = a.pet_id AND b.adopter_id = a.adopter_id
+    AND b.status IN ('pending', 'approved') AND b.adoption_id > a.adoption_id
+SET a.status = 'rejected', a.version = a.version + 1
+WHERE a.status IN ('pending', 'approved');
+ALTER TABLE adoptions ADD COLUMN IF NOT EXISTS open_adopter_id INT AS (IF(status IN ('pending', 'approved'), adopter_id, NULL)) STORED;
+CREATE UNIQUE INDEX IF NOT EXISTS unique_open_application ON adoptions(pet_id, open_adopter_id);
+
+-- Recommendations migration (recommendations.py): workers poll pets changed since their last refresh
+CREATE INDEX IF NOT EXISTS idx_pets_updated ON pets(updated_at);
+
+-- Duplicate report migration (duplicates.py): perceptual hashes and hash band lookups.
+-- Only the last 3 days are compared, so existing photos need no backfill.
+ALTER TABLE report_photos ADD COLUMN IF NOT EXISTS phash BIGINT UNSIGNED NULL;
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS duplicate_of INT NULL;
+ALTER TABLE animal_reports ADD CONSTRAINT fk_reports_duplicate_of FOREIGN KEY IF NOT EXISTS (duplicate_of)
+    REFERENCES animal_reports(report_id) ON DELETE SET NULL;
+CREATE TABLE IF NOT EXISTS report_photo_hashes (
+    area_key BIGINT NOT NULL,
+    band_key INT UNSIGNED NOT NULL,
+    day INT NOT NULL,
+    report_id INT NOT NULL,
+    position TINYINT UNSIGNED NOT NULL,
+    phash BIGINT UNSIGNED NOT NULL,
+    PRIMARY KEY (area_key, band_key, day, report_id, position),
+    INDEX idx_photo_hashes_day (day),
+    INDEX idx_photo_hashes_report (report_id),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS report_duplicates (
+    report_id INT NOT NULL,
+    duplicate_of INT NOT NULL,
+    distance TINYINT UNSIGNED NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (report_id, duplicate_of),
+    INDEX idx_report_duplicates_of (duplicate_of),
+    FOREIGN KEY (report_id) REFERENCES animal_reports(report_id) ON DELETE CASCADE,
+    FOREIGN KEY (duplicate_of) REFERENCES animal_reports(report_id) ON DELETE CASCADE
+);
+
+-- Report search migration (report_search.py): full-text index for staff search
+CREATE FULLTEXT INDEX IF NOT EXISTS ft_reports_text ON animal_reports(description, street, region);
+
+-- Delta sync migration (sync.py): change timestamps, their indexes and offline client ids.
+-- Existing rows get the migration time as updated_at, so clients re-sync them once.
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS client_id VARCHAR(64) NULL;
+ALTER TABLE animal_reports ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+ALTER TABLE animal_reports ADD UNIQUE KEY IF NOT EXISTS unique_report_client_id (reporter_id, client_id);
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP;
+CREATE INDEX IF NOT EXISTS idx_reports_reporter_updated ON animal_reports(reporter_id, updated_at, report_id);
+CREATE INDEX IF NOT EXISTS idx_notifications_user_updated ON notifications(user_id, updated_at, notification_id);
+
+-- Outbox migration (outbox.py, notifications.py): event table, dead letters, notification sources
+CREATE TABLE IF NOT EXISTS outbox_events (
+    event_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    aggregate_type VARCHAR(30) NOT NULL,
+    aggregate_id BIGINT NOT NULL,
+    event_type VARCHAR(50) NOT NULL,
+    payload TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_outbox_aggregate (aggregate_type, aggregate_id, event_id),
+    INDEX idx_outbox_created (created_at)
+);
+CREATE TABLE IF NOT EXISTS outbox_dead_letters (
+    subscriber VARCHAR(50) NOT NULL,
+    event_id BIGINT NOT NULL,
+    error VARCHAR(500),
+    attempts INT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (subscriber, event_id)
+);
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS source_event_id BIGINT NULL;
+ALTER TABLE notifications ADD UNIQUE KEY IF NOT EXISTS unique_notification_source (source_event_id, user_id);
+
+-- Session revocation migration (session_store.py): logouts and password changes reach every worker's hot tier
+CREATE TABLE IF NOT EXISTS session_revocations (
+    revocation_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    session_id VARCHAR(255) NOT NULL,
+    revoked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_revocations_at (revoked_at)
+);
+
+-- Gap-safe watermark migration (watermarks.py): ids a rollup must read again once they commit
+CREATE TABLE IF NOT EXISTS watermark_gaps (
+    name VARCHAR(50) NOT NULL,
+    gap_id BIGINT NOT NULL,
+    found_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, gap_id)
+);
+
+-- Badge subscriber migration (badges.py): events written before it were counted by the request, so start after them
+INSERT IGNORE INTO rollup_watermarks (name, last_id)
+SELECT 'outbox:badges', COALESCE(MAX(event_id), 0) FROM outbox_events;
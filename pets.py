@@ -0,0 +1,224 @@
+"""
+Pet listings for PetNest Network
+A page of pets is two queries whatever its size: pets joined with their
+seller, then every image of those pets in one batched IN (...) lookup.
+pets.primary_image_url is a denormalized copy of the primary image so cards
+can render without the images; sync_primary_images keeps it in step with
+pet_images after every write. Functions expect a dictionary cursor.
+"""
+
+from user_directory import encode_cursor
+
+PET_COLUMNS = """p.pet_id, p.seller_id, p.pet_name, p.animal_type, p.breed, p.age, p.gender, p.color,
+                 p.weight, p.health_status, p.vaccination_status, p.spayed_neutered, p.price, p.status,
+                 p.is_for_adoption, p.is_for_sale, p.primary_image_url, p.favorite_count, p.created_at"""
+
+SELLER_COLUMNS = """u.username AS seller_username, u.full_name AS seller_name, u.role AS seller_role,
+                    u.city AS seller_city, u.profile_picture AS seller_picture, u.badge AS seller_badge,
+                    u.is_verified AS seller_verified"""
+
+STATUSES = ('available', 'reserved', 'adopted', 'sold')
+
+
+# ========== READS ==========
+def build_filters(animal_type=None, breed=None, city=None, status=None, seller_id=None,
+                  for_adoption=None, for_sale=None, min_price=None, max_price=None, pet_ids=None):
+    """WHERE clauses and params for the listing"""
+    clauses = []
+    params = []
+    if pet_ids is not None:
+        clauses.append(f"p.pet_id IN ({', '.join(['%s'] * len(pet_ids))})" if pet_ids else "FALSE")
+        params.extend(pet_ids)
+    if status:
+        clauses.append("p.status = %s")
+        params.append(status)
+    if animal_type:
+        clauses.append("p.animal_type = %s")
+        params.append(animal_type)
+    if breed:
+        clauses.append("p.breed = %s")
+        params.append(breed)
+    if city:
+        clauses.append("u.city = %s")
+        params.append(city)
+    if seller_id:
+        clauses.append("p.seller_id = %s")
+        params.append(seller_id)
+    if for_adoption is not None:
+        clauses.append("p.is_for_adoption = %s")
+        params.append(for_adoption)
+    if for_sale is not None:
+        clauses.append("p.is_for_sale = %s")
+        params.append(for_sale)
+    if min_price is not None:
+        clauses.append("p.price >= %s")
+        params.append(min_price)
+    if max_price is not None:
+        clauses.append("p.price <= %s")
+        params.append(max_price)
+    return clauses, params
+
+
+def _shape(row):
+    """Nest the seller columns and make the row JSON friendly"""
+    pet = {key: value for key, value in row.items() if not key.startswith('seller_')}
+    pet['seller'] = {
+        'user_id': row['seller_id'],
+        'username': row['seller_username'],
+        'full_name': row['seller_name'],
+        'role': row['seller_role'],
+        'city': row['seller_city'],
+        'profile_picture': row['seller_picture'],
+        'badge': row['seller_badge'],
+        'is_verified': bool(row['seller_verified']) if row['seller_verified'] is not None else None
+    }
+    for key in ('price', 'weight'):
+        pet[key] = float(pet[key]) if pet[key] is not None else None
+    for key in ('vaccination_status', 'spayed_neutered', 'is_for_adoption', 'is_for_sale'):
+        pet[key] = bool(pet[key])
+    pet['created_at'] = pet['created_at'].isoformat() if pet['created_at'] else None
+    pet['images'] = []
+    return pet
+
+
+def attach_images(cursor, pets):
+    """Load the images of all `pets` with one query (primary first, then upload order)"""
+    if not pets:
+        return pets
+    by_id = {pet['pet_id']: pet for pet in pets}
+    cursor.execute(f"""
+        SELECT image_id, pet_id, image_url, is_primary
+        FROM pet_images
+        WHERE pet_id IN ({', '.join(['%s'] * len(by_id))})
+        ORDER BY pet_id, is_primary DESC, image_id
+    """, list(by_id))
+    for image in cursor.fetchall():
+        by_id[image['pet_id']]['images'].append({
+            'image_id': image['image_id'],
+            'image_url': image['image_url'],
+            'is_primary': bool(image['is_primary'])
+        })
+    return pets
+
+
+def list_pets(cursor, filters, limit=50, after=None, with_images=True):
+    """One page of pets, newest first; returns (pets, next_cursor or None)
+
+    Query 1 fetches pets with their seller, query 2 (skipped when
+    with_images is False) fetches the images of the whole page.
+    """
+    clauses, params = build_filters(**filters)
+    if after:
+        clauses.append("(p.created_at < %s OR (p.created_at = %s AND p.pet_id < %s))")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor.execute(f"""
+        SELECT {PET_COLUMNS}, {SELLER_COLUMNS}
+        FROM pets p
+        LEFT JOIN users u ON u.user_id = p.seller_id
+        {where}
+        ORDER BY p.created_at DESC, p.pet_id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['pet_id'])
+    pets = [_shape(row) for row in rows]
+    if with_images:
+        attach_images(cursor, pets)
+    return pets, next_cursor
+
+
+def popular_pets(cursor, limit=20, status='available'):
+    """Most favorited pets from the maintained favorite_count (idx_pets_popular), with images"""
+    cursor.execute(f"""
+        SELECT {PET_COLUMNS}, {SELLER_COLUMNS}
+        FROM pets p
+        LEFT JOIN users u ON u.user_id = p.seller_id
+        WHERE p.status = %s
+        ORDER BY p.favorite_count DESC, p.pet_id DESC
+        LIMIT %s
+    """, (status, limit))
+    pets = [_shape(row) for row in cursor.fetchall()]
+    return attach_images(cursor, pets)
+
+
+def get_pet(cursor, pet_id):
+    """A pet with its seller, description and images (two queries), None if missing"""
+    cursor.execute(f"""
+        SELECT {PET_COLUMNS}, p.description, p.updated_at, {SELLER_COLUMNS}
+        FROM pets p
+        LEFT JOIN users u ON u.user_id = p.seller_id
+        WHERE p.pet_id = %s
+    """, (pet_id,))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    pet = _shape(row)
+    pet['updated_at'] = pet['updated_at'].isoformat() if pet['updated_at'] else None
+    attach_images(cursor, [pet])
+    return pet
+
+
+# ========== WRITES ==========
+def sync_primary_images(cursor, pet_ids):
+    """Copy each pet's primary image URL onto pets.primary_image_url
+
+    The primary image is the one flagged is_primary, else the oldest image;
+    pets without images get NULL. One UPDATE for all `pet_ids`.
+    """
+    if not pet_ids:
+        return 0
+    cursor.execute(f"""
+        UPDATE pets p
+        SET p.primary_image_url = (
+            SELECT i.image_url FROM pet_images i
+            WHERE i.pet_id = p.pet_id
+            ORDER BY i.is_primary DESC, i.image_id
+            LIMIT 1
+        )
+        WHERE p.pet_id IN ({', '.join(['%s'] * len(pet_ids))})
+    """, list(pet_ids))
+    return cursor.rowcount
+
+
+def add_images(cursor, pet_id, image_urls, make_primary=False):
+    """Insert images for a pet in one statement; the first becomes primary if asked"""
+    if not image_urls:
+        return
+    if make_primary:
+        cursor.execute("UPDATE pet_images SET is_primary = FALSE WHERE pet_id = %s AND is_primary = TRUE", (pet_id,))
+    values = []
+    for index, url in enumerate(image_urls):
+        values.extend([pet_id, url, bool(make_primary and index == 0)])
+    cursor.execute(f"""
+        INSERT INTO pet_images (pet_id, image_url, is_primary)
+        VALUES {', '.join(['(%s, %s, %s)'] * len(image_urls))}
+    """, values)
+    sync_primary_images(cursor, [pet_id])
+
+
+def set_primary_image(cursor, pet_id, image_id):
+    """Make one image the primary; returns False if it is not an image of this pet"""
+    cursor.execute("SELECT 1 FROM pet_images WHERE pet_id = %s AND image_id = %s", (pet_id, image_id))
+    if not cursor.fetchone():
+        return False
+    cursor.execute("""
+        UPDATE pet_images SET is_primary = (image_id = %s)
+        WHERE pet_id = %s
+    """, (image_id, pet_id))
+    sync_primary_images(cursor, [pet_id])
+    return True
+
+
+def delete_image(cursor, pet_id, image_id):
+    """Remove an image; the next one takes over as primary. Returns its URL or None"""
+    cursor.execute("SELECT image_url FROM pet_images WHERE pet_id = %s AND image_id = %s", (pet_id, image_id))
+    row = cursor.fetchone()
+    if not row:
+        return None
+    cursor.execute("DELETE FROM pet_images WHERE image_id = %s", (image_id,))
+    sync_primary_images(cursor, [pet_id])
+    return row['image_url']
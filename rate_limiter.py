@@ -0,0 +1,213 @@
+"""
+Rate limiting for PetNest Network
+Token buckets (request rate) and sliding-window counters (failed attempts),
+kept in a sharded in-memory store or a shared Redis store for multi-node
+deployments. Checks are pure in-memory arithmetic so over-limit requests are
+rejected before any database or bcrypt work.
+"""
+
+import itertools
+import math
+import threading
+import time
+from collections import namedtuple
+
+try:
+    import redis
+except ImportError:  # Only needed for RATE_LIMIT_BACKEND=redis
+    redis = None
+
+Decision = namedtuple('Decision', ['allowed', 'retry_after'])
+
+ALLOW = Decision(True, 0.0)
+
+
+# ========== STORES ==========
+class ShardedMemoryStore:
+    """Per-process store split into independently locked shards to keep lock contention low"""
+
+    def __init__(self, shards=64, max_keys_per_shard=20000, low_water=0.9):
+        self._shards = [({}, threading.Lock()) for _ in range(shards)]
+        self.max_keys_per_shard = max_keys_per_shard
+        # A prune always frees at least a tenth of the shard, so a stream of new
+        # keys scans it once per that many inserts rather than on every one
+        self.low_water_keys = int(max_keys_per_shard * low_water)
+
+    def _shard(self, key):
+        return self._shards[hash(key) % len(self._shards)]
+
+    def _prune(self, entries, now):
+        """Drop entries that are back at their initial state, then the oldest inserted down to the low-water mark"""
+        for key in [k for k, v in entries.items() if v[-1] <= now]:
+            del entries[key]
+        overflow = len(entries) - self.low_water_keys
+        if overflow > 0:
+            for key in list(itertools.islice(entries, overflow)):
+                del entries[key]
+
+    def take(self, key, capacity, rate, now, cost=1):
+        """Token bucket: returns (allowed, seconds until a token is available)"""
+        entries, lock = self._shard(key)
+        with lock:
+            state = entries.get(key)
+            if state is None:
+                if len(entries) >= self.max_keys_per_shard:
+                    self._prune(entries, now)
+                tokens = capacity
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed = True
+            else:
+                allowed = False
+            # Last element is when the bucket will be full again (safe to forget)
+            entries[key] = (tokens, now, now + (capacity - tokens) / rate)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def window_count(self, key, window, now, add=0):
+        """Sliding-window counter: weighted previous window plus the current one"""
+        index = int(now // window)
+        entries, lock = self._shard(key)
+        with lock:
+            state = entries.get(key)
+            if state is None or state[0] < index - 1:
+                if state is None and len(entries) >= self.max_keys_per_shard:
+                    self._prune(entries, now)
+                previous, current = 0, 0
+            elif state[0] == index - 1:
+                previous, current = state[2], 0
+            else:
+                previous, current = state[1], state[2]
+            current += add
+            if add or state is not None:
+                entries[key] = (index, previous, current, (index + 2) * window)
+        elapsed = (now % window) / window
+        return previous * (1 - elapsed) + current
+
+    def reset(self, key):
+        entries, lock = self._shard(key)
+        with lock:
+            entries.pop(key, None)
+
+    def size(self):
+        return sum(len(entries) for entries, _ in self._shards)
+
+
+class RedisStore:
+    """Shared store so every node enforces the same limits"""
+
+    _TAKE_SCRIPT = """
+        local capacity = tonumber(ARGV[1])
+        local rate = tonumber(ARGV[2])
+        local now = tonumber(ARGV[3])
+        local cost = tonumber(ARGV[4])
+        local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+        local allowed = 0
+        if tokens >= cost then
+            tokens = tokens - cost
+            allowed = 1
+        end
+        redis.call('HSET', KEYS[1], 't', tostring(tokens), 'ts', tostring(now))
+        redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+        return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url, prefix='petnest:rl:'):
+        if redis is None:
+            raise RuntimeError('RATE_LIMIT_BACKEND=redis requires the redis package')
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(self._TAKE_SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, capacity, rate, now, cost=1):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate, now, cost])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (cost - tokens) / rate
+
+    def window_count(self, key, window, now, add=0):
+        index = int(now // window)
+        current_key = f"{self.prefix}{key}:{index}"
+        pipe = self._client.pipeline()
+        if add:
+            pipe.incrby(current_key, add)
+            pipe.expire(current_key, int(window * 2))
+        else:
+            pipe.get(current_key)
+        pipe.get(f"{self.prefix}{key}:{index - 1}")
+        results = pipe.execute()
+        current = int(results[0] or 0)
+        previous = int(results[-1] or 0)
+        elapsed = (now % window) / window
+        return previous * (1 - elapsed) + current
+
+    def reset(self, key):
+        self._client.delete(self.prefix + key)
+        for keys in self._client.scan_iter(match=f"{self.prefix}{key}:*", count=100):
+            self._client.delete(keys)
+
+    def size(self):
+        return None
+
+
+# ========== LIMITER ==========
+class RateLimiter:
+    """Named rules over a store, with per-rule metrics"""
+
+    def __init__(self, store, clock=None):
+        self.store = store
+        self.clock = clock or (time.time if isinstance(store, RedisStore) else time.monotonic)
+        self._rules = {}
+        self._metrics = {}
+
+    def bucket(self, name, capacity, per_seconds):
+        """Allow bursts of `capacity` requests, refilled evenly over `per_seconds`"""
+        self._rules[name] = ('bucket', capacity, capacity / float(per_seconds))
+        self._metrics[name] = {'allowed': 0, 'rejected': 0, 'recorded': 0}
+
+    def window(self, name, limit, window_seconds):
+        """Reject once `limit` recorded events fall within the last `window_seconds`"""
+        self._rules[name] = ('window', limit, float(window_seconds))
+        self._metrics[name] = {'allowed': 0, 'rejected': 0, 'recorded': 0}
+
+    def check(self, name, key):
+        """Consume a token (bucket) or test the counter (window) for key"""
+        kind, limit, param = self._rules[name]
+        now = self.clock()
+        store_key = f"{name}:{key}"
+        if kind == 'bucket':
+            allowed, retry_after = self.store.take(store_key, limit, param, now)
+        else:
+            allowed = self.store.window_count(store_key, param, now) < limit
+            retry_after = 0.0 if allowed else param - (now % param)
+        metrics = self._metrics[name]
+        if allowed:
+            metrics['allowed'] += 1
+            return ALLOW
+        metrics['rejected'] += 1
+        return Decision(False, retry_after)
+
+    def record(self, name, key):
+        """Count an event (e.g. a failed login) against a window rule"""
+        _, _, window = self._rules[name]
+        self.store.window_count(f"{name}:{key}", window, self.clock(), add=1)
+        self._metrics[name]['recorded'] += 1
+
+    def reset(self, name, key):
+        self.store.reset(f"{name}:{key}")
+
+    def stats(self):
+        """Per-rule counters for the health endpoint"""
+        return {
+            'backend': type(self.store).__name__,
+            'tracked_keys': self.store.size(),
+            'rules': {name: dict(metrics) for name, metrics in self._metrics.items()}
+        }
+
+
+def retry_after_header(decision):
+    """Whole seconds for the Retry-After header"""
+    return str(max(1, int(math.ceil(decision.retry_after))))
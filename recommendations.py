@@ -0,0 +1,357 @@
+"""
+Pet recommendations for PetNest Network
+Every available pet is encoded as a fixed set of one-hot feature indices
+(animal type, breed, age band, gender, size band, health, vaccination,
+spay/neuter, seller city, price band) held as one (fields x pets) int16
+matrix. An adopter's preference vector is built from the pets they
+favorited or applied for, normalized per field, so scoring all pets is one
+vectorised pass: preference[codes[f]] gathered and added for each field.
+The best results per adopter are cached; changed pets arrive from
+pets.updated_at polling.
+"""
+
+import bisect
+import datetime
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+# field -> buckets; bucket 0 is "unknown" for every field
+FIELDS = (
+    ('animal_type', 32),
+    ('breed', 256),
+    ('age', 6),
+    ('gender', 4),
+    ('size', 5),
+    ('health', 5),
+    ('vaccinated', 2),
+    ('spayed', 2),
+    ('city', 64),
+    ('price', 6),
+)
+
+# How much a perfect match on each field counts
+WEIGHTS = {'animal_type': 3.0, 'breed': 2.0, 'city': 1.5, 'age': 1.0, 'size': 1.0, 'price': 1.0,
+           'gender': 0.5, 'health': 0.5, 'vaccinated': 0.5, 'spayed': 0.25}
+
+OFFSETS = {}
+DIM = 0
+for _name, _size in FIELDS:
+    OFFSETS[_name] = DIM
+    DIM += _size
+
+AGE_EDGES = (6, 12, 36, 84)        # months
+SIZE_EDGES = (5, 10, 25)           # kg
+PRICE_EDGES = (1, 5000, 20000, 50000)
+GENDERS = {'male': 1, 'female': 2, 'unknown': 3}
+HEALTH = {'excellent': 1, 'good': 2, 'fair': 3, 'poor': 4}
+
+# Pets nobody has a preference signal for are still ordered: well-kept and popular first
+PRIOR = np.zeros(DIM, dtype=np.float32)
+PRIOR[OFFSETS['health'] + HEALTH['excellent']] = 0.2
+PRIOR[OFFSETS['health'] + HEALTH['good']] = 0.1
+PRIOR[OFFSETS['vaccinated'] + 1] = 0.1
+POPULARITY_WEIGHT = 0.3
+
+# interaction -> weight in the preference vector
+FAVORITE = 1.0
+APPLIED = 2.0
+ADOPTED = 3.0
+HISTORY_LIMIT = 500
+
+COLUMNS = """p.pet_id, p.seller_id, p.animal_type, p.breed, p.age, p.gender, p.weight, p.health_status,
+             p.vaccination_status, p.spayed_neutered, p.price, p.favorite_count, u.city"""
+
+
+def _hashed(value, size):
+    """Stable bucket for free-text values (same in every worker), 0 for empty"""
+    if value is None:
+        return 0
+    value = str(value).strip().lower()
+    if not value:
+        return 0
+    return 1 + zlib.crc32(value.encode('utf-8')) % (size - 1)
+
+
+def _band(value, edges):
+    if value is None:
+        return 0
+    return 1 + bisect.bisect_right(edges, float(value))
+
+
+def encode(row):
+    """Pet row (pet_id, seller_id, animal_type, ..., favorite_count, city) -> global feature indices"""
+    (_, _, animal_type, breed, age, gender, weight, health, vaccinated, spayed, price, _, city) = row
+    local = (
+        _hashed(animal_type, 32),
+        _hashed(breed, 256),
+        _band(age, AGE_EDGES),
+        GENDERS.get(gender, 0),
+        _band(weight, SIZE_EDGES),
+        HEALTH.get(health, 0),
+        1 if vaccinated else 0,
+        1 if spayed else 0,
+        _hashed(city, 64),
+        _band(price, PRICE_EDGES),
+    )
+    return [OFFSETS[name] + code for (name, _), code in zip(FIELDS, local)]
+
+
+def preference_vector(codes, weights):
+    """Weighted one-hot counts per field, each field scaled to sum to its WEIGHTS entry
+
+    codes: (interactions x fields) feature indices; weights: one per interaction.
+    """
+    preference = np.zeros(DIM, dtype=np.float32)
+    if len(codes):
+        codes = np.asarray(codes, dtype=np.intp)
+        weights = np.asarray(weights, dtype=np.float32)
+        np.add.at(preference, codes.ravel(), np.repeat(weights, codes.shape[1]))
+        for name, size in FIELDS:
+            block = preference[OFFSETS[name]:OFFSETS[name] + size]
+            # "Unknown" is not a taste: it never earns points
+            block[0] = 0
+            total = block.sum()
+            if total > 0:
+                block *= WEIGHTS[name] / total
+    return preference + PRIOR
+
+
+class PetMatrix:
+    """Sorted pet ids with their feature codes, seller and popularity; replaced wholesale on change
+
+    codes is field-major (one contiguous row per field), which makes the
+    per-field gathers in score() sequential reads.
+    """
+
+    def __init__(self, ids=None, codes=None, sellers=None, popularity=None):
+        self.ids = ids if ids is not None else np.zeros(0, dtype=np.int64)
+        self.codes = codes if codes is not None else np.zeros((len(FIELDS), 0), dtype=np.int16)
+        self.sellers = sellers if sellers is not None else np.zeros(0, dtype=np.int64)
+        self.popularity = popularity if popularity is not None else np.zeros(0, dtype=np.float32)
+        # Popularity term of the score, the same for every adopter
+        top = self.popularity.max() if len(self.popularity) else 0
+        self.boost = (POPULARITY_WEIGHT * np.log1p(self.popularity) / np.log1p(top)).astype(np.float32) if top > 0 \
+            else np.zeros(len(self.ids), dtype=np.float32)
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = sorted(rows, key=lambda row: row[0])
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        codes = np.ascontiguousarray(np.array([encode(row) for row in rows], dtype=np.int16)
+                                     .reshape(len(rows), len(FIELDS)).T)
+        sellers = np.fromiter((row[1] or 0 for row in rows), dtype=np.int64, count=len(rows))
+        favorites = np.fromiter((row[11] or 0 for row in rows), dtype=np.float32, count=len(rows))
+        return cls(ids, codes, sellers, favorites)
+
+    def merged(self, rows, removed_ids):
+        """New matrix with `rows` upserted and `removed_ids` (plus the rows' own ids) dropped"""
+        changed = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        drop = np.concatenate([changed, np.asarray(list(removed_ids), dtype=np.int64)])
+        keep = ~np.isin(self.ids, drop)
+        fresh = PetMatrix.from_rows(rows)
+        ids = np.concatenate([self.ids[keep], fresh.ids])
+        order = np.argsort(ids, kind='stable')
+        return PetMatrix(ids[order],
+                         np.ascontiguousarray(np.concatenate([self.codes[:, keep], fresh.codes], axis=1)[:, order]),
+                         np.concatenate([self.sellers[keep], fresh.sellers])[order],
+                         np.concatenate([self.popularity[keep], fresh.popularity])[order])
+
+    def positions(self, pet_ids):
+        """Row positions of the given ids that are present"""
+        pet_ids = np.asarray(pet_ids, dtype=np.int64)
+        if not len(self.ids) or not len(pet_ids):
+            return np.zeros(0, dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.ids, pet_ids), len(self.ids) - 1)
+        return positions[self.ids[positions] == pet_ids]
+
+    def score(self, preference):
+        """Score every pet in one vectorised pass"""
+        scores = self.boost.copy()
+        for field_codes in self.codes:
+            scores += preference[field_codes]
+        return scores
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.codes.nbytes + self.sellers.nbytes + self.popularity.nbytes + self.boost.nbytes
+
+
+class Recommender:
+    """Per-worker pet matrix plus an LRU of each adopter's best-scored pet ids"""
+
+    def __init__(self, get_connection, refresh_interval=30, cache_capacity=10000, cache_ttl=300, depth=200):
+        self._get_connection = get_connection
+        self.refresh_interval = refresh_interval
+        self.cache_capacity = cache_capacity
+        self.cache_ttl = cache_ttl
+        self.depth = depth  # ranked ids kept per adopter; pages beyond it are rescored
+        self.matrix = PetMatrix()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._changed_since = None
+        self.ready = False
+        self._metrics = {'hits': 0, 'misses': 0, 'scored': 0, 'score_ms_total': 0.0, 'score_ms_last': 0.0,
+                         'refreshes': 0, 'pets_applied': 0, 'errors': 0}
+
+    # ----- loading -----
+    def load(self):
+        """Encode every available pet, then switch to incremental refreshes"""
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT CURRENT_TIMESTAMP")
+            started_at = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT {COLUMNS} FROM pets p
+                LEFT JOIN users u ON u.user_id = p.seller_id
+                WHERE p.status = 'available'
+            """)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        self.matrix = PetMatrix.from_rows(rows)
+        with self._lock:
+            self._cache.clear()
+        self._changed_since = started_at - datetime.timedelta(seconds=5)
+        self.ready = True
+        return len(rows)
+
+    def refresh(self):
+        """Fold in pets changed since the last pass; ones no longer available drop out"""
+        if not self.ready:
+            return 0
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        try:
+            cursor.execute("SELECT CURRENT_TIMESTAMP")
+            started_at = cursor.fetchone()[0]
+            cursor.execute(f"""
+                SELECT {COLUMNS}, p.status FROM pets p
+                LEFT JOIN users u ON u.user_id = p.seller_id
+                WHERE p.updated_at >= %s
+            """, (self._changed_since,))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        if rows:
+            available = [row[:-1] for row in rows if row[-1] == 'available']
+            gone = [row[0] for row in rows if row[-1] != 'available']
+            # Readers keep using the old matrix until the new one is swapped in
+            self.matrix = self.matrix.merged(available, gone)
+            self._metrics['pets_applied'] += len(rows)
+        # Overlap a little so a change committed during this pass is seen next time
+        self._changed_since = started_at - datetime.timedelta(seconds=5)
+        self._metrics['refreshes'] += 1
+        return len(rows)
+
+    def start(self):
+        """Initial load plus a background refresh loop"""
+        def loop():
+            while True:
+                try:
+                    if not self.ready:
+                        count = self.load()
+                        print(f"✅ Recommendations loaded: {count} pets")
+                    else:
+                        self.refresh()
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    print(f"⚠️ Recommendation refresh failed: {e}")
+                time.sleep(self.refresh_interval)
+        threading.Thread(target=loop, name='recommendations-refresh', daemon=True).start()
+
+    # ----- adopters -----
+    def history(self, user_id):
+        """(feature codes, weights, pet ids) of the user's recent favorites and applications"""
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"""
+                SELECT {COLUMNS}, h.weight FROM (
+                    (SELECT pet_id, %s AS weight FROM favorites WHERE user_id = %s
+                     ORDER BY favorite_id DESC LIMIT %s)
+                    UNION ALL
+                    (SELECT pet_id, IF(status = 'completed', %s, %s) FROM adoptions WHERE adopter_id = %s
+                     ORDER BY adoption_id DESC LIMIT %s)
+                ) h
+                JOIN pets p ON p.pet_id = h.pet_id
+                LEFT JOIN users u ON u.user_id = p.seller_id
+            """, (FAVORITE, user_id, HISTORY_LIMIT, ADOPTED, APPLIED, user_id, HISTORY_LIMIT))
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        return [encode(row[:-1]) for row in rows], [float(row[-1]) for row in rows], [row[0] for row in rows]
+
+    def rank(self, user_id, codes, weights, seen, limit):
+        """Top `limit` (pet_id, score) for a preference built from codes/weights, skipping
+        pets in `seen` and the user's own listings"""
+        started = time.perf_counter()
+        matrix = self.matrix
+        if not len(matrix.ids):
+            return []
+        scores = matrix.score(preference_vector(codes, weights))
+        scores[matrix.sellers == user_id] = -np.inf
+        scores[matrix.positions(sorted(set(seen)))] = -np.inf
+        k = min(limit, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Highest score first, newer (higher) pet id breaks ties
+        top = top[np.lexsort((-matrix.ids[top], -scores[top]))]
+        ranked = [(int(matrix.ids[i]), float(scores[i])) for i in top if scores[i] != -np.inf]
+        elapsed = (time.perf_counter() - started) * 1000
+        self._metrics['scored'] += 1
+        self._metrics['score_ms_total'] += elapsed
+        self._metrics['score_ms_last'] = round(elapsed, 3)
+        return ranked
+
+    def recommend(self, user_id, limit=20, offset=0):
+        """Best available pets for an adopter as [(pet_id, score)], from cache when fresh"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry and entry[1] + self.cache_ttl > now and offset + limit <= self.depth:
+                self._cache.move_to_end(user_id)
+                self._metrics['hits'] += 1
+                ranked = entry[0]
+            else:
+                ranked = None
+        if ranked is None:
+            self._metrics['misses'] += 1
+            codes, weights, seen = self.history(user_id)
+            ranked = self.rank(user_id, codes, weights, seen, max(self.depth, offset + limit))
+            with self._lock:
+                self._cache[user_id] = (ranked, now)
+                self._cache.move_to_end(user_id)
+                while len(self._cache) > self.cache_capacity:
+                    self._cache.popitem(last=False)
+        # Pets adopted or withdrawn since the ranking was cached are skipped
+        matrix = self.matrix
+        still = set(matrix.ids[matrix.positions([pet_id for pet_id, _ in ranked])].tolist())
+        return [(pet_id, score) for pet_id, score in ranked if pet_id in still][offset:offset + limit]
+
+    def forget(self, user_id):
+        """Drop a user's cached ranking after they favorite or apply"""
+        with self._lock:
+            self._cache.pop(user_id, None)
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['score_ms_total'] = round(stats['score_ms_total'], 3)
+        stats['ready'] = self.ready
+        stats['pets'] = len(self.matrix.ids)
+        stats['bytes'] = self.matrix.nbytes
+        with self._lock:
+            stats['cached_users'] = len(self._cache)
+        return stats
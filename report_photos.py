@@ -0,0 +1,180 @@
+"""
+Report photo storage for PetNest Network
+Per-photo rows in report_photos (dimensions, size, content hash, thumbnail)
+instead of the comma-separated animal_reports.photos column.
+"""
+
+import hashlib
+import io
+import os
+import struct
+
+try:
+    from PIL import Image
+except ImportError:  # Thumbnails are skipped without Pillow; metadata still works
+    Image = None
+
+THUMBNAIL_SIZE = (320, 320)
+
+
+# ========== IMAGE METADATA ==========
+def _jpeg_size(data):
+    """Read width/height from the first SOF marker of a JPEG"""
+    pos = 2
+    while pos + 9 < len(data):
+        if data[pos] != 0xFF:
+            pos += 1
+            continue
+        marker = data[pos + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            pos += 2
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None, None
+
+
+def image_format(data):
+    """'png' or 'jpg' from the file signature, None for anything else"""
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'png'
+    if data[:2] == b'\xff\xd8':
+        return 'jpg'
+    return None
+
+
+def image_dimensions(data):
+    """Width/height of PNG or JPEG bytes, (None, None) if unknown"""
+    kind = image_format(data)
+    if kind == 'png' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if kind == 'jpg':
+        return _jpeg_size(data)
+    return None, None
+
+
+def describe_image(file_path):
+    """Size, content hash and dimensions for a stored photo"""
+    with open(file_path, 'rb') as f:
+        return describe_bytes(f.read())
+
+
+def describe_bytes(data):
+    """Size, content hash, format and dimensions of photo bytes"""
+    width, height = image_dimensions(data)
+    return {
+        'format': image_format(data),
+        'size_bytes': len(data),
+        'content_hash': hashlib.sha256(data).hexdigest(),
+        'width': width,
+        'height': height
+    }
+
+
+def make_thumbnail(file_path, thumb_dir):
+    """Write a JPEG thumbnail next to the uploads, returns its file name or None"""
+    if Image is None:
+        return None
+    try:
+        os.makedirs(thumb_dir, exist_ok=True)
+        thumb_name = os.path.splitext(os.path.basename(file_path))[0] + '.jpg'
+        with Image.open(file_path) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            img.convert('RGB').save(os.path.join(thumb_dir, thumb_name), 'JPEG', quality=80)
+        return thumb_name
+    except Exception as e:
+        print(f"⚠️ Thumbnail failed for {file_path}: {e}")
+        return None
+
+
+def thumbnail_bytes(data):
+    """JPEG thumbnail of photo bytes, None without Pillow or for unreadable images"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.thumbnail(THUMBNAIL_SIZE)
+            out = io.BytesIO()
+            img.convert('RGB').save(out, 'JPEG', quality=80)
+            return out.getvalue()
+    except Exception as e:
+        print(f"⚠️ Thumbnail failed: {e}")
+        return None
+
+
+# ========== DATABASE ==========
+def insert_report_photos(cursor, report_id, photos):
+    """Insert all photos of a report in one multi-row INSERT
+
+    photos: list of dicts with file_path plus optional thumbnail_path, width,
+    height, size_bytes, content_hash, phash (position is the list order).
+    """
+    if not photos:
+        return
+    rows = [(
+        report_id,
+        position,
+        photo['file_path'],
+        photo.get('thumbnail_path'),
+        photo.get('width'),
+        photo.get('height'),
+        photo.get('size_bytes'),
+        photo.get('content_hash'),
+        photo.get('phash')
+    ) for position, photo in enumerate(photos)]
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    cursor.execute(f"""
+        INSERT INTO report_photos
+        (report_id, position, file_path, thumbnail_path, width, height, size_bytes, content_hash, phash)
+        VALUES {placeholders}
+    """, [value for row in rows for value in row])
+
+
+def backfill_photo_metadata(get_connection, static_root, batch_size=200):
+    """Fill width/height/size/hash/thumbnail for rows created by the SQL backfill
+
+    Works through report_photos in primary-key order, one batch per
+    transaction, and returns the number of rows updated.
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        connection = get_connection()
+        if not connection:
+            break
+        cursor = connection.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT photo_id, file_path FROM report_photos
+                WHERE photo_id > %s AND content_hash IS NULL
+                ORDER BY photo_id LIMIT %s
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            changes = []
+            for row in rows:
+                last_id = row['photo_id']
+                local_path = os.path.join(static_root, row['file_path'].replace('/static/', '', 1).lstrip('/'))
+                if not os.path.exists(local_path):
+                    continue
+                meta = describe_image(local_path)
+                thumb = make_thumbnail(local_path, os.path.join(os.path.dirname(local_path), 'thumbs'))
+                thumb_path = row['file_path'].rsplit('/', 1)[0] + '/thumbs/' + thumb if thumb else None
+                changes.append((meta['width'], meta['height'], meta['size_bytes'],
+                                meta['content_hash'], thumb_path, row['photo_id']))
+            if changes:
+                cursor.executemany("""
+                    UPDATE report_photos
+                    SET width = %s, height = %s, size_bytes = %s, content_hash = %s, thumbnail_path = %s
+                    WHERE photo_id = %s
+                """, changes)
+                connection.commit()
+                updated += len(changes)
+        finally:
+            cursor.close()
+            connection.close()
+    return updated
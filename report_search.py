@@ -0,0 +1,133 @@
+"""
+Report search for PetNest Network
+Staff search over animal report text uses the InnoDB FULLTEXT index
+ft_reports_text (description, street, region) instead of LIKE '%...%'
+scans. MATCH ... AGAINST ranks reports by relevance and the status, city,
+condition and date filters are applied to the matches in the same query.
+InnoDB updates the index when a report is inserted or edited, so results
+are as current as the commit. Snippets are cut from the description around
+the matched words, with the words wrapped in <mark>.
+"""
+
+import html
+import re
+
+MATCH = "MATCH(r.description, r.street, r.region)"
+MIN_TERM = 3  # innodb_ft_min_token_size
+# InnoDB's default stopword list (words of MIN_TERM letters or more); they are not indexed
+STOPWORDS = {'about', 'are', 'com', 'for', 'from', 'how', 'that', 'the', 'this', 'was', 'what', 'when',
+             'where', 'who', 'will', 'with', 'und', 'www'}
+MAX_TERMS = 10
+SNIPPET_WIDTH = 160
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_query(text):
+    """Lower-cased search words long enough to be indexed; ValueError if none are"""
+    terms = []
+    for word in _WORD.findall((text or '').lower()):
+        if len(word) >= MIN_TERM and word not in STOPWORDS and word not in terms:
+            terms.append(word)
+    if not terms:
+        raise ValueError(f'Search for at least one word of {MIN_TERM} or more letters')
+    return terms[:MAX_TERMS]
+
+
+def boolean_query(terms, match_all=False):
+    """BOOLEAN MODE query: each term also matches as a prefix (injur* -> injured, injury)"""
+    return ' '.join(('+' if match_all else '') + term + '*' for term in terms)
+
+
+def _matches(word, terms):
+    return any(word.startswith(term) for term in terms)
+
+
+def snippet(text, terms, width=SNIPPET_WIDTH):
+    """HTML-escaped excerpt of `text` around the densest run of matched words, matches in <mark>"""
+    if not text:
+        return ''
+    words = list(_WORD.finditer(text))
+    hits = [match for match in words if _matches(match.group().lower(), terms)]
+    if not hits:
+        start, end = 0, min(len(text), width)
+    else:
+        # Window start that covers the most hits within `width` characters
+        best_start, best_count = hits[0].start(), 0
+        j = 0
+        for i, hit in enumerate(hits):
+            while j < len(hits) and hits[j].end() - hit.start() <= width:
+                j += 1
+            if j - i > best_count:
+                best_start, best_count = hit.start(), j - i
+        # Centre the hits a little instead of starting on the first one
+        start = max(0, best_start - width // 4)
+        end = min(len(text), start + width)
+        start = max(0, end - width)
+    # Snap to word boundaries
+    if start > 0:
+        space = text.find(' ', start)
+        start = space + 1 if 0 <= space < start + 20 else start
+    if end < len(text):
+        space = text.rfind(' ', start, end)
+        end = space if space > start else end
+
+    parts = []
+    position = start
+    for match in words:
+        if match.start() < start or match.end() > end or not _matches(match.group().lower(), terms):
+            continue
+        parts.append(html.escape(text[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        position = match.end()
+    parts.append(html.escape(text[position:end]))
+    return ('…' if start > 0 else '') + ''.join(parts).strip() + ('…' if end < len(text) else '')
+
+
+def search(cursor, text, statuses=None, city=None, condition=None, since=None, until=None,
+           shelter_id=None, match_all=False, limit=20, offset=0):
+    """Ranked reports matching `text`; returns (reports, has_more)
+
+    shelter_id limits results to reports a shelter may see: unassigned
+    pending ones and those assigned to it. Expects a dictionary cursor.
+    """
+    terms = parse_query(text)
+    query = boolean_query(terms, match_all)
+    clauses = [f"{MATCH} AGAINST (%s IN BOOLEAN MODE)"]
+    params = [query]
+    if statuses:
+        clauses.append(f"r.status IN ({', '.join(['%s'] * len(statuses))})")
+        params.extend(statuses)
+    if city:
+        clauses.append("r.city = %s")
+        params.append(city)
+    if condition:
+        clauses.append("r.animal_condition = %s")
+        params.append(condition)
+    if since:
+        clauses.append("r.reported_at >= %s")
+        params.append(since)
+    if until:
+        clauses.append("r.reported_at < %s")
+        params.append(until)
+    if shelter_id is not None:
+        clauses.append("(r.assigned_to = %s OR (r.assigned_to IS NULL AND r.status = 'pending'))")
+        params.append(shelter_id)
+    cursor.execute(f"""
+        SELECT r.report_id, r.animal_type, r.breed, r.animal_condition, r.urgency_level, r.status,
+               r.city, r.region AS area, r.street, r.description, r.reported_at, r.assigned_to,
+               {MATCH} AGAINST (%s IN BOOLEAN MODE) AS relevance
+        FROM animal_reports r
+        WHERE {' AND '.join(clauses)}
+        ORDER BY relevance DESC, r.report_id DESC
+        LIMIT %s OFFSET %s
+    """, [query] + params + [limit + 1, offset])
+    rows = cursor.fetchall()
+    has_more = len(rows) > limit
+    reports = []
+    for row in rows[:limit]:
+        row['snippet'] = snippet(row.pop('description'), terms)
+        row['relevance'] = round(float(row['relevance']), 4)
+        row['reported_at'] = row['reported_at'].isoformat() if row['reported_at'] else None
+        reports.append(row)
+    return reports, has_more
@@ -0,0 +1,218 @@
+"""
+Report status history and SLA rollups for PetNest Network
+Every status change appends a row to report_status_events carrying the time
+the report spent in its previous status. A background aggregator folds new
+events (tracked by a gap-safe event_id watermark, see watermarks.py) into
+fixed histogram buckets in report_sla_rollup per city, per shelter and
+overall, so p50/p90 time in each status is read from a handful of rollup
+rows instead of scanning events.
+"""
+
+import bisect
+import threading
+from collections import defaultdict
+
+import watermarks
+from outbox import emit_select
+
+# Histogram bucket upper bounds in seconds (last bucket is open-ended)
+BUCKET_BOUNDS = [
+    60, 300, 900, 1800, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 7 * 86400, 14 * 86400, 30 * 86400
+]
+
+# Assignment list used by every status UPDATE: MySQL applies single-table
+# assignments left to right, so last_status_seconds sees the old
+# status_changed_at before it is reset.
+STATUS_CHANGE_SET = (
+    "last_status_seconds = TIMESTAMPDIFF(SECOND, status_changed_at, CURRENT_TIMESTAMP), "
+    "status_changed_at = CURRENT_TIMESTAMP"
+)
+
+
+def bucket_for(seconds):
+    return bisect.bisect_left(BUCKET_BOUNDS, max(seconds, 0))
+
+
+# ========== EVENT WRITES ==========
+def record_status_events(cursor, report_ids, from_status, shelter_id=None):
+    """Append events for reports whose status was just changed by STATUS_CHANGE_SET
+
+    Runs in the caller's transaction right after the UPDATE; the rows are
+    already locked by it, and the new status/duration are read back from them.
+    The same change goes to the outbox as report.status_changed.
+    """
+    if not report_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(report_ids))
+    cursor.execute(f"""
+        INSERT INTO report_status_events
+        (report_id, from_status, to_status, shelter_id, city, seconds_in_status)
+        SELECT report_id, %s, status, %s, city, last_status_seconds
+        FROM animal_reports WHERE report_id IN ({placeholders})
+    """, [from_status, shelter_id] + list(report_ids))
+    emit_select(cursor, 'report', 'report.status_changed', 'report_id', {
+        'report_id': 'report_id', 'reporter_id': 'reporter_id', 'from_status': '%s', 'to_status': 'status',
+        'shelter_id': 'assigned_to', 'city': 'city'
+    }, f"FROM animal_reports WHERE report_id IN ({placeholders})", [from_status] + list(report_ids))
+
+
+def record_report_created(cursor, report_id):
+    """First event of a report (no previous status)"""
+    cursor.execute("""
+        INSERT INTO report_status_events (report_id, from_status, to_status, city)
+        SELECT report_id, NULL, status, city FROM animal_reports WHERE report_id = %s
+    """, (report_id,))
+
+
+# ========== AGGREGATOR ==========
+class SlaAggregator:
+    """Folds new status events into report_sla_rollup, exactly once per event"""
+
+    WATERMARK = 'report_sla'
+
+    def __init__(self, get_connection, interval=10, batch_size=5000):
+        self._get_connection = get_connection
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._metrics = {'runs': 0, 'events_applied': 0, 'last_event_id': 0, 'open_gaps': 0, 'errors': 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='sla-aggregator', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                while self.run_once() == self.batch_size:
+                    pass
+            except Exception as e:
+                self._metrics['errors'] += 1
+                print(f"⚠️ SLA aggregator error: {e}")
+
+    def run_once(self):
+        """Apply one batch of events; the rollup and the watermark commit together"""
+        with self._lock:
+            connection = self._get_connection()
+            if not connection:
+                return 0
+            cursor = connection.cursor()
+            try:
+                watermark = (watermarks.read(connection, self.WATERMARK)
+                             or watermarks.Watermark(0, (), *watermarks.step_of(connection)))
+                condition, params = watermark.condition('event_id')
+                cursor.execute(f"""
+                    SELECT event_id, from_status, shelter_id, city, seconds_in_status
+                    FROM report_status_events
+                    WHERE {condition}
+                    ORDER BY event_id LIMIT %s
+                """, params + [self.batch_size])
+                events = cursor.fetchall()
+                if not events:
+                    connection.commit()  # keeps the gaps read() expired
+                    return 0
+
+                # (scope, scope_key, status, bucket) -> [count, total_seconds]
+                deltas = defaultdict(lambda: [0, 0])
+                for _, from_status, shelter_id, city, seconds in events:
+                    if not from_status or seconds is None:
+                        continue
+                    bucket = bucket_for(seconds)
+                    scopes = [('all', '')]
+                    if city:
+                        scopes.append(('city', city))
+                    if shelter_id:
+                        scopes.append(('shelter', str(shelter_id)))
+                    for scope, key in scopes:
+                        delta = deltas[(scope, key, from_status, bucket)]
+                        delta[0] += 1
+                        delta[1] += seconds
+
+                if deltas:
+                    rows = [key + tuple(value) for key, value in deltas.items()]
+                    cursor.execute(f"""
+                        INSERT INTO report_sla_rollup (scope, scope_key, status, bucket, event_count, total_seconds)
+                        VALUES {', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows))}
+                        ON DUPLICATE KEY UPDATE
+                        event_count = event_count + VALUES(event_count),
+                        total_seconds = total_seconds + VALUES(total_seconds)
+                    """, [value for row in rows for value in row])
+
+                opened, closed = watermark.advance([event[0] for event in events])
+                watermarks.save(connection, self.WATERMARK, watermark, opened, closed)
+                connection.commit()
+                self._metrics['runs'] += 1
+                self._metrics['events_applied'] += len(events)
+                self._metrics['last_event_id'] = watermark.last_id
+                self._metrics['open_gaps'] = len(watermark.gaps)
+                return len(events)
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+                connection.close()
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        return stats
+
+
+# ========== READS ==========
+def _percentile(counts, total, q):
+    """Interpolated percentile from bucket counts"""
+    target = q * total
+    cumulative = 0
+    for bucket, count in enumerate(counts):
+        if count and cumulative + count >= target:
+            lower = BUCKET_BOUNDS[bucket - 1] if bucket > 0 else 0
+            upper = BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else lower * 2
+            return round(lower + (upper - lower) * (target - cumulative) / count)
+        cumulative += count
+    return None
+
+
+def sla_percentiles(get_connection, scope='all', scope_key=''):
+    """Count, mean, p50 and p90 seconds per status for one scope, from rollup rows only"""
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT status, bucket, event_count, total_seconds FROM report_sla_rollup
+            WHERE scope = %s AND scope_key = %s
+        """, (scope, scope_key))
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+    histograms = defaultdict(lambda: [0] * (len(BUCKET_BOUNDS) + 1))
+    totals = defaultdict(int)
+    for status, bucket, count, seconds in rows:
+        histograms[status][bucket] += count
+        totals[status] += int(seconds)
+
+    result = {}
+    for status, counts in histograms.items():
+        count = sum(counts)
+        result[status] = {
+            'count': count,
+            'mean_seconds': round(totals[status] / count) if count else None,
+            'p50_seconds': _percentile(counts, count, 0.5),
+            'p90_seconds': _percentile(counts, count, 0.9)
+        }
+    return result
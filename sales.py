@@ -0,0 +1,134 @@
+"""
+Sales rollups for PetNest Network
+sales_daily holds revenue, units and order counts per store, product and
+day. Checkout adds to it in the order's own transaction, so the rollup is
+exactly as committed as the orders. The row with product_id 0 is the store
+total for the day (an order with three products counts once there).
+Dashboards read one store's date range from the primary key in a single
+query; backfill() recomputes days from orders/order_items.
+"""
+
+import datetime
+
+STORE_TOTAL = 0  # product_id of the per-store daily total row
+
+
+def record_order_sales(cursor, orders):
+    """Add just-placed orders to today's rollup rows (call inside the checkout transaction)
+
+    Rows are upserted in key order after checkout has locked the product
+    rows, so every checkout takes these locks in the same order.
+    """
+    rows = {}
+    for order in orders:
+        store_id = order['store_id']
+        total = rows.setdefault((store_id, STORE_TOTAL), [0, 0, 0])
+        total[0] += order['total_amount']
+        total[2] += 1
+        for item in order['items']:
+            revenue = item['unit_price'] * item['quantity']
+            product = rows.setdefault((store_id, item['product_id']), [0, 0, 0])
+            product[0] += revenue
+            product[1] += item['quantity']
+            product[2] += 1
+            total[1] += item['quantity']
+    if not rows:
+        return
+    keys = sorted(rows)
+    cursor.execute(f"""
+        INSERT INTO sales_daily (store_id, product_id, day, revenue, units, orders)
+        VALUES {', '.join(['(%s, %s, CURRENT_DATE, %s, %s, %s)'] * len(keys))}
+        ON DUPLICATE KEY UPDATE
+            revenue = revenue + VALUES(revenue),
+            units = units + VALUES(units),
+            orders = orders + VALUES(orders)
+    """, [value for key in keys for value in (key[0], key[1], round(rows[key][0], 2), rows[key][1], rows[key][2])])
+
+
+def store_dashboard(cursor, store_id, since, until):
+    """Totals, daily series and top products for one store from a single PK range read"""
+    cursor.execute("""
+        SELECT product_id, day, revenue, units, orders
+        FROM sales_daily
+        WHERE store_id = %s AND day BETWEEN %s AND %s
+    """, (store_id, since, until))
+    totals = {'revenue': 0.0, 'units': 0, 'orders': 0}
+    daily = {}
+    products = {}
+    for product_id, day, revenue, units, orders in cursor.fetchall():
+        revenue = float(revenue)
+        if product_id == STORE_TOTAL:
+            daily[day] = {'day': day.isoformat(), 'revenue': revenue, 'units': units, 'orders': orders}
+            totals['revenue'] += revenue
+            totals['units'] += units
+            totals['orders'] += orders
+        else:
+            product = products.setdefault(product_id, {'product_id': product_id, 'revenue': 0.0, 'units': 0, 'orders': 0})
+            product['revenue'] += revenue
+            product['units'] += units
+            product['orders'] += orders
+    # Zero-fill so charts get one point per day
+    series = []
+    day = since
+    while day <= until:
+        series.append(daily.get(day, {'day': day.isoformat(), 'revenue': 0.0, 'units': 0, 'orders': 0}))
+        day += datetime.timedelta(days=1)
+    totals['revenue'] = round(totals['revenue'], 2)
+    totals['average_order'] = round(totals['revenue'] / totals['orders'], 2) if totals['orders'] else 0
+    top = sorted(products.values(), key=lambda p: -p['revenue'])
+    for product in top:
+        product['revenue'] = round(product['revenue'], 2)
+    return {'totals': totals, 'daily': series, 'products': top}
+
+
+def backfill(get_connection, since=None, until=None):
+    """Recompute rollup rows from order history, one day per transaction; returns days rebuilt
+
+    Each day is replaced (DELETE + INSERT ... SELECT) in its own transaction,
+    so rerunning is safe and live checkouts only wait on the day being rebuilt.
+    Cancelled orders are left out.
+    """
+    connection = get_connection()
+    if not connection:
+        raise ConnectionError('Database unavailable')
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT DATE(MIN(order_date)), DATE(MAX(order_date)) FROM orders")
+        first, last = cursor.fetchone()
+        connection.commit()  # ends the implicit transaction the read opened (autocommit is off)
+        if not first:
+            return 0
+        day = max(first, since) if since else first
+        last = min(last, until) if until else last
+        days = 0
+        while day <= last:
+            start = datetime.datetime.combine(day, datetime.time())
+            end = start + datetime.timedelta(days=1)
+            connection.start_transaction()
+            cursor.execute("DELETE FROM sales_daily WHERE day = %s", (day,))
+            cursor.execute("""
+                INSERT INTO sales_daily (store_id, product_id, day, revenue, units, orders)
+                SELECT o.store_id, oi.product_id, %s, SUM(oi.subtotal), SUM(oi.quantity), COUNT(DISTINCT o.order_id)
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.order_id
+                WHERE o.order_date >= %s AND o.order_date < %s AND o.status != 'cancelled'
+                GROUP BY o.store_id, oi.product_id
+            """, (day, start, end))
+            cursor.execute("""
+                INSERT INTO sales_daily (store_id, product_id, day, revenue, units, orders)
+                SELECT o.store_id, %s, %s, SUM(oi.subtotal), SUM(oi.quantity), COUNT(DISTINCT o.order_id)
+                FROM orders o
+                JOIN order_items oi ON oi.order_id = o.order_id
+                WHERE o.order_date >= %s AND o.order_date < %s AND o.status != 'cancelled'
+                GROUP BY o.store_id
+            """, (STORE_TOTAL, day, start, end))
+            connection.commit()
+            days += 1
+            day += datetime.timedelta(days=1)
+        return days
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,454 @@
+"""
+Session storage engine for PetNest Network
+Single source of truth for login sessions: compact binary session records,
+an in-memory hot tier in front of a pluggable shared backend, and a
+background reaper that deletes expired sessions in throttled batches.
+The user_sessions table is defined in petnest_db.sql.
+
+Hot tiers are per worker, so every deletion (logout, revoke_user) is also
+logged in session_revocations; each store polls the log at most once per
+REVOCATION_POLL seconds and drops the revoked ids from its hot tier. The
+poll re-reads REVOCATION_OVERLAP extra seconds, which covers clock skew
+and a request that cached a record just before its revocation was read.
+"""
+
+import datetime
+import ipaddress
+import struct
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+# ========== RECORD ENCODING ==========
+RECORD_VERSION = 1
+MAX_AGENT_BYTES = 255
+
+REVOCATION_POLL = 1  # seconds between polls of the revocation log
+REVOCATION_OVERLAP = 5  # seconds re-read on every poll
+REVOCATION_KEEP = 600  # seconds a revocation is kept; must exceed the hot tier ttl
+
+# version, user_id, created_at, expires_at, ip (16 bytes, v4 is v6-mapped), agent length
+_HEADER = struct.Struct('!BIII16sB')
+
+SessionRecord = namedtuple('SessionRecord', ['user_id', 'created_at', 'expires_at', 'ip', 'agent'])
+
+
+def _pack_ip(ip):
+    """Pack an IPv4/IPv6 address into 16 bytes"""
+    try:
+        address = ipaddress.ip_address(ip or '')
+    except ValueError:
+        return bytes(16)
+    if address.version == 4:
+        address = ipaddress.IPv6Address('::ffff:' + str(address))
+    return address.packed
+
+
+def _unpack_ip(packed):
+    """Unpack 16 bytes back into an address string"""
+    if packed == bytes(16):
+        return None
+    address = ipaddress.IPv6Address(packed)
+    return str(address.ipv4_mapped or address)
+
+
+def encode_record(record):
+    """Encode a SessionRecord into its compact binary form"""
+    agent = (record.agent or '').encode('utf-8')[:MAX_AGENT_BYTES]
+    return _HEADER.pack(
+        RECORD_VERSION,
+        record.user_id,
+        record.created_at,
+        record.expires_at,
+        _pack_ip(record.ip),
+        len(agent)
+    ) + agent
+
+
+def decode_record(blob):
+    """Decode a binary session record, returns None for unknown versions"""
+    if not blob or len(blob) < _HEADER.size:
+        return None
+    version, user_id, created_at, expires_at, ip, agent_len = _HEADER.unpack_from(blob)
+    if version != RECORD_VERSION:
+        return None
+    agent = bytes(blob[_HEADER.size:_HEADER.size + agent_len]).decode('utf-8', 'ignore')
+    return SessionRecord(user_id, created_at, expires_at, _unpack_ip(ip), agent)
+
+
+# ========== BACKENDS ==========
+class MemorySessionBackend:
+    """Process-local backend, for single-worker setups and benchmarks"""
+
+    def __init__(self):
+        self._rows = {}
+        self._revoked = []  # (revoked_at, session_id)
+        self._lock = threading.Lock()
+
+    def put(self, session_id, user_id, expires_at, blob):
+        with self._lock:
+            self._rows[session_id] = (user_id, expires_at, blob)
+
+    def get(self, session_id, now):
+        row = self._rows.get(session_id)
+        if row and row[1] > now:
+            return row[2]
+        return None
+
+    def delete(self, session_id):
+        with self._lock:
+            self._rows.pop(session_id, None)
+            self._revoked.append((time.time(), session_id))
+
+    def revoke_user(self, user_id, keep=None):
+        with self._lock:
+            revoked = [sid for sid, row in self._rows.items() if row[0] == user_id and sid != keep]
+            for sid in revoked:
+                del self._rows[sid]
+            self._revoked.extend((time.time(), sid) for sid in revoked)
+        return revoked
+
+    def revoked_since(self, seconds):
+        cutoff = time.time() - seconds
+        return [sid for revoked_at, sid in list(self._revoked) if revoked_at >= cutoff]
+
+    def sweep(self, now, batch_size):
+        with self._lock:
+            expired = [sid for sid, row in self._rows.items() if row[1] <= now][:batch_size]
+            for sid in expired:
+                del self._rows[sid]
+            self._revoked = [(at, sid) for at, sid in self._revoked if at > now - REVOCATION_KEEP]
+        return len(expired)
+
+    def table_stats(self, now):
+        rows = list(self._rows.values())
+        return {
+            'rows': len(rows),
+            'expired_rows': sum(1 for row in rows if row[1] <= now),
+            'data_bytes': sum(len(row[2]) for row in rows),
+            'index_bytes': 0
+        }
+
+
+class MySQLSessionBackend:
+    """Shared backend on the user_sessions table, visible to every worker and node"""
+
+    def __init__(self, get_connection):
+        self._get_connection = get_connection
+
+    def put(self, session_id, user_id, expires_at, blob):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Session backend unavailable')
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO user_sessions (session_id, user_id, session_data, expires_at)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE session_data = VALUES(session_data), expires_at = VALUES(expires_at)
+            """, (session_id, user_id, blob, datetime.datetime.fromtimestamp(expires_at)))
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def get(self, session_id, now):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Session backend unavailable')
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+                SELECT session_data FROM user_sessions
+                WHERE session_id = %s AND expires_at > %s
+            """, (session_id, datetime.datetime.fromtimestamp(now)))
+            row = cursor.fetchone()
+            return bytes(row[0]) if row and row[0] else None
+        finally:
+            cursor.close()
+            connection.close()
+
+    def delete(self, session_id):
+        connection = self._get_connection()
+        if not connection:
+            return
+        cursor = connection.cursor()
+        try:
+            cursor.execute("DELETE FROM user_sessions WHERE session_id = %s", (session_id,))
+            cursor.execute("INSERT INTO session_revocations (session_id) VALUES (%s)", (session_id,))
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def revoke_user(self, user_id, keep=None):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Session backend unavailable')
+        cursor = connection.cursor()
+        try:
+            # Locks the user's rows through idx_sessions_user, so a concurrent login waits for the revocation
+            cursor.execute("SELECT session_id FROM user_sessions WHERE user_id = %s FOR UPDATE", (user_id,))
+            revoked = [row[0] for row in cursor.fetchall() if row[0] != keep]
+            if revoked:
+                placeholders = ', '.join(['%s'] * len(revoked))
+                cursor.execute(f"DELETE FROM user_sessions WHERE session_id IN ({placeholders})", revoked)
+                cursor.execute(f"INSERT INTO session_revocations (session_id) VALUES {', '.join(['(%s)'] * len(revoked))}",
+                               revoked)
+            connection.commit()
+            return revoked
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    def revoked_since(self, seconds):
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Session backend unavailable')
+        cursor = connection.cursor()
+        try:
+            # Range scan on idx_revocations_at; the server clock decides, so worker clocks need not agree
+            cursor.execute("""
+                SELECT session_id FROM session_revocations
+                WHERE revoked_at >= CURRENT_TIMESTAMP - INTERVAL %s SECOND
+            """, (int(seconds) + 1,))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+            connection.close()
+
+    def sweep(self, now, batch_size):
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        try:
+            cursor.execute(
+                "DELETE FROM user_sessions WHERE expires_at <= %s LIMIT %s",
+                (datetime.datetime.fromtimestamp(now), batch_size)
+            )
+            deleted = cursor.rowcount
+            cursor.execute(
+                "DELETE FROM session_revocations WHERE revoked_at < CURRENT_TIMESTAMP - INTERVAL %s SECOND LIMIT %s",
+                (REVOCATION_KEEP, batch_size)
+            )
+            connection.commit()
+            return deleted
+        finally:
+            cursor.close()
+            connection.close()
+
+    def table_stats(self, now):
+        connection = self._get_connection()
+        if not connection:
+            return {}
+        cursor = connection.cursor(dictionary=True)
+        try:
+            # information_schema row counts are estimates, which is all a size metric needs
+            cursor.execute("""
+                SELECT TABLE_ROWS AS `rows`, DATA_LENGTH AS data_bytes, INDEX_LENGTH AS index_bytes
+                FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_sessions'
+            """)
+            stats = cursor.fetchone() or {}
+            # Range scan on idx_sessions_expires
+            cursor.execute(
+                "SELECT COUNT(*) AS expired_rows FROM user_sessions WHERE expires_at <= %s",
+                (datetime.datetime.fromtimestamp(now),)
+            )
+            stats.update(cursor.fetchone())
+            return {key: int(value or 0) for key, value in stats.items()}
+        finally:
+            cursor.close()
+            connection.close()
+
+
+# ========== HOT TIER ==========
+class HotTier:
+    """Bounded LRU of decoded records; entries are revalidated against the backend after ttl seconds"""
+
+    def __init__(self, capacity=10000, ttl=30):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id, now):
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if not entry:
+                return None
+            record, cached_at = entry
+            if cached_at + self.ttl <= now or record.expires_at <= now:
+                del self._entries[session_id]
+                return None
+            self._entries.move_to_end(session_id)
+            return record
+
+    def put(self, session_id, record, now):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._entries[session_id] = (record, now)
+            self._entries.move_to_end(session_id)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_id):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# ========== SESSION STORE ==========
+class SessionStore:
+    """Login session store: hot tier first, shared backend as the source of truth"""
+
+    def __init__(self, backend, lifetime=datetime.timedelta(days=7), hot_capacity=10000, hot_ttl=30):
+        self.backend = backend
+        self.lifetime = int(lifetime.total_seconds())
+        self.hot = HotTier(hot_capacity, hot_ttl)
+        self._next_poll = 0.0
+        self._last_poll = float('-inf')
+        self._poll_lock = threading.Lock()
+        self._counters = {'created': 0, 'hot_hits': 0, 'backend_hits': 0, 'misses': 0, 'deleted': 0,
+                          'revoked': 0, 'revocation_polls': 0, 'revocation_poll_errors': 0}
+
+    def create(self, user_id, session_id, ip=None, agent=None):
+        """Persist a new session and warm the hot tier"""
+        now = int(time.time())
+        record = SessionRecord(user_id, now, now + self.lifetime, ip, agent)
+        self.backend.put(session_id, user_id, record.expires_at, encode_record(record))
+        self.hot.put(session_id, record, now)
+        self._counters['created'] += 1
+        return record
+
+    def get(self, session_id):
+        """Return the live SessionRecord for session_id, or None"""
+        self._sync_revocations()
+        now = int(time.time())
+        record = self.hot.get(session_id, now)
+        if record:
+            self._counters['hot_hits'] += 1
+            return record
+
+        record = decode_record(self.backend.get(session_id, now))
+        if not record or record.expires_at <= now:
+            self._counters['misses'] += 1
+            return None
+        self.hot.put(session_id, record, now)
+        self._counters['backend_hits'] += 1
+        return record
+
+    def delete(self, session_id):
+        """Remove a session everywhere (logout)"""
+        self.hot.discard(session_id)
+        self.backend.delete(session_id)
+        self._counters['deleted'] += 1
+
+    def revoke_user(self, user_id, keep=None):
+        """Remove every session of a user except `keep` (password change or reset); returns how many"""
+        revoked = self.backend.revoke_user(user_id, keep)
+        for session_id in revoked:
+            self.hot.discard(session_id)
+        self._counters['revoked'] += len(revoked)
+        return len(revoked)
+
+    def _sync_revocations(self):
+        """Drop hot entries revoked by other workers, polling the backend at most every REVOCATION_POLL seconds"""
+        now = time.monotonic()
+        if now < self._next_poll or not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_poll = now + REVOCATION_POLL
+            # Entries older than the ttl are revalidated anyway, so the window never needs to be longer
+            window = min(now - self._last_poll, self.hot.ttl) + REVOCATION_OVERLAP
+            for session_id in self.backend.revoked_since(window):
+                self.hot.discard(session_id)
+            self._last_poll = now
+            self._counters['revocation_polls'] += 1
+        except Exception as e:
+            # The hot tier ttl still bounds how long a revoked session is served
+            self._counters['revocation_poll_errors'] += 1
+            print(f"⚠️ Session revocation poll failed: {e}")
+        finally:
+            self._poll_lock.release()
+
+    def stats(self):
+        """Counters for the health endpoint"""
+        stats = dict(self._counters)
+        stats['hot_entries'] = len(self.hot)
+        stats['backend'] = type(self.backend).__name__
+        return stats
+
+
+# ========== REAPER ==========
+class SessionReaper:
+    """Background thread that deletes expired sessions in small, throttled batches"""
+
+    def __init__(self, backend, interval=300, batch_size=500, throttle=0.05, max_batches=200):
+        self.backend = backend
+        self.interval = interval
+        self.batch_size = batch_size
+        self.throttle = throttle
+        self.max_batches = max_batches
+        self._stop = threading.Event()
+        self._thread = None
+        self._metrics = {'runs': 0, 'batches': 0, 'deleted_total': 0, 'last_deleted': 0,
+                         'last_run_at': None, 'last_run_ms': 0.0, 'errors': 0}
+
+    def start(self):
+        """Start the reaper thread (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name='session-reaper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                self._metrics['errors'] += 1
+                print(f"⚠️ Session reaper error: {e}")
+
+    def run_once(self, now=None):
+        """Delete expired sessions batch by batch, sleeping between batches to spare the table"""
+        now = int(now or time.time())
+        started = time.perf_counter()
+        deleted_this_run = 0
+        for _ in range(self.max_batches):
+            deleted = self.backend.sweep(now, self.batch_size)
+            self._metrics['batches'] += 1
+            deleted_this_run += deleted
+            if deleted < self.batch_size or self._stop.is_set():
+                break
+            time.sleep(self.throttle)
+        self._metrics['runs'] += 1
+        self._metrics['deleted_total'] += deleted_this_run
+        self._metrics['last_deleted'] = deleted_this_run
+        self._metrics['last_run_at'] = now
+        self._metrics['last_run_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return deleted_this_run
+
+    def stats(self):
+        """Reaper counters plus current table size"""
+        stats = dict(self._metrics)
+        stats['running'] = bool(self._thread and self._thread.is_alive())
+        try:
+            stats['table'] = self.backend.table_stats(int(time.time()))
+        except Exception as e:
+            print(f"⚠️ Session table stats failed: {e}")
+            stats['table'] = {}
+        return stats
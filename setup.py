@@ -23,12 +23,12 @@ def install_dependencies():
     requirements = [
         'Flask>=2.3.3',
         'Flask-CORS>=4.0.0',
-        'Flask-Session>=0.5.0',
         'mysql-connector-python>=8.1.0',
         'python-dotenv>=1.0.0',
         'werkzeug>=2.3.7',
         'bcrypt>=4.0.1',
-        'PyJWT>=2.8.0'
+        'PyJWT>=2.8.0',
+        'numpy>=1.24'
     ]
     
     for package in requirements:
@@ -166,7 +166,7 @@ def create_minimal_schema(cursor):
     CREATE TABLE IF NOT EXISTS user_sessions (
         session_id VARCHAR(255) PRIMARY KEY,
         user_id INT NOT NULL,
-        session_data TEXT,
+        session_data VARBINARY(512),
         expires_at TIMESTAMP NOT NULL,
         FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE,
         INDEX idx_user_id (user_id),
@@ -190,9 +190,7 @@ DB_PASSWORD={password}
 DB_NAME=petnest_db
 
 # Session Configuration
-SESSION_TYPE=filesystem
-SESSION_PERMANENT=False
-SESSION_USE_SIGNER=True
+SESSION_BACKEND=mysql
 
 # Security
 BCRYPT_LOG_ROUNDS=12
@@ -0,0 +1,266 @@
+"""
+Upload storage for PetNest Network
+Files are content-addressed: the key is <namespace>/<aa>/<bb>/<sha256>.<ext>,
+so identical uploads are stored once and no directory grows past 256
+entries per level. LocalStorage writes to a temp file and renames it into
+place; S3Storage talks to any S3-compatible service (AWS, MinIO). The
+migration helpers re-home legacy flat files and rewrite the DB paths in
+batches.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # Only needed for STORAGE_BACKEND=s3
+    boto3 = None
+    ClientError = Exception
+
+CONTENT_TYPES = {
+    'png': 'image/png', 'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'gif': 'image/gif',
+    'mp4': 'video/mp4', 'mov': 'video/quicktime', 'avi': 'video/x-msvideo', 'mkv': 'video/x-matroska'
+}
+
+
+# <namespace>/<aa>/<bb>/<sha256>.<ext>
+KEY_RE = re.compile(r'^[a-z_/]+/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+def content_key(namespace, data, ext):
+    """Sharded content-addressed key for some bytes"""
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{namespace}/{digest[:2]}/{digest[2:4]}/{digest}.{ext.lower().lstrip('.')}"
+
+
+def _key_for_url(url_prefix, url):
+    prefix = url_prefix + '/'
+    if not url or not url.startswith(prefix):
+        return None
+    key = url[len(prefix):]
+    return key if KEY_RE.match(key) else None
+
+
+class LocalStorage:
+    """Sharded directories under a local root (served by the /static route)"""
+
+    def __init__(self, root='static/uploads', url_prefix='/static/uploads'):
+        self.root = root
+        self.url_prefix = url_prefix.rstrip('/')
+        self._metrics = {'puts': 0, 'dedup_hits': 0, 'bytes_written': 0}
+
+    def _path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def put(self, namespace, data, ext):
+        """Store bytes once; returns (key, url). Readers never see a partial file."""
+        key = content_key(namespace, data, ext)
+        path = self._path(key)
+        self._metrics['puts'] += 1
+        if os.path.exists(path):
+            self._metrics['dedup_hits'] += 1
+            return key, self.url(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._metrics['bytes_written'] += len(data)
+        return key, self.url(key)
+
+    def get(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def key_for_url(self, url):
+        """Key of a URL this storage produced, None otherwise (e.g. legacy flat paths)"""
+        return _key_for_url(self.url_prefix, url)
+
+    def local_path(self, key):
+        return self._path(key)
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['backend'] = 'local'
+        return stats
+
+
+class S3Storage:
+    """S3-compatible bucket (AWS S3, MinIO, ...); PUTs are atomic on the server side"""
+
+    def __init__(self, bucket, endpoint_url=None, access_key=None, secret_key=None, region=None, public_url=None):
+        if boto3 is None:
+            raise RuntimeError('boto3 is required for the S3 storage backend (pip install boto3)')
+        self.bucket = bucket
+        self._client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key,
+            region_name=region
+        )
+        base = public_url or (f"{endpoint_url.rstrip('/')}/{bucket}" if endpoint_url
+                              else f"https://{bucket}.s3.amazonaws.com")
+        self.url_prefix = base.rstrip('/')
+        self._metrics = {'puts': 0, 'dedup_hits': 0, 'bytes_written': 0}
+
+    def ensure_bucket(self):
+        try:
+            self._client.head_bucket(Bucket=self.bucket)
+        except ClientError:
+            self._client.create_bucket(Bucket=self.bucket)
+
+    def put(self, namespace, data, ext):
+        key = content_key(namespace, data, ext)
+        self._metrics['puts'] += 1
+        if self.exists(key):
+            self._metrics['dedup_hits'] += 1
+            return key, self.url(key)
+        self._client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=CONTENT_TYPES.get(ext.lower().lstrip('.'), 'application/octet-stream'),
+            CacheControl='public, max-age=31536000, immutable'  # content-addressed, never changes
+        )
+        self._metrics['bytes_written'] += len(data)
+        return key, self.url(key)
+
+    def get(self, key):
+        return self._client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def exists(self, key):
+        try:
+            self._client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def url(self, key):
+        return f"{self.url_prefix}/{key}"
+
+    def key_for_url(self, url):
+        return _key_for_url(self.url_prefix, url)
+
+    def local_path(self, key):
+        return None
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats.update({'backend': 's3', 'bucket': self.bucket})
+        return stats
+
+
+def create_storage(backend='local', **options):
+    """Storage for STORAGE_BACKEND ('local' or 's3')"""
+    if backend == 's3':
+        return S3Storage(
+            options['bucket'],
+            endpoint_url=options.get('endpoint_url'),
+            access_key=options.get('access_key'),
+            secret_key=options.get('secret_key'),
+            region=options.get('region'),
+            public_url=options.get('public_url')
+        )
+    return LocalStorage(options.get('root', 'static/uploads'), options.get('url_prefix', '/static/uploads'))
+
+
+# ========== MIGRATION ==========
+# (table, primary key, column, namespace, comma separated list?)
+UPLOAD_COLUMNS = [
+    ('users', 'user_id', 'profile_picture', 'profiles', False),
+    ('report_photos', 'photo_id', 'file_path', 'reports', False),
+    ('report_photos', 'photo_id', 'thumbnail_path', 'reports/thumbs', False),
+    ('pet_images', 'image_id', 'image_url', 'pets', False),
+    ('messages', 'message_id', 'image_url', 'messages', False),
+    ('products', 'product_id', 'images', 'products', True),
+]
+
+LEGACY_PREFIX = '/static/uploads/'
+
+
+def is_legacy_path(url, storage):
+    """Flat /static/uploads/<type>/<file> path that is not already a storage key"""
+    return bool(url) and url.startswith(LEGACY_PREFIX) and storage.key_for_url(url) is None
+
+
+def _rehome(url, storage, namespace, static_root, counters):
+    if not is_legacy_path(url, storage):
+        return url
+    local_path = os.path.join(static_root, *url[len('/static/'):].split('/'))
+    if not os.path.exists(local_path):
+        counters['missing'] += 1
+        return url
+    with open(local_path, 'rb') as f:
+        data = f.read()
+    _, new_url = storage.put(namespace, data, os.path.splitext(local_path)[1] or '.bin')
+    counters['moved'] += 1
+    return new_url
+
+
+def migrate_uploads(get_connection, storage, static_root='static', batch_size=500, columns=None):
+    """Copy legacy uploads into storage and point the DB rows at the new URLs
+
+    Walks each table in primary-key order, one batch per transaction. Rows are
+    updated only if the column still holds the value that was read, so a
+    concurrent change is never overwritten. Legacy files are left in place.
+    Returns {table.column: {'rows': n, 'moved': n, 'missing': n}}.
+    """
+    summary = {}
+    for table, pk, column, namespace, is_list in columns or UPLOAD_COLUMNS:
+        counters = {'rows': 0, 'moved': 0, 'missing': 0}
+        summary[f"{table}.{column}"] = counters
+        last_id = 0
+        while True:
+            connection = get_connection()
+            if not connection:
+                raise ConnectionError('Database unavailable')
+            cursor = connection.cursor()
+            try:
+                cursor.execute(f"""
+                    SELECT {pk}, {column} FROM {table}
+                    WHERE {pk} > %s AND {column} LIKE %s
+                    ORDER BY {pk} LIMIT %s
+                """, (last_id, f"%{LEGACY_PREFIX}%", batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = []
+                for row_id, value in rows:
+                    last_id = row_id
+                    if is_list:
+                        parts = [part.strip() for part in value.split(',')]
+                        new_value = ','.join(_rehome(part, storage, namespace, static_root, counters) for part in parts)
+                    else:
+                        new_value = _rehome(value, storage, namespace, static_root, counters)
+                    if new_value != value:
+                        updates.append((new_value, row_id, value))
+                if updates:
+                    cursor.executemany(f"""
+                        UPDATE {table} SET {column} = %s WHERE {pk} = %s AND {column} = %s
+                    """, updates)
+                    connection.commit()
+                    counters['rows'] += len(updates)
+            finally:
+                cursor.close()
+                connection.close()
+    return summary
@@ -0,0 +1,304 @@
+"""
+Autocomplete for PetNest Network
+Distinct animal types, breeds, cities, areas and streets, with how often
+each is used, are kept per worker in one sorted array per field. Values are
+matched case- and space-insensitively, and every value is shown in its most
+common spelling. A prefix is a range of the sorted keys (two bisects), and
+the most used keys in that range come out of a sparse table of range
+maxima, so the cost of a suggestion does not depend on how many values
+share the prefix. New rows are folded in every refresh_interval seconds past
+a gap-safe id watermark (watermarks.py, so a row that commits after a
+higher id was read is still counted) into a small overlay of changed keys. The overlay is merged
+into a new array once it grows past compact_at keys, and the counts are
+rebuilt from GROUP BY queries every rebuild_interval seconds to pick up
+edits and deletes.
+"""
+
+import bisect
+import heapq
+import threading
+import time
+
+import numpy as np
+
+import watermarks
+
+# table, id column, columns -> suggestion fields
+SOURCES = (
+    ('animal_reports', 'report_id', {'animal_type': 'animal_type', 'breed': 'breed', 'city': 'city',
+                                     'region': 'region', 'street': 'street'}),
+    ('pets', 'pet_id', {'animal_type': 'animal_type', 'breed': 'breed'}),
+    ('users', 'user_id', {'city': 'city'}),
+)
+FIELDS = ('animal_type', 'breed', 'city', 'region', 'street')
+MAX_LIMIT = 20
+_END = chr(0x10ffff)
+
+
+def normalize(value):
+    """Match key of a value: surrounding and repeated spaces removed, case folded"""
+    return ' '.join(value.split()).casefold()
+
+
+def tidy(value):
+    return ' '.join(value.split())
+
+
+class FieldIndex:
+    """Immutable sorted keys with their counts, spellings and a range-maximum table"""
+
+    def __init__(self, entries=()):
+        """entries: (key, count, label) in any order"""
+        entries = sorted(entries)
+        self.keys = [key for key, _, _ in entries]
+        self.counts = [count for _, count, _ in entries]
+        self.labels = [label for _, _, label in entries]
+        # levels[j][i]: position of the largest count in keys[i:i + 2**j] (first one on ties)
+        self.levels = []
+        if entries:
+            counts = np.array(self.counts, dtype=np.int64)
+            level = np.arange(len(entries), dtype=np.int64)
+            self.levels.append(level.tolist())
+            span = 1
+            while span * 2 <= len(entries):
+                left, right = level[:-span], level[span:]
+                level = np.where(counts[left] >= counts[right], left, right)
+                self.levels.append(level.tolist())
+                span *= 2
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _best(self, lo, hi):
+        """Position of the largest count in keys[lo:hi]"""
+        level = (hi - lo).bit_length() - 1
+        table = self.levels[level]
+        a, b = table[lo], table[hi - (1 << level)]
+        return a if self.counts[a] >= self.counts[b] else b
+
+    def range(self, prefix):
+        return bisect.bisect_left(self.keys, prefix), bisect.bisect_left(self.keys, prefix + _END)
+
+    def ranked(self, prefix):
+        """Positions of the keys starting with prefix, most used first, generated lazily"""
+        lo, hi = self.range(prefix)
+        if lo >= hi:
+            return
+        best = self._best(lo, hi)
+        heap = [(-self.counts[best], best, lo, hi)]
+        while heap:
+            _, position, lo, hi = heapq.heappop(heap)
+            yield position
+            # The rest of the range is the two sides of the position just taken
+            for a, b in ((lo, position), (position + 1, hi)):
+                if a < b:
+                    best = self._best(a, b)
+                    heapq.heappush(heap, (-self.counts[best], best, a, b))
+
+    def get(self, key):
+        """(count, label) of a key, or None"""
+        position = bisect.bisect_left(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return self.counts[position], self.labels[position]
+        return None
+
+    @property
+    def nbytes(self):
+        # list slots only; the key and label strings are shared with the spellings table
+        return 8 * len(self.keys) * (3 + len(self.levels))
+
+
+class Suggester:
+    """Per-worker autocomplete over the values already used in reports, pets and profiles"""
+
+    def __init__(self, get_connection, refresh_interval=30, rebuild_interval=3600, compact_at=2000):
+        self._get_connection = get_connection
+        self.refresh_interval = refresh_interval
+        self.rebuild_interval = rebuild_interval
+        self.compact_at = compact_at
+        # Written only by the refresh thread (under _lock); readers use the published views below
+        self._spellings = {field: {} for field in FIELDS}  # field -> key -> {spelling: count}
+        self._watermarks = {}  # table -> watermarks.Watermark
+        # Published per field as one tuple so readers see a consistent view:
+        # (index, {changed key: (count, label)}, changed keys sorted)
+        self._views = {field: (FieldIndex(), {}, []) for field in FIELDS}
+        self._lock = threading.Lock()
+        self._rebuilt_at = 0.0
+        self.ready = False
+        self._metrics = {'queries': 0, 'refreshes': 0, 'rebuilds': 0, 'compactions': 0, 'rows_applied': 0,
+                         'errors': 0, 'query_ms_last': 0.0, 'query_ms_max': 0.0}
+
+    # ----- writing -----
+    def add(self, field, values):
+        """Count one more use of each value; they show up in suggestions right away"""
+        changed = {}
+        with self._lock:
+            by_key = self._spellings[field]
+            for value in values:
+                if not value or not value.strip():
+                    continue
+                key, value = normalize(value), tidy(value)
+                spellings = by_key.setdefault(key, {})
+                spellings[value] = spellings.get(value, 0) + 1
+                changed[key] = spellings
+            if not changed:
+                return
+            index, overlay, _ = self._views[field]
+            overlay = dict(overlay)
+            for key, spellings in changed.items():
+                overlay[key] = (sum(spellings.values()), max(spellings, key=spellings.get))
+            # Swapped in whole, so readers never see a half-updated overlay
+            self._views[field] = (index, overlay, sorted(overlay))
+        if len(overlay) >= self.compact_at:
+            self.compact(field)
+
+    def compact(self, field):
+        """Rebuild a field's sorted array from the current counts and clear its overlay"""
+        with self._lock:
+            entries = [(key, sum(spellings.values()), max(spellings, key=spellings.get))
+                       for key, spellings in self._spellings[field].items()]
+            self._views[field] = (FieldIndex(entries), {}, [])
+            self._metrics['compactions'] += 1
+
+    def load(self):
+        """Count every value with GROUP BY, then switch to incremental refreshes"""
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        spellings = {field: {} for field in FIELDS}
+        marks = {}
+        try:
+            step, offset = watermarks.step_of(connection)
+            for table, id_column, columns in SOURCES:
+                cursor.execute(f"SELECT COALESCE(MAX({id_column}), 0) FROM {table}")
+                top = cursor.fetchone()[0]
+                # Ids missing just below the top may still commit; start the watermark
+                # a little lower and read the ids present so they are tracked as gaps
+                mark = watermarks.Watermark(max(top - watermarks.MAX_NEW_GAPS * step, 0), (), step, offset)
+                cursor.execute(f"SELECT {id_column} FROM {table} WHERE {id_column} > %s AND {id_column} <= %s "
+                               f"ORDER BY {id_column}", (mark.last_id, top))
+                mark.advance([row_id for row_id, in cursor.fetchall()])
+                marks[table] = mark
+                for column, field in columns.items():
+                    # Rows past the watermark are left to the next refresh so none are counted twice
+                    cursor.execute(f"""
+                        SELECT {column}, COUNT(*) FROM {table}
+                        WHERE {id_column} <= %s AND {column} IS NOT NULL AND {column} != ''
+                        GROUP BY {column}
+                    """, (mark.last_id,))
+                    for value, count in cursor.fetchall():
+                        if value.strip():
+                            by_key = spellings[field].setdefault(normalize(value), {})
+                            by_key[tidy(value)] = by_key.get(tidy(value), 0) + count
+        finally:
+            cursor.close()
+            connection.close()
+        with self._lock:
+            self._spellings = spellings
+            self._watermarks = marks
+        for field in FIELDS:
+            self.compact(field)
+        self._rebuilt_at = time.time()
+        self._metrics['rebuilds'] += 1
+        self.ready = True
+        return sum(len(values) for values in spellings.values())
+
+    def refresh(self, batch_size=5000):
+        """Count values of rows added since the last pass, and of late rows below the watermark"""
+        if not self.ready:
+            return 0
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        applied = 0
+        try:
+            for table, id_column, columns in SOURCES:
+                mark = self._watermarks[table]
+                mark.expire()
+                while True:
+                    condition, params = mark.condition(id_column)
+                    cursor.execute(f"""
+                        SELECT {id_column}, {', '.join(columns)} FROM {table}
+                        WHERE {condition} ORDER BY {id_column} LIMIT %s
+                    """, params + [batch_size])
+                    rows = cursor.fetchall()
+                    for position, field in enumerate(columns.values(), start=1):
+                        self.add(field, [row[position] for row in rows])
+                    if rows:
+                        mark.advance([row[0] for row in rows])
+                        applied += len(rows)
+                    if len(rows) < batch_size:
+                        break
+        finally:
+            cursor.close()
+            connection.close()
+        self._metrics['rows_applied'] += applied
+        self._metrics['refreshes'] += 1
+        return applied
+
+    def start(self):
+        """Initial load plus a background refresh loop with periodic full rebuilds"""
+        def loop():
+            while True:
+                try:
+                    if not self.ready or time.time() - self._rebuilt_at >= self.rebuild_interval:
+                        count = self.load()
+                        print(f"✅ Suggestions loaded: {count} distinct values")
+                    else:
+                        self.refresh()
+                except Exception as e:
+                    self._metrics['errors'] += 1
+                    print(f"⚠️ Suggestion refresh failed: {e}")
+                time.sleep(self.refresh_interval)
+        threading.Thread(target=loop, name='suggest-refresh', daemon=True).start()
+
+    # ----- reading -----
+    def suggest(self, field, prefix, limit=8):
+        """Most used values of a field starting with prefix, as [{'value', 'count'}]"""
+        if field not in self._views:
+            raise ValueError(f"field must be one of {', '.join(FIELDS)}")
+        started = time.perf_counter()
+        prefix = normalize(prefix or '')
+        limit = min(max(limit, 1), MAX_LIMIT)
+        index, overlay, changed_keys = self._views[field]
+        lo = bisect.bisect_left(changed_keys, prefix)
+        hi = bisect.bisect_left(changed_keys, prefix + _END)
+        candidates = {key: overlay[key] for key in changed_keys[lo:hi]}
+        # Changed keys only gain uses, so the best `limit` unchanged keys from the
+        # index plus every changed key with the prefix hold the answer
+        unchanged = 0
+        for position in index.ranked(prefix):
+            if unchanged == limit:
+                break
+            key = index.keys[position]
+            if key not in overlay:
+                candidates[key] = (index.counts[position], index.labels[position])
+                unchanged += 1
+        ranked = sorted(candidates.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self._metrics['queries'] += 1
+        self._metrics['query_ms_last'] = elapsed
+        self._metrics['query_ms_max'] = max(self._metrics['query_ms_max'], elapsed)
+        return [{'value': label, 'count': count} for _, (count, label) in ranked]
+
+    def canonical(self, field, value):
+        """The most common spelling of a value already in use, else the value tidied"""
+        if not value:
+            return value
+        key = normalize(value)
+        index, overlay, _ = self._views[field]
+        entry = overlay.get(key) or index.get(key)
+        return entry[1] if entry else tidy(value)
+
+    def stats(self):
+        stats = dict(self._metrics)
+        stats['query_ms_last'] = round(stats['query_ms_last'], 3)
+        stats['query_ms_max'] = round(stats['query_ms_max'], 3)
+        stats['ready'] = self.ready
+        stats['fields'] = {}
+        for field, (index, overlay, _) in self._views.items():
+            stats['fields'][field] = {'values': len(index), 'overlay': len(overlay), 'bytes': index.nbytes}
+        return stats
@@ -0,0 +1,194 @@
+"""
+Delta sync for PetNest Network mobile reporters
+A client keeps an opaque watermark and sends it back on the next sync; the
+response carries only what changed since: the reporter's reports (by
+animal_reports.updated_at), their status history, notifications (by
+notifications.updated_at) and the profile and report counts when either
+moved. Each stream is read with a keyset on (updated_at, id) through the
+(user, updated_at, id) indexes, pages of at most `limit` rows, and rows are
+sent as column lists plus value arrays instead of one object per row.
+
+TIMESTAMP columns have one-second resolution and a transaction can commit
+after a later one has been read, so a finished stream restarts OVERLAP
+seconds before the server time of the sync, and so does a page that reaches
+into those last OVERLAP seconds. Clients upsert by id, so the few rows sent
+twice are harmless. Only when more than `limit` rows of one stream changed
+within OVERLAP seconds of the sync does a page keep its exact position (a
+restart would send the same page again); a row of that page's range still
+uncommitted at the time is then missed until it changes again.
+"""
+
+import datetime
+import decimal
+import re
+
+OVERLAP = 5  # seconds re-read after a finished stream
+MAX_LIMIT = 500
+WATERMARK_VERSION = '1'
+_TIME_FORMAT = '%Y%m%d%H%M%S'
+_START = '0'  # stream position before any row: sync everything
+
+CLIENT_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+REPORT_COLUMNS = ('report_id', 'client_id', 'animal_type', 'breed', 'animal_condition', 'urgency_level',
+                  'status', 'city', 'region', 'street', 'description', 'latitude', 'longitude', 'assigned_to',
+                  'duplicate_of', 'reported_at', 'status_changed_at', 'completed_at', 'updated_at')
+EVENT_COLUMNS = ('event_id', 'report_id', 'from_status', 'to_status', 'created_at')
+NOTIFICATION_COLUMNS = ('notification_id', 'title', 'message', 'type', 'is_read', 'related_id', 'related_type',
+                        'created_at', 'updated_at')
+PROFILE_COLUMNS = ('user_id', 'username', 'email', 'role', 'full_name', 'phone', 'city', 'profile_picture', 'badge',
+                   'is_verified', 'updated_at')
+
+
+# ========== WATERMARKS ==========
+def _position(value):
+    """'<yyyymmddhhmmss>-<id>' -> (datetime, id); '0' -> None"""
+    if value == _START:
+        return None
+    moment, _, row_id = value.partition('-')
+    return datetime.datetime.strptime(moment, _TIME_FORMAT), int(row_id)
+
+
+def decode_watermark(token):
+    """Stream positions of a watermark, (reports, notifications, profile); ValueError if malformed"""
+    if not token:
+        return None, None, None
+    try:
+        version, reports, notifications, profile = token.split('.')
+        if version != WATERMARK_VERSION:
+            raise ValueError(f'version {version}')
+        profile = None if profile == _START else datetime.datetime.strptime(profile, _TIME_FORMAT)
+        return _position(reports), _position(notifications), profile
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid watermark: {e}')
+
+
+def encode_watermark(reports, notifications, profile):
+    def position(value):
+        return _START if value is None else f"{value[0].strftime(_TIME_FORMAT)}-{value[1]}"
+    return '.'.join([WATERMARK_VERSION, position(reports), position(notifications),
+                     _START if profile is None else profile.strftime(_TIME_FORMAT)])
+
+
+def is_valid_client_id(value):
+    return bool(CLIENT_ID.match(value or ''))
+
+
+# ========== ENCODING ==========
+def _value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)  # coordinates
+    return value
+
+
+def table(columns, rows):
+    """Column names once, then one value array per row"""
+    return {'columns': list(columns), 'rows': [[_value(value) for value in row] for row in rows]}
+
+
+# ========== QUERIES ==========
+def _after(position, time_column, id_column):
+    """Keyset condition for rows after a stream position"""
+    if position is None:
+        return "", []
+    # Spelled out rather than as a row comparison so MySQL reads it as an index range
+    return (f" AND ({time_column} > %s OR ({time_column} = %s AND {id_column} > %s))",
+            [position[0], position[0], position[1]])
+
+
+def _stream(cursor, sql, params, position, time_column, id_column, limit, now):
+    """One page of a stream and its next position; the position never passes OVERLAP seconds before now
+
+    Rows older than that have committed, so a page that ends before it
+    continues right after its last row. Rows must start with the id and end
+    with the time column.
+    """
+    condition, keyset = _after(position, time_column, id_column)
+    cursor.execute(sql.format(after=condition), params + keyset + [limit + 1])
+    rows = cursor.fetchall()
+    settled = now - datetime.timedelta(seconds=OVERLAP)
+    if len(rows) <= limit:
+        return rows, (settled, 0), False
+    rows = rows[:limit]
+    if rows[-1][-1] < settled or rows[0][-1] >= settled:
+        return rows, (rows[-1][-1], rows[-1][0]), True
+    return rows, (settled, 0), True
+
+
+def changes(cursor, user_id, token=None, limit=200):
+    """Everything that changed for a reporter since `token`, plus the watermark for the next sync
+
+    Expects a plain (tuple) cursor. Returns a dict with 'watermark',
+    'has_more' and only the sections that have changes.
+    """
+    limit = min(max(limit, 1), MAX_LIMIT)
+    report_position, notification_position, profile_since = decode_watermark(token)
+    cursor.execute("SELECT CURRENT_TIMESTAMP")
+    now = cursor.fetchone()[0]
+    result = {}
+
+    reports, report_next, reports_more = _stream(cursor, f"""
+        SELECT {', '.join(REPORT_COLUMNS)} FROM animal_reports
+        WHERE reporter_id = %s{{after}}
+        ORDER BY updated_at, report_id
+        LIMIT %s
+    """, [user_id], report_position, 'updated_at', 'report_id', limit, now)
+    if reports:
+        result['reports'] = table(REPORT_COLUMNS, reports)
+        if report_position is not None:
+            # Status changes of those reports since the last sync (a first sync has the current status only)
+            ids = [row[0] for row in reports]
+            cursor.execute(f"""
+                SELECT {', '.join(EVENT_COLUMNS)} FROM report_status_events
+                WHERE report_id IN ({', '.join(['%s'] * len(ids))}) AND created_at >= %s
+                ORDER BY event_id
+            """, ids + [report_position[0] - datetime.timedelta(seconds=OVERLAP)])
+            events = cursor.fetchall()
+            if events:
+                result['status_updates'] = table(EVENT_COLUMNS, events)
+
+    notifications, notification_next, notifications_more = _stream(cursor, f"""
+        SELECT {', '.join(NOTIFICATION_COLUMNS)} FROM notifications
+        WHERE user_id = %s{{after}}
+        ORDER BY updated_at, notification_id
+        LIMIT %s
+    """, [user_id], notification_position, 'updated_at', 'notification_id', limit, now)
+    if notifications:
+        result['notifications'] = table(NOTIFICATION_COLUMNS, notifications)
+
+    cursor.execute(f"SELECT {', '.join(PROFILE_COLUMNS)} FROM users WHERE user_id = %s", (user_id,))
+    profile = cursor.fetchone()
+    if profile is None:
+        raise LookupError('User not found')
+    if profile_since is None or profile[-1] >= profile_since:
+        result['profile'] = dict(zip(PROFILE_COLUMNS, (_value(value) for value in profile)))
+    if reports or 'profile' in result:
+        # Same counts as the dashboard, recomputed only when they can have moved
+        cursor.execute("""
+            SELECT COUNT(*),
+                   SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN status = 'in_progress' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN urgency_level = 'high' THEN 1 ELSE 0 END)
+            FROM animal_reports WHERE reporter_id = %s
+        """, (user_id,))
+        total, completed, pending, in_progress, urgent = (int(value or 0) for value in cursor.fetchone())
+        result['stats'] = {'total_reports': total, 'completed_reports': completed, 'pending_reports': pending,
+                           'in_progress_reports': in_progress, 'urgent_reports': urgent,
+                           'completion_rate': round(completed / max(total, 1) * 100, 1)}
+
+    result['watermark'] = encode_watermark(report_next, notification_next,
+                                           now - datetime.timedelta(seconds=OVERLAP))
+    result['has_more'] = reports_more or notifications_more
+    result['server_time'] = now.isoformat()
+    return result
+
+
+def find_client_report(cursor, reporter_id, client_id):
+    """report_id already stored for a client-generated id, or None"""
+    cursor.execute("SELECT report_id FROM animal_reports WHERE reporter_id = %s AND client_id = %s",
+                   (reporter_id, client_id))
+    row = cursor.fetchone()
+    return row[0] if row else None
@@ -0,0 +1,147 @@
+"""
+Admin user directory for PetNest Network
+Keyset-paginated listing of users (newest first) with prefix search and
+index-backed filters, an approximate match count from the optimizer's row
+estimate, and bulk suspend/verify applied as one UPDATE.
+"""
+
+import base64
+import datetime
+import json
+import re
+
+# Columns searchable by prefix; each has its own index
+SEARCH_FIELDS = ('username', 'email', 'full_name', 'phone', 'cnic')
+
+ROLES = ('admin', 'reporter', 'adopter', 'seller', 'shelter', 'store')
+
+# action -> SET clause; admins are never touched by bulk actions
+BULK_ACTIONS = {
+    'suspend': "is_active = FALSE, suspended_at = CURRENT_TIMESTAMP, suspended_by = %s, suspension_reason = %s",
+    'unsuspend': "is_active = TRUE, suspended_at = NULL, suspended_by = NULL, suspension_reason = NULL",
+    'verify': "is_verified = TRUE",
+    'unverify': "is_verified = FALSE",
+}
+
+LIST_COLUMNS = """user_id, username, email, role, full_name, phone, city, cnic,
+                  is_verified, is_active, badge, created_at"""
+
+
+# ========== CURSORS ==========
+def encode_cursor(created_at, user_id):
+    """Opaque page cursor for the last row of a page"""
+    raw = json.dumps([created_at.isoformat(), user_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """(created_at, user_id) from a cursor, ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, user_id = json.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), int(user_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+# ========== QUERY BUILDING ==========
+def _prefix_pattern(value):
+    """LIKE pattern matching values that start with `value` (wildcards escaped)"""
+    return re.sub(r'([\\%_])', r'\\\1', value) + '%'
+
+
+def search_fields_for(query):
+    """Columns worth searching for a query, so each prefix probe can use its index"""
+    if '@' in query:
+        return ['email']
+    if re.fullmatch(r'[\d+\-\s]+', query):
+        return ['phone', 'cnic']
+    return ['username', 'full_name', 'email']
+
+
+def build_filters(query=None, field=None, role=None, is_active=None, is_verified=None, city=None):
+    """WHERE clauses and params shared by the page query and the count estimate
+
+    role/is_active/is_verified are matched left to right against
+    idx_users_role_status; city rides along idx_users_created_city with the
+    created_at ordering.
+    """
+    clauses = []
+    params = []
+    if role:
+        clauses.append("role = %s")
+        params.append(role)
+    if is_active is not None:
+        clauses.append("is_active = %s")
+        params.append(is_active)
+    if is_verified is not None:
+        clauses.append("is_verified = %s")
+        params.append(is_verified)
+    if city:
+        clauses.append("city = %s")
+        params.append(city)
+    if query:
+        fields = [field] if field else search_fields_for(query)
+        pattern = _prefix_pattern(query)
+        clauses.append('(' + ' OR '.join(f"{column} LIKE %s" for column in fields) + ')')
+        params.extend([pattern] * len(fields))
+    return clauses, params
+
+
+def list_users(cursor, filters, limit=50, after=None):
+    """One page of users, newest first; returns (rows, next_cursor or None)
+
+    Pages continue from (created_at, user_id) of the previous page's last row
+    instead of OFFSET, so page 1000 costs the same as page 1.
+    """
+    clauses, params = build_filters(**filters)
+    if after:
+        clauses.append("(created_at < %s OR (created_at = %s AND user_id < %s))")
+        params.extend([after[0], after[0], after[1]])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    cursor.execute(f"""
+        SELECT {LIST_COLUMNS}
+        FROM users
+        {where}
+        ORDER BY created_at DESC, user_id DESC
+        LIMIT %s
+    """, params + [limit + 1])
+    rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['user_id'])
+    return rows, next_cursor
+
+
+def approximate_count(cursor, filters):
+    """Estimated number of matches without counting rows
+
+    Unfiltered: the table statistics row count. Filtered: the optimizer's
+    row estimate for the query plan.
+    """
+    clauses, params = build_filters(**filters)
+    if not clauses:
+        cursor.execute("""
+            SELECT TABLE_ROWS AS estimate FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'users'
+        """)
+        row = cursor.fetchone()
+        return int(row['estimate'] or 0) if row else 0
+    cursor.execute(f"EXPLAIN SELECT user_id FROM users WHERE {' AND '.join(clauses)}", params)
+    plan = cursor.fetchall()
+    return int(plan[0].get('rows') or 0) if plan else 0
+
+
+# ========== BULK ACTIONS ==========
+def bulk_update(cursor, action, user_ids, admin_id, reason=None):
+    """Apply a bulk action to many users in one UPDATE; returns rows changed"""
+    if action not in BULK_ACTIONS or not user_ids:
+        return 0
+    params = [admin_id, reason] if action == 'suspend' else []
+    placeholders = ', '.join(['%s'] * len(user_ids))
+    cursor.execute(f"""
+        UPDATE users SET {BULK_ACTIONS[action]}
+        WHERE user_id IN ({placeholders}) AND role != 'admin'
+    """, params + list(user_ids))
+    return cursor.rowcount
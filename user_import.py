@@ -0,0 +1,322 @@
+"""
+Bulk user import for PetNest Network
+Loads users from CSV or NDJSON in four phases: validate every row up front,
+drop rows whose username/email/cnic already exist (one IN query per chunk),
+hash passwords across a process pool, then insert in multi-row chunks. Each
+input row gets a line in the result file (created / invalid / duplicate /
+error), and the summary reports per-phase timings and throughput.
+"""
+
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import bcrypt
+
+from availability import normalize
+
+REQUIRED_FIELDS = ('username', 'email', 'password', 'role', 'full_name', 'phone', 'city')
+TEXT_FIELDS = REQUIRED_FIELDS + ('address',)  # NDJSON values must be strings
+IMPORT_ROLES = ('reporter', 'adopter', 'seller', 'shelter', 'store')  # no admin accounts by import
+EMAIL_RE = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$')
+BCRYPT_ROUNDS = 12  # same cost as hash_password in app.py
+
+RESULT_COLUMNS = ['line', 'username', 'email', 'status', 'user_id', 'message']
+
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def _pool_context():
+    """Start method for the hashing pool: forking the multithreaded server can deadlock a child
+
+    The fork server preloads only this module (and bcrypt), not the main
+    script, so it starts none of the app's background threads itself.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')  # Windows
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+# ========== PARSING & VALIDATION ==========
+def read_rows(text, fmt):
+    """Rows as dicts from CSV (header line) or NDJSON text"""
+    if fmt == 'ndjson':
+        rows = []
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            rows.append(row if isinstance(row, dict) else {'_parse_error': 'Invalid JSON line'})
+        return rows
+    if fmt == 'csv':
+        return [dict(row) for row in csv.DictReader(io.StringIO(text))]
+    raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def format_for(filename):
+    return 'ndjson' if filename.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def validate_row(row):
+    """Same rules as /api/auth/register; returns an error message or None"""
+    if '_parse_error' in row:
+        return row['_parse_error']
+    for field in TEXT_FIELDS:
+        if row.get(field) is not None and not isinstance(row[field], str):
+            return f'{field} must be a string'
+    cnic = row.get('cnic')
+    if cnic is not None and (isinstance(cnic, bool) or not isinstance(cnic, (str, int))):
+        return 'cnic must be a string or a number'
+    for field in REQUIRED_FIELDS:
+        if not str(row.get(field) or '').strip():
+            return f'{field} is required'
+    if not EMAIL_RE.match(row['email'].strip()):
+        return 'Invalid email'
+    if len(row['password']) < 8:
+        return 'Password must be 8+ characters'
+    if row['role'] not in IMPORT_ROLES:
+        return f"role must be one of {', '.join(IMPORT_ROLES)}"
+    if len(row['username'].strip()) > 50 or len(row['email'].strip()) > 100:
+        return 'Username or email too long'
+    return None
+
+
+class UserImporter:
+    """Runs one import; results[i] is the outcome of input row i"""
+
+    def __init__(self, get_connection, chunk_size=1000, workers=None, on_progress=None):
+        self._get_connection = get_connection
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 1
+        self.on_progress = on_progress
+
+    def run(self, rows):
+        timings = {}
+        started = time.perf_counter()
+        results = [None] * len(rows)
+
+        # 1. Validate everything (including duplicates inside the file) before touching the DB
+        phase = time.perf_counter()
+        pending = []
+        seen = set()
+        for index, row in enumerate(rows):
+            error = validate_row(row)
+            if error:
+                results[index] = ('invalid', None, error)
+                continue
+            row = {key: (value.strip() if isinstance(value, str) and key != 'password' else value)
+                   for key, value in row.items()}
+            if row.get('cnic') is not None:
+                # A numeric NDJSON cnic must match the stored VARCHAR in dedup
+                row['cnic'] = str(row['cnic']).strip()
+            keys = {('u', normalize(row['username'])), ('e', normalize(row['email']))}
+            if row.get('cnic'):
+                keys.add(('c', row['cnic']))
+            if keys & seen:
+                results[index] = ('duplicate', None, 'Duplicate of an earlier row in the file')
+                continue
+            seen |= keys
+            pending.append((index, row))
+        timings['validate'] = time.perf_counter() - phase
+
+        # 2. Set-based dedup against existing users
+        phase = time.perf_counter()
+        pending = self._drop_existing(pending, results)
+        timings['dedup'] = time.perf_counter() - phase
+
+        # 3. Hash passwords on every core
+        phase = time.perf_counter()
+        if pending:
+            chunksize = max(1, len(pending) // (self.workers * 4))
+            with ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context()) as pool:
+                hashes = list(pool.map(_hash, [row['password'] for _, row in pending], chunksize=chunksize))
+        else:
+            hashes = []
+        timings['hash'] = time.perf_counter() - phase
+
+        # 4. Chunked multi-row inserts
+        phase = time.perf_counter()
+        created = []
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = [(index, row, hashes[start + offset])
+                     for offset, (index, row) in enumerate(pending[start:start + self.chunk_size])]
+            created.extend(self._insert_chunk(chunk, results))
+            if self.on_progress:
+                self.on_progress(min(start + self.chunk_size, len(pending)), len(pending))
+        timings['insert'] = time.perf_counter() - phase
+
+        elapsed = time.perf_counter() - started
+        counts = {}
+        for status, _, _ in results:
+            counts[status] = counts.get(status, 0) + 1
+        summary = {
+            'rows': len(rows),
+            'counts': counts,
+            'seconds': round(elapsed, 2),
+            'phase_seconds': {name: round(value, 2) for name, value in timings.items()},
+            'rows_per_second': round(len(rows) / elapsed, 1) if elapsed else None,
+            'created_per_second': round(len(created) / elapsed, 1) if elapsed else None,
+            'workers': self.workers
+        }
+        return results, created, summary
+
+    def _drop_existing(self, pending, results):
+        """Mark rows whose username/email/cnic is already taken; one query per chunk"""
+        remaining = []
+        for start in range(0, len(pending), self.chunk_size):
+            chunk = pending[start:start + self.chunk_size]
+            usernames = [row['username'] for _, row in chunk]
+            emails = [row['email'] for _, row in chunk]
+            cnics = [row['cnic'] for _, row in chunk if row.get('cnic')]
+            connection = self._get_connection()
+            if not connection:
+                raise ConnectionError('Database unavailable')
+            cursor = connection.cursor()
+            try:
+                clauses = [f"username IN ({', '.join(['%s'] * len(usernames))})",
+                           f"email IN ({', '.join(['%s'] * len(emails))})"]
+                params = usernames + emails
+                if cnics:
+                    clauses.append(f"cnic IN ({', '.join(['%s'] * len(cnics))})")
+                    params += cnics
+                cursor.execute(f"SELECT username, email, cnic FROM users WHERE {' OR '.join(clauses)}", params)
+                taken = set()
+                for username, email, cnic in cursor.fetchall():
+                    taken.add(('u', normalize(username)))
+                    taken.add(('e', normalize(email)))
+                    if cnic:
+                        taken.add(('c', cnic))
+            finally:
+                cursor.close()
+                connection.close()
+            for index, row in chunk:
+                keys = {('u', normalize(row['username'])), ('e', normalize(row['email']))}
+                if row.get('cnic'):
+                    keys.add(('c', row['cnic']))
+                if keys & taken:
+                    results[index] = ('duplicate', None, 'Username, email or CNIC already exists')
+                else:
+                    remaining.append((index, row))
+        return remaining
+
+    def _insert_chunk(self, chunk, results):
+        """Insert one chunk in a transaction; falls back to row by row if it races a duplicate"""
+        connection = self._get_connection()
+        if not connection:
+            for index, _, _ in chunk:
+                results[index] = ('error', None, 'Database unavailable')
+            return []
+        cursor = connection.cursor()
+        try:
+            try:
+                created = self._insert_rows(cursor, chunk)
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                if len(chunk) == 1:
+                    index, row, _ = chunk[0]
+                    duplicate = getattr(e, 'errno', None) == 1062
+                    results[index] = ('duplicate' if duplicate else 'error', None,
+                                      'Username, email or CNIC already exists' if duplicate else str(e))
+                    return []
+                created = []
+                for item in chunk:
+                    created.extend(self._insert_chunk([item], results))
+                return created
+            for index, row, user_id in created:
+                results[index] = ('created', user_id, None)
+            return created
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _insert_rows(self, cursor, chunk):
+        values = []
+        for _, row, hashed in chunk:
+            values.extend([row['username'], row['email'], hashed, row['role'], row['full_name'],
+                           row['phone'], row['city'], row.get('address') or '', row.get('cnic') or None])
+        cursor.execute(f"""
+            INSERT INTO users (username, email, password, role, full_name, phone, city, address, cnic)
+            VALUES {', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(chunk))}
+        """, values)
+        # Auto-increment ids are not guaranteed consecutive across concurrent inserts, so read them back
+        usernames = [row['username'] for _, row, _ in chunk]
+        cursor.execute(f"SELECT user_id, username FROM users WHERE username IN ({', '.join(['%s'] * len(usernames))})",
+                       usernames)
+        ids = {normalize(username): user_id for user_id, username in cursor.fetchall()}
+        created = [(index, row, ids[normalize(row['username'])]) for index, row, _ in chunk]
+
+        shelters = [(user_id, row['shelter_name'], row.get('license') or '', row['full_name'])
+                    for _, row, user_id in created if row['role'] == 'shelter' and row.get('shelter_name')]
+        if shelters:
+            cursor.execute(f"""
+                INSERT INTO shelters (user_id, organization_name, license_number, contact_person)
+                VALUES {', '.join(['(%s, %s, %s, %s)'] * len(shelters))}
+            """, [value for shelter in shelters for value in shelter])
+        return created
+
+
+def write_results(path, rows, results):
+    """Per-row result CSV (line numbers are 1-based data rows)"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(RESULT_COLUMNS)
+        for index, (row, (status, user_id, message)) in enumerate(zip(rows, results), start=1):
+            writer.writerow([index, row.get('username', ''), row.get('email', ''), status, user_id or '', message or ''])
+
+
+# ========== BACKGROUND JOBS ==========
+class ImportJobs:
+    """Imports started from the API run in a thread; status is kept in memory per worker"""
+
+    def __init__(self, get_connection, results_dir, on_created=None):
+        self._get_connection = get_connection
+        self.results_dir = results_dir
+        self.on_created = on_created
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, rows, admin_id):
+        job_id = uuid.uuid4().hex
+        job = {'job_id': job_id, 'admin_id': admin_id, 'status': 'running', 'rows': len(rows),
+               'progress': 0, 'summary': None, 'error': None, 'result_file': None}
+        with self._lock:
+            self._jobs[job_id] = job
+        threading.Thread(target=self._run, args=(job, rows), name=f'user-import-{job_id[:8]}', daemon=True).start()
+        return job_id
+
+    def _run(self, job, rows):
+        def progress(done, total):
+            job['progress'] = done
+        try:
+            importer = UserImporter(self._get_connection, on_progress=progress)
+            results, created, summary = importer.run(rows)
+            os.makedirs(self.results_dir, exist_ok=True)
+            result_file = f"{job['job_id']}.csv"
+            write_results(os.path.join(self.results_dir, result_file), rows, results)
+            if self.on_created:
+                self.on_created([row for _, row, _ in created])
+            job.update(status='completed', summary=summary, result_file=result_file)
+            print(f"✅ User import {job['job_id']}: {summary['counts']} in {summary['seconds']}s")
+        except Exception as e:
+            job.update(status='failed', error=str(e))
+            print(f"❌ User import {job['job_id']} failed: {e}")
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return dict(job) if job else None
@@ -0,0 +1,128 @@
+"""
+Gap-safe id watermarks for PetNest Network
+Background folds (SLA rollups, heatmap cells, the outbox relay) read a table
+in id order and remember how far they got in rollup_watermarks. An
+AUTO_INCREMENT id is taken when a row is inserted but only becomes visible
+when its transaction commits, so id 10 can commit after id 11 was read, and
+a plain "id > last_id" watermark would skip it for good. A Watermark also
+keeps the ids below last_id that were missing when it moved past them
+(gaps, in watermark_gaps) and asks for them again on every read. A gap
+closes when its row shows up, or after GAP_TIMEOUT seconds: an id that
+stays missing that long was rolled back or skipped by the server, since no
+transaction holds an insert open for an hour.
+"""
+
+import time
+
+GAP_TIMEOUT = 3600  # seconds before a missing id is given up as never committed
+MAX_NEW_GAPS = 1000  # a larger hole in one batch is a deleted range, only its top is tracked
+
+
+class Watermark:
+    """last_id plus the ids below it still missing; ids come in steps of auto_increment_increment"""
+
+    def __init__(self, last_id=0, gaps=(), step=1, offset=1):
+        self.last_id = last_id
+        self.step = max(int(step), 1)
+        self.offset = int(offset)
+        now = time.monotonic()
+        self.gaps = {gap: now for gap in gaps}  # id -> when it was found missing
+
+    def condition(self, column):
+        """SQL condition and params for rows not consumed yet"""
+        if not self.gaps:
+            return f"{column} > %s", [self.last_id]
+        gaps = sorted(self.gaps)
+        return f"({column} > %s OR {column} IN ({', '.join(['%s'] * len(gaps))}))", [self.last_id] + gaps
+
+    def advance(self, ids):
+        """Consume the ids a batch read (ascending); returns (gaps opened, gaps closed)"""
+        closed = [row_id for row_id in ids if row_id in self.gaps]
+        for row_id in closed:
+            del self.gaps[row_id]
+        fresh = [row_id for row_id in ids if row_id > self.last_id]
+        if not fresh:
+            return [], closed
+        top = fresh[-1]
+        if self.last_id:
+            first = self.last_id + 1
+            first += (self.offset - first) % self.step
+            first = max(first, top - MAX_NEW_GAPS * self.step)
+        else:
+            first = fresh[0]  # a new watermark starts at the first row it reads
+        seen = set(fresh)
+        opened = [row_id for row_id in range(first, top, self.step) if row_id not in seen]
+        now = time.monotonic()
+        for row_id in opened:
+            self.gaps[row_id] = now
+        self.last_id = top
+        return opened, closed
+
+    def expire(self, timeout=GAP_TIMEOUT):
+        """Give up gaps older than timeout (in-memory watermarks; stored ones expire in read())"""
+        cutoff = time.monotonic() - timeout
+        expired = [row_id for row_id, found in self.gaps.items() if found < cutoff]
+        for row_id in expired:
+            del self.gaps[row_id]
+        return expired
+
+
+# ========== STORAGE ==========
+def read(connection, name, lock='FOR UPDATE', timeout=GAP_TIMEOUT):
+    """Stored watermark `name` with its open gaps, in the caller's transaction
+
+    lock is appended to the rollup_watermarks read ('FOR UPDATE', 'FOR
+    UPDATE SKIP LOCKED' or '' for a snapshot read). Returns None when there
+    is no row, which with SKIP LOCKED also means another worker holds it.
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT last_id, @@auto_increment_increment, @@auto_increment_offset
+            FROM rollup_watermarks WHERE name = %s {lock}
+        """, (name,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        last_id, step, offset = row
+        if lock:
+            cursor.execute("""
+                DELETE FROM watermark_gaps
+                WHERE name = %s AND found_at < CURRENT_TIMESTAMP - INTERVAL %s SECOND
+            """, (name, timeout))
+        cursor.execute("SELECT gap_id FROM watermark_gaps WHERE name = %s", (name,))
+        return Watermark(last_id, [gap for gap, in cursor.fetchall()], step, offset)
+    finally:
+        cursor.close()
+
+
+def step_of(connection):
+    """(auto_increment_increment, auto_increment_offset) for a watermark that has no row yet"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT @@auto_increment_increment, @@auto_increment_offset")
+        return cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def save(connection, name, watermark, opened=(), closed=(), replace=False):
+    """Write last_id and the gap changes of the last advance(); replace=True rewrites every gap"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            INSERT INTO rollup_watermarks (name, last_id) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE last_id = VALUES(last_id)
+        """, (name, watermark.last_id))
+        if replace:
+            cursor.execute("DELETE FROM watermark_gaps WHERE name = %s", (name,))
+            opened, closed = sorted(watermark.gaps), ()
+        if closed:
+            cursor.execute(f"DELETE FROM watermark_gaps WHERE name = %s AND gap_id IN ({', '.join(['%s'] * len(closed))})",
+                           [name] + list(closed))
+        for start in range(0, len(opened), 1000):
+            chunk = opened[start:start + 1000]
+            cursor.execute(f"INSERT IGNORE INTO watermark_gaps (name, gap_id) VALUES {', '.join(['(%s, %s)'] * len(chunk))}",
+                           [value for gap in chunk for value in (name, gap)])
+    finally:
+        cursor.close()
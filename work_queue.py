@@ -0,0 +1,226 @@
+"""
+Shelter work queue for PetNest Network
+Shelters claim pending animal reports in batches with SELECT ... FOR UPDATE
+SKIP LOCKED, so concurrent staff never wait on or double-claim the same rows.
+A claim is a lease (status 'seen', assigned_to = shelter) that must be kept
+alive by heartbeats; expired leases go back to 'pending'. Every status
+change is a single conditional UPDATE that only succeeds from the expected
+state and appends a report_status_events row in the same transaction.
+"""
+
+import time
+
+from report_sla import STATUS_CHANGE_SET, record_status_events
+
+# Claim order; NULL (no urgency given) comes last
+URGENCY_LEVELS = ('high', 'medium', 'low', None)
+
+# action -> (required current status, new status, extra SET clause)
+TRANSITIONS = {
+    'accept': ('seen', 'assigned', 'lease_expires_at = NULL'),
+    'start': ('assigned', 'in_progress', None),
+    'complete': ('in_progress', 'completed', 'completed_at = CURRENT_TIMESTAMP'),
+    'release': ('seen', 'pending', 'assigned_to = NULL, lease_expires_at = NULL'),
+}
+
+
+class TransitionError(Exception):
+    """The report is not in the state the action requires (or not held by this shelter)"""
+
+
+class ReportWorkQueue:
+    """Lease-based claiming over animal_reports"""
+
+    def __init__(self, get_connection, lease_seconds=300, requeue_interval=30, requeue_batch=500):
+        self._get_connection = get_connection
+        self.lease_seconds = lease_seconds
+        self.requeue_interval = requeue_interval
+        self.requeue_batch = requeue_batch
+        self._last_requeue = 0.0
+        self._metrics = {'claimed': 0, 'heartbeats': 0, 'requeued': 0, 'transitions': 0, 'conflicts': 0}
+
+    def claim(self, shelter_id, limit=5, city=None, condition=None):
+        """Claim up to `limit` pending reports (most urgent, oldest first) for a shelter"""
+        self.maybe_requeue()
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor(dictionary=True)
+        try:
+            connection.start_transaction()
+            filters = ["status = 'pending'"]
+            params = []
+            if city:
+                filters.append("city = %s")
+                params.append(city)
+            if condition:
+                filters.append("animal_condition = %s")
+                params.append(condition)
+            # One urgency level at a time: with status and urgency_level fixed,
+            # idx_reports_queue returns rows already in reported_at order, so the
+            # LIMIT stops the scan (and the row locks) after `limit` rows. A single
+            # ORDER BY urgency_level DESC, reported_at mixes directions, sorts the
+            # whole pending set and locks every row of it first.
+            report_ids = []
+            for level in URGENCY_LEVELS:
+                cursor.execute(f"""
+                    SELECT report_id FROM animal_reports
+                    WHERE {' AND '.join(filters)} AND urgency_level {'= %s' if level else 'IS NULL'}
+                    ORDER BY reported_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, params + ([level] if level else []) + [limit - len(report_ids)])
+                report_ids.extend(row['report_id'] for row in cursor.fetchall())
+                if len(report_ids) >= limit:
+                    break
+            if not report_ids:
+                connection.rollback()
+                return []
+
+            placeholders = ', '.join(['%s'] * len(report_ids))
+            cursor.execute(f"""
+                UPDATE animal_reports
+                SET {STATUS_CHANGE_SET}, status = 'seen', assigned_to = %s,
+                    lease_expires_at = CURRENT_TIMESTAMP + INTERVAL %s SECOND
+                WHERE report_id IN ({placeholders})
+            """, [shelter_id, self.lease_seconds] + report_ids)
+            record_status_events(cursor, report_ids, 'pending', shelter_id)
+            cursor.execute(f"""
+                SELECT report_id, animal_type, breed, animal_condition, description,
+                       urgency_level, city, region AS area, street, latitude, longitude,
+                       status, reported_at, lease_expires_at
+                FROM animal_reports WHERE report_id IN ({placeholders})
+                ORDER BY urgency_level DESC, reported_at
+            """, report_ids)
+            reports = cursor.fetchall()
+            connection.commit()
+            self._metrics['claimed'] += len(reports)
+            return reports
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+    def heartbeat(self, shelter_id, report_ids):
+        """Extend the leases this shelter still holds; returns the ids that were extended"""
+        if not report_ids:
+            return []
+        connection = self._get_connection()
+        if not connection:
+            raise ConnectionError('Database unavailable')
+        cursor = connection.cursor()
+        try:
+            placeholders = ', '.join(['%s'] * len(report_ids))
+            params = [self.lease_seconds, shelter_id] + list(report_ids)
+            cursor.execute(f"""
+                UPDATE animal_reports
+                SET lease_expires_at = CURRENT_TIMESTAMP + INTERVAL %s SECOND
+                WHERE status = 'seen' AND assigned_to = %s
+                AND lease_expires_at > CURRENT_TIMESTAMP
+                AND report_id IN ({placeholders})
+            """, params)
+            cursor.execute(f"""
+                SELECT report_id FROM animal_reports
+                WHERE status = 'seen' AND assigned_to = %s AND report_id IN ({placeholders})
+            """, [shelter_id] + list(report_ids))
+            held = [row[0] for row in cursor.fetchall()]
+            connection.commit()
+            self._metrics['heartbeats'] += 1
+            return held
+        finally:
+            cursor.close()
+            connection.close()
+
+    def transition(self, shelter_id, report_id, action, cursor=None):
+        """Apply a workflow action with one conditional UPDATE; raises TransitionError on conflict
+
+        The status event is appended in the same transaction. Returns
+        (old_status, new_status). Pass a cursor to run inside the caller's
+        transaction (the caller commits).
+        """
+        if action not in TRANSITIONS:
+            raise ValueError(f"Unknown action: {action}")
+        from_status, to_status, extra = TRANSITIONS[action]
+        own_connection = cursor is None
+        if own_connection:
+            connection = self._get_connection()
+            if not connection:
+                raise ConnectionError('Database unavailable')
+            cursor = connection.cursor()
+        try:
+            lease_check = " AND lease_expires_at > CURRENT_TIMESTAMP" if from_status == 'seen' else ""
+            cursor.execute(f"""
+                UPDATE animal_reports
+                SET {STATUS_CHANGE_SET}, status = %s{', ' + extra if extra else ''}
+                WHERE report_id = %s AND status = %s AND assigned_to = %s{lease_check}
+            """, (to_status, report_id, from_status, shelter_id))
+            if cursor.rowcount != 1:
+                self._metrics['conflicts'] += 1
+                raise TransitionError(f"Report {report_id} cannot be moved to '{to_status}' from its current state")
+            record_status_events(cursor, [report_id], from_status, shelter_id)
+            if own_connection:
+                connection.commit()
+            self._metrics['transitions'] += 1
+            return from_status, to_status
+        finally:
+            if own_connection:
+                cursor.close()
+                connection.close()
+
+    def requeue_stale(self):
+        """Return reports with expired leases to 'pending' in bounded batches"""
+        connection = self._get_connection()
+        if not connection:
+            return 0
+        cursor = connection.cursor()
+        try:
+            requeued = 0
+            while True:
+                connection.start_transaction()
+                cursor.execute("""
+                    SELECT report_id, assigned_to FROM animal_reports
+                    WHERE status = 'seen' AND lease_expires_at <= CURRENT_TIMESTAMP
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                """, (self.requeue_batch,))
+                rows = cursor.fetchall()
+                if rows:
+                    report_ids = [row[0] for row in rows]
+                    placeholders = ', '.join(['%s'] * len(report_ids))
+                    cursor.execute(f"""
+                        UPDATE animal_reports
+                        SET {STATUS_CHANGE_SET}, status = 'pending', assigned_to = NULL, lease_expires_at = NULL
+                        WHERE report_id IN ({placeholders})
+                    """, report_ids)
+                    # Time spent in 'seen' is charged to the shelter whose lease expired
+                    by_shelter = {}
+                    for report_id, shelter_id in rows:
+                        by_shelter.setdefault(shelter_id, []).append(report_id)
+                    for shelter_id, ids in by_shelter.items():
+                        record_status_events(cursor, ids, 'seen', shelter_id)
+                connection.commit()
+                requeued += len(rows)
+                if len(rows) < self.requeue_batch:
+                    break
+            self._metrics['requeued'] += requeued
+            return requeued
+        finally:
+            cursor.close()
+            connection.close()
+
+    def maybe_requeue(self):
+        """Run requeue_stale at most every requeue_interval seconds"""
+        now = time.monotonic()
+        if now - self._last_requeue < self.requeue_interval:
+            return 0
+        self._last_requeue = now
+        try:
+            return self.requeue_stale()
+        except Exception as e:
+            print(f"⚠️ Requeue of stale report leases failed: {e}")
+            return 0
+
+    def stats(self):
+        return dict(self._metrics)